@@ -37,6 +37,7 @@ def setup_directories():
         # 웹훅 및 전략 디렉토리 경로
         webhook_dir = os.path.join(storage_base, "webhooks")
         strategy_dir = os.path.join(storage_base, "strategies")
+        bar_dir = os.path.join(storage_base, "bars")
         
         logger.debug(f"디렉토리 경로 - 웹훅: {webhook_dir}, 전략: {strategy_dir}")
         
@@ -47,11 +48,13 @@ def setup_directories():
         # 환경 변수 설정
         os.environ["LOG_DIR"] = webhook_dir
         os.environ["STRATEGY_DIR"] = strategy_dir
+        os.environ["BAR_DIR"] = bar_dir
         
         return {
             "storage_base": storage_base,
             "webhook_dir": webhook_dir,
-            "strategy_dir": strategy_dir
+            "strategy_dir": strategy_dir,
+            "bar_dir": bar_dir
         }
     except Exception as e:
         logger.error(f"디렉토리 설정 중 오류: {str(e)}")
@@ -62,6 +65,7 @@ def setup_directories():
         if os.environ.get("VERCEL", ""):
             os.environ["LOG_DIR"] = "/tmp/storage/webhooks"
             os.environ["STRATEGY_DIR"] = "/tmp/storage/strategies"
+            os.environ["BAR_DIR"] = "/tmp/storage/bars"
             return {
                 "storage_base": "/tmp/storage",
                 "webhook_dir": "/tmp/storage/webhooks",
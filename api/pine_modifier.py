@@ -1,10 +1,17 @@
 import os
-import json
 import openai
 import datetime
 from pathlib import Path
 import logging
 
+# 비동기 코드 수정 경로는 루트 pine_modifier의 구현(공유 비동기 클라이언트)을 사용합니다.
+import pine_modifier as shared_modifier
+import metadata_store
+import status_counters
+import storage_utils
+import fast_json
+import pine_rules
+
 # 로깅 설정
 logger = logging.getLogger("api.pine_modifier")
 
@@ -20,6 +27,11 @@ def generate_modified_script(original_code, webhook_data):
     """
     웹훅 데이터와 원본 전략 코드를 기반으로 OpenAI API를 사용하여 수정된 코드를 생성합니다.
     """
+    # 단순한 매개변수 변경 요청은 LLM 없이 규칙으로 처리 (루트 pine_modifier와 같은 규칙)
+    rule_code = pine_rules.try_rules(original_code, webhook_data)
+    if rule_code is not None:
+        return rule_code
+    
     if not api_key:
         logger.warning("API 키가 없어 코드 수정을 건너뜁니다.")
         return original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다."
@@ -27,74 +39,11 @@ def generate_modified_script(original_code, webhook_data):
     try:
         logger.debug("전략 코드 수정 시작")
         
-        # 원본 코드에서 전략 이름 추출
-        strategy_name = "Unknown Strategy"
-        for line in original_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    strategy_name = line[start_idx:end_idx]
-                    break
-        logger.debug(f"원본 전략 이름: {strategy_name}")
-        
-        # 웹훅 데이터 구성
-        trading_problem = webhook_data.get("trading_problem", "전략 최적화가 필요합니다.")
-        suggested_improvements = webhook_data.get("suggested_improvements", "전략의 매개변수를 현재 시장 상황에 맞게 조정하세요.")
-        
-        # 성과 데이터 추출
-        performance = webhook_data.get("performance", {})
-        profit_factor = performance.get("profit_factor", "불명")
-        win_rate = performance.get("win_rate", "불명")
-        avg_profit = performance.get("avg_profit", "불명")
-        max_drawdown = performance.get("max_drawdown", "불명")
-        
-        # 최근 트레이드 데이터
-        recent_trades = webhook_data.get("recent_trades", [])
-        trades_summary = ""
-        if recent_trades:
-            trades_summary = f"최근 {len(recent_trades)}개 거래 요약:\n"
-            for i, trade in enumerate(recent_trades):
-                direction = trade.get("direction", "불명")
-                result = trade.get("result", "불명")
-                profit_pct = trade.get("profit_pct", "불명")
-                trades_summary += f"- 거래 {i+1}: {direction}, 결과: {result}, 수익률: {profit_pct}%\n"
-        
+        # 프롬프트 구성 (주석/시각화 줄은 빼고, 거래 내역은 토큰 예산 안에서 요약, 루트 pine_modifier와 같은 프롬프트)
+        prompt_code, compaction = shared_modifier.compact_code(original_code)
+        prompt = shared_modifier.build_prompt(prompt_code, webhook_data)
         logger.debug(f"웹훅 데이터 처리 완료, OpenAI API 요청 준비")
         
-        # API 요청을 위한 프롬프트 구성
-        prompt = f"""
-당신은 Pine Script 전략 코드 최적화 전문가입니다. 다음 트레이딩 전략 코드를 분석하고 개선해야 합니다.
-
-## 원본 전략: {strategy_name}
-```pine
-{original_code}
-```
-
-## 전략 성과:
-- 수익 팩터: {profit_factor}
-- 승률: {win_rate}
-- 평균 수익: {avg_profit}
-- 최대 낙폭: {max_drawdown}
-
-## 문제점:
-{trading_problem}
-
-## 제안된 개선사항:
-{suggested_improvements}
-
-{trades_summary}
-
-위 정보를 바탕으로 전략 코드를 개선해주세요. 다음 규칙을 따라주세요:
-1. 전략의 핵심 로직은 유지하되, 매개변수와 조건을 최적화하세요.
-2. 추가 기능이나 지표를 통합하여 성능을 향상시킬 수 있습니다.
-3. 코드는 Pine Script 문법에 맞게 작성해야 합니다.
-4. 코드 설명 주석을 추가하여 변경 사항을 명확히 해주세요.
-5. 전체 Pine Script 코드만 반환하세요.
-
-개선된 Pine Script 코드:
-"""
-        
         # 모의 응답 모드 (디버깅용)
         # return original_code + "\n\n// 이것은 모의 응답입니다. OpenAI API가 호출되지 않았습니다."
         
@@ -130,6 +79,10 @@ def generate_modified_script(original_code, webhook_data):
                     modified_code = modified_code[start_idx:end_idx].strip()
                     logger.debug("``` 코드 블록에서 코드 추출")
             
+            if compaction is not None:
+                # 프롬프트에서 뺀 주석/시각화 줄을 다시 넣음
+                modified_code = compaction.restore(modified_code)
+            
             logger.info("전략 코드 수정 완료")
             return modified_code
             
@@ -145,6 +98,28 @@ def generate_modified_script(original_code, webhook_data):
         logger.error(tb)
         return original_code + f"\n\n// 코드 수정 중 오류 발생: {str(e)}"
 
+async def generate_modified_script_async(original_code, webhook_data, report=None):
+    """
+    generate_modified_script의 비동기 버전입니다. 이벤트 루프를 막지 않습니다.
+    report(dict)를 주면 호출별 토큰 사용량을 기록합니다.
+    규칙(pine_rules)으로 처리할 수 있는 요청은 API 키가 없어도 처리되도록 API 키 확인도 루트 구현에 맡깁니다.
+    """
+    return await shared_modifier.generate_modified_script_async(original_code, webhook_data, report)
+
+async def select_modified_script_async(original_code, webhook_data, bars=None, report=None):
+    """
+    best-of-N 모드의 코드 수정입니다. 후보 생성과 백테스트 순위는 루트 pine_modifier의 구현을 사용합니다.
+    """
+    return await shared_modifier.select_modified_script_async(original_code, webhook_data, bars, report)
+
+async def stream_modified_script(original_code, webhook_data):
+    """
+    수정 코드 생성 과정을 토큰 단위로 내보내는 스트리밍 버전입니다.
+    이벤트 형식은 루트 pine_modifier.stream_modified_script와 같으며, 규칙 처리와 API 키 확인도 루트 구현에서 합니다.
+    """
+    async for event in shared_modifier.stream_modified_script(original_code, webhook_data):
+        yield event
+
 def test_analysis(strategy_code, webhook_data):
     """
     전략 코드와 웹훅 데이터를 이용한 테스트 분석을 수행합니다.
@@ -154,6 +129,15 @@ def test_analysis(strategy_code, webhook_data):
     logger.debug("테스트 분석 완료")
     return result
 
+async def test_analysis_async(strategy_code, webhook_data):
+    """
+    전략 코드와 웹훅 데이터를 이용한 테스트 분석을 비동기로 수행합니다.
+    """
+    logger.debug("테스트 분석 시작 (비동기)")
+    result = await generate_modified_script_async(strategy_code, webhook_data)
+    logger.debug("테스트 분석 완료")
+    return result
+
 def save_modification(original_code, modified_code, webhook_data, strategy_dir):
     """
     수정된 전략 코드와 메타데이터를 저장합니다.
@@ -161,8 +145,9 @@ def save_modification(original_code, modified_code, webhook_data, strategy_dir):
     try:
         logger.debug("수정된 코드 저장 시작")
         
-        # 타임스탬프 생성
+        # 타임스탬프와 파일 ID 생성 (ULID: 시간순 정렬, 여러 프로세스에서 동시에 저장해도 충돌 없음)
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_id = storage_utils.new_ulid()
         
         # 디렉토리 확인 및 생성
         try:
@@ -173,32 +158,16 @@ def save_modification(original_code, modified_code, webhook_data, strategy_dir):
             raise
         
         # 수정된 코드 파일명
-        modified_file = os.path.join(strategy_dir, f"modified_{timestamp}.pine")
+        modified_file = os.path.join(strategy_dir, f"modified_{file_id}.pine")
         
         # 메타데이터 파일명
-        metadata_file = os.path.join(strategy_dir, f"metadata_{timestamp}.json")
+        metadata_file = os.path.join(strategy_dir, f"metadata_{file_id}.json")
         
         logger.debug(f"파일 경로 설정 - 수정된 코드: {modified_file}, 메타데이터: {metadata_file}")
         
-        # 원본 코드에서 전략 이름 추출
-        original_strategy = "Unknown Strategy"
-        for line in original_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    original_strategy = line[start_idx:end_idx]
-                    break
-        
-        # 수정된 코드에서 전략 이름 추출
-        modified_strategy = "Modified Strategy"
-        for line in modified_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    modified_strategy = line[start_idx:end_idx]
-                    break
+        # 원본/수정된 코드에서 전략 이름 추출 (루트 pine_modifier와 같은 파서 사용)
+        original_strategy = shared_modifier.extract_strategy_name(original_code)
+        modified_strategy = shared_modifier.extract_strategy_name(modified_code, "Modified Strategy")
         
         logger.debug(f"전략 이름 추출 - 원본: {original_strategy}, 수정됨: {modified_strategy}")
         
@@ -207,6 +176,7 @@ def save_modification(original_code, modified_code, webhook_data, strategy_dir):
         
         # 메타데이터 생성
         metadata = {
+            "id": file_id,
             "timestamp": timestamp,
             "original_strategy": original_strategy,
             "modified_strategy": modified_strategy,
@@ -215,20 +185,30 @@ def save_modification(original_code, modified_code, webhook_data, strategy_dir):
             "trading_problem": webhook_data.get("trading_problem", ""),
             "modification_summary": modification_summary
         }
+        if "optimization" in webhook_data:
+            # 매개변수 탐색으로 저장한 경우 고른 조합과 그 조합의 백테스트 성과
+            metadata["optimization"] = webhook_data["optimization"]
+        if "candidates" in webhook_data:
+            # best-of-N 모드에서 평가한 모든 후보의 점수
+            metadata["candidates"] = webhook_data["candidates"]
         
         logger.debug("메타데이터 생성 완료")
         
         # 파일 저장
         try:
-            with open(modified_file, 'w') as f:
-                f.write(modified_code)
+            # 임시 파일에 쓴 뒤 rename으로 교체 (읽는 쪽은 완성된 파일만 보게 됨)
+            storage_utils.atomic_write(modified_file, modified_code)
             logger.debug(f"수정된 코드 저장 완료: {modified_file}")
                 
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=4)
+            storage_utils.atomic_write(metadata_file, fast_json.dumps(metadata))
             logger.debug(f"메타데이터 저장 완료: {metadata_file}")
+            
+            # 내역 조회용 메타데이터 저장소에도 기록
+            metadata_store.record_modification(strategy_dir, metadata, modified_file, metadata_file)
+            status_counters.counters.record_modification(modified_file, metadata_file)
                 
             return {
+                "id": file_id,
                 "timestamp": timestamp,
                 "modified_file": modified_file,
                 "metadata_file": metadata_file
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request, HTTPException
+from typing import Optional
 import os
-import json
+import asyncio
 import datetime
 from pathlib import Path
 import sys
@@ -16,58 +17,45 @@ logger.debug(f"webhook_router - sys.path: {sys.path}")
 
 # pine_modifier 모듈 임포트
 try:
-    from api.pine_modifier import generate_modified_script, save_modification, test_analysis, api_key
+    from api.pine_modifier import generate_modified_script, generate_modified_script_async, stream_modified_script, select_modified_script_async, save_modification, test_analysis, test_analysis_async, api_key
     logger.debug("pine_modifier 모듈 함수 임포트 성공")
 except Exception as e:
     logger.error(f"pine_modifier 모듈 임포트 실패: {str(e)}")
     import traceback
     logger.error(traceback.format_exc())
 
-router = APIRouter()
+from job_queue import JobQueue, JobQueueFull
+from webhook_coalescer import WebhookCoalescer
+import llm_client
+import llm_cache
+import webhook_log
+import metadata_store
+import status_counters
+import storage_utils
+import async_storage
+import sse
+import fast_json
+import pine_parser
+import pine_rules
+import backtester
+import param_sweep
+import bar_store
+import streaming
+import candidate_ranker
+import pine_compiler
+import backtest_cache
+from fast_json import FastJSONResponse
+
+router = APIRouter(default_response_class=FastJSONResponse)
 
 # 기본 디렉토리 설정 (나중에 index.py에서 설정됨)
 LOG_DIR = os.getenv("LOG_DIR", "/tmp/storage/webhooks")
 STRATEGY_DIR = os.getenv("STRATEGY_DIR", "/tmp/storage/strategies")
+BAR_DIR = os.getenv("BAR_DIR", "/tmp/storage/bars")
 logger.debug(f"디렉토리 설정 - LOG_DIR: {LOG_DIR}, STRATEGY_DIR: {STRATEGY_DIR}")
 
-@router.post("/")
-async def receive_webhook(request: Request):
-    """
-    TradingView에서 보낸 웹훅을 처리합니다.
-    """
-    try:
-        logger.debug("웹훅 수신 요청 시작")
-        
-        # 웹훅 데이터 받기
-        webhook_data = await request.json()
-        logger.debug(f"웹훅 데이터 수신 성공: {webhook_data.keys() if webhook_data else 'None'}")
-        
-        # 타임스탬프 생성
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # 웹훅 데이터 로깅
-        log_file = os.path.join(LOG_DIR, f"webhook_{timestamp}.json")
-        logger.debug(f"로그 파일 경로: {log_file}")
-        
-        try:
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
-            with open(log_file, 'w') as f:
-                json.dump(webhook_data, f, indent=4)
-            logger.debug("웹훅 데이터 로깅 완료")
-        except Exception as write_error:
-            logger.error(f"웹훅 데이터 저장 중 오류: {str(write_error)}")
-        
-        # 샘플 전략 코드가 없으면 생성
-        current_strategy_file = os.path.join(STRATEGY_DIR, "current.pine")
-        logger.debug(f"전략 파일 경로: {current_strategy_file}")
-        
-        if not os.path.exists(current_strategy_file):
-            logger.debug("기본 전략 파일이 없어 생성 시작")
-            try:
-                os.makedirs(os.path.dirname(current_strategy_file), exist_ok=True)
-                # 기본 코드 생성
-                with open(current_strategy_file, 'w') as f:
-                    f.write("""
+# current.pine이 없을 때 사용하는 기본 전략 코드
+DEFAULT_STRATEGY_CODE = """
 //@version=4
 strategy("Simple RSI Strategy", overlay=true)
 rsiLength = input(14, title="RSI 기간")
@@ -78,52 +66,232 @@ if (crossover(rsiValue, rsiOversold))
     strategy.entry("RSI_Long", strategy.long)
 if (crossunder(rsiValue, rsiOverbought))
     strategy.entry("RSI_Short", strategy.short)
-""")
-                logger.debug("기본 전략 파일 생성 완료")
-            except Exception as create_error:
-                logger.error(f"기본 전략 파일 생성 중 오류: {str(create_error)}")
-                raise
+"""
+
+# /test, /test/stream에서 사용하는 샘플 전략 코드와 웹훅 데이터
+TEST_STRATEGY_CODE = """
+//@version=4
+strategy("Simple RSI Strategy", overlay=true)
+rsiLength = input(14, title="RSI 기간")
+rsiOverbought = input(70, title="RSI 과매수 기준")
+rsiOversold = input(33, title="RSI 과매도 기준")
+rsiValue = rsi(close, rsiLength)
+if (crossover(rsiValue, rsiOversold))
+    strategy.entry("RSI_Long", strategy.long)
+if (crossunder(rsiValue, rsiOverbought))
+    strategy.entry("RSI_Short", strategy.short)
+"""
+
+TEST_WEBHOOK_DATA = {
+    "trading_problem": "RSI 전략이 최근 상승 추세에서 수익성이 낮습니다. 과매수/과매도 기준이 현재 시장 상황에 최적화되지 않았으며, 이익실현 및 손절매 설정이 개선이 필요합니다.",
+    "suggested_improvements": "RSI 과매도 기준을 28로 낮추고, 이익실현 비율을 5%에서 7%로 높이세요. 트레일링 스탑을 2%로 적용하고, 매도 신호에 볼린저 밴드 상단을 추가로 활용하여 더 정확한 매도 시점을 잡으세요."
+}
+
+async def load_current_strategy():
+    """
+    current.pine을 읽습니다. 파일이 없으면 기본 코드로 생성합니다.
+    다른 워커 프로세스와 동시에 만들거나 교체하지 않도록 파일 잠금을 사용합니다.
+    """
+    current_strategy_file = os.path.join(STRATEGY_DIR, "current.pine")
+    logger.debug(f"전략 파일 경로: {current_strategy_file}")
+    
+    logger.debug("원본 전략 코드 로드 시작")
+    try:
+        original_code, created = await async_storage.run(storage_utils.read_locked, current_strategy_file, DEFAULT_STRATEGY_CODE)
+        if created:
+            status_counters.counters.incr("strategies", key="current.pine")
+            logger.debug("기본 전략 파일 생성 완료")
+        logger.debug("원본 전략 코드 로드 완료")
+    except Exception as read_error:
+        logger.error(f"원본 전략 코드 로드 중 오류: {str(read_error)}")
+        raise
+    return original_code
+
+async def read_strategy_file(filename):
+    """
+    STRATEGY_DIR의 전략 파일을 읽어 코드를 반환합니다.
+    파일명이 잘못되었거나 파일을 읽을 수 없으면 HTTPException을 발생시킵니다.
+    """
+    # 보안 체크: 파일명에 경로 문자가 포함되어 있거나 절대 경로인지 확인
+    if not isinstance(filename, str) or "../" in filename or "..\\" in filename \
+            or Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="잘못된 파일명 형식입니다.")
+    
+    strategy_file = Path(STRATEGY_DIR) / filename
+    file_status = await async_storage.file_status(strategy_file)
+    if file_status == async_storage.FILE_MISSING:
+        raise HTTPException(status_code=404, detail=f"전략 파일 '{filename}'을 찾을 수 없습니다.")
+    if file_status == async_storage.FILE_IS_DIR:
+        raise HTTPException(status_code=400, detail=f"'{filename}'은 디렉토리입니다.")
+    if file_status == async_storage.FILE_NO_ACCESS:
+        raise HTTPException(status_code=403, detail=f"전략 파일 '{filename}'에 접근할 수 없습니다.")
+    return await async_storage.read_text(strategy_file)
+
+async def process_webhook(webhook_data):
+    """
+    작업 큐에서 실행되는 전략 코드 수정 작업입니다.
+    """
+    # 원본 전략 코드 로드
+    original_code = await load_current_strategy()
+    
+    # AI를 통한 수정된 코드 생성
+    logger.debug("AI를 통한 코드 수정 시작")
+    llm_report = {}
+    ranking = None
+    try:
+        if candidate_ranker.LLM_CANDIDATES > 1:
+            # best-of-N: 후보 여러 개를 최근 봉으로 백테스트해 가장 좋은 후보만 저장
+            bars = await async_storage.run(candidate_ranker.locate_bars, bar_data, webhook_data)
+            modified_code, ranking = await select_modified_script_async(original_code, webhook_data, bars, llm_report)
+            if ranking is not None:
+                webhook_data = dict(webhook_data, candidates=ranking)
+        else:
+            modified_code = await generate_modified_script_async(original_code, webhook_data, llm_report)
+        logger.debug(f"코드 수정 완료: {llm_report}")
+    except Exception as modify_error:
+        logger.error(f"AI 코드 수정 중 오류: {str(modify_error)}")
+        raise
+    
+    # 수정된 코드와 메타데이터 저장
+    logger.debug("수정된 코드 저장 시작")
+    try:
+        result = await async_storage.run(
+            save_modification,
+            original_code, 
+            modified_code, 
+            webhook_data,
+            STRATEGY_DIR
+        )
+        logger.debug(f"수정된 코드 저장 완료: {result}")
+    except Exception as save_error:
+        logger.error(f"수정된 코드 저장 중 오류: {str(save_error)}")
+        raise
+    
+    return {
+        "modified_strategy": result["modified_file"],
+        "metadata_file": result["metadata_file"],
+        "llm": llm_report,
+        "candidates": ranking
+    }
+
+# 세그먼트 단위 추가 전용 웹훅 로그
+webhook_store = webhook_log.get_log(LOG_DIR)
+
+# 인덱스가 있는 수정 내역 메타데이터 저장소 (SQLite)
+history_store = metadata_store.get_store(STRATEGY_DIR)
+
+# 티커/타임프레임별 열 단위 봉 데이터 저장소 (메모리 맵)
+bar_data = bar_store.get_store(BAR_DIR)
+
+def scan_status_counts():
+    """
+    저장소를 직접 세어 상태 카운터의 기준값을 만듭니다.
+    시작 시 백그라운드 스레드에서 한 번만 실행됩니다.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    os.makedirs(STRATEGY_DIR, exist_ok=True)
+    legacy_webhooks = []
+    with os.scandir(LOG_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith("webhook_") and entry.name.endswith(".json"):
+                legacy_webhooks.append((entry.stat().st_mtime, entry.path))
+    strategy_files = set()
+    metadata_files = set()
+    with os.scandir(STRATEGY_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith(".pine"):
+                strategy_files.add(entry.name)
+            elif entry.name.startswith("metadata_") and entry.name.endswith(".json"):
+                metadata_files.add(entry.name)
+
+    # 레코드 수와 최근 웹훅을 같은 시점에서 읽음 (ID가 정렬되어 있어 그 이하의 ID는 이미 센 것)
+    summary = webhook_store.summary()
+    through = summary["latest"]["id"] if summary["latest"] else None
+
+    def includes(name, key):
+        """스캔 중에 기록된 갱신이 이 스캔 결과에 이미 포함되었는지 확인합니다."""
+        if name == "webhooks":
+            return through is not None and key <= through
+        return key in (strategy_files if name == "strategies" else metadata_files)
+
+    # 최근 웹훅: 세그먼트 로그 우선, 없으면 이전 형식의 가장 최근 파일
+    latest_webhook = summary["latest"]
+    if latest_webhook is None and legacy_webhooks:
+        mtime, path = max(legacy_webhooks)
+        latest_webhook = {
+            "file": path,
+            "timestamp": datetime.datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    return {
+        "counts": {
+            "webhooks": summary["records"] + len(legacy_webhooks),
+            "strategies": len(strategy_files),
+            "modifications": len(metadata_files)
+        },
+        "latest_webhook": latest_webhook,
+        "includes": includes
+    }
+
+# /status용 카운터: 저장된 값으로 시작하고 백그라운드에서 디렉토리 스캔으로 맞춤
+status_counters.counters.start(scan_status_counts)
+
+async def store_webhook(webhook_data):
+    """
+    웹훅 데이터를 세그먼트 로그에 추가하고 웹훅 ID를 반환합니다. 동시 요청은 한 번의 fsync로 함께 커밋됩니다.
+    저장에 실패해도 코드 수정은 진행할 수 있도록 오류를 기록하고 None을 반환합니다.
+    """
+    try:
+        webhook_id = await async_storage.run(webhook_store.append, webhook_data)
+        status_counters.counters.record_webhook(webhook_id, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        logger.debug(f"웹훅 데이터 로깅 완료: {webhook_id}")
+        return webhook_id
+    except Exception as write_error:
+        logger.error(f"웹훅 데이터 저장 중 오류: {str(write_error)}")
+        return None
+
+# 웹훅 처리 작업 큐 (작업자 수는 WEBHOOK_WORKERS 환경 변수로 설정)
+# 작업 상태는 저장소에도 기록하여 여러 워커 프로세스에서 조회할 수 있게 함
+job_queue = JobQueue(process_webhook, state_dir=os.path.join(os.path.dirname(LOG_DIR), "jobs"))
+
+# 전략/티커별 웹훅 병합기 (병합 창은 WEBHOOK_COALESCE_WINDOW 환경 변수로 설정)
+coalescer = WebhookCoalescer(job_queue)
+
+@router.post("/")
+async def receive_webhook(request: Request):
+    """
+    TradingView에서 보낸 웹훅을 저장하고 처리 작업을 큐에 등록합니다.
+    코드 수정은 작업자가 비동기로 수행하며, 진행 상태는 /webhook/jobs/{job_id}로 조회합니다.
+    """
+    try:
+        logger.debug("웹훅 수신 요청 시작")
         
-        # 원본 전략 코드 로드
-        logger.debug("원본 전략 코드 로드 시작")
-        try:
-            with open(current_strategy_file, 'r') as f:
-                original_code = f.read()
-            logger.debug("원본 전략 코드 로드 완료")
-        except Exception as read_error:
-            logger.error(f"원본 전략 코드 로드 중 오류: {str(read_error)}")
-            raise
+        # 웹훅 데이터 받기
+        webhook_data = await async_storage.loads(await request.body())
+        logger.debug(f"웹훅 데이터 수신 성공: {webhook_data.keys() if webhook_data else 'None'}")
         
-        # AI를 통한 수정된 코드 생성
-        logger.debug("AI를 통한 코드 수정 시작")
-        try:
-            modified_code = generate_modified_script(original_code, webhook_data)
-            logger.debug("코드 수정 완료")
-        except Exception as modify_error:
-            logger.error(f"AI 코드 수정 중 오류: {str(modify_error)}")
-            raise
+        # 웹훅 데이터 로깅
+        webhook_id = await store_webhook(webhook_data)
         
-        # 수정된 코드와 메타데이터 저장
-        logger.debug("수정된 코드 저장 시작")
+        # 코드 수정 작업 등록 (같은 전략/티커의 연속 웹훅은 하나의 작업으로 병합)
         try:
-            result = save_modification(
-                original_code, 
-                modified_code, 
-                webhook_data,
-                STRATEGY_DIR
-            )
-            logger.debug(f"수정된 코드 저장 완료: {result}")
-        except Exception as save_error:
-            logger.error(f"수정된 코드 저장 중 오류: {str(save_error)}")
-            raise
+            job, coalesced = coalescer.submit(webhook_data, webhook_id=webhook_id)
+        except JobQueueFull as queue_error:
+            logger.error(f"작업 등록 실패: {str(queue_error)}")
+            return FastJSONResponse(status_code=503, content={
+                "status": "error",
+                "message": f"작업 등록 실패: {str(queue_error)}",
+                "webhook_id": webhook_id
+            })
         
-        return {
-            "status": "success",
-            "message": "웹훅 수신 및 전략 코드 수정 완료",
-            "log_file": log_file,
-            "modified_strategy": result["modified_file"],
-            "metadata_file": result["metadata_file"]
-        }
+        return FastJSONResponse(status_code=202, content={
+            "status": "accepted",
+            "message": "웹훅 수신 완료, 전략 코드 수정 작업이 등록되었습니다.",
+            "job_id": job.id,
+            "job_url": f"/webhook/jobs/{job.id}",
+            "coalesced": coalesced,
+            "webhook_id": webhook_id
+        })
     except Exception as e:
         logger.error(f"웹훅 처리 중 오류 발생: {str(e)}")
         import traceback
@@ -135,6 +303,21 @@ if (crossunder(rsiValue, rsiOverbought))
             "traceback": tb
         }
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    웹훅 처리 작업의 상태와 결과 파일 경로를 반환합니다.
+    """
+    logger.debug(f"작업 상태 조회: {job_id}")
+    job = await job_queue.get(job_id)
+    if job is None:
+        logger.warning(f"작업을 찾을 수 없음: {job_id}")
+        raise HTTPException(status_code=404, detail=f"작업 '{job_id}'을 찾을 수 없습니다.")
+    return {
+        "status": "success",
+        "job": job.to_dict()
+    }
+
 @router.get("/test")
 async def test_analysis_endpoint():
     """
@@ -143,31 +326,15 @@ async def test_analysis_endpoint():
     try:
         logger.debug("테스트 분석 시작")
         
-        # 샘플 전략 코드
-        sample_code = """
-//@version=4
-strategy("Simple RSI Strategy", overlay=true)
-rsiLength = input(14, title="RSI 기간")
-rsiOverbought = input(70, title="RSI 과매수 기준")
-rsiOversold = input(33, title="RSI 과매도 기준")
-rsiValue = rsi(close, rsiLength)
-if (crossover(rsiValue, rsiOversold))
-    strategy.entry("RSI_Long", strategy.long)
-if (crossunder(rsiValue, rsiOverbought))
-    strategy.entry("RSI_Short", strategy.short)
-"""
-        
-        # 샘플 웹훅 데이터
-        sample_webhook_data = {
-            "trading_problem": "RSI 전략이 최근 상승 추세에서 수익성이 낮습니다. 과매수/과매도 기준이 현재 시장 상황에 최적화되지 않았으며, 이익실현 및 손절매 설정이 개선이 필요합니다.",
-            "suggested_improvements": "RSI 과매도 기준을 28로 낮추고, 이익실현 비율을 5%에서 7%로 높이세요. 트레일링 스탑을 2%로 적용하고, 매도 신호에 볼린저 밴드 상단을 추가로 활용하여 더 정확한 매도 시점을 잡으세요."
-        }
+        # 샘플 전략 코드와 웹훅 데이터
+        sample_code = TEST_STRATEGY_CODE
+        sample_webhook_data = TEST_WEBHOOK_DATA
         
         logger.debug("샘플 데이터 준비 완료, AI 분석 시작")
         
         # AI를 통한 수정된 코드 생성
         try:
-            modified_code = test_analysis(sample_code, sample_webhook_data)
+            modified_code = await test_analysis_async(sample_code, sample_webhook_data)
             logger.debug("테스트 분석 완료")
         except Exception as analysis_error:
             logger.error(f"테스트 분석 중 오류: {str(analysis_error)}")
@@ -190,58 +357,131 @@ if (crossunder(rsiValue, rsiOverbought))
             "traceback": tb
         }
 
+async def stream_modification(original_code, webhook_data, save, start_info):
+    """
+    수정 코드 생성 과정을 SSE 이벤트로 내보냅니다.
+    start → token(여러 번) → done 순서이며, 오류가 나면 error 이벤트로 끝납니다.
+    패치 모드에서 전체 코드로 다시 요청하면 중간에 retry 이벤트가 들어갑니다.
+    save가 참이면 done을 보내기 전에 save_modification으로 결과를 저장합니다.
+    """
+    # 첫 이벤트를 LLM 호출 전에 바로 보내 첫 바이트까지의 시간을 줄임
+    yield sse.format_event("start", start_info)
+    try:
+        modified_code = None
+        cached = False
+        llm_report = {}
+        async for event in stream_modified_script(original_code, webhook_data):
+            if event["type"] == "token":
+                yield sse.format_event("token", {"text": event["text"]})
+            elif event["type"] == "retry":
+                # 패치 모드 응답을 적용하지 못해 전체 코드를 다시 받음 (클라이언트는 받은 토큰을 버림)
+                yield sse.format_event("retry", {"reason": event["reason"]})
+            elif event["type"] == "done":
+                modified_code = event["modified_code"]
+                cached = event["cached"]
+                llm_report = event.get("llm", {})
+        
+        result = {
+            "status": "success",
+            "modified_code": modified_code,
+            "cached": cached,
+            "llm": llm_report
+        }
+        if save:
+            logger.debug("수정된 코드 저장 시작")
+            saved = await async_storage.run(save_modification, original_code, modified_code, webhook_data, STRATEGY_DIR)
+            if "error" in saved:
+                raise Exception(saved["error"])
+            logger.debug(f"수정된 코드 저장 완료: {saved}")
+            result["modified_strategy"] = saved["modified_file"]
+            result["metadata_file"] = saved["metadata_file"]
+        yield sse.format_event("done", result)
+    except Exception as e:
+        logger.error(f"스트리밍 코드 수정 중 오류 발생: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        yield sse.format_event("error", {
+            "status": "error",
+            "message": f"스트리밍 코드 수정 중 오류 발생: {str(e)}"
+        })
+
+@router.post("/stream")
+async def receive_webhook_stream(request: Request):
+    """
+    웹훅을 저장한 뒤 작업 큐를 거치지 않고 바로 전략 코드를 수정하며, LLM 출력을 SSE로 전달합니다.
+    최종 결과는 save_modification으로 저장되고 done 이벤트에 파일 경로가 포함됩니다.
+    """
+    try:
+        logger.debug("스트리밍 웹훅 수신 요청 시작")
+        
+        # 웹훅 데이터 받기
+        webhook_data = await async_storage.loads(await request.body())
+        logger.debug(f"웹훅 데이터 수신 성공: {webhook_data.keys() if webhook_data else 'None'}")
+        
+        # 웹훅 데이터 로깅
+        webhook_id = await store_webhook(webhook_data)
+        
+        # 원본 전략 코드 로드
+        original_code = await load_current_strategy()
+        
+        return sse.EventStreamResponse(stream_modification(original_code, webhook_data, True, {
+            "status": "started",
+            "webhook_id": webhook_id
+        }))
+    except Exception as e:
+        logger.error(f"웹훅 처리 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"웹훅 처리 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.get("/test/stream")
+async def test_analysis_stream_endpoint():
+    """
+    /test와 같은 샘플 데이터로 테스트 분석을 수행하며, LLM 출력을 SSE로 전달합니다.
+    /test와 마찬가지로 결과는 저장하지 않습니다.
+    """
+    logger.debug("스트리밍 테스트 분석 시작")
+    return sse.EventStreamResponse(stream_modification(TEST_STRATEGY_CODE, TEST_WEBHOOK_DATA, False, {
+        "status": "started",
+        "original_code": TEST_STRATEGY_CODE,
+        "webhook_data": TEST_WEBHOOK_DATA
+    }))
+
 @router.get("/history")
-async def get_modification_history():
+async def get_modification_history(limit: int = metadata_store.HISTORY_DEFAULT_LIMIT, cursor: Optional[str] = None,
+                                   strategy: Optional[str] = None, since: Optional[str] = None,
+                                   until: Optional[str] = None):
     """
-    수정 내역 메타데이터를 반환합니다.
+    수정 내역 메타데이터를 최신 순으로 한 페이지씩 반환합니다.
+
+    - limit: 페이지 크기 (최대 HISTORY_MAX_LIMIT)
+    - cursor: 이전 응답의 next_cursor
+    - strategy: 원본 전략 이름 필터
+    - since/until: 시간 범위 (예: 2024-01-02, 2024-01-02 03:04:05, 20240102_030405)
     """
     try:
-        logger.debug("수정 내역 조회 시작")
+        logger.debug(f"수정 내역 조회 시작 (limit={limit}, cursor={cursor}, strategy={strategy})")
         
-        # 메타데이터 파일 찾기
         try:
-            os.makedirs(STRATEGY_DIR, exist_ok=True)
-            metadata_files = [os.path.join(STRATEGY_DIR, f) for f in os.listdir(STRATEGY_DIR) 
-                            if f.startswith("metadata_") and f.endswith(".json")]
-            logger.debug(f"메타데이터 파일 {len(metadata_files)}개 찾음")
-        except Exception as list_error:
-            logger.error(f"메타데이터 파일 목록 조회 중 오류: {str(list_error)}")
-            metadata_files = []
-        
-        if not metadata_files:
-            logger.debug("메타데이터 파일이 없음")
-            return {
-                "status": "success",
-                "history": []
-            }
-        
-        # 최신 순으로 정렬
-        metadata_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-        
-        # 메타데이터 로드
-        history = []
-        for file in metadata_files:
-            try:
-                with open(file, 'r') as f:
-                    metadata = json.load(f)
-                    
-                # 중요 정보만 선택
-                history.append({
-                    "timestamp": metadata.get("timestamp", ""),
-                    "original_strategy": metadata.get("original_strategy", ""),
-                    "modified_strategy": metadata.get("modified_strategy", ""),
-                    "performance_before": metadata.get("performance_before", {}),
-                    "modification_summary": metadata.get("modification_summary", "")
-                })
-                logger.debug(f"메타데이터 파일 로드 성공: {file}")
-            except Exception as e:
-                logger.error(f"메타데이터 파일 '{file}' 처리 중 오류: {str(e)}")
+            # 기존 JSON 메타데이터 파일은 처음 한 번만 저장소로 가져옴
+            await async_storage.run(history_store.ensure_imported, STRATEGY_DIR)
+            history, next_cursor = await async_storage.run(history_store.history, limit, cursor, strategy, since, until)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         logger.debug(f"총 {len(history)}개의 수정 내역 로드 완료")
         return {
             "status": "success",
-            "history": history
+            "history": history,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"수정 내역 조회 중 오류 발생: {str(e)}")
         import traceback
@@ -261,51 +501,16 @@ async def get_system_status():
     try:
         logger.debug("시스템 상태 조회 시작")
         
-        # 웹훅 로그 파일 카운트
-        try:
-            os.makedirs(LOG_DIR, exist_ok=True)
-            webhook_count = len([f for f in os.listdir(LOG_DIR) if f.startswith("webhook_") and f.endswith(".json")])
-            logger.debug(f"웹훅 로그 파일 카운트: {webhook_count}")
-        except Exception as count_error:
-            logger.error(f"웹훅 로그 파일 카운트 중 오류: {str(count_error)}")
-            webhook_count = -1
-        
-        # 전략 파일 카운트
-        try:
-            os.makedirs(STRATEGY_DIR, exist_ok=True)
-            strategy_count = len([f for f in os.listdir(STRATEGY_DIR) if f.endswith(".pine")])
-            logger.debug(f"전략 파일 카운트: {strategy_count}")
-        except Exception as count_error:
-            logger.error(f"전략 파일 카운트 중 오류: {str(count_error)}")
-            strategy_count = -1
-        
-        # 수정 내역 메타데이터 카운트
-        try:
-            metadata_count = len([f for f in os.listdir(STRATEGY_DIR) if f.startswith("metadata_") and f.endswith(".json")])
-            logger.debug(f"메타데이터 파일 카운트: {metadata_count}")
-        except Exception as count_error:
-            logger.error(f"메타데이터 파일 카운트 중 오류: {str(count_error)}")
-            metadata_count = -1
-        
-        # 최근 웹훅 데이터
-        latest_webhook = None
-        try:
-            webhook_files = [os.path.join(LOG_DIR, f) for f in os.listdir(LOG_DIR) 
-                            if f.startswith("webhook_") and f.endswith(".json")]
-            if webhook_files:
-                latest_webhook_file = max(webhook_files, key=os.path.getmtime)
-                try:
-                    with open(latest_webhook_file, 'r') as f:
-                        latest_webhook = {
-                            "file": latest_webhook_file,
-                            "timestamp": datetime.datetime.fromtimestamp(os.path.getmtime(latest_webhook_file)).strftime("%Y-%m-%d %H:%M:%S"),
-                        }
-                    logger.debug(f"최근 웹훅 파일: {latest_webhook_file}")
-                except Exception as read_error:
-                    logger.error(f"최근 웹훅 파일 읽기 중 오류: {str(read_error)}")
-                    latest_webhook = {"error": str(read_error)}
-        except Exception as list_error:
-            logger.error(f"웹훅 파일 목록 조회 중 오류: {str(list_error)}")
+        # 카운트와 최근 웹훅은 메모리 카운터에서 읽음 (디렉토리 스캔 없음)
+        counter_state = status_counters.counters.snapshot()
+        webhook_count = counter_state["counts"]["webhooks"]
+        strategy_count = counter_state["counts"]["strategies"]
+        metadata_count = counter_state["counts"]["modifications"]
+        latest_webhook = counter_state["latest_webhook"]
+        logger.debug(f"상태 카운터: {counter_state['counts']}")
+        
+        # 웹훅 로그 상태 (다른 프로세스의 기록을 따라 읽으므로 스레드 풀에서 실행)
+        webhook_log_stats = await async_storage.run(webhook_store.stats)
         
         # OpenAI API 키 상태
         api_key_status = "사용 가능" if api_key is not None else "설정되지 않음"
@@ -317,11 +522,30 @@ async def get_system_status():
             "strategy_count": strategy_count,
             "modification_count": metadata_count,
             "latest_webhook": latest_webhook,
+            "counters_reconciled": counter_state["reconciled"],
+            "job_queue": job_queue.stats(),
+            "coalescer": coalescer.stats(),
+            "webhook_log": webhook_log_stats,
+            "metadata_store": history_store.stats(),
+            "llm": llm_client.stats(),
+            "llm_cache": llm_cache.cache.stats(),
+            "pine_parser": pine_parser.cache_info(),
+            "pine_rules": pine_rules.stats(),
+            "backtester": backtester.stats(),
+            "pine_compiler": pine_compiler.stats(),
+            "param_sweep": param_sweep.stats(),
+            "bar_store": bar_data.stats(),
+            "streaming": streaming.stats(),
+            "candidates": candidate_ranker.stats(),
+            "backtest_cache": backtest_cache.stats(),
+            "storage_io": async_storage.stats(),
+            "json_backend": fast_json.BACKEND,
             "api_key_status": api_key_status,
             "server_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "directories": {
                 "LOG_DIR": LOG_DIR,
-                "STRATEGY_DIR": STRATEGY_DIR
+                "STRATEGY_DIR": STRATEGY_DIR,
+                "BAR_DIR": BAR_DIR
             }
         }
     except Exception as e:
@@ -335,6 +559,316 @@ async def get_system_status():
             "traceback": tb
         }
 
+@router.post("/optimize")
+async def optimize_strategy_parameters(request: Request):
+    """
+    전략 파일의 input 매개변수 조합을 요청에 담긴 봉 데이터(bars) 또는 봉 저장소의 구간
+    (ticker, timeframe, start, end, limit)으로 백테스트해 순위표를 반환합니다.
+    기본값보다 나은 조합을 찾으면 save_modification으로 수정된 전략을 저장합니다 (save가 false면 저장하지 않음).
+    """
+    try:
+        body = await async_storage.loads(await request.body())
+        if not isinstance(body, dict) or not (body.get("bars") or (body.get("ticker") and body.get("timeframe"))):
+            raise HTTPException(status_code=400,
+                                detail="백테스트할 봉 데이터(bars) 또는 저장된 봉의 ticker/timeframe이 필요합니다.")
+        
+        filename = body.get("strategy", "current.pine")
+        code = await read_strategy_file(filename)
+        
+        try:
+            if body.get("bars"):
+                bars = body["bars"]
+            else:
+                # 봉 저장소에서 필요한 구간만 찾아 작업자들이 저장소 파일을 메모리 맵으로 직접 읽게 함
+                bars = await async_storage.run(bar_data.locate, body["ticker"], body["timeframe"],
+                                               body.get("start"), body.get("end"), body.get("limit"))
+            result = await param_sweep.optimize(
+                code,
+                bars,
+                parameters=body.get("parameters"),
+                sort=body.get("sort", "net_profit"),
+                top=body.get("top"),
+                min_trades=body.get("min_trades")
+            )
+            modified_code = None
+            if result["improved"] and body.get("save", True):
+                modified_code = param_sweep.apply_parameters(code, result["best"]["parameters"])
+        except (param_sweep.SweepError, backtester.BacktestError, bar_store.BarStoreError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 기본값보다 나은 조합은 새 수정 전략으로 저장
+        saved = None
+        if modified_code is not None:
+            saved = await async_storage.run(
+                save_modification,
+                code,
+                modified_code,
+                param_sweep.modification_data(result),
+                STRATEGY_DIR
+            )
+            if "error" in saved:
+                raise Exception(saved["error"])
+            logger.info(f"최적화된 전략 저장 완료: {saved['modified_file']}")
+        
+        return {
+            "status": "success",
+            "strategy": filename,
+            **result,
+            "saved": saved
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"매개변수 최적화 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"매개변수 최적화 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.post("/backtest")
+async def backtest_strategies(request: Request):
+    """
+    전략 파일(strategy, 기본 current.pine) 또는 여러 전략 파일(strategies)을 요청에 담긴 봉 데이터(bars) 또는
+    봉 저장소의 구간(ticker, timeframe, start, end, limit)으로 백테스트해 성과 지표를 반환합니다.
+    같은 코드와 구간의 결과는 백테스트 결과 캐시에서 가져오며(cached), equity가 참이면 평가 자본 곡선을 함께 반환합니다.
+    """
+    try:
+        body = await async_storage.loads(await request.body())
+        if not isinstance(body, dict) or not (body.get("bars") or (body.get("ticker") and body.get("timeframe"))):
+            raise HTTPException(status_code=400,
+                                detail="백테스트할 봉 데이터(bars) 또는 저장된 봉의 ticker/timeframe이 필요합니다.")
+        filenames = body.get("strategies") or [body.get("strategy", "current.pine")]
+        if not isinstance(filenames, list):
+            raise HTTPException(status_code=400, detail="strategies는 전략 파일명 목록이어야 합니다.")
+        overrides = body.get("overrides") or {}
+        if not isinstance(overrides, dict):
+            raise HTTPException(status_code=400, detail="overrides는 input 이름과 값의 객체여야 합니다.")
+        
+        codes = [await read_strategy_file(filename) for filename in filenames]
+        
+        try:
+            window = None
+            if body.get("bars"):
+                try:
+                    bars = await async_storage.run(backtester.load_bars, body["bars"])
+                except (TypeError, ValueError) as e:
+                    raise HTTPException(status_code=400, detail=f"봉 데이터를 읽을 수 없습니다: {str(e)}")
+                bar_range = await async_storage.run(backtest_cache.data_range, bars)
+            else:
+                window = await async_storage.run(bar_data.locate, body["ticker"], body["timeframe"],
+                                                 body.get("start"), body.get("end"), body.get("limit"))
+                if window.size == 0:
+                    raise HTTPException(status_code=400,
+                                        detail=f"저장된 봉이 없습니다: {body['ticker']} {body['timeframe']}")
+                bar_range = await async_storage.run(backtest_cache.window_range, window)
+            
+            # 같은 코드와 구간의 결과는 백테스트 결과 캐시에서 가져옴
+            checked = []
+            rows = []
+            for code in codes:
+                checked.append(await async_storage.run(backtest_cache.check_overrides, code, overrides))
+                rows.append(await async_storage.run(backtest_cache.lookup, code, bar_range, checked[-1]))
+            missing = [index for index, row in enumerate(rows) if row is None]
+            if missing:
+                # 백테스트는 CPU 작업이므로 저장소 I/O 풀 대신 매개변수 탐색 프로세스 풀에서 동시에 실행
+                # (작업 프로세스가 결과를 캐시에 저장)
+                if window is not None:
+                    computed = await param_sweep.pool.map(
+                        backtest_cache.evaluate_window,
+                        [(window, codes[index], checked[index], None, False) for index in missing])
+                else:
+                    computed = await param_sweep.pool.map(
+                        backtest_cache.evaluate_bars,
+                        [(bars, bar_range, codes[index], checked[index], None, False) for index in missing])
+                for index, row in zip(missing, computed):
+                    backtest_cache.merge_report(row.pop("cache"))
+                    if "error" in row:
+                        raise backtester.BacktestError(row["error"])
+                    rows[index] = row
+            
+            results = []
+            for filename, result in zip(filenames, rows):
+                result.pop("range")
+                curve = result.pop("equity_curve")
+                if body.get("equity"):
+                    result["equity"] = await async_storage.run(backtest_cache.decode_equity, curve)
+                results.append(dict(result, strategy=filename))
+        except (backtester.BacktestError, bar_store.BarStoreError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return {
+            "status": "success",
+            "range": bar_range,
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"백테스트 중 오류 발생: {str(e)}")
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"백테스트 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.get("/bars")
+async def list_bar_series():
+    """
+    봉 저장소에 있는 티커/타임프레임 목록과 봉 수, 시간 범위를 반환합니다.
+    """
+    try:
+        series = await async_storage.run(bar_data.list)
+        return {
+            "status": "success",
+            "series": series
+        }
+    except Exception as e:
+        logger.error(f"봉 목록 조회 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"봉 목록 조회 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.get("/bars/{ticker}/{timeframe}")
+async def get_bars(ticker: str, timeframe: str, start: Optional[str] = None, end: Optional[str] = None,
+                   limit: int = bar_store.BAR_STORE_DEFAULT_LIMIT):
+    """
+    저장된 봉 중 time이 start~end(밀리초 epoch 또는 ISO 8601)인 구간의 마지막 limit개를 열 단위로 반환합니다.
+    """
+    try:
+        limit = max(0, min(limit, bar_store.BAR_STORE_MAX_LIMIT))
+        try:
+            window = await async_storage.run(bar_data.window, ticker, timeframe, start, end, limit)
+        except bar_store.BarStoreError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "status": "success",
+            "ticker": ticker,
+            "timeframe": timeframe,
+            "count": int(window["time"].size),
+            "bars": {name: values.tolist() for name, values in window.items()}
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"봉 데이터 조회 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"봉 데이터 조회 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.post("/bars/{ticker}/{timeframe}")
+async def ingest_bars(ticker: str, timeframe: str, request: Request):
+    """
+    봉 데이터를 저장소에 덧붙입니다. Content-Type에 따라 CSV(text/csv), NDJSON(application/x-ndjson),
+    JSON(봉 목록 또는 {"bars": [...]})을 받으며, 저장된 마지막 봉보다 이른 봉은 건너뜁니다.
+    """
+    try:
+        content_type = request.headers.get("content-type", "")
+        body = await request.body()
+        try:
+            if "csv" in content_type:
+                result = await async_storage.run(bar_data.ingest, ticker, timeframe, body.decode("utf-8"), "csv")
+            elif "ndjson" in content_type or "jsonl" in content_type:
+                result = await async_storage.run(bar_data.ingest, ticker, timeframe, body.decode("utf-8"), "ndjson")
+            else:
+                data = await async_storage.loads(body)
+                records = data.get("bars") if isinstance(data, dict) else data
+                result = await async_storage.run(bar_data.ingest, ticker, timeframe, records, "records")
+        except (bar_store.BarStoreError, UnicodeDecodeError, fast_json.JSONDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"봉 데이터를 읽을 수 없습니다: {str(e)}")
+        
+        logger.debug(f"봉 저장 완료: {ticker} {timeframe} {result}")
+        return {
+            "status": "success",
+            "ticker": ticker,
+            "timeframe": timeframe,
+            **result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"봉 데이터 저장 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"봉 데이터 저장 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
+@router.post("/bars")
+async def receive_live_bars(request: Request):
+    """
+    새로 마감된 봉을 받아 봉 저장소에 덧붙이고(store가 false면 저장하지 않음), 전략 파일(strategy, 기본 current.pine)의
+    스트리밍 엔진에 차례로 넣어 이번 봉들에서 발생한 진입/청산 신호와 체결을 반환합니다.
+    이미 처리한 시간 이하의 봉은 건너뛰며, 엔진은 처음 요청 때 저장된 이전 봉으로 상태를 채웁니다.
+    """
+    try:
+        body = await async_storage.loads(await request.body())
+        if not isinstance(body, dict) or not body.get("ticker") or not body.get("timeframe") \
+                or not isinstance(body.get("bars"), list):
+            raise HTTPException(status_code=400, detail="ticker, timeframe과 봉 목록(bars)이 필요합니다.")
+        
+        filename = body.get("strategy", "current.pine")
+        code = await read_strategy_file(filename)
+        
+        try:
+            bars = await async_storage.run(bar_store.parse_records, body["bars"])
+            # 엔진 생성(저장된 봉으로 상태 채우기)과 봉 처리는 CPU 작업이므로 저장소 I/O 풀이 아닌 기본 실행기에서 실행
+            # (엔진 상태가 이 프로세스에 있으므로 프로세스 풀은 쓰지 않음)
+            result = await asyncio.get_running_loop().run_in_executor(
+                None,
+                streaming.process_bars,
+                bar_data,
+                body["ticker"],
+                body["timeframe"],
+                filename,
+                code,
+                bars,
+                body.get("store", True)
+            )
+        except (bar_store.BarStoreError, backtester.BacktestError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        signals = [event for event in result["events"] if event["type"] == "signal"]
+        if signals:
+            logger.info(f"스트리밍 신호 {len(signals)}건: {body['ticker']} {body['timeframe']} {filename}")
+        return {
+            "status": "success",
+            "ticker": body["ticker"],
+            "timeframe": body["timeframe"],
+            "strategy": filename,
+            **result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"실시간 봉 처리 중 오류 발생: {str(e)}")
+        import traceback
+        tb = traceback.format_exc()
+        logger.error(tb)
+        return {
+            "status": "error",
+            "message": f"실시간 봉 처리 중 오류 발생: {str(e)}",
+            "traceback": tb
+        }
+
 @router.get("/strategy/{filename}")
 async def get_strategy_code(filename: str):
     """
@@ -351,24 +885,20 @@ async def get_strategy_code(filename: str):
         strategy_file = os.path.join(STRATEGY_DIR, filename)
         logger.debug(f"전략 파일 경로: {strategy_file}")
         
-        # 파일 존재 여부 확인
-        if not os.path.exists(strategy_file):
+        # 파일 존재 여부, 디렉토리 여부, 접근 권한 확인
+        file_status = await async_storage.file_status(strategy_file)
+        if file_status == async_storage.FILE_MISSING:
             logger.warning(f"전략 파일을 찾을 수 없음: {filename}")
             raise HTTPException(status_code=404, detail=f"전략 파일 '{filename}'을 찾을 수 없습니다.")
-            
-        # 파일이 디렉토리인지 확인
-        if os.path.isdir(strategy_file):
+        if file_status == async_storage.FILE_IS_DIR:
             logger.warning(f"전략 파일이 디렉토리임: {filename}")
             raise HTTPException(status_code=400, detail=f"'{filename}'은 디렉토리입니다.")
-            
-        # 파일 접근 권한 확인
-        if not os.access(strategy_file, os.R_OK):
+        if file_status == async_storage.FILE_NO_ACCESS:
             logger.warning(f"전략 파일에 접근할 수 없음: {filename}")
             raise HTTPException(status_code=403, detail=f"전략 파일 '{filename}'에 접근할 수 없습니다.")
             
         # 파일 내용 읽기
-        with open(strategy_file, 'r') as f:
-            code = f.read()
+        code = await async_storage.read_text(strategy_file)
         logger.debug(f"전략 코드 읽기 성공: {len(code)} 바이트")
             
         return {
@@ -388,6 +918,7 @@ async def get_strategy_code(filename: str):
 async def get_webhook_data(filename: str):
     """
     특정 웹훅 데이터를 반환합니다.
+    filename에는 세그먼트 로그의 웹훅 ID 또는 이전 형식의 웹훅 파일명을 사용할 수 있습니다.
     """
     try:
         logger.debug(f"웹훅 데이터 조회 시작: {filename}")
@@ -396,28 +927,38 @@ async def get_webhook_data(filename: str):
         if "../" in filename or "..\\" in filename:
             logger.warning(f"잘못된 파일명 형식: {filename}")
             raise HTTPException(status_code=400, detail="잘못된 파일명 형식입니다.")
+        
+        # 세그먼트 로그에서 웹훅 ID로 조회 (희소 인덱스 사용)
+        if not filename.endswith(".json"):
+            record = await async_storage.run(webhook_store.get, filename)
+            if record is None:
+                logger.warning(f"웹훅을 찾을 수 없음: {filename}")
+                raise HTTPException(status_code=404, detail=f"웹훅 '{filename}'을 찾을 수 없습니다.")
+            logger.debug(f"웹훅 레코드 조회 성공: {filename}")
+            return {
+                "status": "success",
+                "filename": filename,
+                "received_at": record.get("received_at"),
+                "data": record["data"]
+            }
             
         webhook_file = os.path.join(LOG_DIR, filename)
         logger.debug(f"웹훅 파일 경로: {webhook_file}")
         
-        # 파일 존재 여부 확인
-        if not os.path.exists(webhook_file):
+        # 파일 존재 여부, 디렉토리 여부, 접근 권한 확인
+        file_status = await async_storage.file_status(webhook_file)
+        if file_status == async_storage.FILE_MISSING:
             logger.warning(f"웹훅 파일을 찾을 수 없음: {filename}")
             raise HTTPException(status_code=404, detail=f"웹훅 파일 '{filename}'을 찾을 수 없습니다.")
-            
-        # 파일이 디렉토리인지 확인
-        if os.path.isdir(webhook_file):
+        if file_status == async_storage.FILE_IS_DIR:
             logger.warning(f"웹훅 파일이 디렉토리임: {filename}")
             raise HTTPException(status_code=400, detail=f"'{filename}'은 디렉토리입니다.")
-            
-        # 파일 접근 권한 확인
-        if not os.access(webhook_file, os.R_OK):
+        if file_status == async_storage.FILE_NO_ACCESS:
             logger.warning(f"웹훅 파일에 접근할 수 없음: {filename}")
             raise HTTPException(status_code=403, detail=f"웹훅 파일 '{filename}'에 접근할 수 없습니다.")
             
-        # 파일 내용 읽기
-        with open(webhook_file, 'r') as f:
-            data = json.load(f)
+        # 파일 읽기와 JSON 파싱 (스레드 풀에서 실행)
+        data = await async_storage.read_json(webhook_file)
         logger.debug(f"웹훅 데이터 읽기 성공: {len(str(data))} 바이트")
             
         return {
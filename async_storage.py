@@ -0,0 +1,143 @@
+# async_storage.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_json
+
+# 로깅 설정
+logger = logging.getLogger("async_storage")
+
+# 저장소 I/O 스레드 풀 설정 (환경 변수로 조정 가능)
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "4"))
+# 이 크기 이상의 JSON만 스레드 풀에서 파싱 (작은 본문은 스레드 전환 비용이 더 큼)
+JSON_OFFLOAD_BYTES = int(os.getenv("JSON_OFFLOAD_BYTES", str(64 * 1024)))
+
+# 파일 상태
+FILE_OK = "ok"
+FILE_MISSING = "missing"
+FILE_IS_DIR = "is_dir"
+FILE_NO_ACCESS = "no_access"
+
+
+class StorageExecutor:
+    """
+    라우트 핸들러의 블로킹 파일 I/O를 크기가 제한된 스레드 풀에서 실행합니다.
+
+    대기 중인 작업 수(queue depth), 실행 중인 작업 수, 대기 시간을 기록해 /status에서 볼 수 있게 합니다.
+    """
+
+    def __init__(self, workers=STORAGE_IO_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="storage-io")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _call(self, submitted_at, func, args, kwargs):
+        started = time.perf_counter()
+        wait = started - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+        ok = False
+        try:
+            result = func(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.total_run += time.perf_counter() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """func(*args, **kwargs)를 스레드 풀에서 실행하고 결과를 기다립니다."""
+        with self._lock:
+            self.queued += 1
+            if self.queued > self.max_queued:
+                self.max_queued = self.queued
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, time.perf_counter(), func, args, kwargs)
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self.total_wait / finished * 1000, 3) if finished else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "avg_run_ms": round(self.total_run / finished * 1000, 3) if finished else 0.0
+            }
+
+
+# 프로세스 전체에서 공유하는 스레드 풀
+executor = StorageExecutor()
+
+
+async def run(func, *args, **kwargs):
+    return await executor.run(func, *args, **kwargs)
+
+
+def stats():
+    return executor.stats()
+
+
+def _file_status(path):
+    if not os.path.exists(path):
+        return FILE_MISSING
+    if os.path.isdir(path):
+        return FILE_IS_DIR
+    if not os.access(path, os.R_OK):
+        return FILE_NO_ACCESS
+    return FILE_OK
+
+
+async def file_status(path):
+    """존재 여부, 디렉토리 여부, 읽기 권한을 한 번에 확인합니다."""
+    return await run(_file_status, path)
+
+
+async def makedirs(path):
+    await run(os.makedirs, path, exist_ok=True)
+
+
+def _read_text(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+async def read_text(path):
+    return await run(_read_text, path)
+
+
+async def read_json(path):
+    """파일 읽기와 JSON 파싱을 모두 스레드 풀에서 수행합니다."""
+    return await run(fast_json.load_file, path)
+
+
+async def loads(data):
+    """JSON 문자열/바이트를 파싱합니다. 큰 본문은 이벤트 루프 밖에서 파싱합니다."""
+    if len(data) >= JSON_OFFLOAD_BYTES:
+        return await run(fast_json.loads, data)
+    return fast_json.loads(data)
@@ -0,0 +1,242 @@
+# backtest_cache.py
+"""
+백테스트 결과 캐시입니다.
+
+같은 전략 파일(modified_<id>.pine 등)을 대시보드, 매개변수 탐색, 후보 비교에서 같은 구간으로 다시 백테스트할 때
+계산하지 않고 저장된 결과를 반환합니다. 키는 (정규화한 코드 해시, 티커, 타임프레임, 봉 구간, 엔진 버전, input 값,
+mintick)이며, 코드는 주석/시각화/빈 줄과 줄 끝 공백을 뺀 뒤 해시하므로 로직이 같은 코드는 같은 결과를 공유합니다.
+값은 성과 지표와 평가 자본 곡선(최대 BACKTEST_CACHE_EQUITY_POINTS개 지점, float32를 zlib으로 압축)입니다.
+
+저장 방식은 LLM 응답 캐시(llm_cache.LLMCache)와 같이 메모리 LRU 계층과 디스크 계층으로 나뉘며,
+디스크 전체 크기가 BACKTEST_CACHE_MAX_BYTES를 넘으면 가장 오래 사용되지 않은 결과부터 삭제합니다.
+"""
+import os
+import zlib
+import base64
+import hashlib
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+import backtester
+import bar_store
+import llm_cache
+import pine_compactor
+import pine_parser
+import pine_rules
+import fast_json
+
+# 로깅 설정
+logger = logging.getLogger("backtest_cache")
+
+# 캐시 설정 (환경 변수로 조정 가능)
+_STORAGE_ROOT = os.path.dirname(os.getenv("LOG_DIR", "/tmp/storage/webhooks"))
+BACKTEST_CACHE_ENABLED = os.getenv("BACKTEST_CACHE_ENABLED", "true") == "true"
+BACKTEST_CACHE_DIR = os.getenv("BACKTEST_CACHE_DIR", os.path.join(_STORAGE_ROOT, "backtest_cache"))
+BACKTEST_CACHE_MAX_BYTES = int(os.getenv("BACKTEST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+BACKTEST_CACHE_MEMORY_ITEMS = int(os.getenv("BACKTEST_CACHE_MEMORY_ITEMS", "512"))
+# 키에 엔진 버전이 들어가므로 결과가 낡지 않음, 오래 쓰지 않은 항목만 정리
+BACKTEST_CACHE_TTL = float(os.getenv("BACKTEST_CACHE_TTL", str(30 * 24 * 3600)))
+# 저장할 평가 자본 곡선의 최대 지점 수 (봉이 더 많으면 같은 간격으로 골라냄)
+BACKTEST_CACHE_EQUITY_POINTS = int(os.getenv("BACKTEST_CACHE_EQUITY_POINTS", "500"))
+
+_EQUITY_ENCODING = "float32-zlib-base64"
+
+
+def normalize_code(code):
+    """백테스트 결과에 영향이 없는 주석/시각화/빈 줄과 줄 끝 공백을 뺀 코드입니다."""
+    return llm_cache.normalize_code(pine_compactor.CompactedCode(code).code)
+
+
+@lru_cache(maxsize=64)
+def code_digest(code):
+    """정규화한 코드의 sha256입니다. 매개변수 탐색은 같은 코드로 여러 번 키를 만들므로 코드별로 보관합니다."""
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def series_range(ticker, timeframe, times):
+    """봉 저장소 시리즈 구간의 키 정보입니다 (덧붙이기 전용이라 같은 구간의 내용은 바뀌지 않음)."""
+    return {
+        "ticker": ticker,
+        "timeframe": timeframe,
+        "start": int(times[0]) if len(times) else None,
+        "end": int(times[-1]) if len(times) else None,
+        "bars": int(len(times))
+    }
+
+
+def window_range(window, bars=None):
+    """bar_store.BarWindow의 키 정보입니다. 이미 읽은 봉(bars)이 있으면 다시 읽지 않습니다."""
+    ticker, timeframe = window.series
+    times = (bars if bars is not None else window.load())["time"]
+    return series_range(ticker, timeframe, times)
+
+
+def data_range(bars):
+    """요청에 담긴 봉처럼 저장소에 없는 데이터의 키 정보입니다 (OHLCV 내용의 해시)."""
+    digest = hashlib.sha256()
+    for name in backtester.OHLCV_COLUMNS:
+        digest.update(np.ascontiguousarray(bars[name], dtype=float).tobytes())
+    return {"digest": digest.hexdigest(), "bars": int(bars["close"].size)}
+
+
+def check_overrides(code, overrides):
+    """
+    바꿀 input 값(overrides)을 전략의 input 선언과 맞춰 봅니다. 전략에 없는 input이거나 타입/허용 범위(minval/maxval)에
+    맞지 않는 값이면 BacktestError가 발생하며, 정수 input의 값은 int로 맞춘 딕셔너리를 반환합니다.
+    """
+    if not overrides:
+        return {}
+    model = pine_parser.parse(code)
+    checked = {}
+    for name, value in overrides.items():
+        decl = model.inputs.get(name)
+        if decl is None or decl.default is None:
+            raise backtester.BacktestError(f"전략에 input {name}이 없습니다.")
+        if not isinstance(value, (bool, int, float)) or pine_rules.format_input_value(decl, value) is None:
+            raise backtester.BacktestError(f"{name}에 사용할 수 없는 값입니다: {value!r}")
+        if not isinstance(value, bool) and isinstance(decl.default.value, int) and decl.function != "input.float":
+            value = int(value)
+        checked[name] = value
+    return checked
+
+
+def make_key(code, bar_range, overrides=None, mintick=None):
+    """캐시 키(sha256)를 만듭니다."""
+    material = fast_json.dumps_str({
+        "code": code_digest(code),
+        "range": bar_range,
+        "engine": backtester.BACKTEST_ENGINE_VERSION,
+        "overrides": {name: overrides[name] for name in sorted(overrides or {})},
+        "mintick": backtester.BACKTEST_MINTICK if mintick is None else mintick
+    })
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def encode_equity(equity, points=None):
+    """평가 자본 곡선을 같은 간격의 지점(최대 points개)으로 줄여 압축합니다. 마지막 봉은 항상 포함합니다."""
+    points = max(2, points or BACKTEST_CACHE_EQUITY_POINTS)
+    size = int(equity.size)
+    index = np.unique(np.linspace(0, size - 1, min(points, size)).round().astype(np.int64)) if size else \
+        np.zeros(0, dtype=np.int64)
+    values = np.asarray(equity[index], dtype=np.float32)
+    return {
+        "bars": size,
+        "points": int(index.size),
+        "encoding": _EQUITY_ENCODING,
+        "index": base64.b64encode(zlib.compress(index.astype(np.int32).tobytes())).decode("ascii"),
+        "values": base64.b64encode(zlib.compress(values.tobytes())).decode("ascii")
+    }
+
+
+def decode_equity(curve):
+    """encode_equity 결과를 {"bars", "index": 봉 번호 목록, "equity": 평가 자본 목록}으로 풉니다."""
+    index = np.frombuffer(zlib.decompress(base64.b64decode(curve["index"])), dtype=np.int32)
+    values = np.frombuffer(zlib.decompress(base64.b64decode(curve["values"])), dtype=np.float32)
+    return {"bars": curve["bars"], "index": index.tolist(), "equity": [round(float(value), 2) for value in values]}
+
+
+class BacktestCache(llm_cache.LLMCache):
+    """백테스트 결과 캐시입니다. 메모리/디스크 계층과 LRU 삭제는 LLM 응답 캐시와 같습니다."""
+
+    def __init__(self, cache_dir=BACKTEST_CACHE_DIR, memory_items=BACKTEST_CACHE_MEMORY_ITEMS,
+                 ttl=BACKTEST_CACHE_TTL, max_bytes=BACKTEST_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, memory_items, ttl, max_bytes)
+
+    def snapshot(self):
+        """조회/저장 횟수의 복사본입니다."""
+        with self._lock:
+            return dict(self.counters)
+
+    def add_counters(self, counters):
+        """작업 프로세스에서 센 조회/저장 횟수를 더합니다."""
+        with self._lock:
+            for name, value in counters.items():
+                if name in self.counters:
+                    self.counters[name] += value
+
+    def stats(self):
+        return dict(super().stats(), enabled=BACKTEST_CACHE_ENABLED, max_bytes=self.max_bytes)
+
+
+# 프로세스 전체에서 공유하는 캐시 (매개변수 탐색 작업 프로세스도 같은 디스크 계층을 사용)
+cache = BacktestCache()
+
+
+def lookup(code, bar_range, overrides=None, mintick=None):
+    """저장된 결과를 반환합니다 (cached가 참). 없거나 캐시가 꺼져 있으면 None을 반환합니다."""
+    if not BACKTEST_CACHE_ENABLED:
+        return None
+    record = cache.get(make_key(code, bar_range, overrides, mintick))
+    return dict(record, cached=True) if record is not None else None
+
+
+def evaluate(code, bars, bar_range, overrides=None, mintick=None, lookup=True):
+    """
+    캐시를 거쳐 백테스트합니다. 같은 키의 결과가 있으면 계산하지 않고 반환합니다.
+    결과는 run_backtest의 성과 지표에 equity_curve(encode_equity)와 cached(캐시 사용 여부)를 더한 딕셔너리이며,
+    백테스트할 수 없는 코드면 BacktestError가 발생합니다 (오류는 캐시하지 않음).
+    호출한 쪽에서 이미 lookup으로 찾아보았으면 lookup을 거짓으로 주어 다시 조회하지 않습니다.
+    """
+    key = make_key(code, bar_range, overrides, mintick) if BACKTEST_CACHE_ENABLED else None
+    record = cache.get(key) if key and lookup else None
+    if record is not None:
+        return dict(record, cached=True)
+    result = backtester.run_backtest(code, bars, overrides, mintick=mintick, include_equity=True)
+    record = {name: value for name, value in result.items() if name not in ("equity", "elapsed_ms")}
+    record["equity_curve"] = encode_equity(result["equity"])
+    record["range"] = bar_range
+    if key:
+        cache.put(key, record)
+    return dict(record, cached=False, elapsed_ms=result["elapsed_ms"])
+
+
+def counters():
+    """이 프로세스의 캐시 조회/저장 횟수입니다 (worker_report의 기준값)."""
+    return cache.snapshot()
+
+
+def worker_report(before):
+    """작업 프로세스에서 before 이후 늘어난 조회/저장 횟수를 부모 프로세스로 돌려보낼 형식으로 만듭니다."""
+    return {"pid": os.getpid(), "counters": {name: value - before[name] for name, value in counters().items()}}
+
+
+def merge_report(report):
+    """
+    worker_report 결과를 이 프로세스의 통계에 더합니다. 프로세스 풀 없이 같은 프로세스에서 실행한 결과는
+    이미 세었으므로 더하지 않습니다.
+    """
+    if report and report["pid"] != os.getpid():
+        cache.add_counters(report["counters"])
+
+
+def evaluate_window(window, code, overrides=None, mintick=None, lookup=True):
+    """
+    작업 프로세스에서 bar_store.BarWindow 구간을 캐시를 거쳐 백테스트합니다.
+    오류는 {"error": 메시지}로 반환하며, 캐시 조회/저장 횟수를 cache(worker_report)에 담습니다.
+    """
+    def load():
+        bars = window.load()
+        return bars, window_range(window, bars)
+    return _evaluate_reported(load, code, overrides, mintick, lookup)
+
+
+def evaluate_bars(bars, bar_range, code, overrides=None, mintick=None, lookup=True):
+    """evaluate_window와 같지만 요청에 담긴 봉 데이터(load_bars 결과와 data_range)를 백테스트합니다."""
+    return _evaluate_reported(lambda: (bars, bar_range), code, overrides, mintick, lookup)
+
+
+def _evaluate_reported(load, code, overrides, mintick, lookup):
+    before = counters()
+    try:
+        bars, bar_range = load()
+        row = evaluate(code, bars, bar_range, overrides, mintick, lookup)
+    except (backtester.BacktestError, bar_store.BarStoreError) as e:
+        row = {"error": str(e)}
+    row["cache"] = worker_report(before)
+    return row
+
+
+def stats():
+    return cache.stats()
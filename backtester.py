@@ -0,0 +1,1207 @@
+# backtester.py
+"""
+RSI 계열 Pine Script 전략을 OHLCV 배열로 빠르게 백테스트하는 모듈입니다.
+
+전략 코드를 pine_parser로 읽어 식을 한 번 컴파일하고, 지표와 진입/청산 조건은 NumPy 배열 연산으로
+모든 봉에 대해 한꺼번에 계산합니다. 봉마다 도는 반복문 대신 거래 단위로만 움직이며, 각 거래의
+이익 실현/손절/트레일링 도달 봉은 배열 구간 검색으로 찾습니다.
+
+체결 방식은 TradingView 브로커 에뮬레이터의 기본값을 따릅니다.
+- 진입(strategy.entry)은 조건이 참인 봉의 다음 봉 시가에 체결되며, 반대 방향 진입은 포지션을 뒤집습니다.
+- strategy.exit의 profit/loss/trail_points/trail_offset은 틱 단위이며 mintick을 곱해 가격 거리로 바꿉니다.
+  청산 주문은 호출된 봉의 종가 기준 값으로 다음 봉부터 유효합니다.
+- 한 봉에서 이익 실현과 손절이 모두 닿으면 시가에서 가까운 고가/저가를 먼저 지난 것으로 봅니다.
+"""
+import os
+import time
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+import indicators
+import pine_parser
+
+# 로깅 설정
+logger = logging.getLogger("backtester")
+
+# 틱 크기 (strategy.exit의 profit/loss 등 틱 단위 값을 가격으로 바꿀 때 사용, 환경 변수로 조정 가능)
+BACKTEST_MINTICK = float(os.getenv("BACKTEST_MINTICK", "0.01"))
+# strategy() 선언에 initial_capital이 없을 때 쓰는 초기 자본 (TradingView 기본값과 같음)
+BACKTEST_INITIAL_CAPITAL = float(os.getenv("BACKTEST_INITIAL_CAPITAL", "1000000"))
+# 컴파일한 전략을 코드별로 보관할 개수
+BACKTEST_COMPILE_CACHE_SIZE = int(os.getenv("BACKTEST_COMPILE_CACHE_SIZE", "64"))
+
+# 백테스트 엔진 버전 (같은 코드와 봉에서 결과가 달라지는 변경마다 올림, 결과 캐시 키에 포함)
+BACKTEST_ENGINE_VERSION = 3
+
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# Pine 연산자 우선순위 (높을수록 먼저 계산)
+_BINARY_PRECEDENCE = {
+    "or": 2, "and": 3, "==": 4, "!=": 4, "<": 5, ">": 5, "<=": 5, ">=": 5,
+    "+": 6, "-": 6, "*": 7, "/": 7, "%": 7
+}
+_TERNARY_PRECEDENCE = 1
+_UNARY_PRECEDENCE = 8
+
+# strategy.exit의 위치 인자 순서 (v4/v5 공통)
+_EXIT_PARAMETERS = ("id", "from_entry", "qty", "qty_percent", "profit", "limit", "loss", "stop",
+                    "trail_price", "trail_points", "trail_offset")
+_EXIT_LEVELS = ("profit", "limit", "loss", "stop", "trail_price", "trail_points", "trail_offset")
+# 청산 가격 식에서 진입가로 쓰는 내장 변수
+POSITION_PRICE = "strategy.position_avg_price"
+# 포지션 상태: 숏 -1, 무포지션 0, 롱 1
+_ALL_STATES = frozenset((-1, 0, 1))
+_POSITION_COMPARISONS = {
+    ">": frozenset((1,)), "<": frozenset((-1,)), "==": frozenset((0,)),
+    "!=": frozenset((-1, 1)), ">=": frozenset((0, 1)), "<=": frozenset((-1, 0))
+}
+
+# 청산 구간 검색을 시작할 봉 수 (찾지 못하면 4배씩 늘림)
+_SEARCH_CHUNK = 32
+
+_runs = 0
+_total_ms = 0.0
+_failures = 0
+
+
+class BacktestError(Exception):
+    """백테스트할 수 없는 코드나 데이터일 때 발생합니다."""
+
+
+class UnsupportedConstruct(BacktestError):
+    """백테스터가 지원하지 않는 Pine Script 구문을 만났을 때 발생합니다."""
+
+
+def load_bars(data):
+    """
+    OHLCV 데이터를 열별 float64 배열 딕셔너리로 바꿉니다.
+    (n, 5) 배열(open, high, low, close, volume), 맨 앞에 시간 열이 붙은 (n, 6) 배열,
+    열 이름을 키로 하는 딕셔너리, 봉 딕셔너리의 리스트를 받을 수 있습니다.
+    """
+    if isinstance(data, dict):
+        columns = {key: np.ascontiguousarray(data[key], dtype=float) for key in OHLCV_COLUMNS if key in data}
+        if "time" in data:
+            columns["time"] = np.asarray(data["time"])
+    elif isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
+        columns = {key: np.fromiter((bar.get(key, np.nan) for bar in data), float, len(data))
+                   for key in OHLCV_COLUMNS}
+        if "time" in data[0]:
+            columns["time"] = np.asarray([bar.get("time") for bar in data])
+    else:
+        array = np.asarray(data, dtype=float)
+        if array.ndim != 2 or array.shape[1] not in (5, 6):
+            raise BacktestError(f"OHLCV 배열의 모양이 올바르지 않습니다: {array.shape}")
+        offset = array.shape[1] - 5
+        columns = {key: np.ascontiguousarray(array[:, offset + index]) for index, key in enumerate(OHLCV_COLUMNS)}
+        if offset:
+            columns["time"] = array[:, 0].astype(np.int64)
+
+    missing = [key for key in OHLCV_COLUMNS[:4] if key not in columns]
+    if missing:
+        raise BacktestError(f"OHLCV 데이터에 열이 없습니다: {', '.join(missing)}")
+    columns.setdefault("volume", np.zeros(columns["close"].size))
+    sizes = {columns[key].size for key in OHLCV_COLUMNS}
+    if len(sizes) != 1:
+        raise BacktestError("OHLCV 열의 길이가 서로 다릅니다.")
+    if columns["close"].size < 2:
+        raise BacktestError("백테스트에는 봉이 2개 이상 필요합니다.")
+    return columns
+
+
+class _ExpressionParser:
+    """
+    Pine Script 식의 토큰을 튜플 트리로 읽습니다. 트리는 해시할 수 있어 계산 결과를 메모하는 키로 씁니다.
+    ("num", 값), ("bool", 값), ("str", 값), ("na",), ("name", 이름), ("call", 이름, 인자, 이름 있는 인자),
+    ("unary", 연산자, 식), ("binary", 연산자, 왼쪽, 오른쪽), ("ternary", 조건, 참, 거짓), ("index", 식, 이전 봉 수)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise UnsupportedConstruct("빈 식입니다.")
+        node = self.expression(0)
+        if self.position != len(self.tokens):
+            token = self.tokens[self.position]
+            raise UnsupportedConstruct(f"{token.line}행: 식을 해석할 수 없습니다 ({token.value!r})")
+        return node
+
+    def peek(self, offset=0):
+        position = self.position + offset
+        return self.tokens[position] if position < len(self.tokens) else None
+
+    def advance(self):
+        token = self.peek()
+        if token is None:
+            raise UnsupportedConstruct("식이 중간에 끝났습니다.")
+        self.position += 1
+        return token
+
+    def expect(self, value):
+        token = self.advance()
+        if token.value != value:
+            raise UnsupportedConstruct(f"{token.line}행: {value!r}가 필요하지만 {token.value!r}가 있습니다.")
+        return token
+
+    def expression(self, min_precedence):
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token.kind not in ("op", "name"):
+                return left
+            if token.value == "?" and min_precedence <= _TERNARY_PRECEDENCE:
+                self.advance()
+                when_true = self.expression(0)
+                self.expect(":")
+                when_false = self.expression(_TERNARY_PRECEDENCE)
+                left = ("ternary", left, when_true, when_false)
+                continue
+            precedence = _BINARY_PRECEDENCE.get(token.value)
+            if token.kind == "name" and token.value not in ("and", "or"):
+                precedence = None
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.advance()
+            left = ("binary", token.value, left, self.expression(precedence + 1))
+
+    def unary(self):
+        token = self.peek()
+        if token is not None and (token.value in ("-", "+") and token.kind == "op"
+                                  or token.value == "not" and token.kind == "name"):
+            self.advance()
+            return ("unary", token.value, self.expression(_UNARY_PRECEDENCE))
+        return self.postfix(self.primary())
+
+    def postfix(self, node):
+        while True:
+            token = self.peek()
+            if token is None or token.kind != "op" or token.value != "[":
+                return node
+            self.advance()
+            offset = self.expression(0)
+            self.expect("]")
+            node = ("index", node, offset)
+
+    def primary(self):
+        token = self.advance()
+        if token.kind == "number":
+            return ("num", float(token.value))
+        if token.kind in ("string", "color"):
+            return ("str", token.value)
+        if token.kind == "op" and token.value == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if token.kind != "name":
+            raise UnsupportedConstruct(f"{token.line}행: 식을 해석할 수 없습니다 ({token.value!r})")
+        if token.value in ("true", "false"):
+            return ("bool", token.value == "true")
+        if token.value == "na" and not self._next_is("("):
+            return ("na",)
+        name = token.value
+        while self._next_is(".") and self.peek(1) is not None and self.peek(1).kind == "name":
+            self.advance()
+            name += "." + self.advance().value
+        if not self._next_is("("):
+            return ("name", name)
+        self.advance()
+        args, kwargs = [], []
+        while not self._next_is(")"):
+            following = self.peek(1)
+            if (self.peek().kind == "name" and following is not None
+                    and following.kind == "op" and following.value == "="):
+                keyword = self.advance().value
+                self.advance()
+                kwargs.append((keyword, self.expression(0)))
+            else:
+                args.append(self.expression(0))
+            if not self._next_is(")"):
+                self.expect(",")
+        self.expect(")")
+        return ("call", name, tuple(args), tuple(kwargs))
+
+    def _next_is(self, value):
+        token = self.peek()
+        return token is not None and token.kind == "op" and token.value == value
+
+
+def parse_expression(tokens):
+    return _ExpressionParser(tokens).parse()
+
+
+def _value_tokens(statement):
+    """대입문에서 연산자 뒤의 값 토큰입니다."""
+    for index, token in enumerate(statement.tokens):
+        if token.kind == "op" and token.value == statement.operator:
+            return statement.tokens[index + 1:]
+    return []
+
+
+class EntryOrder:
+    """strategy.entry 호출 하나입니다. condition은 실행 조건 식 목록(AND), states는 허용되는 포지션 상태입니다."""
+
+    __slots__ = ("id", "direction", "conditions", "states", "line")
+
+    def __init__(self, order_id, direction, conditions, states, line):
+        self.id = order_id
+        self.direction = direction
+        self.conditions = conditions
+        self.states = states
+        self.line = line
+
+
+class ExitOrder:
+    """strategy.exit 또는 strategy.close 호출 하나입니다. levels는 청산 가격/틱 값의 식입니다."""
+
+    __slots__ = ("id", "from_entry", "levels", "conditions", "states", "market", "line")
+
+    def __init__(self, order_id, from_entry, levels, conditions, states, market, line):
+        self.id = order_id
+        self.from_entry = from_entry
+        self.levels = levels
+        self.conditions = conditions
+        self.states = states
+        self.market = market
+        self.line = line
+
+
+class CompiledStrategy:
+    """백테스트할 수 있도록 식을 트리로 읽어 둔 전략입니다. 봉 데이터와 무관하므로 코드별로 재사용합니다."""
+
+    def __init__(self, model):
+        self.model = model
+        self.name = model.name
+        self.variables = {}
+        self.invalid_variables = {}
+        self.entries = []
+        self.exits = []
+        self.settings = {}
+
+
+def _declaration_settings(model):
+    settings = {
+        "initial_capital": BACKTEST_INITIAL_CAPITAL,
+        "qty_type": "fixed",
+        "qty_value": 1.0,
+        "commission_type": "percent",
+        "commission_value": 0.0,
+        "pyramiding": 0
+    }
+    declaration = model.declaration
+    if declaration is None:
+        return settings
+    for keyword, key in (("initial_capital", "initial_capital"), ("default_qty_value", "qty_value"),
+                         ("commission_value", "commission_value"), ("pyramiding", "pyramiding")):
+        arg = declaration.kwargs.get(keyword)
+        if arg is not None:
+            if not isinstance(arg.value, (int, float)) or isinstance(arg.value, bool):
+                raise UnsupportedConstruct(f"strategy()의 {keyword}는 숫자 리터럴이어야 합니다: {arg.text}")
+            settings[key] = float(arg.value)
+    for keyword, key, prefix in (("default_qty_type", "qty_type", "strategy."),
+                                 ("commission_type", "commission_type", "strategy.commission.")):
+        arg = declaration.kwargs.get(keyword)
+        if arg is not None:
+            settings[key] = arg.text.replace(prefix, "")
+    if settings["qty_type"] not in ("fixed", "percent_of_equity", "cash"):
+        raise UnsupportedConstruct(f"지원하지 않는 default_qty_type입니다: {settings['qty_type']}")
+    if settings["commission_type"] not in ("percent", "cash_per_contract", "cash_per_order"):
+        raise UnsupportedConstruct(f"지원하지 않는 commission_type입니다: {settings['commission_type']}")
+    if settings["pyramiding"] > 1:
+        raise UnsupportedConstruct("피라미딩(pyramiding > 1)은 지원하지 않습니다.")
+    return settings
+
+
+def _conjunction(node):
+    """AND로 묶인 조건을 항 목록으로 펼칩니다."""
+    if node[0] == "binary" and node[1] == "and":
+        return _conjunction(node[2]) + _conjunction(node[3])
+    return [node]
+
+
+def expression_names(node):
+    """식 트리에 나오는 모든 이름입니다."""
+    if not node:
+        return
+    if node[0] == "name":
+        yield node[1]
+        return
+    for child in node:
+        if isinstance(child, tuple):
+            yield from expression_names(child)
+
+
+def _mentions_position(node):
+    return any(name.startswith("strategy.position") or name.startswith("strategy.opentrades")
+               for name in expression_names(node))
+
+
+def _position_states(term):
+    """strategy.position_size와 0을 비교하는 항이면 허용되는 포지션 상태 집합을, 아니면 None을 반환합니다."""
+    negate = False
+    while term[0] == "unary" and term[1] == "not":
+        negate = not negate
+        term = term[2]
+    if not _mentions_position(term):
+        return None
+    if (term[0] == "binary" and term[1] in _POSITION_COMPARISONS
+            and term[2] == ("name", "strategy.position_size") and term[3] == ("num", 0.0)):
+        states = _POSITION_COMPARISONS[term[1]]
+        return _ALL_STATES - states if negate else states
+    raise UnsupportedConstruct("strategy.position_size는 0과의 비교만 조건으로 쓸 수 있습니다.")
+
+
+def _split_conditions(conditions):
+    """조건 식 목록을 (포지션과 무관한 항 목록, 허용되는 포지션 상태)로 나눕니다."""
+    terms = []
+    states = _ALL_STATES
+    for condition in conditions:
+        for term in _conjunction(condition):
+            position = _position_states(term)
+            if position is None:
+                terms.append(term)
+            else:
+                states = states & position
+    return tuple(terms), states
+
+
+def _negate(node):
+    return ("unary", "not", node)
+
+
+def _arg_node(code, arg):
+    tokens = [token for token in pine_parser.tokenize(code[arg.start:arg.end])
+              if token.kind not in ("indent", "newline", "comment")]
+    return parse_expression(tokens)
+
+
+def _literal_string(arg, what):
+    if arg is None or not isinstance(arg.value, str):
+        raise UnsupportedConstruct(f"{what}는 문자열 리터럴이어야 합니다.")
+    return arg.value
+
+
+def _compile_order(compiled, call, conditions):
+    code = compiled.model.code
+    when = call.kwargs.get("when")
+    if when is not None:
+        conditions = conditions + [_arg_node(code, when)]
+    terms, states = _split_conditions(conditions)
+
+    if call.name == "strategy.entry":
+        if any(keyword in call.kwargs for keyword in ("limit", "stop")) or len(call.args) > 3:
+            raise UnsupportedConstruct(f"{call.line}행: 지정가/역지정가 진입은 지원하지 않습니다.")
+        direction_arg = call.arg(1, "direction") or call.arg(1, "long")
+        direction = _arg_node(code, direction_arg) if direction_arg is not None else None
+        if direction in (("name", "strategy.long"), ("bool", True)):
+            sign = 1
+        elif direction in (("name", "strategy.short"), ("bool", False)):
+            sign = -1
+        else:
+            raise UnsupportedConstruct(f"{call.line}행: 진입 방향은 strategy.long/strategy.short여야 합니다.")
+        order_id = _literal_string(call.arg(0, "id"), "진입 주문 id")
+        compiled.entries.append(EntryOrder(order_id, sign, terms, states, call.line))
+    elif call.name == "strategy.exit":
+        arguments = {}
+        for position, arg in enumerate(call.args):
+            if position < len(_EXIT_PARAMETERS):
+                arguments[_EXIT_PARAMETERS[position]] = arg
+        arguments.update(call.kwargs)
+        if "qty" in arguments or "qty_percent" in arguments:
+            raise UnsupportedConstruct(f"{call.line}행: 부분 청산(qty/qty_percent)은 지원하지 않습니다.")
+        levels = {name: _arg_node(code, arguments[name]) for name in _EXIT_LEVELS if name in arguments}
+        if not levels:
+            raise UnsupportedConstruct(f"{call.line}행: 청산 가격이 없는 strategy.exit입니다.")
+        if ("trail_offset" in levels) != ("trail_points" in levels or "trail_price" in levels):
+            raise UnsupportedConstruct(f"{call.line}행: 트레일링 청산에는 trail_offset과 trail_points/trail_price가 모두 필요합니다.")
+        from_entry = arguments.get("from_entry")
+        compiled.exits.append(ExitOrder(
+            _literal_string(arguments.get("id"), "청산 주문 id"),
+            _literal_string(from_entry, "from_entry") if from_entry is not None else None,
+            levels, terms, states, False, call.line))
+    elif call.name in ("strategy.close", "strategy.close_all"):
+        from_entry = _literal_string(call.arg(0, "id"), "청산할 진입 id") if call.name == "strategy.close" else None
+        compiled.exits.append(ExitOrder(call.name, from_entry, {}, terms, states, True, call.line))
+    else:
+        raise UnsupportedConstruct(f"{call.line}행: {call.name}은 지원하지 않습니다.")
+
+
+def _compile(code, problems=None):
+    """
+    전략 코드를 컴파일합니다. problems(list)를 주면 지원하지 않는 주문/분기 구문에서 멈추지 않고
+    (메시지, 그 구문을 감싼 if 조건 목록)을 모아 두고 나머지를 계속 컴파일합니다 (진단용).
+    """
+    def unsupported(error, conditions):
+        if problems is None:
+            raise error
+        problems.append((str(error), conditions))
+
+    model = pine_parser.parse(code)
+    if model.declaration is None or model.declaration.name != "strategy":
+        raise BacktestError("strategy() 선언이 없는 코드는 백테스트할 수 없습니다.")
+    compiled = CompiledStrategy(model)
+    compiled.settings = _declaration_settings(model)
+
+    # 최상위에서 한 번만 대입한 변수만 식으로 보관 (다시 대입하거나 블록 안에서 바꾸는 변수는 쓰면 오류)
+    blocks = []
+    chains = {}
+    for statement in model.statements:
+        while blocks and blocks[-1][0] >= statement.indent:
+            blocks.pop()
+        for indent in [indent for indent in chains if indent > statement.indent]:
+            del chains[indent]
+        first = statement.tokens[0]
+
+        if first.kind == "name" and first.value == "if":
+            try:
+                condition = parse_expression(statement.tokens[1:])
+            except UnsupportedConstruct as e:
+                unsupported(UnsupportedConstruct(f"{statement.line}행: {e}"),
+                            [condition for _, block in blocks if block for condition in block])
+                condition = ("bool", True)
+            chains[statement.indent] = [condition]
+            blocks.append((statement.indent, [condition]))
+            continue
+        if first.kind == "name" and first.value == "else":
+            previous = chains.get(statement.indent)
+            if previous is None:
+                unsupported(UnsupportedConstruct(f"{statement.line}행: if 없이 else가 있습니다."), [])
+                blocks.append((statement.indent, []))
+                continue
+            conditions = [_negate(condition) for condition in previous]
+            rest = statement.tokens[1:]
+            if rest and rest[0].kind == "name" and rest[0].value == "if":
+                condition = parse_expression(rest[1:])
+                previous.append(condition)
+                conditions.append(condition)
+            else:
+                chains.pop(statement.indent)
+            blocks.append((statement.indent, conditions))
+            continue
+        chains.pop(statement.indent, None)
+        if first.kind == "name" and first.value in ("for", "while", "switch"):
+            blocks.append((statement.indent, None))
+            continue
+
+        in_loop = any(conditions is None for _, conditions in blocks)
+        if statement.target is not None:
+            targets = statement.target if isinstance(statement.target, tuple) else (statement.target,)
+            if (isinstance(statement.target, str) and statement.operator == "=" and not blocks
+                    and statement.target not in compiled.variables
+                    and statement.target not in compiled.invalid_variables):
+                try:
+                    compiled.variables[statement.target] = parse_expression(_value_tokens(statement))
+                except UnsupportedConstruct as e:
+                    compiled.invalid_variables[statement.target] = str(e)
+            else:
+                for target in targets:
+                    compiled.variables.pop(target, None)
+                    compiled.invalid_variables[target] = f"{statement.line}행: 다시 대입하는 변수는 지원하지 않습니다."
+            continue
+
+        for call in statement.calls:
+            if call.name in pine_parser.ORDER_FUNCTIONS and call.start == statement.start:
+                conditions = [condition for _, block in blocks if block for condition in block]
+                try:
+                    if in_loop:
+                        raise UnsupportedConstruct(f"{call.line}행: 반복문 안의 주문은 지원하지 않습니다.")
+                    _compile_order(compiled, call, conditions)
+                except UnsupportedConstruct as e:
+                    unsupported(e, conditions)
+
+    # 진단 중 진입 주문이 모두 지원하지 않는 구문이었으면 그 문제들만 알림
+    if not compiled.entries and not problems:
+        raise BacktestError("strategy.entry 호출이 없습니다.")
+    entry_ids = {entry.id for entry in compiled.entries}
+    for order in compiled.exits:
+        if order.from_entry is not None and order.from_entry not in entry_ids:
+            logger.debug(f"{order.line}행: 존재하지 않는 진입 {order.from_entry}에 대한 청산은 무시됩니다.")
+    return compiled
+
+
+@lru_cache(maxsize=BACKTEST_COMPILE_CACHE_SIZE)
+def compile_strategy(code):
+    """전략 코드를 컴파일합니다. 같은 코드는 캐시된 결과를 반환하므로 결과를 수정하지 말아야 합니다."""
+    return _compile(code)
+
+
+def collect_problems(code):
+    """
+    지원하지 않는 주문/분기 구문을 모두 모으며 컴파일합니다 (진단용, 캐시하지 않음).
+    (CompiledStrategy 또는 None, [(메시지, 그 구문을 감싼 if 조건 목록)])을 반환하며,
+    strategy() 선언이 없는 등 더 컴파일할 수 없으면 CompiledStrategy는 None입니다.
+    """
+    problems = []
+    try:
+        return _compile(code, problems), problems
+    except BacktestError as e:
+        return None, problems + [(str(e), [])]
+
+
+def _as_length(value):
+    if isinstance(value, np.ndarray):
+        raise UnsupportedConstruct("지표 기간에는 시리즈 값을 쓸 수 없습니다.")
+    if value is None or value != value:
+        raise BacktestError("지표 기간이 na입니다.")
+    return int(round(float(value)))
+
+
+def _to_float(value):
+    if value is None:
+        return np.nan
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        return value.astype(float)
+    return value
+
+
+def _truth(value, size):
+    """Pine 조건값을 bool 배열로 바꿉니다. na와 0은 거짓입니다."""
+    if isinstance(value, np.ndarray):
+        if value.dtype == bool:
+            return value
+        return np.nan_to_num(value, nan=0.0) != 0.0
+    return np.full(size, bool(value) if value is not None and value == value else False)
+
+
+def _scalar_truth(value):
+    return bool(value) if value is not None and value == value else False
+
+
+def _where(condition, when_true, when_false, size):
+    """시리즈 조건의 삼항 연산입니다. 두 값이 모두 bool이면 bool 배열, 아니면 float 배열입니다."""
+    when_true, when_false = _to_float(when_true), _to_float(when_false)
+    if isinstance(when_true, (bool, np.bool_)) and isinstance(when_false, (bool, np.bool_)):
+        return np.where(_truth(condition, size), when_true, when_false)
+    return np.where(_truth(condition, size), when_true, when_false).astype(float)
+
+
+def _apply_binary(operator, left, right):
+    """and/or를 뺀 이항 연산을 계산한 값에 적용합니다."""
+    if isinstance(left, str) or isinstance(right, str):
+        if operator in ("==", "!="):
+            return (left == right) == (operator == "==")
+        raise UnsupportedConstruct(f"문자열에는 {operator} 연산을 쓸 수 없습니다.")
+    left, right = _to_float(left), _to_float(right)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if operator == "+":
+            return left + right
+        if operator == "-":
+            return left - right
+        if operator == "*":
+            return left * right
+        if operator == "/":
+            if not isinstance(right, np.ndarray) and right == 0:
+                return np.nan
+            return np.divide(left, right)
+        if operator == "%":
+            return np.fmod(left, right)
+        comparison = {
+            "==": np.equal, "!=": np.not_equal, "<": np.less, ">": np.greater,
+            "<=": np.less_equal, ">=": np.greater_equal
+        }[operator](left, right)
+        if operator == "!=":
+            # na는 어떤 비교에서도 거짓
+            comparison = comparison & ~(np.isnan(left) | np.isnan(right))
+        return comparison if isinstance(comparison, np.ndarray) else bool(comparison)
+
+
+class Evaluator:
+    """컴파일한 전략의 식을 봉 데이터와 input 값으로 계산합니다. 같은 식은 한 번만 계산합니다."""
+
+    def __init__(self, compiled, bars, overrides=None):
+        self.compiled = compiled
+        self.bars = bars
+        self.size = bars["close"].size
+        self.overrides = overrides or {}
+        self.memo = {}
+        self.resolving = set()
+        # 계산에 실제로 쓰인 input 이름 (스칼라 조건으로 건너뛴 분기의 input은 빠짐)
+        self.used_inputs = set()
+
+    def with_overrides(self, overrides):
+        """같은 봉 데이터에서 input 값만 바꾼 평가기입니다."""
+        return Evaluator(self.compiled, self.bars, overrides)
+
+    def evaluate(self, node):
+        cached = self.memo.get(node)
+        if cached is None and node not in self.memo:
+            cached = self._evaluate(node)
+            self.memo[node] = cached
+        return cached
+
+    def condition(self, terms):
+        result = np.ones(self.size, dtype=bool)
+        for term in terms:
+            result &= _truth(self.evaluate(term), self.size)
+        return result
+
+    def series(self, node):
+        value = _to_float(self.evaluate(node))
+        if not isinstance(value, np.ndarray):
+            value = np.full(self.size, float(value))
+        return value
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind in ("num", "bool", "str"):
+            return node[1]
+        if kind == "na":
+            return None
+        if kind == "name":
+            return self._name(node[1])
+        if kind == "call":
+            return self._call(node[1], node[2], dict(node[3]))
+        if kind == "index":
+            offset = self.evaluate(node[2])
+            value = self.evaluate(node[1])
+            if not isinstance(value, np.ndarray):
+                return value
+            return indicators.shift(_to_float(value), _as_length(offset))
+        if kind == "unary":
+            value = self.evaluate(node[2])
+            if node[1] == "not":
+                return ~_truth(value, self.size) if isinstance(value, np.ndarray) else not _scalar_truth(value)
+            value = _to_float(value)
+            return -value if node[1] == "-" else value
+        if kind == "ternary":
+            condition = self.evaluate(node[1])
+            if not isinstance(condition, np.ndarray):
+                return self.evaluate(node[2] if _scalar_truth(condition) else node[3])
+            return _where(condition, self.evaluate(node[2]), self.evaluate(node[3]), self.size)
+        if kind == "binary":
+            return self._binary(node[1], node[2], node[3])
+        raise UnsupportedConstruct(f"알 수 없는 식입니다: {kind}")
+
+    def _binary(self, operator, left_node, right_node):
+        left = self.evaluate(left_node)
+        if operator in ("and", "or"):
+            if not isinstance(left, np.ndarray):
+                # 스칼라 조건은 단락 평가 (사용하지 않는 지표는 계산하지 않음)
+                if _scalar_truth(left) == (operator == "or"):
+                    return operator == "or"
+                right = self.evaluate(right_node)
+                return right if isinstance(right, np.ndarray) else _scalar_truth(right)
+            right = self.evaluate(right_node)
+            left, right = _truth(left, self.size), _truth(right, self.size)
+            return left & right if operator == "and" else left | right
+        return _apply_binary(operator, left, self.evaluate(right_node))
+
+    def _name(self, name):
+        bars = self.bars
+        if name in OHLCV_COLUMNS:
+            return bars[name]
+        if name == "hl2":
+            return (bars["high"] + bars["low"]) / 2
+        if name == "hlc3":
+            return (bars["high"] + bars["low"] + bars["close"]) / 3
+        if name == "ohlc4":
+            return (bars["open"] + bars["high"] + bars["low"] + bars["close"]) / 4
+        if name == "bar_index":
+            return np.arange(self.size, dtype=float)
+        decl = self.compiled.model.inputs.get(name)
+        if decl is not None:
+            self.used_inputs.add(name)
+        if name in self.overrides:
+            return self.overrides[name]
+        if decl is not None:
+            if decl.default is None or not decl.default.is_literal:
+                raise UnsupportedConstruct(f"input {name}의 기본값이 리터럴이 아닙니다.")
+            return decl.default.value
+        node = self.compiled.variables.get(name)
+        if node is not None:
+            if name in self.resolving:
+                raise UnsupportedConstruct(f"변수 {name}가 자기 자신을 참조합니다.")
+            self.resolving.add(name)
+            try:
+                return self.evaluate(node)
+            finally:
+                self.resolving.discard(name)
+        if name in self.compiled.invalid_variables:
+            raise UnsupportedConstruct(f"변수 {name}: {self.compiled.invalid_variables[name]}")
+        raise UnsupportedConstruct(f"지원하지 않는 이름입니다: {name}")
+
+    def _call(self, name, args, kwargs):
+        if name == "input" or name.startswith("input."):
+            default = args[0] if args else kwargs.get("defval")
+            if default is None:
+                raise UnsupportedConstruct("기본값이 없는 input입니다.")
+            return self.evaluate(default)
+        for prefix in ("ta.", "math."):
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        values = [self.evaluate(arg) for arg in args]
+
+        if name in ("rsi", "sma", "ema", "rma", "stdev"):
+            source = kwargs.get("source")
+            source = self.series(source) if source is not None else _to_float(values.pop(0))
+            length = kwargs.get("length")
+            length = _as_length(self.evaluate(length) if length is not None else values[0])
+            return indicators.cached(name, source, length)
+        if name in ("highest", "lowest"):
+            if len(values) == 1:
+                source = self.bars["high" if name == "highest" else "low"]
+            else:
+                source = _to_float(values.pop(0))
+            return indicators.cached(name, source, _as_length(values[0]))
+        if name in ("crossover", "crossunder", "cross"):
+            return indicators.cached(name, _to_float(values[0]), _to_float(values[1]))
+        if name == "change":
+            return indicators.cached("change", _to_float(values[0]), _as_length(values[1]) if len(values) > 1 else 1)
+        if name == "nz":
+            replacement = values[1] if len(values) > 1 else 0.0
+            value = _to_float(values[0])
+            if isinstance(value, np.ndarray):
+                return indicators.nz(value, replacement)
+            return replacement if value is None or value != value else value
+        if name == "na":
+            value = _to_float(values[0])
+            return np.isnan(value) if isinstance(value, np.ndarray) else value is None or value != value
+        if name == "iff":
+            return self._evaluate(("ternary",) + tuple(args))
+        if name in ("abs", "sqrt", "log", "exp"):
+            function = {"abs": np.abs, "sqrt": np.sqrt, "log": np.log, "exp": np.exp}[name]
+            return function(_to_float(values[0]))
+        if name in ("max", "min"):
+            function = np.fmax if name == "max" else np.fmin
+            result = _to_float(values[0])
+            for value in values[1:]:
+                result = function(result, _to_float(value))
+            return result
+        raise UnsupportedConstruct(f"지원하지 않는 함수입니다: {name}")
+
+
+def _next_index(mask):
+    """각 위치 i에서 i 이후(포함) 처음으로 mask가 참인 위치입니다. 없으면 len(mask)입니다."""
+    size = mask.size
+    positions = np.where(mask, np.arange(size), size)
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+
+def _last_index(mask):
+    """각 위치 i에서 i 이전(포함) 마지막으로 mask가 참인 위치입니다. 없으면 -1입니다."""
+    positions = np.where(mask, np.arange(mask.size), -1)
+    return np.maximum.accumulate(positions)
+
+
+class _ExitPlan:
+    """
+    진입 하나에 적용되는 strategy.exit입니다. 청산 가격은 봉마다 "직전 봉까지 마지막으로 호출된 값"으로 미리 펼쳐 두고,
+    거래 방향을 곱한 부호 공간에서 진입가 E에 대한 A + B * E 꼴의 (A, B)로 보관합니다 (lines).
+    """
+
+    __slots__ = ("order", "last_call", "prior_call", "lines", "uses_position_price")
+
+    def __init__(self, order, last_call, lines, uses_position_price):
+        self.order = order
+        self.last_call = last_call
+        self.prior_call = np.concatenate(([-1], last_call[:-1]))
+        self.lines = lines
+        self.uses_position_price = uses_position_price
+
+    def active_from(self, first_call):
+        """first_call 이후에 호출된 값이 유효해지는 첫 봉입니다 (prior_call은 단조 증가)."""
+        return int(self.prior_call.searchsorted(first_call))
+
+
+def _line_values(line, start, end, entry):
+    intercept, slope = line
+    if isinstance(slope, np.ndarray):
+        slope = slope[start:end]
+    return intercept[start:end] + slope * entry
+
+
+
+class _Trade:
+    __slots__ = ("entry", "direction", "signal_bar", "entry_bar", "entry_price", "previous_state", "exit_bar",
+                 "exit_price", "exit_reason", "qty", "profit")
+
+    def __init__(self, entry, direction, signal_bar, entry_bar, entry_price, previous_state):
+        self.entry = entry
+        self.direction = direction
+        self.signal_bar = signal_bar
+        self.entry_bar = entry_bar
+        self.entry_price = entry_price
+        # 신호 봉 종가 시점의 포지션 상태 (그 봉에서 호출된 청산 주문이 유효한지 판단할 때 씀)
+        self.previous_state = previous_state
+        self.exit_bar = None
+        self.exit_price = None
+        self.exit_reason = None
+        self.qty = 0.0
+        self.profit = 0.0
+
+
+class _Simulator:
+    """신호 배열로 거래를 만듭니다. 봉 단위가 아니라 거래 단위로 진행하고, 청산 봉은 구간 검색으로 찾습니다."""
+
+    def __init__(self, compiled, evaluator, bars, mintick):
+        self.compiled = compiled
+        self.bars = bars
+        self.size = bars["close"].size
+        self.mintick = mintick
+        # 부호 공간의 (시가, 유리한 쪽 극값, 불리한 쪽 극값): 롱은 (open, high, low), 숏은 (-open, -low, -high)
+        self.signed = {
+            1: (bars["open"], bars["high"], bars["low"]),
+            -1: (-bars["open"], -bars["low"], -bars["high"])
+        }
+        # 한 봉에서 고가를 먼저 지났다고 볼지 여부 (시가에서 고가가 저가보다 가까우면 고가 먼저)
+        self.high_first = (bars["high"] - bars["open"]) <= (bars["open"] - bars["low"])
+
+        conditions = [evaluator.condition(entry.conditions) for entry in compiled.entries]
+        # 포지션 상태별로 다음 진입 신호 위치 (무포지션은 모든 방향, 포지션 보유 중에는 반대 방향만)
+        self.signal_entry = {}
+        self.next_signal = {}
+        for state in (-1, 0, 1):
+            entry_index = np.full(self.size, -1, dtype=np.int64)
+            for index, (entry, condition) in enumerate(zip(compiled.entries, conditions)):
+                if state in entry.states and entry.direction != state:
+                    # 같은 봉에 여러 진입이 있으면 나중에 실행된 주문이 최종 포지션을 정함
+                    entry_index[condition] = index
+            self.signal_entry[state] = entry_index
+            self.next_signal[state] = _next_index(entry_index >= 0)
+
+        self.exit_plans = {}
+        self.next_close = {}
+        for index, entry in enumerate(compiled.entries):
+            orders = [order for order in compiled.exits if order.from_entry in (None, entry.id)]
+            stops = [order for order in orders if not order.market]
+            if len(stops) > 1:
+                raise UnsupportedConstruct(f"진입 {entry.id}에 strategy.exit가 여러 개 적용됩니다.")
+            if stops:
+                self.exit_plans[index] = self._plan(stops[0], evaluator, entry.direction)
+            closes = [order for order in orders if order.market and entry.direction in order.states]
+            if closes:
+                mask = np.zeros(self.size, dtype=bool)
+                for order in closes:
+                    mask |= evaluator.condition(order.conditions)
+                self.next_close[index] = _next_index(mask)
+
+    def _plan(self, order, evaluator, direction):
+        last_call = _last_index(evaluator.condition(order.conditions))
+        prior_call = np.concatenate(([-1], last_call[:-1]))
+        missing = prior_call < 0
+        prior_call[missing] = 0
+        levels = {}
+        for name, node in order.levels.items():
+            if POSITION_PRICE in expression_names(node):
+                intercept, slope = self._affine_level(evaluator, node)
+                slope = slope[prior_call]
+            else:
+                intercept, slope = self._level_series(evaluator, node), 0.0
+            intercept = intercept[prior_call]
+            intercept[missing] = np.nan
+            levels[name] = (intercept, slope)
+
+        mintick = self.mintick
+
+        def price_line(price_key, ticks_key, sign):
+            # 가격 인자: d * (a + b * E) = d * a + b * E'
+            # 틱 인자: E' + sign * mintick * (a + b * E) = sign * mintick * a + (1 + sign * mintick * b * d) * E'
+            if price_key in levels:
+                intercept, slope = levels[price_key]
+                return direction * intercept, slope
+            if ticks_key in levels:
+                intercept, slope = levels[ticks_key]
+                return sign * mintick * intercept, 1.0 + sign * mintick * direction * slope
+            return np.full(self.size, sign * np.inf), 0.0
+
+        lines = {"target": price_line("limit", "profit", 1), "stop": price_line("stop", "loss", -1)}
+        if "trail_offset" in levels:
+            intercept, slope = levels["trail_offset"]
+            lines["activation"] = price_line("trail_price", "trail_points", 1)
+            lines["offset"] = (mintick * intercept, mintick * direction * slope)
+        uses_position_price = any(isinstance(slope, np.ndarray) for _, slope in levels.values())
+        return _ExitPlan(order, last_call, lines, uses_position_price)
+
+    def _level_series(self, evaluator, node):
+        value = _to_float(evaluator.evaluate(node))
+        return value if isinstance(value, np.ndarray) else np.full(self.size, float(value))
+
+    def _affine_level(self, evaluator, node):
+        """진입가를 0, 1, 2로 두고 계산해 진입가에 대한 1차식인지 확인하고 (상수, 계수)를 반환합니다."""
+        samples = []
+        for price in (0.0, 1.0, 2.0):
+            overrides = dict(evaluator.overrides, **{POSITION_PRICE: price})
+            samples.append(self._level_series(evaluator.with_overrides(overrides), node))
+        base, slope = samples[0], samples[1] - samples[0]
+        if not np.allclose(samples[2], base + 2 * slope, equal_nan=True):
+            raise UnsupportedConstruct(f"{POSITION_PRICE}에 대한 1차식이 아닌 청산 가격은 지원하지 않습니다.")
+        return base, slope
+
+    def run(self):
+        trades = []
+        cursor = 0
+        trade = None
+        last_bar = self.size - 1
+        while True:
+            if trade is None:
+                signal_bar = int(self.next_signal[0][cursor]) if cursor < self.size else self.size
+                if signal_bar >= last_bar:
+                    break
+                entry_index = int(self.signal_entry[0][signal_bar])
+                trade = self._open(entry_index, signal_bar, previous_state=0)
+            direction = trade.direction
+            fill = trade.entry_bar
+
+            reverse_signal = int(self.next_signal[direction][fill])
+            reverse_bar = reverse_signal + 1 if reverse_signal < last_bar else self.size
+            close_index = self.next_close.get(trade.entry)
+            close_bar = int(close_index[fill]) + 1 if close_index is not None and close_index[fill] < last_bar \
+                else self.size
+            horizon = min(reverse_bar, close_bar)
+
+            plan = self.exit_plans.get(trade.entry)
+            hit = self._find_exit(plan, trade, horizon) if plan is not None else None
+            if hit is not None:
+                trade.exit_bar, trade.exit_price, trade.exit_reason = hit
+                trades.append(trade)
+                trade = None
+                cursor = hit[0]
+                continue
+            if horizon >= self.size:
+                trades.append(trade)
+                break
+            trade.exit_bar = horizon
+            trade.exit_price = float(self.bars["open"][horizon])
+            trades.append(trade)
+            if horizon == reverse_bar:
+                trade.exit_reason = "reverse"
+                entry_index = int(self.signal_entry[direction][reverse_signal])
+                trade = self._open(entry_index, reverse_signal, previous_state=direction)
+            else:
+                trade.exit_reason = "close"
+                trade = None
+                cursor = horizon
+        return trades
+
+    def _open(self, entry_index, signal_bar, previous_state):
+        entry = self.compiled.entries[entry_index]
+        fill = signal_bar + 1
+        return _Trade(entry_index, entry.direction, signal_bar, fill, float(self.bars["open"][fill]), previous_state)
+
+    def _find_exit(self, plan, trade, horizon):
+        """
+        trade의 진입 봉부터 horizon 전까지 strategy.exit 가격에 닿는 첫 봉을 찾습니다.
+        (봉, 체결 가격, 사유)를 반환하며 닿지 않으면 None입니다.
+        """
+        order = plan.order
+        direction = trade.direction
+        # 신호 봉에서 이미 호출된 청산 주문은 진입 봉부터, 포지션이 있어야 호출되는 주문은 그다음 봉부터 유효
+        # (진입가를 쓰는 주문은 신호 봉에서 진입가가 아직 정해지지 않았으므로 다음 봉부터)
+        if (trade.previous_state in order.states and not plan.uses_position_price
+                and plan.last_call[trade.signal_bar] == trade.signal_bar):
+            first_call = trade.signal_bar
+        elif direction in order.states:
+            first_call = trade.entry_bar
+        else:
+            return None
+
+        opens, favorable, adverse = self.signed[direction]
+        entry = direction * trade.entry_price
+        trailing = "offset" in plan.lines
+        peak = None
+        start = max(trade.entry_bar, plan.active_from(first_call))
+        chunk = _SEARCH_CHUNK
+        while start < horizon:
+            end = min(horizon, start + chunk)
+            chunk *= 4
+            fav, adv = favorable[start:end], adverse[start:end]
+            target = _line_values(plan.lines["target"], start, end, entry)
+            fixed_stop = _line_values(plan.lines["stop"], start, end, entry)
+            hit_target = fav >= target
+            hit_stop = adv <= fixed_stop
+            stop = fixed_stop
+
+            trail_stop = None
+            if trailing:
+                offset = _line_values(plan.lines["offset"], start, end, entry)
+                if peak is None:
+                    activated = fav >= _line_values(plan.lines["activation"], start, end, entry)
+                    if activated.any():
+                        # 활성화된 봉 다음부터는 그때까지의 최고가(부호 공간)에서 offset만큼 떨어진 가격이 손절가
+                        first = int(activated.argmax())
+                        running = np.maximum.accumulate(fav[first:])
+                        trail_stop = np.full(end - start, np.nan)
+                        trail_stop[first + 1:] = running[:-1] - offset[first + 1:]
+                        peak = running[-1]
+                else:
+                    running = np.maximum.accumulate(np.concatenate(([peak], fav)))
+                    trail_stop = running[:-1] - offset
+                    peak = running[-1]
+                if trail_stop is not None:
+                    hit_stop |= adv <= trail_stop
+                    stop = np.fmax(fixed_stop, trail_stop)
+
+            hits = hit_target | hit_stop
+            if hits.any():
+                k = int(hits.argmax())
+                bar = start + k
+                open_price = opens[bar]
+                stop_price = stop[k]
+                target_price = target[k]
+                stop_reason = "trailing" if trail_stop is not None and trail_stop[k] > fixed_stop[k] else "stop"
+                if hit_stop[k] and open_price <= stop_price:
+                    price, reason = open_price, stop_reason
+                elif hit_target[k] and open_price >= target_price:
+                    price, reason = open_price, "target"
+                elif hit_stop[k] and hit_target[k]:
+                    favorable_first = self.high_first[bar] if direction == 1 else not self.high_first[bar]
+                    price, reason = (target_price, "target") if favorable_first else (stop_price, stop_reason)
+                elif hit_target[k]:
+                    price, reason = target_price, "target"
+                else:
+                    price, reason = stop_price, stop_reason
+                return bar, float(direction * price), reason
+            start = end
+        return None
+
+
+def _commission(settings, price, qty):
+    value = settings["commission_value"]
+    if settings["commission_type"] == "percent":
+        return price * qty * value / 100
+    if settings["commission_type"] == "cash_per_contract":
+        return qty * value
+    return value
+
+
+def _settle(trades, settings):
+    """거래마다 수량과 손익을 계산합니다 (자본 비율 수량은 직전까지 실현된 자본 기준)."""
+    equity = settings["initial_capital"]
+    for trade in trades:
+        if settings["qty_type"] == "percent_of_equity":
+            trade.qty = max(equity, 0.0) * settings["qty_value"] / 100 / trade.entry_price
+        elif settings["qty_type"] == "cash":
+            trade.qty = settings["qty_value"] / trade.entry_price
+        else:
+            trade.qty = settings["qty_value"]
+        if trade.exit_bar is None:
+            continue
+        trade.profit = (trade.direction * (trade.exit_price - trade.entry_price) * trade.qty
+                        - _commission(settings, trade.entry_price, trade.qty)
+                        - _commission(settings, trade.exit_price, trade.qty))
+        equity += trade.profit
+
+
+def _equity_curve(trades, bars, settings):
+    """봉 종가 기준 평가 자본(초기 자본 + 실현 손익 + 미실현 손익)입니다."""
+    size = bars["close"].size
+    realized = np.zeros(size)
+    position = np.zeros(size)
+    entry_price = np.zeros(size)
+    for trade in trades:
+        end = trade.exit_bar if trade.exit_bar is not None else size
+        position[trade.entry_bar:end] = trade.direction * trade.qty
+        entry_price[trade.entry_bar:end] = trade.entry_price
+        if trade.exit_bar is not None:
+            realized[trade.exit_bar] += trade.profit
+    return settings["initial_capital"] + np.cumsum(realized) + position * (bars["close"] - entry_price)
+
+
+def _max_drawdown(equity):
+    """평가 자본의 최대 낙폭(%)입니다."""
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    return float(drawdown.max()) * 100 if drawdown.size else 0.0
+
+
+def _max_drawdown_amount(equity):
+    """평가 자본의 최대 낙폭 금액입니다 (주문 수량이 자본에 비해 작으면 낙폭(%)보다 차이가 잘 드러남)."""
+    return float((np.maximum.accumulate(equity) - equity).max()) if equity.size else 0.0
+
+
+def _trade_dict(trade, bars, compiled):
+    result = {
+        "type": "LONG" if trade.direction == 1 else "SHORT",
+        "entry_id": compiled.entries[trade.entry].id,
+        "entry_bar": trade.entry_bar,
+        "entry_price": round(trade.entry_price, 8),
+        "exit_bar": trade.exit_bar,
+        "exit_price": round(trade.exit_price, 8) if trade.exit_price is not None else None,
+        "exit_reason": trade.exit_reason,
+        "qty": trade.qty,
+        "profit": round(trade.profit, 8),
+        "profit_loss": round(trade.direction * (trade.exit_price / trade.entry_price - 1) * 100, 4)
+        if trade.exit_price is not None else None
+    }
+    if "time" in bars:
+        result["time"] = bars["time"][trade.entry_bar].item()
+    return result
+
+
+def run_backtest(code, data, overrides=None, include_trades=False, mintick=None, include_equity=False):
+    """
+    전략 코드를 OHLCV 데이터로 백테스트합니다. overrides로 input 기본값을 바꿔 계산할 수 있습니다.
+    웹훅의 performance와 같은 키(total_trades, profitable_trades, losing_trades, winrate, profit_factor,
+    max_drawdown)를 담은 결과를 반환하며, 지원하지 않는 코드면 BacktestError가 발생합니다.
+    include_equity가 참이면 봉별 평가 자본 배열(equity)을 함께 반환합니다.
+    """
+    global _runs, _total_ms, _failures
+    started = time.perf_counter()
+    try:
+        bars = data if isinstance(data, dict) and all(
+            isinstance(data.get(key), np.ndarray) for key in OHLCV_COLUMNS) else load_bars(data)
+        compiled = compile_strategy(code)
+        # pine_compiler가 backtester를 import하므로 순환 import를 피하려고 함수 안에서 import
+        import pine_compiler
+        evaluator = pine_compiler.evaluator(code, compiled, bars, overrides)
+        # na가 섞인 청산 가격 비교와 inf 연산 경고는 결과에 영향이 없으므로 숨김
+        with np.errstate(invalid="ignore"):
+            simulator = _Simulator(compiled, evaluator, bars, BACKTEST_MINTICK if mintick is None else mintick)
+            trades = simulator.run()
+    except BacktestError:
+        _failures += 1
+        raise
+    settings = compiled.settings
+    _settle(trades, settings)
+
+    closed = [trade for trade in trades if trade.exit_bar is not None]
+    profits = np.array([trade.profit for trade in closed])
+    gross_profit = float(profits[profits > 0].sum()) if profits.size else 0.0
+    gross_loss = float(-profits[profits < 0].sum()) if profits.size else 0.0
+    wins = int((profits > 0).sum())
+    losses = int((profits < 0).sum())
+    net_profit = float(profits.sum()) if profits.size else 0.0
+    equity = _equity_curve(trades, bars, settings)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _runs += 1
+    _total_ms += elapsed_ms
+
+    result = {
+        "strategy_name": compiled.name,
+        "bars": int(bars["close"].size),
+        "performance": {
+            "total_trades": len(closed),
+            "profitable_trades": wins,
+            "losing_trades": losses,
+            "winrate": round(wins / len(closed) * 100, 2) if closed else 0.0,
+            "profit_factor": round(gross_profit / gross_loss, 2) if gross_loss else None,
+            "max_drawdown": round(_max_drawdown(equity), 2)
+        },
+        "net_profit": round(net_profit, 2),
+        "net_profit_pct": round(net_profit / settings["initial_capital"] * 100, 2),
+        "max_drawdown_amount": round(_max_drawdown_amount(equity), 2),
+        "gross_profit": round(gross_profit, 2),
+        "gross_loss": round(gross_loss, 2),
+        "inputs": [name for name in compiled.model.inputs if name in evaluator.used_inputs],
+        "open_trade": _trade_dict(trades[-1], bars, compiled) if trades and trades[-1].exit_bar is None else None,
+        "elapsed_ms": round(elapsed_ms, 3)
+    }
+    if include_trades:
+        result["trades"] = [_trade_dict(trade, bars, compiled) for trade in closed]
+    if include_equity:
+        result["equity"] = equity
+    return result
+
+
+def stats():
+    return {
+        "runs": _runs,
+        "failures": _failures,
+        "avg_ms": round(_total_ms / _runs, 3) if _runs else 0.0,
+        "compile_cache": compile_strategy.cache_info()._asdict(),
+        "indicator_cache": indicators.cache.stats()
+    }
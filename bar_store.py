@@ -0,0 +1,441 @@
+# bar_store.py
+"""
+티커/타임프레임별 OHLCV 봉 데이터를 열 단위 고정 폭 파일로 보관하는 저장소입니다.
+
+<BAR_DIR>/<티커>/<타임프레임>/ 아래에 열마다 파일 하나(time은 int64 밀리초, 나머지는 float64)를 두고
+봉을 시간순으로 뒤에만 덧붙입니다. 읽을 때는 파일을 메모리 맵으로 열어 복사 없이 배열로 쓰며,
+시간 범위는 time 열의 이진 탐색으로 잘라 필요한 구간만 읽습니다.
+봉 수는 meta.json에 기록하고 rename으로 교체하므로, 읽는 쪽은 덧붙이는 중에도 완성된 봉까지만 봅니다.
+"""
+import io
+import os
+import re
+import sys
+import csv
+import time
+import datetime
+import logging
+import threading
+
+import numpy as np
+
+import fast_json
+from storage_utils import atomic_write, file_lock
+
+# 로깅 설정
+logger = logging.getLogger("bar_store")
+
+# 봉 저장소 설정 (환경 변수로 조정 가능)
+BAR_DIR = os.getenv("BAR_DIR", "/tmp/storage/bars")
+BAR_STORE_FSYNC = os.getenv("BAR_STORE_FSYNC", "false") == "true"
+# GET /webhook/bars/{ticker}/{timeframe}에서 한 번에 반환하는 봉 수
+BAR_STORE_DEFAULT_LIMIT = int(os.getenv("BAR_STORE_DEFAULT_LIMIT", "500"))
+BAR_STORE_MAX_LIMIT = int(os.getenv("BAR_STORE_MAX_LIMIT", "10000"))
+
+# (열 이름, 저장 형식) - 모든 열은 리틀 엔디언 고정 폭
+COLUMNS = (
+    ("time", np.dtype("<i8")),
+    ("open", np.dtype("<f8")),
+    ("high", np.dtype("<f8")),
+    ("low", np.dtype("<f8")),
+    ("close", np.dtype("<f8")),
+    ("volume", np.dtype("<f8"))
+)
+COLUMN_SUFFIX = ".col"
+META_FILENAME = "meta.json"
+LOCK_FILENAME = ".lock"
+
+# CSV 헤더/NDJSON 키의 별칭
+_ALIASES = {
+    "time": ("time", "timestamp", "date", "datetime", "t", "open_time"),
+    "open": ("open", "o"),
+    "high": ("high", "h"),
+    "low": ("low", "l"),
+    "close": ("close", "c"),
+    "volume": ("volume", "vol", "v")
+}
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+# 이보다 작은 시간 값은 초 단위로 보고 밀리초로 바꿈 (밀리초 기준 1973년 3월)
+_SECONDS_THRESHOLD = 100_000_000_000
+
+
+class BarStoreError(Exception):
+    """봉 데이터 형식이 올바르지 않거나 티커/타임프레임 이름이 잘못되었을 때 발생합니다."""
+
+
+def _safe_name(value, what):
+    name = _SAFE_NAME.sub("_", str(value or "").strip())
+    if not name or name.startswith("."):
+        raise BarStoreError(f"{what} 이름이 올바르지 않습니다: {value!r}")
+    return name
+
+
+def _parse_time(value):
+    """밀리초/초 epoch 숫자나 ISO 8601 문자열을 밀리초 epoch로 바꿉니다 (시간대가 없으면 UTC)."""
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            try:
+                parsed = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+            except ValueError:
+                raise BarStoreError(f"시간 값을 읽을 수 없습니다: {value!r}")
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+            return int(round(parsed.timestamp() * 1000))
+    if value is None or isinstance(value, bool):
+        raise BarStoreError(f"시간 값을 읽을 수 없습니다: {value!r}")
+    value = float(value)
+    if not np.isfinite(value):
+        raise BarStoreError(f"시간 값을 읽을 수 없습니다: {value!r}")
+    return int(round(value * 1000 if abs(value) < _SECONDS_THRESHOLD else value))
+
+
+def normalize_bars(columns):
+    """
+    열 이름 -> 값 목록 딕셔너리를 저장 형식 배열로 바꿉니다.
+    시간순으로 정렬하고, 같은 시간의 봉이 여러 개면 마지막 것만 남깁니다.
+    """
+    missing = [name for name, _ in COLUMNS[:5] if name not in columns]
+    if missing:
+        raise BarStoreError(f"봉 데이터에 열이 없습니다: {', '.join(missing)}")
+    times = columns["time"]
+    if isinstance(times, np.ndarray) and np.issubdtype(times.dtype, np.number):
+        times = np.asarray(times, dtype=float)
+        times = np.where(np.abs(times) < _SECONDS_THRESHOLD, times * 1000, times).round().astype(np.int64)
+    else:
+        times = np.fromiter((_parse_time(value) for value in times), np.int64)
+    arrays = {"time": times}
+    for name, dtype in COLUMNS[1:]:
+        values = columns.get(name)
+        if values is None:
+            values = np.zeros(times.size)
+        try:
+            arrays[name] = np.asarray(values, dtype=float).astype(dtype, copy=False)
+        except (TypeError, ValueError):
+            raise BarStoreError(f"{name} 열에 숫자가 아닌 값이 있습니다.")
+        if arrays[name].shape != times.shape:
+            raise BarStoreError("봉 데이터 열의 길이가 서로 다릅니다.")
+    prices = np.vstack([arrays[name] for name in ("open", "high", "low", "close")])
+    if not np.isfinite(prices).all():
+        raise BarStoreError("가격 열에 비어 있거나 유한하지 않은 값이 있습니다.")
+
+    # 시간순 정렬 후 같은 시간의 마지막 봉만 남김 (역순에서 첫 번째 = 원래 순서의 마지막)
+    order = np.argsort(times, kind="stable")
+    reversed_times = times[order][::-1]
+    _, first = np.unique(reversed_times, return_index=True)
+    keep = order[::-1][first]
+    return {name: arrays[name][keep] for name, _ in COLUMNS}
+
+
+def _column_map(header):
+    lowered = [str(name).strip().lower() for name in header]
+    mapping = {}
+    for column, aliases in _ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                mapping[column] = lowered.index(alias)
+                break
+    return mapping
+
+
+def parse_csv(text):
+    """헤더가 있는 CSV(time, open, high, low, close, volume; 별칭 허용)를 열 딕셔너리로 읽습니다."""
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if header is None:
+        raise BarStoreError("CSV가 비어 있습니다.")
+    mapping = _column_map(header)
+    if "time" not in mapping:
+        raise BarStoreError(f"CSV 헤더에 시간 열이 없습니다: {header}")
+    rows = [row for row in reader if row and any(cell.strip() for cell in row)]
+    try:
+        columns = {column: [row[index] for row in rows] for column, index in mapping.items()}
+    except IndexError:
+        raise BarStoreError("CSV 행의 열 수가 헤더와 다릅니다.")
+    for name, _ in COLUMNS[1:]:
+        if name in columns:
+            try:
+                columns[name] = np.asarray([float(value) if value.strip() else np.nan for value in columns[name]])
+            except ValueError:
+                raise BarStoreError(f"{name} 열에 숫자가 아닌 값이 있습니다.")
+    return normalize_bars(columns)
+
+
+def parse_records(records):
+    """봉 딕셔너리 목록(키는 별칭 허용)이나 [time, open, high, low, close(, volume)] 목록을 열 딕셔너리로 바꿉니다."""
+    if not records:
+        raise BarStoreError("봉 데이터가 비어 있습니다.")
+    if isinstance(records[0], dict):
+        mapping = _column_map(records[0].keys())
+        keys = list(records[0].keys())
+        columns = {column: [record.get(keys[index]) for record in records] for column, index in mapping.items()}
+        return normalize_bars(columns)
+    try:
+        array = np.asarray(records, dtype=float)
+    except (TypeError, ValueError):
+        raise BarStoreError("봉 배열에 숫자가 아닌 값이 있습니다.")
+    if array.ndim != 2 or array.shape[1] not in (5, 6):
+        raise BarStoreError(f"봉 배열은 [time, open, high, low, close(, volume)] 형식이어야 합니다: {array.shape}")
+    names = [name for name, _ in COLUMNS][:array.shape[1]]
+    return normalize_bars({name: array[:, index] for index, name in enumerate(names)})
+
+
+def parse_ndjson(text):
+    """한 줄에 봉 하나(JSON 객체 또는 배열)인 NDJSON을 열 딕셔너리로 읽습니다."""
+    records = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(fast_json.loads(line))
+        except ValueError:
+            raise BarStoreError(f"NDJSON {number}번째 줄을 읽을 수 없습니다.")
+    return parse_records(records)
+
+
+def _map_columns(directory, count):
+    """열 파일들을 앞에서부터 count개 봉만큼 읽기 전용 메모리 맵으로 엽니다."""
+    if count == 0:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+    return {
+        name: np.memmap(os.path.join(directory, name + COLUMN_SUFFIX), dtype=dtype, mode="r", shape=(count,))
+        for name, dtype in COLUMNS
+    }
+
+
+class BarWindow:
+    """
+    시리즈의 [start, stop) 봉 구간을 가리키는 작은 설명자입니다.
+    다른 프로세스로 보내도(pickle) 경로와 위치만 전달되며, load()로 메모리 맵 구간을 다시 엽니다.
+    덧붙이기 전용이므로 이미 기록된 구간의 내용은 바뀌지 않습니다.
+    """
+
+    __slots__ = ("directory", "start", "stop")
+
+    def __init__(self, directory, start, stop):
+        self.directory = directory
+        self.start = start
+        self.stop = stop
+
+    @property
+    def size(self):
+        return self.stop - self.start
+
+    @property
+    def key(self):
+        return (self.directory, self.start, self.stop)
+
+    @property
+    def series(self):
+        """(티커, 타임프레임) (저장소 디렉토리 구조 <루트>/<티커>/<타임프레임>에서 읽음)"""
+        parent, timeframe = os.path.split(os.path.normpath(self.directory))
+        return os.path.basename(parent), timeframe
+
+    def load(self):
+        return {name: np.asarray(array[self.start:self.stop])
+                for name, array in _map_columns(self.directory, self.stop).items()}
+
+    def __repr__(self):
+        return f"BarWindow({self.directory!r}, {self.start}, {self.stop})"
+
+
+class BarSeries:
+    """티커/타임프레임 하나의 봉 데이터입니다."""
+
+    def __init__(self, directory, ticker, timeframe):
+        self.directory = directory
+        self.ticker = ticker
+        self.timeframe = timeframe
+        self.meta_path = os.path.join(directory, META_FILENAME)
+        self.lock_path = os.path.join(directory, LOCK_FILENAME)
+        self._lock = threading.Lock()
+        # (meta.json의 inode와 변경 시각, 메타데이터, 메모리 맵)
+        self._cached = (None, None, None)
+
+    def meta(self):
+        """meta.json을 읽습니다. 다른 프로세스가 덧붙였으면 새 내용을 반환합니다."""
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return {"count": 0, "first_time": None, "last_time": None}
+        # rename으로 교체할 때마다 inode가 바뀌므로 시각 해상도가 거칠어도 변경을 놓치지 않음
+        version = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if self._cached[0] == version:
+                return self._cached[1]
+        meta = fast_json.load_file(self.meta_path)
+        with self._lock:
+            self._cached = (version, meta, None)
+        return meta
+
+    def columns(self):
+        """전체 봉을 메모리 맵 배열 딕셔너리로 반환합니다 (복사 없음)."""
+        meta = self.meta()
+        with self._lock:
+            mapped = self._cached[2] if self._cached[1] is meta else None
+        if mapped is None:
+            mapped = _map_columns(self.directory, meta["count"])
+            with self._lock:
+                if self._cached[1] is meta:
+                    self._cached = (self._cached[0], meta, mapped)
+        return mapped
+
+    def locate(self, start=None, end=None, limit=None):
+        """time이 start 이상 end 이하인 봉 구간을 이진 탐색으로 찾아 BarWindow로 반환합니다. limit는 뒤쪽 봉 수입니다."""
+        times = self.columns()["time"]
+        lo = int(np.searchsorted(times, _parse_time(start), "left")) if start is not None else 0
+        hi = int(np.searchsorted(times, _parse_time(end), "right")) if end is not None else times.size
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise BarStoreError(f"limit은 정수여야 합니다: {limit!r}")
+            lo = max(lo, hi - max(0, limit))
+        return BarWindow(self.directory, lo, max(lo, hi))
+
+    def window(self, start=None, end=None, limit=None):
+        """locate한 구간의 열 배열 딕셔너리 (메모리 맵 조각, 복사 없음)입니다."""
+        window = self.locate(start, end, limit)
+        return {name: array[window.start:window.stop] for name, array in self.columns().items()}
+
+    def append(self, bars):
+        """
+        normalize_bars 형식의 봉을 덧붙입니다. 이미 저장된 마지막 봉보다 이른 봉은 건너뜁니다
+        (같은 시간의 봉은 덮어쓰지 않음). 반환값은 덧붙인 봉 수와 건너뛴 봉 수입니다.
+        """
+        with file_lock(self.lock_path):
+            meta = self.meta()
+            count = meta["count"]
+            times = bars["time"]
+            keep = times > meta["last_time"] if meta["last_time"] is not None else np.ones(times.size, dtype=bool)
+            appended = int(keep.sum())
+            if appended:
+                os.makedirs(self.directory, exist_ok=True)
+                for name, dtype in COLUMNS:
+                    path = os.path.join(self.directory, name + COLUMN_SUFFIX)
+                    with open(path, "ab+") as f:
+                        # 이전에 쓰다 중단된 꼬리(meta.json의 봉 수를 넘는 부분)를 버리고 이어 씀
+                        f.truncate(count * dtype.itemsize)
+                        f.seek(count * dtype.itemsize)
+                        f.write(np.ascontiguousarray(bars[name][keep], dtype=dtype).tobytes())
+                        if BAR_STORE_FSYNC:
+                            f.flush()
+                            os.fsync(f.fileno())
+                new_times = times[keep]
+                meta = {
+                    "ticker": self.ticker,
+                    "timeframe": self.timeframe,
+                    "count": count + appended,
+                    "first_time": meta["first_time"] if meta["first_time"] is not None else int(new_times[0]),
+                    "last_time": int(new_times[-1]),
+                    "updated_at": time.time()
+                }
+                atomic_write(self.meta_path, fast_json.dumps(meta), fsync=BAR_STORE_FSYNC)
+        return {"appended": appended, "skipped": int(times.size) - appended, "count": meta["count"],
+                "first_time": meta["first_time"], "last_time": meta["last_time"]}
+
+    def info(self):
+        meta = self.meta()
+        return {"ticker": self.ticker, "timeframe": self.timeframe, "count": meta["count"],
+                "first_time": meta["first_time"], "last_time": meta["last_time"]}
+
+
+class BarStore:
+    """BAR_DIR 아래 모든 티커/타임프레임 시리즈를 관리합니다."""
+
+    def __init__(self, root):
+        self.root = root
+        self._series = {}
+        self._lock = threading.Lock()
+        self.appended = 0
+        self.reads = 0
+
+    def series(self, ticker, timeframe):
+        key = (_safe_name(ticker, "티커"), _safe_name(timeframe, "타임프레임"))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = BarSeries(os.path.join(self.root, *key), key[0], key[1])
+                self._series[key] = series
+            return series
+
+    def append(self, ticker, timeframe, bars):
+        result = self.series(ticker, timeframe).append(bars)
+        with self._lock:
+            self.appended += result["appended"]
+        logger.debug(f"봉 저장: {ticker} {timeframe} +{result['appended']}개 (건너뜀 {result['skipped']}개)")
+        return result
+
+    def ingest(self, ticker, timeframe, data, fmt="csv"):
+        """CSV/NDJSON 텍스트나 봉 목록(fmt="records")을 읽어 덧붙입니다."""
+        if fmt == "csv":
+            bars = parse_csv(data)
+        elif fmt == "ndjson":
+            bars = parse_ndjson(data)
+        elif fmt == "records":
+            if not isinstance(data, list):
+                raise BarStoreError("봉 데이터는 목록이어야 합니다.")
+            bars = parse_records(data)
+        else:
+            raise BarStoreError(f"지원하지 않는 형식입니다: {fmt} (csv, ndjson, records)")
+        return self.append(ticker, timeframe, bars)
+
+    def window(self, ticker, timeframe, start=None, end=None, limit=None):
+        with self._lock:
+            self.reads += 1
+        return self.series(ticker, timeframe).window(start, end, limit)
+
+    def locate(self, ticker, timeframe, start=None, end=None, limit=None):
+        with self._lock:
+            self.reads += 1
+        return self.series(ticker, timeframe).locate(start, end, limit)
+
+    def list(self):
+        """저장된 시리즈 목록 (봉 수와 시간 범위)입니다."""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for ticker in sorted(os.listdir(self.root)):
+            ticker_dir = os.path.join(self.root, ticker)
+            if not os.path.isdir(ticker_dir):
+                continue
+            for timeframe in sorted(os.listdir(ticker_dir)):
+                if os.path.exists(os.path.join(ticker_dir, timeframe, META_FILENAME)):
+                    result.append(self.series(ticker, timeframe).info())
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"root": self.root, "series": len(self._series), "appended": self.appended, "reads": self.reads}
+
+
+# 저장소 디렉토리별 인스턴스 (프로세스 안에서 공유)
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root=None):
+    root = root or BAR_DIR
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = BarStore(root)
+        return _stores[root]
+
+
+if __name__ == "__main__":
+    # 봉 데이터 가져오기: python bar_store.py <티커> <타임프레임> <파일.csv|파일.ndjson> [...]
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 4:
+        print("사용법: python bar_store.py <티커> <타임프레임> <파일.csv|파일.ndjson> [...]")
+        sys.exit(1)
+    target_store = get_store(os.getenv("BAR_DIR", "storage/bars"))
+    for source in sys.argv[3:]:
+        with open(source, "r", encoding="utf-8") as f:
+            source_format = "ndjson" if source.endswith((".ndjson", ".jsonl")) else "csv"
+            started = time.perf_counter()
+            outcome = target_store.ingest(sys.argv[1], sys.argv[2], f.read(), source_format)
+        print(f"{source}: {outcome['appended']}개 추가, {outcome['skipped']}개 건너뜀 "
+              f"(총 {outcome['count']}개, {(time.perf_counter() - started) * 1000:.1f}ms)")
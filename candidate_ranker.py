@@ -0,0 +1,157 @@
+# candidate_ranker.py
+"""
+LLM이 한 번의 요청으로 돌려준 수정 후보 여러 개(best-of-N)를 최근 봉으로 백테스트해 순위를 매깁니다.
+
+후보와 원본 전략은 매개변수 탐색과 같은 프로세스 풀(param_sweep.pool)에서 동시에 백테스트하며,
+봉 데이터는 봉 저장소의 구간(bar_store.BarWindow)을 작업자가 메모리 맵으로 직접 읽습니다.
+점수는 profit factor를 낙폭 비율만큼 깎은 값(profit_factor * (1 - 낙폭 금액 / (낙폭 금액 + 순이익)))입니다.
+전략의 기본 주문 수량(1계약)이 초기 자본에 비해 매우 작아 자본 대비 최대 낙폭(%)은 거의 0이므로,
+최대 낙폭 금액을 순이익에 견주어 봅니다. 순이익이 없으면 낙폭 비율은 1(점수 0)입니다.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+
+import bar_store
+import param_sweep
+import backtest_cache
+
+# 로깅 설정
+logger = logging.getLogger("candidate_ranker")
+
+# 요청 한 번에 받을 수정 후보 수 (1이면 기존처럼 응답 하나를 그대로 사용)
+LLM_CANDIDATES = int(os.getenv("LLM_CANDIDATES", "1"))
+# 후보를 백테스트할 최근 봉 수 (웹훅의 ticker/timeframe으로 봉 저장소에서 읽음)
+LLM_CANDIDATE_BARS = int(os.getenv("LLM_CANDIDATE_BARS", "2000"))
+# 거래 수가 이보다 적은 후보는 점수가 높아도 거래 수를 채운 후보보다 뒤로 보냄
+LLM_CANDIDATE_MIN_TRADES = int(os.getenv("LLM_CANDIDATE_MIN_TRADES", "5"))
+
+_lock = threading.Lock()
+_rankings = 0
+_candidates = 0
+_unscored = 0
+_improved = 0
+_total_ms = 0.0
+
+
+def locate_bars(store, webhook_data):
+    """웹훅의 ticker/timeframe에 해당하는 최근 LLM_CANDIDATE_BARS개 봉 구간입니다. 봉이 없으면 None을 반환합니다."""
+    ticker, timeframe = webhook_data.get("ticker"), webhook_data.get("timeframe")
+    if not ticker or not timeframe:
+        return None
+    try:
+        window = store.locate(str(ticker), str(timeframe), limit=LLM_CANDIDATE_BARS)
+    except bar_store.BarStoreError as e:
+        logger.warning(f"후보 백테스트용 봉을 찾을 수 없습니다: {str(e)}")
+        return None
+    return window if window.size > 0 else None
+
+
+def drawdown_ratio(row):
+    """최대 낙폭 금액을 (최대 낙폭 금액 + 순이익)으로 나눈 값입니다. 낙폭도 순이익도 없으면 0입니다."""
+    drawdown = row["max_drawdown_amount"]
+    profit = max(row["net_profit"], 0.0)
+    return drawdown / (drawdown + profit) if drawdown + profit > 0 else 0.0
+
+
+def score(row):
+    """백테스트 결과의 점수입니다. 손실 거래가 없으면 profit factor를 수익 여부에 따라 무한대 또는 0으로 봅니다."""
+    profit_factor = row["performance"]["profit_factor"]
+    if profit_factor is None:
+        profit_factor = math.inf if row["net_profit"] > 0 else 0.0
+    return profit_factor * (1 - drawdown_ratio(row))
+
+
+def _rank_key(item):
+    index, row = item
+    if "error" in row:
+        return (0, 0, 0.0, 0.0, -index)
+    eligible = row["performance"]["total_trades"] >= LLM_CANDIDATE_MIN_TRADES
+    return (1, int(eligible), score(row), -row["max_drawdown_amount"], -index)
+
+
+def _summary(row):
+    if row is None:
+        return {"score": None}
+    if "error" in row:
+        return {"score": None, "error": row["error"]}
+    value = score(row)
+    performance = row["performance"]
+    return {
+        "score": round(value, 4) if math.isfinite(value) else None,
+        "profit_factor": performance["profit_factor"],
+        "max_drawdown": performance["max_drawdown"],
+        "max_drawdown_amount": row["max_drawdown_amount"],
+        "drawdown_ratio": round(drawdown_ratio(row), 4),
+        "total_trades": performance["total_trades"],
+        "winrate": performance["winrate"],
+        "net_profit": row["net_profit"],
+        "cached": row["cached"]
+    }
+
+
+async def rank(original_code, candidates, bars=None):
+    """
+    후보 코드 목록을 bars(bar_store.BarWindow)로 백테스트해 가장 좋은 후보를 고릅니다.
+    {"selected": 후보 번호, "improved": 원본보다 점수가 높은지, "bars", "baseline", "scores", "elapsed_ms"}를 반환하며,
+    bars가 없으면 백테스트하지 않고 첫 번째 후보를 고릅니다.
+    """
+    global _rankings, _candidates, _unscored, _improved, _total_ms
+    started = time.perf_counter()
+    if bars is None:
+        rows = [None] * (len(candidates) + 1)
+        selected = 0
+    else:
+        # 같은 구간에서 이미 백테스트한 코드(대개 원본)는 결과 캐시에서 가져옴
+        codes = [original_code] + list(candidates)
+        loop = asyncio.get_running_loop()
+        bar_range = await loop.run_in_executor(None, backtest_cache.window_range, bars)
+        rows = await loop.run_in_executor(None, lambda: [backtest_cache.lookup(code, bar_range) for code in codes])
+        missing = [index for index, row in enumerate(rows) if row is None]
+        if missing:
+            # 나머지는 한 개씩 작업으로 나눠 동시에 실행 (작업 프로세스가 결과를 캐시에 저장)
+            results = await param_sweep.pool.map(backtest_cache.evaluate_window,
+                                                 [(bars, codes[index], None, None, False) for index in missing])
+            for index, row in zip(missing, results):
+                backtest_cache.merge_report(row.pop("cache"))
+                rows[index] = row
+        selected = max(enumerate(rows[1:]), key=_rank_key)[0]
+
+    baseline, best = rows[0], rows[selected + 1]
+    improved = (best is not None and baseline is not None and "error" not in best
+                and ("error" in baseline or score(best) > score(baseline)))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        _rankings += 1
+        _candidates += len(candidates)
+        _total_ms += elapsed_ms
+        if bars is None:
+            _unscored += 1
+        if improved:
+            _improved += 1
+    scores = [dict(_summary(row), index=index, selected=index == selected) for index, row in enumerate(rows[1:])]
+    logger.info(f"수정 후보 {len(candidates)}개 평가 완료: {selected}번 선택, 원본 대비 개선 {improved}, {elapsed_ms:.0f}ms")
+    return {
+        "selected": selected,
+        "improved": improved,
+        "bars": bars.size if bars is not None else 0,
+        "min_trades": LLM_CANDIDATE_MIN_TRADES,
+        "baseline": _summary(baseline),
+        "scores": scores,
+        "elapsed_ms": round(elapsed_ms, 3)
+    }
+
+
+def stats():
+    with _lock:
+        return {
+            "candidates_per_request": LLM_CANDIDATES,
+            "rankings": _rankings,
+            "candidates": _candidates,
+            "unscored": _unscored,
+            "improved": _improved,
+            "avg_ms": round(_total_ms / _rankings, 3) if _rankings else 0.0
+        }
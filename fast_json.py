@@ -0,0 +1,59 @@
+# fast_json.py
+import json
+import logging
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json 모듈로 동작
+    orjson = None
+
+# 로깅 설정
+logger = logging.getLogger("fast_json")
+
+# 사용 중인 코덱 이름 (/status 표시용)
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data):
+    """JSON 문자열/바이트를 파싱합니다."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """공백 없는 UTF-8 JSON 바이트로 직렬화합니다. 한글 등은 이스케이프하지 않습니다."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj):
+    """dumps와 같지만 str을 반환합니다 (SQLite TEXT 컬럼 등)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_file(path):
+    """JSON 파일을 바이트로 읽어 파싱합니다."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson으로 응답 본문을 만드는 JSONResponse입니다. orjson이 없으면 표준 json을 씁니다.
+    라우터의 default_response_class로 사용합니다.
+    """
+
+    def render(self, content):
+        return dumps(content)
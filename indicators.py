@@ -0,0 +1,344 @@
+# indicators.py
+"""
+Pine Script 내장 지표 함수를 NumPy 배열 연산으로 구현한 모듈입니다.
+
+모든 함수는 float64 배열을 받아 같은 길이의 배열을 반환하며, 값이 없는 구간(na)은 NaN입니다.
+계산식은 TradingView 내장 함수와 같습니다. rma/ema는 첫 length개 값의 sma로 시작하므로 앞의
+length - 1개 봉은 na이고, 중간에 na가 나오면 na를 이어 가다가 다시 sma로 시작합니다.
+rsi는 상승/하락폭의 rma(Wilder 평활)로 계산합니다.
+값은 tools/check_indicator_parity.py로 참고 값과 비교할 수 있습니다.
+
+cached()는 같은 입력 시리즈(내용 기준)와 매개변수의 결과를 재사용하므로, 매개변수 탐색에서
+rsiLength=14처럼 겹치는 지표를 조합마다 다시 계산하지 않습니다.
+"""
+import os
+import math
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# 재귀 필터를 닫힌 식으로 계산할 때 한 구간에서 허용하는 가중치 배율 (float64 정밀도 유지)
+_MAX_FILTER_SCALE = 1e6
+# stdev에서 평균과의 차이가 이보다 작으면 0으로 봄 (TradingView stdev와 같은 값)
+_STDEV_EPSILON = 1e-10
+
+# 지표 결과 캐시 크기 (바이트, 0이면 캐시하지 않음, 환경 변수로 조정 가능)
+INDICATOR_CACHE_BYTES = int(os.getenv("INDICATOR_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+def as_series(values, length=None):
+    """스칼라나 리스트를 float64 배열로 바꿉니다. length를 주면 스칼라를 그 길이로 늘립니다."""
+    array = np.asarray(values, dtype=float)
+    if array.ndim == 0 and length is not None:
+        return np.full(length, float(array))
+    return array
+
+
+def shift(series, periods=1):
+    """series[periods] (periods개 이전 봉의 값)입니다. 앞쪽은 NaN으로 채웁니다."""
+    series = as_series(series)
+    if periods <= 0:
+        return series
+    result = np.full(series.shape, np.nan)
+    if periods < series.size:
+        result[periods:] = series[:-periods]
+    return result
+
+
+def change(series, periods=1):
+    series = as_series(series)
+    return series - shift(series, periods)
+
+
+def nz(series, replacement=0.0):
+    series = as_series(series)
+    return np.where(np.isnan(series), replacement, series)
+
+
+def _first_valid(series):
+    valid = np.flatnonzero(~np.isnan(series))
+    return int(valid[0]) if valid.size else series.size
+
+
+def _recursive_filter(values, alpha, initial):
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t - 1] (y[-1] = initial)를 계산합니다.
+
+    파이썬 반복문 대신, 가중치 배율이 _MAX_FILTER_SCALE을 넘지 않는 구간마다
+    y[t] = d^(t+1) * (y[-1] + alpha * cumsum(x[i] / d^(i+1)))의 닫힌 식을 벡터 연산으로 풉니다.
+    """
+    decay = 1.0 - alpha
+    result = np.empty(values.size)
+    if values.size == 0:
+        return result
+    if decay <= 0.0:
+        result[:] = values
+        return result
+    block = max(1, int(math.log(_MAX_FILTER_SCALE) / -math.log(decay)))
+    powers = decay ** np.arange(1, min(block, values.size) + 1)
+    previous = initial
+    for start in range(0, values.size, block):
+        chunk = values[start:start + block]
+        scale = powers[:chunk.size]
+        result[start:start + chunk.size] = scale * (previous + alpha * np.cumsum(chunk / scale))
+        previous = result[start + chunk.size - 1]
+    return result
+
+
+def sma(series, length):
+    """단순 이동 평균입니다. 구간에 na가 하나라도 있으면 na입니다."""
+    series = as_series(series)
+    result = np.full(series.shape, np.nan)
+    if length <= 0 or series.size < length:
+        return result
+    invalid = np.isnan(series)
+    # 누적합의 자릿수 손실을 줄이려고 첫 유효 값을 빼고 더한 뒤 다시 더함
+    start = _first_valid(series)
+    offset = series[start] if start < series.size else 0.0
+    cumulative = np.cumsum(np.insert(np.where(invalid, 0.0, series - offset), 0, 0.0))
+    missing = np.cumsum(np.insert(invalid, 0, False))
+    averages = (cumulative[length:] - cumulative[:-length]) / length + offset
+    result[length - 1:] = np.where(missing[length:] - missing[:-length] > 0, np.nan, averages)
+    return result
+
+
+def _seeded_average(series, length, alpha):
+    """
+    첫 length개 값의 sma로 시작해 alpha로 지수 평활합니다 (TradingView rma/ema 방식).
+
+    Pine의 sum := na(sum[1]) ? sma(src, length) : alpha * src + (1 - alpha) * nz(sum[1])와 같이, 중간에 na가 있으면
+    그 봉부터 na가 되고 이후 length개 값이 모두 있는 첫 봉의 sma로 다시 시작합니다.
+    """
+    series = as_series(series)
+    result = np.full(series.shape, np.nan)
+    if length <= 0 or series.size < length:
+        return result
+    averages = sma(series, length)
+    seeds = np.flatnonzero(~np.isnan(averages))
+    gaps = np.flatnonzero(np.isnan(series))
+    position = 0
+    while True:
+        # position 이후 sma가 처음 나오는 봉에서 시작해 다음 na 직전까지 평활
+        index = int(seeds.searchsorted(position))
+        if index == seeds.size:
+            return result
+        seed_at = int(seeds[index])
+        result[seed_at] = averages[seed_at]
+        gap = int(gaps.searchsorted(seed_at))
+        end = int(gaps[gap]) if gap < gaps.size else series.size
+        if end > seed_at + 1:
+            result[seed_at + 1:end] = _recursive_filter(series[seed_at + 1:end], alpha, averages[seed_at])
+        position = end
+
+
+def rma(series, length):
+    """Wilder 이동 평균 (alpha = 1 / length)입니다."""
+    return _seeded_average(series, length, 1.0 / length)
+
+
+def ema(series, length):
+    """지수 이동 평균 (alpha = 2 / (length + 1))입니다. TradingView 내장 ema처럼 sma로 시작합니다."""
+    return _seeded_average(series, length, 2.0 / (length + 1))
+
+
+def rsi(series, length):
+    """상대 강도 지수입니다. 상승/하락폭의 rma 비율로 계산하며, 하락이 없으면 100, 상승만 없으면 0입니다."""
+    series = as_series(series)
+    delta = change(series)
+    up = rma(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), length)
+    down = rma(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = 100.0 - 100.0 / (1.0 + up / down)
+    result = np.where(up == 0.0, 0.0, result)
+    result = np.where(down == 0.0, 100.0, result)
+    return np.where(np.isnan(up) | np.isnan(down), np.nan, result)
+
+
+def _windows(series, length):
+    return np.lib.stride_tricks.sliding_window_view(series, length)
+
+
+def stdev(series, length):
+    """모집단 표준편차입니다 (TradingView stdev와 같이 length로 나누고, 아주 작은 편차는 0으로 봄)."""
+    series = as_series(series)
+    result = np.full(series.shape, np.nan)
+    if length <= 0 or series.size < length:
+        return result
+    windows = _windows(series, length)
+    deviations = windows - sma(series, length)[length - 1:, None]
+    deviations[np.abs(deviations) <= _STDEV_EPSILON] = 0.0
+    result[length - 1:] = np.sqrt(np.einsum("ij,ij->i", deviations, deviations) / length)
+    return result
+
+
+def bb(series, length, mult):
+    """볼린저 밴드 (기준선, 상단, 하단)입니다. 기준선은 sma, 폭은 mult * stdev입니다."""
+    basis = sma(series, length)
+    deviation = mult * stdev(series, length)
+    return basis, basis + deviation, basis - deviation
+
+
+def highest(series, length):
+    series = as_series(series)
+    result = np.full(series.shape, np.nan)
+    if length <= 0 or series.size < length:
+        return result
+    result[length - 1:] = _windows(series, length).max(axis=1)
+    return result
+
+
+def lowest(series, length):
+    series = as_series(series)
+    result = np.full(series.shape, np.nan)
+    if length <= 0 or series.size < length:
+        return result
+    result[length - 1:] = _windows(series, length).min(axis=1)
+    return result
+
+
+def crossover(a, b):
+    """현재 봉에서 a > b이고 이전 봉에서 a <= b이면 참입니다."""
+    a, b = as_series(a), as_series(b)
+    if a.ndim == 0:
+        a = np.full(b.shape, float(a))
+    if b.ndim == 0:
+        b = np.full(a.shape, float(b))
+    return (a > b) & (shift(a) <= shift(b))
+
+
+def crossunder(a, b):
+    """현재 봉에서 a < b이고 이전 봉에서 a >= b이면 참입니다."""
+    a, b = as_series(a), as_series(b)
+    if a.ndim == 0:
+        a = np.full(b.shape, float(a))
+    if b.ndim == 0:
+        b = np.full(a.shape, float(b))
+    return (a < b) & (shift(a) >= shift(b))
+
+
+def cross(a, b):
+    return crossover(a, b) | crossunder(a, b)
+
+
+# cached()로 계산할 수 있는 함수
+_CACHEABLE = {
+    "sma": sma, "ema": ema, "rma": rma, "rsi": rsi, "stdev": stdev, "bb": bb,
+    "highest": highest, "lowest": lowest, "change": change,
+    "crossover": crossover, "crossunder": crossunder, "cross": cross
+}
+
+# id(배열) -> 시리즈 id (배열이 사라지면 weakref.finalize로 지움)
+_series_ids = {}
+
+
+def _remember(series, key):
+    ident = id(series)
+    _series_ids[ident] = key
+    weakref.finalize(series, _series_ids.pop, ident, None)
+
+
+def series_id(series):
+    """
+    배열 내용의 지문입니다. 내용이 같으면 다른 배열 객체여도 같은 id이며, 한 번 계산한 배열은 기억해 둡니다.
+    cached()가 돌려준 결과는 (지표, 입력 id, 매개변수)가 그대로 id가 됩니다.
+    """
+    key = _series_ids.get(id(series))
+    if key is None:
+        array = np.ascontiguousarray(series)
+        digest = hashlib.blake2b(array.view(np.uint8).reshape(-1), digest_size=16)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        key = digest.hexdigest()
+        _remember(series, key)
+    return key
+
+
+class SeriesCache:
+    """(시리즈 id, 지표, 매개변수) -> 결과 배열 LRU 캐시입니다. 결과 배열의 바이트 합을 max_bytes 이하로 유지합니다."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, tuple):
+            return sum(item.nbytes for item in value)
+        return value.nbytes
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size(previous)
+            self._entries[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# 프로세스 전체에서 공유하는 지표 결과 캐시
+cache = SeriesCache(INDICATOR_CACHE_BYTES)
+
+
+def _freeze(value, key):
+    value.flags.writeable = False
+    _remember(value, key)
+    return value
+
+
+def cached(name, *args):
+    """
+    지표 함수 name을 args로 계산합니다. 배열 인자는 series_id로, 나머지는 값 그대로 키를 만들어
+    같은 키의 결과를 재사용합니다. 결과 배열은 여러 호출이 공유하므로 읽기 전용입니다.
+    """
+    function = _CACHEABLE[name]
+    if cache.max_bytes <= 0:
+        return function(*args)
+    key = (name,) + tuple(series_id(arg) if isinstance(arg, np.ndarray) else arg for arg in args)
+    result = cache.get(key)
+    if result is None:
+        result = function(*args)
+        if isinstance(result, tuple):
+            result = tuple(_freeze(item, key + (index,)) for index, item in enumerate(result))
+        else:
+            result = _freeze(result, key)
+        cache.put(key, result)
+    return result
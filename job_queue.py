@@ -0,0 +1,246 @@
+# job_queue.py
+import os
+import asyncio
+import datetime
+import logging
+import traceback
+from collections import OrderedDict
+
+import fast_json
+import async_storage
+from storage_utils import new_ulid, atomic_write
+
+# 로깅 설정
+logger = logging.getLogger("job_queue")
+
+# 작업 큐 설정 (환경 변수로 조정 가능)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+JOB_QUEUE_MAXSIZE = int(os.getenv("JOB_QUEUE_MAXSIZE", "1000"))
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "1000"))
+
+# 작업 상태
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobQueueFull(Exception):
+    """작업 큐가 가득 차서 새 작업을 받을 수 없을 때 발생합니다."""
+
+
+class Job:
+    """큐에 등록된 웹훅 처리 작업 하나의 상태를 담습니다."""
+
+    def __init__(self, job_id, info=None):
+        self.id = job_id
+        self.state = JOB_QUEUED
+        self.info = dict(info or {})
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            **self.info
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """다른 프로세스가 저장한 작업 상태 파일로 Job을 복원합니다."""
+        fields = ("job_id", "state", "created_at", "started_at", "finished_at", "result", "error")
+        job = cls(data["job_id"], {k: v for k, v in data.items() if k not in fields})
+        job.state = data.get("state", JOB_QUEUED)
+        job.created_at = data.get("created_at")
+        job.started_at = data.get("started_at")
+        job.finished_at = data.get("finished_at")
+        job.result = data.get("result")
+        job.error = data.get("error")
+        return job
+
+
+class JobQueue:
+    """
+    웹훅 처리 작업을 메모리 큐에 넣고 작업자 풀이 순서대로 처리합니다.
+
+    handler는 payload 하나를 받아 결과 딕셔너리를 반환하는 함수입니다.
+    일반 함수는 스레드 풀에서, 코루틴 함수는 이벤트 루프에서 실행됩니다.
+    작업자는 첫 작업이 등록될 때 현재 이벤트 루프에서 시작됩니다.
+
+    state_dir을 지정하면 작업 상태가 바뀔 때마다 <state_dir>/<job_id>.json에 저장하므로,
+    여러 프로세스로 실행할 때 다른 프로세스가 등록한 작업도 조회할 수 있습니다.
+    상태 파일은 이벤트 루프를 막지 않도록 백그라운드 작성 태스크가 저장소 I/O 스레드 풀에서 모아 씁니다
+    (같은 작업의 상태가 여러 번 바뀌면 마지막 상태만 씀).
+    """
+
+    def __init__(self, handler, workers=WEBHOOK_WORKERS, maxsize=JOB_QUEUE_MAXSIZE, history_limit=JOB_HISTORY_LIMIT,
+                 state_dir=None):
+        self.handler = handler
+        self.state_dir = state_dir
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.history_limit = history_limit
+        self.jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+        self._loop = None
+        # 저장할 작업 상태 (job_id -> Job, 삭제할 파일은 None)
+        self._pending_writes = OrderedDict()
+        self._wakeup = None
+        self._writer = None
+        self._writer_loop = None
+
+    def _ensure_workers(self):
+        """현재 이벤트 루프에 큐와 작업자 태스크를 준비합니다."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [loop.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.debug(f"작업자 {self.workers}개 시작")
+
+    def create(self, **info):
+        """작업을 생성만 하고 큐에는 아직 넣지 않습니다."""
+        job = Job(new_ulid(), info)
+        self.jobs[job.id] = job
+        self._trim_history()
+        self._persist(job)
+        return job
+
+    def enqueue(self, job, payload):
+        """생성된 작업을 큐에 넣습니다. 큐가 가득 차면 JobQueueFull을 발생시킵니다."""
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((job, payload))
+        except asyncio.QueueFull:
+            job.state = JOB_FAILED
+            job.error = "작업 큐가 가득 찼습니다."
+            job.finished_at = _now()
+            self._persist(job)
+            raise JobQueueFull(job.error)
+        self._persist(job)
+        logger.debug(f"작업 등록: {job.id} (대기 {self._queue.qsize()}개)")
+        return job
+
+    def submit(self, payload, **info):
+        """작업을 생성하고 바로 큐에 넣습니다."""
+        return self.enqueue(self.create(**info), payload)
+
+    async def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None or not self.state_dir or not job_id.isalnum():
+            return job
+        # 다른 프로세스에서 등록된 작업
+        return await async_storage.run(self._load, job_id)
+
+    def _load(self, job_id):
+        try:
+            return Job.from_dict(fast_json.load_file(os.path.join(self.state_dir, f"{job_id}.json")))
+        except FileNotFoundError:
+            return None
+
+    def _persist(self, job):
+        if self.state_dir:
+            self._schedule_write(job.id, job)
+
+    def _remove_persisted(self, job_id):
+        if self.state_dir:
+            self._schedule_write(job_id, None)
+
+    def _schedule_write(self, job_id, job):
+        """작업 상태 저장(job이 None이면 삭제)을 백그라운드 작성 태스크에 맡깁니다."""
+        self._pending_writes[job_id] = job
+        self._pending_writes.move_to_end(job_id)
+        loop = asyncio.get_running_loop()
+        if self._writer_loop is not loop or self._writer is None or self._writer.done():
+            self._writer_loop = loop
+            self._wakeup = asyncio.Event()
+            self._writer = loop.create_task(self._write_pending())
+        self._wakeup.set()
+
+    async def _write_pending(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending_writes:
+                # 직렬화는 상태를 바꾸는 이벤트 루프에서 하고, 파일 쓰기만 스레드 풀에서 실행
+                batch = [(job_id, None if job is None else fast_json.dumps(job.to_dict()))
+                         for job_id, job in self._pending_writes.items()]
+                self._pending_writes.clear()
+                await async_storage.run(self._write_batch, batch)
+
+    def _write_batch(self, batch):
+        for job_id, data in batch:
+            path = os.path.join(self.state_dir, f"{job_id}.json")
+            try:
+                if data is None:
+                    os.remove(path)
+                else:
+                    atomic_write(path, data)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"작업 상태 저장 중 오류: {str(e)}")
+
+    def stats(self):
+        states = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "pending_writes": len(self._pending_writes),
+            "jobs": states
+        }
+
+    def _trim_history(self):
+        """완료된 오래된 작업부터 지워 작업 기록 크기를 제한합니다."""
+        if len(self.jobs) <= self.history_limit:
+            return
+        for job_id in list(self.jobs.keys()):
+            if len(self.jobs) <= self.history_limit:
+                break
+            if self.jobs[job_id].state in (JOB_COMPLETED, JOB_FAILED):
+                del self.jobs[job_id]
+                self._remove_persisted(job_id)
+
+    async def _run_handler(self, payload):
+        if asyncio.iscoroutinefunction(self.handler):
+            return await self.handler(payload)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler, payload)
+
+    async def _worker(self, n):
+        while True:
+            job, payload = await self._queue.get()
+            job.state = JOB_RUNNING
+            job.started_at = _now()
+            self._persist(job)
+            logger.debug(f"작업자 {n}: 작업 {job.id} 처리 시작")
+            try:
+                job.result = await self._run_handler(payload)
+                job.state = JOB_COMPLETED
+                logger.debug(f"작업자 {n}: 작업 {job.id} 완료")
+            except Exception as e:
+                job.state = JOB_FAILED
+                job.error = str(e)
+                logger.error(f"작업 {job.id} 처리 중 오류: {str(e)}")
+                logger.error(traceback.format_exc())
+            finally:
+                job.finished_at = _now()
+                self._persist(job)
+                self._queue.task_done()
@@ -0,0 +1,212 @@
+# llm_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+
+import fast_json
+from storage_utils import atomic_write
+
+# 로깅 설정
+logger = logging.getLogger("llm_cache")
+
+# 캐시 설정 (환경 변수로 조정 가능)
+_STORAGE_ROOT = os.path.dirname(os.getenv("LOG_DIR", "/tmp/storage/webhooks"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(_STORAGE_ROOT, "llm_cache"))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true") == "true"
+
+
+def normalize_code(code):
+    """줄바꿈과 줄 끝 공백, 앞뒤 빈 줄을 정리해 의미가 같은 코드가 같은 키를 갖게 합니다."""
+    lines = [line.rstrip() for line in code.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def make_key(original_code, prompt_fields, model, temperature, max_tokens):
+    """원본 코드, 프롬프트에 들어가는 웹훅 필드, 모델 설정으로 캐시 키(sha256)를 만듭니다."""
+    material = json.dumps({
+        "code": normalize_code(original_code),
+        "fields": prompt_fields,
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    LLM 응답 캐시입니다. 메모리 LRU 계층이 디스크 계층 앞에 위치합니다.
+
+    디스크 항목은 TTL이 지나면 만료되고, 전체 크기가 max_bytes를 넘으면
+    가장 오래 사용되지 않은 파일부터 삭제됩니다.
+    """
+
+    def __init__(self, cache_dir=LLM_CACHE_DIR, memory_items=LLM_CACHE_MEMORY_ITEMS,
+                 ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, created_at, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """캐시된 값을 반환합니다. 없거나 만료되었으면 None을 반환합니다."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            record = fast_json.load_file(path)
+            if now - record["created_at"] > self.ttl:
+                with self._lock:
+                    self.counters["expired"] += 1
+                self._remove(path)
+            else:
+                # 최근 사용 시각을 mtime으로 기록 (LRU 삭제 기준)
+                os.utime(path, None)
+                with self._lock:
+                    self._remember(key, record["created_at"], record["value"])
+                    self.counters["disk_hits"] += 1
+                return record["value"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"캐시 파일 읽기 중 오류: {str(e)}")
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        """값을 메모리와 디스크 계층에 저장합니다."""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, value)
+            self.counters["stores"] += 1
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = fast_json.dumps({"created_at": created_at, "value": value})
+            # 같은 키를 덮어쓰면 이전 파일 크기를 빼고 차이만 더함
+            try:
+                previous = os.path.getsize(path)
+            except FileNotFoundError:
+                previous = 0
+            atomic_write(path, data)
+            with self._lock:
+                if self._disk_bytes is not None:
+                    self._disk_bytes += len(data) - previous
+            self._evict_if_needed()
+        except Exception as e:
+            logger.error(f"캐시 파일 저장 중 오류: {str(e)}")
+            logger.error(traceback.format_exc())
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            with self._lock:
+                if self._disk_bytes is not None:
+                    self._disk_bytes -= size
+        except FileNotFoundError:
+            pass
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict_if_needed(self):
+        """디스크 계층이 max_bytes를 넘으면 만료 항목과 오래 사용되지 않은 항목을 삭제합니다."""
+        with self._lock:
+            known = self._disk_bytes
+        if known is not None and known <= self.max_bytes:
+            return
+
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            # 오래 사용되지 않은 순서로 삭제하되, 만료된 항목은 크기와 관계없이 함께 정리
+            now = time.time()
+            entries.sort()
+            for mtime, size, path in entries:
+                expired = now - mtime > self.ttl
+                if not expired and total <= self.max_bytes * 0.9:
+                    break
+                self._remove_quietly(path)
+                total -= size
+                with self._lock:
+                    self.counters["expired" if expired else "evictions"] += 1
+            logger.debug(f"캐시 정리 완료: {total} 바이트")
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remove_quietly(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            memory_entries = len(self._memory)
+            disk_bytes = self._disk_bytes
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **counters,
+            "memory_entries": memory_entries,
+            "disk_bytes": disk_bytes,
+            "cache_dir": self.cache_dir
+        }
+
+
+# 프로세스 전체에서 공유하는 캐시
+cache = LLMCache()
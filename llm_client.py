@@ -0,0 +1,150 @@
+# llm_client.py
+import os
+import asyncio
+import logging
+import httpx
+import openai
+
+# 로깅 설정
+logger = logging.getLogger("llm_client")
+
+# 비동기 OpenAI 클라이언트 설정 (환경 변수로 조정 가능)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# 스트리밍 응답 마지막에 토큰 사용량을 함께 요청 (stream_options를 지원하지 않는 호환 서버는 false)
+OPENAI_STREAM_USAGE = os.getenv("OPENAI_STREAM_USAGE", "true").lower() == "true"
+
+# 프로세스 전체에서 공유하는 클라이언트와 동시 요청 제한기
+_client = None
+_client_key = None
+_client_loop = None
+_semaphore = None
+_semaphore_loop = None
+_in_flight = 0
+_waiting = 0
+# 스트리밍 요청 통계 (조기 종료: 응답이 끝나기 전에 닫힌 스트림)
+_streams = 0
+_streams_closed_early = 0
+_streamed_chunks = 0
+
+
+def get_async_client():
+    """
+    연결 풀(keep-alive)을 사용하는 공유 AsyncOpenAI 클라이언트를 반환합니다.
+    API 키나 이벤트 루프가 바뀌면 새로 만듭니다.
+    """
+    global _client, _client_key, _client_loop
+    api_key = os.getenv("OPENAI_API_KEY")
+    loop = asyncio.get_running_loop()
+    if _client is not None and _client_key == api_key and _client_loop is loop:
+        return _client
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        ),
+        timeout=OPENAI_TIMEOUT
+    )
+    _client = openai.AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=OPENAI_MAX_RETRIES)
+    _client_key = api_key
+    _client_loop = loop
+    logger.debug(f"비동기 OpenAI 클라이언트 생성 (최대 연결 {OPENAI_MAX_CONNECTIONS}개)")
+    return _client
+
+
+def _get_semaphore():
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(max(1, OPENAI_MAX_CONCURRENCY))
+        _semaphore_loop = loop
+    return _semaphore
+
+
+async def create_chat_completion(**kwargs):
+    """
+    동시 요청 수를 OPENAI_MAX_CONCURRENCY로 제한하면서 채팅 완성 요청을 보냅니다.
+    """
+    global _in_flight, _waiting
+    semaphore = _get_semaphore()
+    _waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting -= 1
+    _in_flight += 1
+    try:
+        return await get_async_client().chat.completions.create(**kwargs)
+    finally:
+        _in_flight -= 1
+        semaphore.release()
+
+
+async def stream_chat_completion(usage=None, **kwargs):
+    """
+    create_chat_completion의 스트리밍 버전입니다. 응답 텍스트 조각을 도착하는 대로 내보냅니다.
+    스트림이 끝나거나 중간에 닫힐 때까지 동시 요청 슬롯 하나를 차지합니다.
+    usage(dict)를 주면 API가 스트림 마지막에 보내는 토큰 사용량(completion_tokens 등)을 채웁니다.
+    스트림을 중간에 닫으면 사용량이 오지 않으므로 비어 있을 수 있습니다.
+    """
+    global _in_flight, _waiting, _streams, _streams_closed_early, _streamed_chunks
+    semaphore = _get_semaphore()
+    _waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting -= 1
+    _in_flight += 1
+    _streams += 1
+    stream = None
+    finished = False
+    if usage is not None and OPENAI_STREAM_USAGE:
+        kwargs["extra_body"] = dict(kwargs.get("extra_body") or {}, stream_options={"include_usage": True})
+    try:
+        stream = await get_async_client().chat.completions.create(stream=True, **kwargs)
+        async for chunk in stream:
+            _streamed_chunks += 1
+            chunk_usage = getattr(chunk, "usage", None)
+            if usage is not None and chunk_usage:
+                usage.update(chunk_usage if isinstance(chunk_usage, dict) else chunk_usage.model_dump())
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+        finished = True
+    finally:
+        # 조기 종료나 클라이언트 연결 끊김으로 중간에 닫힌 경우에도 HTTP 응답을 닫아 생성을 멈추고 연결을 정리함
+        if stream is not None:
+            if not finished:
+                _streams_closed_early += 1
+            await stream.response.aclose()
+        _in_flight -= 1
+        semaphore.release()
+
+
+async def close_client():
+    """공유 클라이언트의 연결을 닫습니다."""
+    global _client, _client_key, _client_loop
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _client_key = None
+    _client_loop = None
+
+
+def stats():
+    return {
+        "max_concurrency": OPENAI_MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+        "waiting": _waiting,
+        "streams": _streams,
+        "streams_closed_early": _streams_closed_early,
+        "streamed_chunks": _streamed_chunks
+    }
@@ -54,6 +54,7 @@ def setup_vercel_directories():
         tmp_root = "/tmp"
         log_dir = os.path.join(tmp_root, "storage", "webhooks")
         strategy_dir = os.path.join(tmp_root, "storage", "strategies")
+        bar_dir = os.path.join(tmp_root, "storage", "bars")
         static_dir = os.path.join(tmp_root, "static")
         
         # 디렉토리 생성
@@ -64,6 +65,7 @@ def setup_vercel_directories():
         # 환경 변수 설정
         os.environ["LOG_DIR"] = log_dir
         os.environ["STRATEGY_DIR"] = strategy_dir
+        os.environ["BAR_DIR"] = bar_dir
         
         # 기본 index.html 생성
         index_html_path = os.path.join(static_dir, "index.html")
@@ -0,0 +1,271 @@
+# metadata_store.py
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import threading
+import traceback
+
+import fast_json
+
+# 로깅 설정
+logger = logging.getLogger("metadata_store")
+
+# 메타데이터 저장소 설정 (환경 변수로 조정 가능)
+# METADATA_DB를 지정하지 않으면 전략 디렉토리 안의 metadata.sqlite3를 사용합니다.
+METADATA_DB = os.getenv("METADATA_DB")
+HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", "50"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "500"))
+
+DB_FILENAME = "metadata.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS modifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    original_strategy TEXT NOT NULL DEFAULT '',
+    modified_strategy TEXT NOT NULL DEFAULT '',
+    modified_file TEXT,
+    metadata_file TEXT UNIQUE,
+    performance_before TEXT NOT NULL DEFAULT '{}',
+    modification_summary TEXT NOT NULL DEFAULT '',
+    metadata TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_modifications_timestamp
+    ON modifications (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_modifications_strategy
+    ON modifications (original_strategy, timestamp, id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def normalize_time(value):
+    """
+    시간 범위 값을 메타데이터 timestamp 형식(YYYYMMDD_HHMMSS)으로 바꿉니다.
+    "2024-01-02", "2024-01-02 03:04:05", "20240102_030405" 형식을 모두 받습니다.
+    """
+    if value is None or value == "":
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) < 8:
+        raise ValueError(f"잘못된 시간 형식입니다: {value}")
+    digits = (digits + "000000")[:14]
+    return f"{digits[:8]}_{digits[8:]}"
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp}.{row_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = cursor.rsplit(".", 1)
+        return timestamp, int(row_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"잘못된 커서입니다: {cursor}")
+
+
+class MetadataStore:
+    """
+    수정 내역 메타데이터를 SQLite(WAL 모드)에 저장합니다.
+
+    timestamp와 전략 이름에 인덱스가 있어 내역 조회 비용은 전체 건수가 아니라
+    페이지 크기에 비례합니다. 페이지는 (timestamp, id) 키셋 커서로 이어집니다.
+    연결은 스레드마다 따로 엽니다.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def add(self, metadata, modified_file=None, metadata_file=None):
+        """메타데이터 레코드 하나를 추가하고 행 ID를 반환합니다. 같은 메타데이터 파일은 한 번만 저장됩니다."""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO modifications (timestamp, original_strategy, modified_strategy, "
+                "modified_file, metadata_file, performance_before, modification_summary, metadata, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    metadata.get("timestamp", ""),
+                    metadata.get("original_strategy", ""),
+                    metadata.get("modified_strategy", ""),
+                    modified_file,
+                    metadata_file,
+                    fast_json.dumps_str(metadata.get("performance_before", {})),
+                    metadata.get("modification_summary", ""),
+                    fast_json.dumps_str(metadata),
+                    time.time()
+                )
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def history(self, limit=HISTORY_DEFAULT_LIMIT, cursor=None, strategy=None, since=None, until=None):
+        """
+        최신 순으로 수정 내역 한 페이지를 반환합니다.
+        반환값은 (항목 목록, 다음 페이지 커서)이며 마지막 페이지면 커서는 None입니다.
+        """
+        limit = max(1, min(int(limit), HISTORY_MAX_LIMIT))
+        clauses = []
+        params = []
+        if strategy:
+            clauses.append("original_strategy = ?")
+            params.append(strategy)
+        since = normalize_time(since)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        until = normalize_time(until)
+        if until:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        if cursor:
+            cursor_timestamp, cursor_id = decode_cursor(cursor)
+            clauses.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([cursor_timestamp, cursor_timestamp, cursor_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            "SELECT id, timestamp, original_strategy, modified_strategy, modified_file, metadata_file, "
+            f"performance_before, modification_summary FROM modifications {where} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+        items = []
+        for row in rows:
+            items.append({
+                "id": row["id"],
+                "timestamp": row["timestamp"],
+                "original_strategy": row["original_strategy"],
+                "modified_strategy": row["modified_strategy"],
+                "modified_file": row["modified_file"],
+                "metadata_file": row["metadata_file"],
+                "performance_before": fast_json.loads(row["performance_before"]),
+                "modification_summary": row["modification_summary"]
+            })
+        return items, next_cursor
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM modifications").fetchone()[0]
+
+    def get_meta(self, key):
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_json_files(self, strategy_dir):
+        """
+        전략 디렉토리의 기존 metadata_*.json 파일을 저장소로 가져옵니다.
+        이미 가져온 파일은 건너뛰므로 여러 번 실행해도 안전합니다. 가져온 건수를 반환합니다.
+        """
+        if not os.path.isdir(strategy_dir):
+            return 0
+        names = sorted(f for f in os.listdir(strategy_dir) if f.startswith("metadata_") and f.endswith(".json"))
+        imported = 0
+        for name in names:
+            metadata_file = os.path.join(strategy_dir, name)
+            try:
+                metadata = fast_json.load_file(metadata_file)
+                if not metadata.get("timestamp"):
+                    metadata["timestamp"] = name[len("metadata_"):-len(".json")]
+                modified_file = os.path.join(strategy_dir, "modified_" + name[len("metadata_"):-len(".json")] + ".pine")
+                if not os.path.exists(modified_file):
+                    modified_file = None
+                if self.add(metadata, modified_file, metadata_file) is not None:
+                    imported += 1
+            except Exception as e:
+                logger.error(f"메타데이터 파일 '{metadata_file}' 가져오기 중 오류: {str(e)}")
+        logger.debug(f"메타데이터 파일 {len(names)}개 중 {imported}개 가져옴: {strategy_dir}")
+        return imported
+
+    def ensure_imported(self, strategy_dir):
+        """기존 JSON 파일 가져오기를 저장소마다 한 번만 실행합니다."""
+        if self.get_meta("json_imported"):
+            return 0
+        imported = self.import_json_files(strategy_dir)
+        self.set_meta("json_imported", str(time.time()))
+        return imported
+
+    def stats(self):
+        # /status에서 호출되므로 COUNT(*) 같은 전체 스캔은 하지 않음
+        return {
+            "db_path": self.db_path
+        }
+
+
+# 전략 디렉토리별 인스턴스 (프로세스 안에서 공유)
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def db_path_for(strategy_dir):
+    return METADATA_DB or os.path.join(strategy_dir, DB_FILENAME)
+
+
+def get_store(strategy_dir):
+    path = db_path_for(strategy_dir)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = MetadataStore(path)
+        return _stores[path]
+
+
+def record_modification(strategy_dir, metadata, modified_file, metadata_file):
+    """
+    save_modification에서 호출합니다. 저장소 기록에 실패해도 JSON 파일은 이미 저장되었으므로
+    예외를 올리지 않고 로그만 남깁니다.
+    """
+    try:
+        store = get_store(strategy_dir)
+        store.ensure_imported(strategy_dir)
+        store.add(metadata, modified_file, metadata_file)
+        logger.debug(f"메타데이터 저장소 기록 완료: {metadata_file}")
+    except Exception as e:
+        logger.error(f"메타데이터 저장소 기록 중 오류: {str(e)}")
+        logger.error(traceback.format_exc())
+
+
+if __name__ == "__main__":
+    # 기존 JSON 메타데이터 가져오기: python metadata_store.py [전략 디렉토리]
+    logging.basicConfig(level=logging.INFO)
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv("STRATEGY_DIR", "storage/strategies")
+    target_store = get_store(target_dir)
+    count = target_store.import_json_files(target_dir)
+    target_store.set_meta("json_imported", str(time.time()))
+    print(f"{count}개의 메타데이터를 가져왔습니다: {target_store.db_path} (총 {target_store.count()}개)")
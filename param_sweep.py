@@ -0,0 +1,456 @@
+# param_sweep.py
+import os
+import math
+import time
+import asyncio
+import logging
+import tempfile
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import backtester
+import backtest_cache
+import bar_store
+import pine_parser
+import pine_rules
+import storage_utils
+
+# 로깅 설정
+logger = logging.getLogger("param_sweep")
+
+# 매개변수 탐색 설정 (환경 변수로 조정 가능)
+PARAM_SWEEP_WORKERS = int(os.getenv("PARAM_SWEEP_WORKERS", str(os.cpu_count() or 1)))
+# 작업 프로세스 시작 방식 (spawn은 스레드가 있는 서버 프로세스를 복제하지 않아 안전함)
+PARAM_SWEEP_START_METHOD = os.getenv("PARAM_SWEEP_START_METHOD", "spawn")
+PARAM_SWEEP_MAX_COMBINATIONS = int(os.getenv("PARAM_SWEEP_MAX_COMBINATIONS", "5000"))
+# 범위를 지정하지 않은 매개변수를 기본값 주변에서 몇 개의 값으로 나눌지
+PARAM_SWEEP_DEFAULT_POINTS = int(os.getenv("PARAM_SWEEP_DEFAULT_POINTS", "5"))
+PARAM_SWEEP_TOP = int(os.getenv("PARAM_SWEEP_TOP", "20"))
+# 거래 수가 이보다 적은 조합은 순위에서 제외 (우연히 몇 번 맞은 조합이 1등이 되지 않도록)
+PARAM_SWEEP_MIN_TRADES = int(os.getenv("PARAM_SWEEP_MIN_TRADES", "10"))
+# 작업자가 메모리 맵으로 읽을 봉 데이터 파일을 둘 디렉토리 (/dev/shm이 있으면 메모리에만 존재)
+PARAM_SWEEP_DIR = os.getenv("PARAM_SWEEP_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+# 순위 기준: (성과 키, 큰 값이 좋은지)
+SORT_KEYS = {
+    "net_profit": ("net_profit", True),
+    "profit_factor": ("profit_factor", True),
+    "winrate": ("winrate", True),
+    "max_drawdown": ("max_drawdown", False)
+}
+# 작업 하나에 담을 조합 수의 상한 (작업자마다 여러 번 나눠 받도록 해 부하를 고르게 함)
+_MAX_BATCH = 64
+
+
+class SweepError(Exception):
+    """탐색 범위가 올바르지 않거나 조합이 너무 많을 때 발생합니다."""
+
+
+def _is_numeric(decl):
+    value = decl.default.value if decl.default is not None else None
+    return (decl.default is not None and decl.default.is_literal and isinstance(value, (int, float))
+            and not isinstance(value, bool) and decl.function != "input.bool")
+
+
+def _is_integer(decl):
+    return isinstance(decl.default.value, int) and decl.function != "input.float"
+
+
+def _bounds(decl):
+    bounds = []
+    for keyword in ("minval", "maxval"):
+        arg = decl.call.kwargs.get(keyword)
+        bounds.append(arg.value if arg is not None and isinstance(arg.value, (int, float)) else None)
+    return bounds
+
+
+def default_values(decl, points=None):
+    """input 기본값 주변의 탐색 값입니다. 정수는 기본값의 약 15% 간격, 실수는 0.5배~1.5배로 나눕니다."""
+    points = max(1, points or PARAM_SWEEP_DEFAULT_POINTS)
+    default = decl.default.value
+    half = (points - 1) / 2
+    if _is_integer(decl):
+        step = max(1, round(abs(default) * 0.15))
+        values = [int(round(default + step * (index - half))) for index in range(points)]
+    else:
+        scales = np.linspace(0.5, 1.5, points) if points > 1 else [1.0]
+        values = [float(round(default * scale, 6)) for scale in scales]
+    minimum, maximum = _bounds(decl)
+    if default > 0:
+        # 기간/비율처럼 양수인 값은 0 이하로 내려가지 않게 함
+        minimum = max(minimum, 1 if _is_integer(decl) else 0.0) if minimum is not None else (
+            1 if _is_integer(decl) else 0.0)
+        values = [value for value in values if value > 0 or value == minimum]
+    values = [value for value in values
+              if (minimum is None or value >= minimum) and (maximum is None or value <= maximum)]
+    return sorted(set(values + [default]))
+
+
+def _range_values(decl, spec):
+    """요청의 범위 지정(리스트, {"start", "stop", "step"}, {"values"})을 값 목록으로 바꿉니다."""
+    if isinstance(spec, dict) and "values" in spec:
+        spec = spec["values"]
+    if isinstance(spec, dict):
+        try:
+            start, stop = float(spec["start"]), float(spec["stop"])
+            step = float(spec.get("step", 1))
+        except (KeyError, TypeError, ValueError):
+            raise SweepError(f"{decl.name}의 범위는 start/stop/step 숫자로 지정해야 합니다.")
+        if step <= 0 or stop < start:
+            raise SweepError(f"{decl.name}의 범위가 올바르지 않습니다: {spec}")
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        if count > PARAM_SWEEP_MAX_COMBINATIONS:
+            raise SweepError(f"{decl.name}의 값이 너무 많습니다: {count}개")
+        spec = [round(start + step * index, 10) for index in range(count)]
+    if not isinstance(spec, (list, tuple)) or not spec:
+        raise SweepError(f"{decl.name}의 값 목록이 비어 있거나 올바르지 않습니다.")
+    values = []
+    for value in spec:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise SweepError(f"{decl.name}의 값은 숫자여야 합니다: {value!r}")
+        if _is_integer(decl):
+            if value != int(value):
+                raise SweepError(f"{decl.name}은 정수 input입니다: {value}")
+            value = int(value)
+        else:
+            value = float(value)
+        if pine_rules.format_input_value(decl, value) is None:
+            raise SweepError(f"{decl.name}의 허용 범위(minval/maxval)를 벗어난 값입니다: {value}")
+        values.append(value)
+    return sorted(set(values))
+
+
+def build_ranges(code, parameters=None, used_inputs=None):
+    """
+    탐색할 매개변수별 값 목록(OrderedDict)을 만듭니다. parameters를 주면 그 이름과 범위만,
+    없으면 백테스트에서 실제로 쓰인 숫자 input(used_inputs)을 기본값 주변에서 탐색합니다.
+    """
+    model = pine_parser.parse(code)
+    ranges = OrderedDict()
+    if parameters:
+        if not isinstance(parameters, dict):
+            raise SweepError("parameters는 {이름: 범위} 형식이어야 합니다.")
+        for name, spec in parameters.items():
+            decl = model.inputs.get(name)
+            if decl is None:
+                raise SweepError(f"전략에 input {name}이 없습니다.")
+            if not _is_numeric(decl):
+                raise SweepError(f"숫자 input만 탐색할 수 있습니다: {name}")
+            ranges[name] = _range_values(decl, spec)
+    else:
+        for name, decl in model.inputs.items():
+            if (used_inputs is None or name in used_inputs) and _is_numeric(decl):
+                ranges[name] = default_values(decl)
+    if not ranges:
+        raise SweepError("탐색할 숫자 input이 없습니다.")
+    combinations = math.prod(len(values) for values in ranges.values())
+    if combinations > PARAM_SWEEP_MAX_COMBINATIONS:
+        raise SweepError(f"조합이 너무 많습니다: {combinations}개 (최대 {PARAM_SWEEP_MAX_COMBINATIONS}개). "
+                         "parameters로 탐색할 input과 범위를 줄여 주세요.")
+    return ranges
+
+
+class SharedBarsFile:
+    """
+    write_shared_bars로 쓴 .npy 파일을 가리키는 설명자입니다. bar_store.BarWindow와 같이
+    key와 load()를 가지며, 작업자에게는 경로만 전달됩니다.
+    """
+
+    __slots__ = ("path", "columns")
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+
+    @property
+    def key(self):
+        return self.path
+
+    def load(self):
+        array = np.load(self.path, mmap_mode="r")
+        # 메모리 맵의 행을 복사 없이 열 배열로 씀
+        return {key: np.asarray(array[index]) for index, key in enumerate(self.columns)}
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            logger.debug(f"봉 데이터 파일 삭제 실패: {self.path}")
+
+
+def write_shared_bars(bars, directory=None):
+    """
+    봉 데이터를 작업자들이 메모리 맵으로 읽을 .npy 파일로 한 번만 씁니다.
+    열 단위로 연속되도록 (열, 봉) 모양으로 저장합니다.
+    """
+    directory = directory or PARAM_SWEEP_DIR
+    os.makedirs(directory, exist_ok=True)
+    # 탐색 결과에는 거래 목록이 없으므로 시간 열은 공유하지 않음
+    columns = backtester.OHLCV_COLUMNS
+    path = os.path.join(directory, f"sweep_bars_{storage_utils.new_ulid()}.npy")
+    np.save(path, np.vstack([np.asarray(bars[key], dtype=float) for key in columns]))
+    return SharedBarsFile(path, columns)
+
+
+# 작업 프로세스가 메모리 맵으로 연 봉 데이터 (설명자 key별, 최근 것 몇 개만 유지)
+_attached_bars = OrderedDict()
+_ATTACHED_LIMIT = 2
+
+
+def _attach_bars(source):
+    bars = _attached_bars.get(source.key)
+    if bars is None:
+        bars = source.load()
+        _attached_bars[source.key] = bars
+        while len(_attached_bars) > _ATTACHED_LIMIT:
+            _attached_bars.popitem(last=False)
+    return bars
+
+
+def _row(values, result):
+    return {
+        "values": values,
+        "performance": result["performance"],
+        "net_profit": result["net_profit"],
+        "net_profit_pct": result["net_profit_pct"]
+    }
+
+
+def evaluate_batch(source, code, names, combinations, bar_range, mintick=None):
+    """
+    작업 프로세스에서 조합 묶음을 백테스트 결과 캐시를 거쳐 백테스트합니다.
+    source는 SharedBarsFile 또는 bar_store.BarWindow이고 bar_range는 캐시 키의 봉 구간입니다.
+    {"rows": 조합마다 성과(row) 또는 오류, "cache": 캐시 조회/저장 횟수(backtest_cache.worker_report)}를 반환합니다.
+    """
+    before = backtest_cache.counters()
+    bars = _attach_bars(source)
+    rows = []
+    for values in combinations:
+        try:
+            result = backtest_cache.evaluate(code, bars, bar_range, dict(zip(names, values)), mintick)
+            rows.append(_row(values, result))
+        except backtester.BacktestError as e:
+            rows.append({"values": values, "error": str(e)})
+    return {"rows": rows, "cache": backtest_cache.worker_report(before)}
+
+
+class SweepPool:
+    """
+    매개변수 탐색을 실행하는 프로세스 풀입니다. 처음 쓸 때 만들어 요청 사이에 재사용하며,
+    프로세스 풀을 만들 수 없는 환경(workers 0, 세마포어 없는 서버리스 등)에서는 스레드 하나에서 순서대로 실행합니다.
+    """
+
+    def __init__(self, workers=PARAM_SWEEP_WORKERS, start_method=PARAM_SWEEP_START_METHOD):
+        self.workers = max(0, workers)
+        self.start_method = start_method
+        self._executor = None
+        self._lock = threading.Lock()
+        self.fallback = self.workers == 0
+        self.sweeps = 0
+        self.combinations = 0
+        self.failed = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and not self.fallback:
+                try:
+                    context = multiprocessing.get_context(self.start_method)
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    logger.info(f"매개변수 탐색 프로세스 풀 시작: {self.workers}개 ({self.start_method})")
+                except (OSError, ValueError, NotImplementedError) as e:
+                    logger.warning(f"프로세스 풀을 만들 수 없어 순차 실행으로 전환합니다: {str(e)}")
+                    self.fallback = True
+            return self._executor
+
+    async def map(self, func, batches):
+        """batches의 각 인자 묶음으로 func를 실행하고 결과 목록을 순서대로 반환합니다."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        if executor is None:
+            return await loop.run_in_executor(None, lambda: [func(*args) for args in batches])
+        try:
+            return await asyncio.gather(*(loop.run_in_executor(executor, func, *args) for args in batches))
+        except BrokenProcessPool:
+            # 작업 프로세스가 비정상 종료되면 다음 요청에서 풀을 새로 만듦
+            with self._lock:
+                self._executor = None
+            raise SweepError("매개변수 탐색 작업 프로세스가 비정상 종료되었습니다.")
+
+    def record(self, combinations, elapsed_ms, ok):
+        with self._lock:
+            self.sweeps += 1
+            self.combinations += combinations
+            self.total_ms += elapsed_ms
+            if not ok:
+                self.failed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "start_method": self.start_method,
+                "pool_started": self._executor is not None,
+                "fallback": self.fallback,
+                "sweeps": self.sweeps,
+                "failed": self.failed,
+                "combinations": self.combinations,
+                "avg_ms": round(self.total_ms / self.sweeps, 3) if self.sweeps else 0.0
+            }
+
+
+# 프로세스 전체에서 공유하는 탐색 풀
+pool = SweepPool()
+
+
+def _sort_value(row, sort):
+    key, descending = SORT_KEYS[sort]
+    performance = row["performance"]
+    value = row[key] if key == "net_profit" else performance[key]
+    if value is None:
+        # 손실 거래가 없어 profit factor를 정할 수 없으면 수익이 있을 때 가장 좋은 값으로 봄
+        value = math.inf if row["net_profit"] > 0 else 0.0
+    return value if descending else -value
+
+
+def rank_rows(rows, sort="net_profit", min_trades=None):
+    """거래 수가 min_trades 이상인 조합을 sort 기준으로 정렬합니다 (같으면 순이익 순)."""
+    min_trades = PARAM_SWEEP_MIN_TRADES if min_trades is None else min_trades
+    eligible = [row for row in rows if "error" not in row and row["performance"]["total_trades"] >= min_trades]
+    eligible.sort(key=lambda row: (_sort_value(row, sort), row["net_profit"]), reverse=True)
+    return eligible
+
+
+def _batches(combinations, workers):
+    size = max(1, min(_MAX_BATCH, math.ceil(len(combinations) / max(1, workers * 4))))
+    return [combinations[start:start + size] for start in range(0, len(combinations), size)]
+
+
+async def optimize(code, data, parameters=None, sort="net_profit", top=None, min_trades=None):
+    """
+    전략의 input 조합을 봉 데이터로 백테스트해 순위표를 반환합니다. data는 load_bars가 받는 형식이나
+    bar_store.BarWindow입니다. 봉 데이터는 메모리 맵 파일로 작업자와 공유하며 (BarWindow는 저장소 파일을
+    그대로 사용), 조합은 묶음 단위로 프로세스 풀에 나눠 보냅니다.
+    """
+    if sort not in SORT_KEYS:
+        raise SweepError(f"지원하지 않는 정렬 기준입니다: {sort} (가능한 값: {', '.join(SORT_KEYS)})")
+    try:
+        top = PARAM_SWEEP_TOP if top is None else max(1, int(top))
+        min_trades = PARAM_SWEEP_MIN_TRADES if min_trades is None else int(min_trades)
+    except (TypeError, ValueError):
+        raise SweepError("top과 min_trades는 정수여야 합니다.")
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    # 기본값으로 한 번 실행해 코드가 백테스트 가능한지 확인하고, 실제로 쓰이는 input을 알아냄
+    shared = data if isinstance(data, bar_store.BarWindow) else None
+    try:
+        bars = await loop.run_in_executor(None, backtester.load_bars, shared.load() if shared is not None else data)
+    except (TypeError, ValueError) as e:
+        raise SweepError(f"봉 데이터를 읽을 수 없습니다: {str(e)}")
+    # 같은 코드와 봉 구간의 기본값 결과는 백테스트 결과 캐시에서 가져옴
+    bar_range = await loop.run_in_executor(
+        None, lambda: backtest_cache.window_range(shared) if shared is not None else backtest_cache.data_range(bars))
+    baseline = await loop.run_in_executor(None, backtest_cache.evaluate, code, bars, bar_range)
+    ranges = build_ranges(code, parameters, used_inputs=baseline["inputs"])
+    names = list(ranges)
+    combinations = list(itertools.product(*ranges.values()))
+    model = pine_parser.parse(code)
+    defaults = tuple(model.input_value(name) for name in names)
+    baseline_row = _row(defaults, baseline)
+
+    source = shared if shared is not None else await loop.run_in_executor(None, write_shared_bars, bars)
+    ok = False
+    try:
+        batches = [(source, code, names, batch, bar_range) for batch in _batches(combinations, pool.workers)]
+        rows = []
+        for result in await pool.map(evaluate_batch, batches):
+            backtest_cache.merge_report(result["cache"])
+            rows.extend(result["rows"])
+        ok = True
+    finally:
+        if shared is None:
+            source.remove()
+        pool.record(len(combinations), (time.perf_counter() - started) * 1000, ok)
+
+    failed = [row for row in rows if "error" in row]
+    ranked = rank_rows(rows, sort, min_trades)
+
+    def named(row, rank=None):
+        entry = dict(row, parameters=dict(zip(names, row["values"])))
+        del entry["values"]
+        if rank is not None:
+            entry["rank"] = rank
+        return entry
+
+    best = ranked[0] if ranked else None
+    improved = (best is not None and best["values"] != defaults
+                and _sort_value(best, sort) > _sort_value(baseline_row, sort))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"매개변수 탐색 완료: 조합 {len(combinations)}개, {elapsed_ms:.0f}ms, 개선 {improved}")
+    return {
+        "sort": sort,
+        "parameters": {name: values for name, values in ranges.items()},
+        "combinations": len(combinations),
+        "failed": len(failed),
+        "eligible": len(ranked),
+        "workers": 0 if pool.fallback else pool.workers,
+        "bars": int(bars["close"].size),
+        "elapsed_ms": round(elapsed_ms, 3),
+        "baseline": named(baseline_row),
+        "best": named(best) if best is not None else None,
+        "improved": improved,
+        "results": [named(row, rank) for rank, row in enumerate(ranked[:top], start=1)],
+        "errors": [row["error"] for row in failed[:5]]
+    }
+
+
+def apply_parameters(code, values):
+    """input 기본값을 values({이름: 값})로 바꾼 코드를 반환합니다."""
+    model = pine_parser.parse(code)
+    replacements = []
+    for name, value in values.items():
+        decl = model.inputs.get(name)
+        text = pine_rules.format_input_value(decl, value) if decl is not None and decl.default else None
+        if text is None:
+            raise SweepError(f"input {name}에 값 {value!r}를 적용할 수 없습니다.")
+        if text != decl.default.text:
+            replacements.append((decl.default.start, decl.default.end, text))
+    return pine_parser.replace_spans(code, replacements)
+
+
+def modification_data(result):
+    """최적화 결과를 save_modification에 넘길 웹훅 형식 데이터로 만듭니다 (이전 성과는 기본값의 백테스트 결과)."""
+    baseline = result["baseline"]["parameters"]
+    best = result["best"]["parameters"]
+    changes = ", ".join(f"{name} {baseline[name]} -> {value}" for name, value in best.items()
+                        if value != baseline[name])
+    return {
+        "performance": result["baseline"]["performance"],
+        "trading_problem": f"매개변수 탐색 ({result['combinations']}개 조합, {result['sort']} 기준)",
+        "suggested_improvements": f"매개변수 최적화: {changes}",
+        "optimization": {
+            "sort": result["sort"],
+            "combinations": result["combinations"],
+            "parameters": best,
+            "performance_after": result["best"]["performance"],
+            "net_profit_before": result["baseline"]["net_profit"],
+            "net_profit_after": result["best"]["net_profit"]
+        }
+    }
+
+
+def stats():
+    return pool.stats()
@@ -0,0 +1,189 @@
+# pine_compactor.py
+import os
+import re
+import logging
+from collections import defaultdict
+
+import pine_parser
+
+# 로깅 설정
+logger = logging.getLogger("pine_compactor")
+
+# 프롬프트를 만들기 전에 주석/시각화/빈 줄을 제거할지 여부 (환경 변수로 조정 가능)
+PINE_COMPACTION = os.getenv("PINE_COMPACTION", "true") == "true"
+
+# 전략 로직에 영향을 주지 않는 시각화 함수
+VISUAL_FUNCTIONS = (
+    "plot", "plotshape", "plotchar", "plotarrow", "plotcandle", "plotbar",
+    "hline", "fill", "bgcolor", "barcolor"
+)
+
+KIND_BLANK = "blank"
+KIND_COMMENT = "comment"
+KIND_VISUAL = "visual"
+
+_VISUAL_PATTERN = re.compile(r"^\s*(?:[A-Za-z_]\w*\s*=\s*)?(?:%s)\s*\(" % "|".join(VISUAL_FUNCTIONS))
+_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_]\w*")
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def classify_line(line):
+    """제거할 수 있는 줄이면 종류(blank/comment/visual)를, 아니면 None을 반환합니다."""
+    stripped = line.strip()
+    if not stripped:
+        return KIND_BLANK
+    if stripped.startswith("//"):
+        # //@version 같은 컴파일러 지시문은 유지
+        return None if stripped.startswith("//@") else KIND_COMMENT
+    if _indent(line) == 0 and _VISUAL_PATTERN.match(line):
+        # if 블록 안의 시각화 줄은 지우면 블록이 비므로 최상위 줄만 제거
+        return KIND_VISUAL
+    return None
+
+
+def defined_names(code):
+    """코드에서 대입/선언되는 변수 이름 집합입니다 (pine_parser의 파싱 결과를 재사용)."""
+    return set(pine_parser.parse(code).assignments)
+
+
+class CompactedCode:
+    """
+    Pine Script에서 주석, 시각화(plot/hline 등), 빈 줄을 떼어 낸 결과입니다.
+
+    떼어 낸 줄은 연속된 묶음(run)마다 바로 앞에 남은 줄을 기준점(anchor)으로 기억해 두었다가,
+    restore가 수정된 코드에서 같은 기준점을 찾아 그 뒤에 다시 넣습니다. 주석은 바로 아래 코드 줄
+    (파일 끝이면 위 줄)을 설명한다고 보고 그 줄 앞에 넣으며, 그 줄이 바뀌었으면 버립니다.
+    수정되지 않은 코드를 restore하면 끝 줄바꿈까지 원본과 똑같이 복원됩니다.
+    """
+
+    def __init__(self, code):
+        self.original = code
+        self.runs = []
+        kept = []
+        seen = defaultdict(int)
+        current = None
+        last_anchor = None
+        # 끝 줄바꿈은 빈 줄로 떼어 내지 않고 restore에서 원본대로 맞춤
+        self.trailing_newline = code.endswith("\n")
+        body = code[:-1] if self.trailing_newline else code
+        lines = body.split("\n") if body else []
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            kind = classify_line(line)
+            end = i + 1
+            if kind == KIND_VISUAL:
+                # 여러 줄에 걸친 호출은 더 깊게 들여쓴 이어지는 줄까지 함께 제거
+                while end < len(lines) and lines[end].strip() and _indent(lines[end]) > _indent(line):
+                    end += 1
+            if kind is None:
+                key = line.strip()
+                anchor = (key, seen[key])
+                seen[key] += 1
+                kept.append(line)
+                if current is not None:
+                    current["before"] = anchor
+                current = None
+                last_anchor = anchor
+            else:
+                if current is None:
+                    current = {"after": last_anchor, "before": None, "items": []}
+                    self.runs.append(current)
+                current["items"].append((kind, lines[i:end]))
+            i = end
+        self.code = "\n".join(kept)
+        self.removed_lines = sum(len(item_lines) for run in self.runs for _, item_lines in run["items"])
+
+    def restore(self, modified_code):
+        """
+        떼어 낸 줄을 수정된 코드의 기준점 뒤(없으면 다음 줄 앞)에 다시 넣습니다.
+
+        기준점을 찾지 못한 시각화 줄은 코드 끝에 붙이고, 주석과 빈 줄은 버립니다.
+        수정된 코드에서 사라진 변수를 쓰는 시각화 줄과 이미 들어 있는 줄, 설명하던 코드 줄이
+        바뀐 주석은 넣지 않습니다. 끝 줄바꿈은 원본 코드를 따릅니다.
+        """
+        body = modified_code[:-1] if modified_code.endswith("\n") else modified_code
+        suffix = "\n" if self.trailing_newline else ""
+        if not self.runs:
+            return body + suffix
+        lines = body.split("\n") if body else []
+        positions = defaultdict(list)
+        for index, line in enumerate(lines):
+            positions[line.strip()].append(index)
+        existing = set(positions)
+        missing_names = defined_names(self.original) - defined_names(modified_code)
+
+        before = defaultdict(list)
+        after = defaultdict(list)
+        unplaced = []
+        skipped = 0
+        for run in self.runs:
+            # 주석이 설명하는 줄(아래 코드 줄, 파일 끝이면 위 줄)이 그대로 남아 있는지 확인
+            described = run["before"] or run["after"]
+            stale = described is not None and not self._unchanged(positions, described)
+            items = []
+            for kind, item_lines in run["items"]:
+                if kind == KIND_COMMENT and stale:
+                    skipped += len(item_lines)
+                    continue
+                if kind == KIND_VISUAL:
+                    text = "\n".join(item_lines)
+                    if item_lines[0].strip() in existing or missing_names & set(_IDENTIFIER_PATTERN.findall(text)):
+                        skipped += len(item_lines)
+                        continue
+                items.append((kind, item_lines))
+            run_lines = [line for _, item_lines in items for line in item_lines]
+            if not run_lines:
+                continue
+
+            if run["after"] is None:
+                after[-1].extend(run_lines)
+                continue
+            # 주석이 있는 묶음은 설명하는 아래 줄 바로 앞에, 나머지는 앞 줄 바로 뒤에 넣음
+            targets = [(after, run["after"]), (before, run["before"])]
+            if any(kind == KIND_COMMENT for kind, _ in items):
+                targets.reverse()
+            position = None
+            for table, anchor in targets:
+                position = self._locate(positions, anchor) if anchor else None
+                if position is not None:
+                    table[position].extend(run_lines)
+                    break
+            if position is not None:
+                continue
+            unplaced.extend(line for kind, item_lines in items if kind == KIND_VISUAL for line in item_lines)
+
+        restored = list(after[-1])
+        for index, line in enumerate(lines):
+            restored.extend(before[index])
+            restored.append(line)
+            restored.extend(after[index])
+        if unplaced:
+            restored.append("")
+            restored.extend(unplaced)
+        if skipped or unplaced:
+            logger.debug(f"코드 복원: 제외 {skipped}줄, 끝에 추가 {len(unplaced)}줄")
+        return "\n".join(restored) + suffix
+
+    @staticmethod
+    def _unchanged(positions, anchor):
+        key, occurrence = anchor
+        return occurrence < len(positions.get(key, ()))
+
+    @staticmethod
+    def _locate(positions, anchor):
+        key, occurrence = anchor
+        found = positions.get(key)
+        if not found:
+            return None
+        return found[min(occurrence, len(found) - 1)]
+
+
+def compact(code):
+    """코드를 압축한 CompactedCode를 반환합니다. PINE_COMPACTION이 꺼져 있으면 None을 반환합니다."""
+    if not PINE_COMPACTION:
+        return None
+    return CompactedCode(code)
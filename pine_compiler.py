@@ -0,0 +1,518 @@
+# pine_compiler.py
+"""
+백테스트할 수 있는 Pine Script 부분 집합인지 전략 전체를 미리 검사하고, 검사 결과를 코드 해시별로 캐시합니다.
+
+backtester가 읽어 둔 식 트리(대입, input(), 산술/비교, x[1], if 블록 안의 strategy.entry/exit/close, 내장 지표)를
+계산하지 않고 따라가며, 식 해석기(backtester.Evaluator)가 실행 중에 만날 지원하지 않는 식을 처음 만나는 곳에서
+멈추지 않고 모두 찾아 행 번호와 함께 진단(diagnose)으로 돌려줍니다. 반드시 실행되는 경로에 있으면 check가
+CompileError를 발생시키며, 결과는 (코드 해시, 바꾸는 input 이름)별로 보관해 매개변수 탐색에서 같은 전략을 다시
+검사하지 않습니다. 식 계산은 이미 NumPy 배열 연산인 backtester.Evaluator가 맡습니다.
+
+사용법:
+    python pine_compiler.py storage/strategies/current.pine
+"""
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import pine_parser
+import backtester
+from backtester import UnsupportedConstruct
+
+# 로깅 설정
+logger = logging.getLogger("pine_compiler")
+
+# 백테스트 전에 전략 전체를 검사할지 여부 (false면 식 해석기가 처음 만나는 문제에서 멈춤)
+PINE_COMPILER_ENABLED = os.getenv("PINE_COMPILER_ENABLED", "true") == "true"
+# (코드 해시, input 이름 집합)별로 보관할 검사 결과 수 (환경 변수로 조정 가능)
+PINE_COMPILER_CACHE_SIZE = int(os.getenv("PINE_COMPILER_CACHE_SIZE", "128"))
+
+_SERIES_NAMES = frozenset(backtester.OHLCV_COLUMNS) | {"hl2", "hlc3", "ohlc4", "bar_index"}
+_INDICATOR_CALLS = frozenset(("rsi", "sma", "ema", "rma", "stdev", "highest", "lowest",
+                              "crossover", "crossunder", "cross", "change"))
+_MATH_CALLS = frozenset(("abs", "sqrt", "log", "exp"))
+_LINE_PREFIX = re.compile(r"^(\d+)행:\s*")
+
+
+class CompileError(UnsupportedConstruct):
+    """반드시 실행되는 경로에 지원하지 않는 식이 있는 전략입니다. diagnostics에 찾은 문제가 모두 담깁니다."""
+
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        errors = [item for item in diagnostics if item["severity"] == "error"]
+        super().__init__("컴파일할 수 없는 전략입니다: " + "; ".join(_format(item) for item in errors))
+
+
+def _format(item):
+    return f"{item['line']}행: {item['message']}" if item["line"] else item["message"]
+
+
+# --- 식 검사 ---
+
+def _variable_lines(model):
+    lines = {}
+    for statement in model.statements:
+        if isinstance(statement.target, str) and statement.target not in lines:
+            lines[statement.target] = statement.line
+    return lines
+
+
+def _uses_position_price(node):
+    return backtester.POSITION_PRICE in backtester.expression_names(node)
+
+
+class _Checker:
+    """
+    식 트리를 계산하지 않고 따라가며 backtester.Evaluator가 실행 중에 발생시킬 문제를 모두 찾습니다.
+    input 값에 따라 계산하지 않을 수도 있는 분기(상수 조건의 삼항/and/or) 안의 문제는 gated인 warning으로 기록합니다.
+    """
+
+    def __init__(self, compiled, override_keys):
+        self.compiled = compiled
+        self.inputs = compiled.model.inputs
+        self.override_keys = override_keys
+        self.variable_lines = _variable_lines(compiled.model)
+        self.code_lines = compiled.model.code.splitlines()
+        self.depth = 0
+        self.visited = {}
+        self.line_stack = []
+        self.resolving = set()
+        self.kinds = {}
+        self.diagnostics = []
+
+    def branch(self, build):
+        """build()가 검사하는 식을 input 값에 따라 계산하지 않을 수도 있는 분기로 표시합니다."""
+        self.depth += 1
+        try:
+            build()
+        finally:
+            self.depth -= 1
+
+    def fail(self, message):
+        """문제를 진단에 기록합니다. 분기 밖에서 다시 만난 문제는 error로 올립니다."""
+        line = next((line for line in reversed(self.line_stack) if line), None)
+        gated = self.depth > 0
+        for existing in self.diagnostics:
+            if existing["line"] == line and existing["message"] == message:
+                if existing["gated"] and not gated:
+                    existing.update(severity="error", gated=False)
+                return
+        self.diagnostics.append({
+            "line": line,
+            "message": message,
+            "code": self.code_lines[line - 1].strip() if line and line <= len(self.code_lines) else None,
+            "severity": "warning" if gated else "error",
+            "gated": gated
+        })
+
+    # 정적 분석: 봉과 무관한 스칼라("scalar")인지, 배열("series")인지, 입력값에 따라 다른지(None)
+
+    def kind(self, node):
+        if node in self.kinds:
+            return self.kinds[node]
+        self.kinds[node] = None
+        result = self._kind(node)
+        self.kinds[node] = result
+        return result
+
+    def _kind(self, node):
+        kind = node[0]
+        if kind in ("num", "bool", "str", "na"):
+            return "scalar"
+        if kind == "name":
+            name = node[1]
+            if name in _SERIES_NAMES:
+                return "series"
+            if name in self.inputs or name in self.override_keys:
+                return "scalar"
+            variable = self.compiled.variables.get(name)
+            return self.kind(variable) if variable is not None else None
+        if kind == "call":
+            name = node[1]
+            if name == "input" or name.startswith("input."):
+                return "scalar"
+            for prefix in ("ta.", "math."):
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+            if name in _INDICATOR_CALLS:
+                return "series"
+            if name == "iff" and len(node[2]) == 3:
+                return self._ternary_kind(*node[2])
+            return self._combined(node[2])
+        if kind in ("index", "unary"):
+            return self.kind(node[1] if kind == "index" else node[2])
+        if kind == "ternary":
+            return self._ternary_kind(node[1], node[2], node[3])
+        if kind == "binary":
+            left, right = self.kind(node[2]), self.kind(node[3])
+            if node[1] in ("and", "or"):
+                if left == "series":
+                    return "series"
+                return "scalar" if left == right == "scalar" else None
+            return self._combined((node[2], node[3]))
+        return None
+
+    def _combined(self, nodes):
+        kinds = [self.kind(node) for node in nodes]
+        if "series" in kinds:
+            return "series"
+        return "scalar" if all(kind == "scalar" for kind in kinds) else None
+
+    def _ternary_kind(self, condition, when_true, when_false):
+        condition = self.kind(condition)
+        if condition == "series":
+            return "series"
+        branches = {self.kind(when_true), self.kind(when_false)}
+        return branches.pop() if condition == "scalar" and len(branches) == 1 else None
+
+    # 식
+
+    def visit(self, node):
+        """식을 검사합니다. 분기 안에서만 검사한 식은 분기 밖에서 다시 만나면 다시 검사합니다."""
+        gated = self.depth > 0
+        if node in self.visited and (not self.visited[node] or gated):
+            return
+        self._visit(node)
+        self.visited[node] = gated
+
+    def _visit(self, node):
+        kind = node[0]
+        if kind in ("num", "bool", "str", "na"):
+            return
+        if kind == "name":
+            self._name(node[1])
+        elif kind == "call":
+            self._call(node)
+        elif kind == "index":
+            self.visit(node[2])
+            self.visit(node[1])
+            if self.kind(node[1]) == "series" and self.kind(node[2]) == "series":
+                self.fail("series[n]의 n에는 시리즈 값을 쓸 수 없습니다.")
+        elif kind == "unary":
+            self.visit(node[2])
+        elif kind == "ternary":
+            self._ternary(node[1], node[2], node[3])
+        elif kind == "binary":
+            self._binary(node[1], node[2], node[3])
+        else:
+            self.fail(f"알 수 없는 식입니다: {kind}")
+
+    def _name(self, name):
+        if name in _SERIES_NAMES or name in self.override_keys:
+            return
+        decl = self.inputs.get(name)
+        if decl is not None:
+            if decl.default is None or not decl.default.is_literal:
+                self.fail(f"input {name}의 기본값이 리터럴이 아닙니다.")
+            return
+        node = self.compiled.variables.get(name)
+        if node is not None:
+            if name in self.resolving:
+                self.fail(f"변수 {name}가 자기 자신을 참조합니다.")
+                return
+            self.resolving.add(name)
+            self.line_stack.append(self.variable_lines.get(name))
+            try:
+                self.visit(node)
+            finally:
+                self.line_stack.pop()
+                self.resolving.discard(name)
+        elif name in self.compiled.invalid_variables:
+            self.fail(f"변수 {name}: {self.compiled.invalid_variables[name]}")
+        elif name == backtester.POSITION_PRICE:
+            self.fail(f"{name}는 strategy.exit의 가격 인자에서만 쓸 수 있습니다.")
+        else:
+            self.fail(f"지원하지 않는 이름입니다: {name}")
+
+    def _length(self, node):
+        if self.kind(node) == "series":
+            self.fail("지표 기간에는 시리즈 값을 쓸 수 없습니다.")
+
+    def _call(self, node):
+        name, args, kwargs = node[1], node[2], dict(node[3])
+        if name == "input" or name.startswith("input."):
+            default = args[0] if args else kwargs.get("defval")
+            if default is None:
+                self.fail("기본값이 없는 input입니다.")
+            else:
+                self.visit(default)
+            return
+        for prefix in ("ta.", "math."):
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        # backtester.Evaluator처럼 위치 인자는 모두 먼저 계산함
+        for arg in args:
+            self.visit(arg)
+        nodes = list(args)
+
+        if name in ("rsi", "sma", "ema", "rma", "stdev"):
+            source = kwargs.get("source")
+            if source is not None:
+                self.visit(source)
+            elif nodes:
+                source = nodes.pop(0)
+            length = kwargs.get("length")
+            if length is not None:
+                self.visit(length)
+            elif nodes:
+                length = nodes[0]
+            if source is None or length is None:
+                self.fail(f"{name}에 필요한 인자(source, length)가 없습니다.")
+            else:
+                self._length(length)
+        elif name in ("highest", "lowest"):
+            if not nodes:
+                self.fail(f"{name}에 필요한 인자(length)가 없습니다.")
+            else:
+                self._length(nodes[0] if len(nodes) == 1 else nodes[1])
+        elif name in ("crossover", "crossunder", "cross"):
+            if len(nodes) < 2:
+                self.fail(f"{name}에는 두 시리즈가 필요합니다.")
+        elif name == "change":
+            if not nodes:
+                self.fail("change에 필요한 인자(source)가 없습니다.")
+            elif len(nodes) > 1:
+                self._length(nodes[1])
+        elif name in ("nz", "na"):
+            if not nodes:
+                self.fail(f"{name}에 필요한 인자가 없습니다.")
+        elif name == "iff":
+            if len(args) != 3:
+                self.fail("iff에는 조건과 두 값이 필요합니다.")
+            else:
+                self._ternary(*args)
+        elif name in _MATH_CALLS or name in ("max", "min"):
+            if not nodes:
+                self.fail(f"{name}에 필요한 인자가 없습니다.")
+        elif name in pine_parser.INDICATOR_FUNCTIONS:
+            self.fail(f"지원하지 않는 지표 함수입니다: {name} (지원: {', '.join(sorted(_INDICATOR_CALLS))})")
+        else:
+            self.fail(f"지원하지 않는 함수입니다: {name}")
+
+    def _ternary(self, condition, when_true, when_false):
+        self.visit(condition)
+
+        def both():
+            self.visit(when_true)
+            self.visit(when_false)
+
+        # 시리즈 조건은 양쪽을 모두 계산하고, 스칼라 조건은 한쪽만 계산함
+        if self.kind(condition) == "series":
+            both()
+        else:
+            self.branch(both)
+
+    def _binary(self, operator, left, right):
+        self.visit(left)
+        # 스칼라 조건의 and/or는 단락 평가되므로 오른쪽은 계산하지 않을 수도 있음
+        if operator in ("and", "or") and self.kind(left) != "series":
+            self.branch(lambda: self.visit(right))
+        else:
+            self.visit(right)
+
+    def output(self, node, line):
+        self.line_stack.append(line)
+        try:
+            self.visit(node)
+        finally:
+            self.line_stack.pop()
+
+
+def _outputs(compiled, checker, position):
+    """
+    backtester의 시뮬레이터가 계산하는 식 (진입 조건, 각 진입에 적용되는 청산 주문의 조건과 가격) 목록입니다.
+    position이 참이면 진입가(strategy.position_avg_price)를 쓰는 청산 가격만 담습니다.
+    """
+    outputs = []
+
+    def add(node, line):
+        outputs.append((node, line))
+
+    if not position:
+        for entry in compiled.entries:
+            for term in entry.conditions:
+                add(term, entry.line)
+    for entry in compiled.entries:
+        orders = [order for order in compiled.exits if order.from_entry in (None, entry.id)]
+        stops = [order for order in orders if not order.market]
+        if len(stops) > 1:
+            checker.line_stack.append(entry.line)
+            checker.fail(f"진입 {entry.id}에 strategy.exit가 여러 개 적용됩니다.")
+            checker.line_stack.pop()
+        for order in stops[:1]:
+            for name, node in order.levels.items():
+                if _uses_position_price(node) == position:
+                    add(node, order.line)
+            if not position:
+                for term in order.conditions:
+                    add(term, order.line)
+        if not position:
+            for order in orders:
+                if order.market and entry.direction in order.states:
+                    for term in order.conditions:
+                        add(term, order.line)
+    unique = OrderedDict()
+    for node, line in outputs:
+        unique.setdefault(node, line)
+    return list(unique.items())
+
+
+def _expression_diagnostics(compiled, override_keys):
+    """진입/청산 식의 진단 목록입니다. 진입가를 쓰는 청산 가격은 진입가를 input처럼 넣어 따로 검사합니다."""
+    diagnostics = []
+    for position in (False, True):
+        keys = override_keys | {backtester.POSITION_PRICE} if position else override_keys
+        checker = _Checker(compiled, keys)
+        for node, line in _outputs(compiled, checker, position):
+            checker.output(node, line)
+        for item in checker.diagnostics:
+            if not any(existing["line"] == item["line"] and existing["message"] == item["message"]
+                       for existing in diagnostics):
+                diagnostics.append(item)
+    return sorted(diagnostics, key=lambda item: item["line"] or 0)
+
+
+# --- 캐시 ---
+
+_checked = OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_errors = 0
+_check_ms = 0.0
+
+
+def check(code, override_keys=()):
+    """
+    전략 코드를 검사하고 backtester.compile_strategy 결과를 반환합니다. override_keys는 실행할 때 overrides로 바꿀
+    input 이름들이며, 반드시 실행되는 경로에 지원하지 않는 식이 있으면 CompileError를 발생시킵니다.
+    (코드 해시, 이름 집합)별로 결과(또는 CompileError)를 보관해 재사용합니다.
+    """
+    global _hits, _misses, _errors, _check_ms
+    override_keys = frozenset(override_keys)
+    key = (pine_parser.code_digest(code), override_keys)
+    with _lock:
+        cached = _checked.get(key)
+        if cached is not None:
+            _checked.move_to_end(key)
+            _hits += 1
+    if cached is not None:
+        if isinstance(cached, CompileError):
+            raise cached
+        return cached
+
+    compiled = backtester.compile_strategy(code)
+    started = time.perf_counter()
+    diagnostics = _expression_diagnostics(compiled, override_keys)
+    result = CompileError(diagnostics) if any(item["severity"] == "error" for item in diagnostics) else compiled
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        _misses += 1
+        _check_ms += elapsed_ms
+        if isinstance(result, CompileError):
+            _errors += 1
+        if PINE_COMPILER_CACHE_SIZE > 0:
+            _checked[key] = result
+            while len(_checked) > PINE_COMPILER_CACHE_SIZE:
+                _checked.popitem(last=False)
+    if isinstance(result, CompileError):
+        logger.debug(f"전략 검사 실패: {result}")
+        raise result
+    logger.debug(f"전략 검사 완료: {compiled.name} ({elapsed_ms:.2f}ms)")
+    return result
+
+
+def evaluator(code, compiled, bars, overrides=None):
+    """
+    run_backtest가 쓰는 식 해석기(backtester.Evaluator)를 반환합니다. PINE_COMPILER_ENABLED가 켜져 있으면
+    먼저 전략 전체를 검사해 지원하지 않는 식이 있으면 모두 담은 CompileError를 발생시킵니다.
+    """
+    if PINE_COMPILER_ENABLED:
+        check(code, (overrides or {}).keys())
+    return backtester.Evaluator(compiled, bars, overrides)
+
+
+def diagnose(code):
+    """
+    전략 코드에서 백테스트할 수 없는 구문을 모두 찾아 진단 목록으로 반환합니다 (문제가 없으면 빈 목록).
+    각 항목은 line, message, code(해당 행), severity, gated입니다. gated는 input 값에 따라 실행되지 않을 수도 있는
+    분기 안의 문제인지이며, 식의 문제는 그 분기가 실행될 때만 오류가 되므로 severity가 warning입니다.
+    주문 구문(지정가 진입, 부분 청산 등)의 문제는 분기와 관계없이 전략 전체를 백테스트할 수 없으므로 항상 error입니다.
+    """
+    compiled, problems = backtester.collect_problems(code)
+    lines = code.splitlines()
+    diagnostics = []
+    for message, conditions in problems:
+        match = _LINE_PREFIX.match(message)
+        line = int(match.group(1)) if match else None
+        diagnostics.append({
+            "line": line,
+            "message": _LINE_PREFIX.sub("", message),
+            "code": lines[line - 1].strip() if line and line <= len(lines) else None,
+            "severity": "error",
+            "gated": compiled is not None and _input_gated(compiled, conditions)
+        })
+    if compiled is None:
+        return diagnostics
+    for item in _expression_diagnostics(compiled, frozenset()):
+        if not any(existing["line"] == item["line"] and existing["message"] == item["message"]
+                   for existing in diagnostics):
+            diagnostics.append(item)
+    return sorted(diagnostics, key=lambda item: item["line"] or 0)
+
+
+def _input_gated(compiled, conditions):
+    """구문을 감싼 if 조건 중 input 값에만 달린(봉과 무관한) 조건이 있는지 확인합니다."""
+    checker = _Checker(compiled, frozenset())
+    for condition in conditions:
+        if checker.kind(condition) == "scalar" and any(name in compiled.model.inputs
+                                                       for name in backtester.expression_names(condition)):
+            return True
+    return False
+
+
+def clear_cache():
+    with _lock:
+        _checked.clear()
+
+
+def stats():
+    with _lock:
+        lookups = _hits + _misses
+        return {
+            "enabled": PINE_COMPILER_ENABLED,
+            "strategies": len(_checked),
+            "max_strategies": PINE_COMPILER_CACHE_SIZE,
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": round(_hits / lookups, 4) if lookups else 0.0,
+            "check_errors": _errors,
+            "avg_check_ms": round(_check_ms / _misses, 3) if _misses else 0.0
+        }
+
+
+def main(argv):
+    """명령행: python pine_compiler.py <전략 파일>..."""
+    if not argv:
+        print("사용법: python pine_compiler.py <전략 파일>...")
+        return 2
+    failures = 0
+    for path in argv:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        diagnostics = diagnose(code)
+        errors = [item for item in diagnostics if item["severity"] == "error"]
+        print(f"{path}: {'컴파일할 수 없음' if errors else '컴파일 가능'}")
+        for item in diagnostics:
+            print(f"  [{item['severity']}{', input 분기' if item['gated'] else ''}] {_format(item)}"
+                  + (f"\n      {item['code']}" if item["code"] else ""))
+        failures += bool(errors)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
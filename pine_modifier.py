@@ -1,13 +1,25 @@
 # pine_modifier.py
 import os
 import re
-import json
 import datetime
 import traceback
 from pathlib import Path
 from dotenv import load_dotenv
 import openai
 import logging
+import llm_client
+import llm_cache
+import metadata_store
+import status_counters
+import storage_utils
+import async_storage
+import fast_json
+import prompt_builder
+import pine_compactor
+import pine_patch
+import pine_parser
+import pine_rules
+import candidate_ranker
 
 # 로깅 설정
 logging.basicConfig(level=logging.DEBUG)
@@ -50,60 +62,62 @@ def load_strategy_code(strategy_file):
     with open(strategy_file, 'r') as file:
         return file.read()
 
-def generate_modified_script(original_code, webhook_data):
-    """
-    웹훅 데이터와 원본 전략 코드를 기반으로 OpenAI API를 사용하여 수정된 코드를 생성합니다.
-    """
-    # OpenAI API 키 확인
-    api_key = os.getenv("OPENAI_API_KEY")
-    
-    if not api_key:
-        logger.warning("OpenAI API 키가 설정되지 않았습니다.")
-        return original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다. 환경 변수 OPENAI_API_KEY를 설정해 주세요."
-    
-    # API 키 설정
-    openai.api_key = api_key
-    
-    try:
-        logger.debug("전략 코드 수정 시작")
-        
-        # 원본 코드에서 전략 이름 추출
-        strategy_name = "Unknown Strategy"
-        for line in original_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    strategy_name = line[start_idx:end_idx]
-                    break
-        logger.debug(f"원본 전략 이름: {strategy_name}")
-        
-        # 웹훅 데이터 구성
-        trading_problem = webhook_data.get("trading_problem", "전략 최적화가 필요합니다.")
-        suggested_improvements = webhook_data.get("suggested_improvements", "전략의 매개변수를 현재 시장 상황에 맞게 조정하세요.")
-        
-        # 성과 데이터 추출
-        performance = webhook_data.get("performance", {})
-        profit_factor = performance.get("profit_factor", "불명")
-        win_rate = performance.get("win_rate", "불명")
-        avg_profit = performance.get("avg_profit", "불명")
-        max_drawdown = performance.get("max_drawdown", "불명")
-        
-        # 최근 트레이드 데이터
-        recent_trades = webhook_data.get("recent_trades", [])
-        trades_summary = ""
-        if recent_trades:
-            trades_summary = f"최근 {len(recent_trades)}개 거래 요약:\n"
-            for i, trade in enumerate(recent_trades):
-                direction = trade.get("direction", "불명")
-                result = trade.get("result", "불명")
-                profit_pct = trade.get("profit_pct", "불명")
-                trades_summary += f"- 거래 {i+1}: {direction}, 결과: {result}, 수익률: {profit_pct}%\n"
-        
-        logger.debug(f"웹훅 데이터 처리 완료, OpenAI API 요청 준비")
-        
-        # API 요청을 위한 프롬프트 구성
-        prompt = f"""
+# OpenAI 요청 설정
+OPENAI_MODEL = "gpt-3.5-turbo"
+OPENAI_TEMPERATURE = 0.7
+OPENAI_MAX_TOKENS = 2000
+SYSTEM_PROMPT = "당신은 Pine Script와 트레이딩 전략에 전문적인 지식을 갖춘 AI 조수입니다."
+
+# 전체 코드 대신 검색/치환 블록이나 diff만 받아 로컬에서 적용 (실패하면 전체 코드 모드로 다시 요청)
+LLM_PATCH_MODE = os.getenv("LLM_PATCH_MODE", "false") == "true"
+OPENAI_PATCH_MAX_TOKENS = int(os.getenv("OPENAI_PATCH_MAX_TOKENS", "800"))
+
+# 응답을 스트리밍으로 받으면서 코드 블록의 닫는 펜스가 오면 요청을 끊습니다 (뒤따르는 설명 토큰을 받지 않음)
+LLM_STREAM_EARLY_STOP = os.getenv("LLM_STREAM_EARLY_STOP", "true") == "true"
+
+def extract_strategy_name(code, default="Unknown Strategy"):
+    """전략 코드의 strategy()/study() 선언에서 이름을 추출합니다. 파싱 결과는 코드 해시별로 재사용됩니다."""
+    name = pine_parser.parse(code).name
+    return default if name is None else name
+
+def prompt_fields(webhook_data):
+    """웹훅 데이터 중 프롬프트에 실제로 들어가는 필드만 추려냅니다."""
+    performance = webhook_data.get("performance", {})
+    return {
+        "trading_problem": webhook_data.get("trading_problem", "전략 최적화가 필요합니다."),
+        "suggested_improvements": webhook_data.get("suggested_improvements", "전략의 매개변수를 현재 시장 상황에 맞게 조정하세요."),
+        "performance": {
+            "profit_factor": performance.get("profit_factor", "불명"),
+            "win_rate": performance.get("win_rate", "불명"),
+            "avg_profit": performance.get("avg_profit", "불명"),
+            "max_drawdown": performance.get("max_drawdown", "불명")
+        },
+        "recent_trades": [
+            {
+                "direction": trade.get("direction", "불명"),
+                "result": trade.get("result", "불명"),
+                "profit_pct": trade.get("profit_pct", "불명")
+            }
+            for trade in webhook_data.get("recent_trades", [])
+        ]
+    }
+
+# 전체 코드 모드 프롬프트의 응답 형식 안내
+FULL_CODE_INSTRUCTIONS = """4. 코드 설명 주석을 추가하여 변경 사항을 명확히 해주세요.
+5. 전체 Pine Script 코드만 반환하세요.
+
+개선된 Pine Script 코드:
+"""
+
+def _render_prompt(strategy_name, original_code, fields, trades_summary, instructions=FULL_CODE_INSTRUCTIONS):
+    performance = fields["performance"]
+    profit_factor = performance["profit_factor"]
+    win_rate = performance["win_rate"]
+    avg_profit = performance["avg_profit"]
+    max_drawdown = performance["max_drawdown"]
+    trading_problem = fields["trading_problem"]
+    suggested_improvements = fields["suggested_improvements"]
+    return f"""
 당신은 Pine Script 전략 코드 최적화 전문가입니다. 다음 트레이딩 전략 코드를 분석하고 개선해야 합니다.
 
 ## 원본 전략: {strategy_name}
@@ -129,48 +143,412 @@ def generate_modified_script(original_code, webhook_data):
 1. 전략의 핵심 로직은 유지하되, 매개변수와 조건을 최적화하세요.
 2. 추가 기능이나 지표를 통합하여 성능을 향상시킬 수 있습니다.
 3. 코드는 Pine Script 문법에 맞게 작성해야 합니다.
-4. 코드 설명 주석을 추가하여 변경 사항을 명확히 해주세요.
-5. 전체 Pine Script 코드만 반환하세요.
+{instructions}"""
 
-개선된 Pine Script 코드:
-"""
+def build_prompt(original_code, webhook_data, report=None, patch=False):
+    """
+    웹훅 데이터와 원본 전략 코드로 OpenAI 요청 프롬프트를 구성합니다.
+    거래 내역은 PROMPT_TOKEN_BUDGET 안에 들어가도록 요약하며, report(dict)를 주면
+    최종 프롬프트 토큰 수와 포함된 거래 수를 기록합니다.
+    patch가 참이면 전체 코드 대신 검색/치환 블록으로 답하도록 요청합니다.
+    """
+    # 원본 코드에서 전략 이름 추출
+    strategy_name = extract_strategy_name(original_code)
+    logger.debug(f"원본 전략 이름: {strategy_name}")
+    
+    # 웹훅 데이터 구성
+    fields = prompt_fields(webhook_data)
+    instructions = pine_patch.PATCH_INSTRUCTIONS if patch else FULL_CODE_INSTRUCTIONS
+    
+    # 거래 내역을 뺀 프롬프트 크기를 재고, 남은 예산 안에서 거래 내역 구성
+    budget = prompt_builder.PROMPT_TOKEN_BUDGET
+    fixed_tokens = prompt_builder.count_message_tokens(build_messages(_render_prompt(strategy_name, original_code, fields, "", instructions)))
+    trades_summary, trades_info = prompt_builder.build_trades_section(fields["recent_trades"], budget - fixed_tokens)
+    
+    # API 요청을 위한 프롬프트 구성
+    prompt = _render_prompt(strategy_name, original_code, fields, trades_summary, instructions)
+    prompt_tokens = prompt_builder.count_message_tokens(build_messages(prompt))
+    if prompt_tokens > budget:
+        logger.warning(f"프롬프트가 토큰 예산을 넘었습니다: {prompt_tokens} > {budget} (거래 내역 제외 {fixed_tokens} 토큰)")
+    logger.info(f"프롬프트 크기: {prompt_tokens} 토큰 (예산 {budget}), "
+                f"거래 {trades_info['trades_total']}개 중 {trades_info['trades_included']}개 포함")
+    if report is not None:
+        report.update({
+            "prompt_tokens": prompt_tokens,
+            "prompt_token_budget": budget,
+            "token_counter": prompt_builder.token_counter_name(),
+            **trades_info
+        })
+    return prompt
+
+def compact_code(original_code, report=None):
+    """
+    프롬프트에 넣기 전에 주석/시각화/빈 줄을 떼어 냅니다 (PINE_COMPACTION).
+    (프롬프트에 넣을 코드, 복원용 CompactedCode 또는 None)을 반환하며, report(dict)를 주면
+    압축 전후 코드 토큰 수와 떼어 낸 줄 수를 기록합니다.
+    """
+    compaction = pine_compactor.compact(original_code)
+    if compaction is None:
+        return original_code, None
+    code_tokens = prompt_builder.count_tokens(original_code)
+    compacted_tokens = prompt_builder.count_tokens(compaction.code)
+    logger.debug(f"코드 압축: {code_tokens} -> {compacted_tokens} 토큰, {compaction.removed_lines}줄 제거")
+    if report is not None:
+        report.update({
+            "code_tokens": code_tokens,
+            "code_tokens_compacted": compacted_tokens,
+            "compaction_removed_lines": compaction.removed_lines
+        })
+    return compaction.code, compaction
+
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def response_cache_key(original_code, webhook_data, candidates=None):
+    """
+    LLM 응답 캐시 키를 만듭니다. 캐시가 꺼져 있으면 None을 반환합니다.
+    candidates(best-of-N의 후보 수)를 주면 응답 하나를 쓰는 모드와 겹치지 않는 후보 목록용 키를 만듭니다.
+    """
+    if not llm_cache.LLM_CACHE_ENABLED:
+        return None
+    fields = prompt_fields(webhook_data)
+    if candidates is not None:
+        fields = dict(fields, candidates=candidates, patch=LLM_PATCH_MODE)
+    return llm_cache.make_key(original_code, fields, OPENAI_MODEL, OPENAI_TEMPERATURE, OPENAI_MAX_TOKENS)
+
+def extract_code_block(content):
+    """
+    응답 텍스트에 코드 블록이 있으면 그 안의 코드만 추출합니다.
+    스트리밍 조기 종료와 같은 블록을 고르도록 CodeFenceParser로 찾습니다.
+    """
+    parser = CodeFenceParser()
+    parser.feed(content)
+    code = parser.finish()
+    if code is None:
+        return content.strip()
+    logger.debug(f"```{parser.language} 코드 블록에서 코드 추출")
+    return code
+
+class CodeFenceParser:
+    """
+    응답에서 코드 블록의 여는/닫는 펜스(```)를 줄 단위로 찾는 증분 파서입니다.
+
+    ```pine 블록이나 언어 표시가 없는 ``` 블록 중 처음 닫힌 블록을 고르며, 그 블록이 닫히면
+    complete가 참이 됩니다. 다른 언어의 블록은 건너뛰고 다음 블록을 기다립니다.
+    스트리밍 조기 종료와 extract_code_block이 같은 파서를 써서 항상 같은 블록을 고릅니다.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._in_block = False
+        self._language = None
+        self._lines = []
+        self._fallback = None
+        self.language = None
+        self.code = None
+        self.complete = False
+
+    def feed(self, text):
+        """응답 조각을 넣고, 추출할 코드 블록이 닫혔으면 True를 반환합니다."""
+        if self.complete:
+            return True
+        self._pending += text
+        while not self.complete and "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            self._feed_line(line)
+        return self.complete
+
+    def finish(self):
+        """
+        응답이 끝났을 때 호출합니다. 남은 마지막 줄까지 처리하고 고른 블록의 코드를 반환합니다.
+        pine/언어 표시 없는 블록이 없으면 처음 닫힌 다른 언어 블록을, 닫힌 블록이 없으면 None을 반환합니다.
+        """
+        if not self.complete and self._pending:
+            line, self._pending = self._pending, ""
+            self._feed_line(line)
+        if self.code is None and self._fallback is not None:
+            self.language, self.code = self._fallback
+        return self.code
+
+    def _feed_line(self, line):
+        fence = line.find("```")
+        if fence < 0:
+            if self._in_block:
+                self._lines.append(line)
+            return
+        if self._in_block:
+            self._lines.append(line[:fence])
+            self._close_block()
+            return
+        rest = line[fence + 3:]
+        closing = rest.find("```")
+        header = rest if closing < 0 else rest[:closing]
+        parts = header.strip().split(None, 1)
+        self._in_block = True
+        self._language = parts[0].lower() if parts else ""
+        self._lines = []
+        # 여는 펜스와 같은 줄에서 닫히는 경우 (```pine ... ```)
+        if closing >= 0:
+            self._lines.append(parts[1] if len(parts) > 1 else "")
+            self._close_block()
+
+    def _close_block(self):
+        self._in_block = False
+        code = "\n".join(self._lines).strip()
+        self._lines = []
+        if self._language == "" or self._language.startswith("pine"):
+            self.language, self.code = self._language, code
+            self.complete = True
+        elif self._fallback is None:
+            self._fallback = (self._language, code)
+
+def apply_patch_response(code, content, report=None):
+    """
+    패치 모드 응답의 검색/치환 블록(또는 diff)을 code에 적용합니다.
+    응답에 패치 대신 전체 코드 블록이 들어 있으면 그 코드를 쓰고, 적용하지 못하면 None을 반환합니다
+    (호출한 쪽은 전체 코드 모드로 다시 요청). report(dict)를 주면 report["patch"]에 결과를 기록합니다.
+    """
+    completion_tokens = report.get("completion_tokens") if report is not None else None
+    try:
+        patched, info = pine_patch.apply_patch(code, content)
+    except pine_patch.PatchNotFound as e:
+        full_code = extract_code_block(content)
+        if "```" in content and extract_strategy_name(full_code, None):
+            logger.info("패치 대신 전체 코드가 반환되어 그대로 사용합니다.")
+            patched, info = full_code, {"format": "full_code"}
+        else:
+            logger.warning(f"패치 적용 실패, 전체 코드 모드로 다시 요청합니다: {str(e)}")
+            patched, info = None, {"error": str(e)}
+    except pine_patch.PatchError as e:
+        logger.warning(f"패치 적용 실패, 전체 코드 모드로 다시 요청합니다: {str(e)}")
+        patched, info = None, {"error": str(e)}
+    if report is not None:
+        report["patch"] = {"applied": patched is not None, "completion_tokens": completion_tokens, **info}
+    return patched
+
+def generate_modified_script(original_code, webhook_data):
+    """
+    웹훅 데이터와 원본 전략 코드를 기반으로 OpenAI API를 사용하여 수정된 코드를 생성합니다.
+    suggested_improvements가 단순한 매개변수 변경이면 LLM 없이 규칙(pine_rules)으로 처리합니다.
+    """
+    # 규칙으로 처리할 수 있는 요청이면 LLM을 호출하지 않음
+    rule_code = pine_rules.try_rules(original_code, webhook_data)
+    if rule_code is not None:
+        return rule_code
+    
+    # OpenAI API 키 확인
+    api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not api_key:
+        logger.warning("OpenAI API 키가 설정되지 않았습니다.")
+        return original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다. 환경 변수 OPENAI_API_KEY를 설정해 주세요."
+    
+    # API 키 설정
+    openai.api_key = api_key
+    
+    try:
+        logger.debug("전략 코드 수정 시작")
+        
+        prompt_code, compaction = compact_code(original_code)
+        prompt = build_prompt(prompt_code, webhook_data, patch=LLM_PATCH_MODE)
+        logger.debug(f"웹훅 데이터 처리 완료, OpenAI API 요청 준비")
         
         # 모의 응답 모드 (디버깅용)
         if os.environ.get("DEBUG_MODE") == "true":
             logger.info("디버그 모드: 모의 응답 반환")
             return original_code + "\n\n// 이것은 디버그 모드의 모의 응답입니다. OpenAI API가 호출되지 않았습니다."
         
+        # 동일한 요청의 캐시된 응답이 있으면 재사용
+        cache_key = response_cache_key(original_code, webhook_data)
+        if cache_key:
+            cached_code = llm_cache.cache.get(cache_key)
+            if cached_code is not None:
+                logger.info("캐시된 LLM 응답 사용")
+                return cached_code
+        
         logger.debug("OpenAI API 요청 시작")
         
         # OpenAI API 호출
         try:
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "당신은 Pine Script와 트레이딩 전략에 전문적인 지식을 갖춘 AI 조수입니다."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
+            modified_code = None
+            if LLM_PATCH_MODE:
+                response = openai.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=build_messages(prompt),
+                    temperature=OPENAI_TEMPERATURE,
+                    max_tokens=OPENAI_PATCH_MAX_TOKENS
+                )
+                modified_code = apply_patch_response(prompt_code, response.choices[0].message.content)
+                if modified_code is None:
+                    prompt = build_prompt(prompt_code, webhook_data)
             
-            # 수정된 코드 추출
-            modified_code = response.choices[0].message.content.strip()
-            logger.debug(f"OpenAI API 응답 수신: {len(modified_code)} 문자")
+            if modified_code is None:
+                response = openai.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=build_messages(prompt),
+                    temperature=OPENAI_TEMPERATURE,
+                    max_tokens=OPENAI_MAX_TOKENS
+                )
+                
+                # 수정된 코드 추출
+                content = response.choices[0].message.content
+                logger.debug(f"OpenAI API 응답 수신: {len(content)} 문자")
+                modified_code = extract_code_block(content)
+            if compaction is not None:
+                # 프롬프트에서 뺀 주석/시각화 줄을 다시 넣음
+                modified_code = compaction.restore(modified_code)
+            if cache_key:
+                llm_cache.cache.put(cache_key, modified_code)
             
-            # 코드 블록이 있으면 추출
-            if "```pine" in modified_code:
-                start_idx = modified_code.find("```pine") + 7
-                end_idx = modified_code.find("```", start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    modified_code = modified_code[start_idx:end_idx].strip()
-                    logger.debug("```pine 코드 블록에서 코드 추출")
-            elif "```" in modified_code:
-                start_idx = modified_code.find("```") + 3
-                end_idx = modified_code.find("```", start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    modified_code = modified_code[start_idx:end_idx].strip()
-                    logger.debug("``` 코드 블록에서 코드 추출")
+            logger.info("전략 코드 수정 완료")
+            return modified_code
+            
+        except Exception as api_error:
+            logger.error(f"OpenAI API 호출 오류: {str(api_error)}")
+            logger.error(traceback.format_exc())
+            # 오류 발생 시 원본 코드에 오류 메시지 추가
+            return original_code + f"\n\n// OpenAI API 오류가 발생했습니다: {str(api_error)}"
+    
+    except Exception as e:
+        logger.error(f"전략 코드 수정 중 오류 발생: {str(e)}")
+        logger.error(traceback.format_exc())
+        return original_code + f"\n\n// 코드 수정 중 오류 발생: {str(e)}"
+
+async def stream_completion(prompt, report=None, max_tokens=OPENAI_MAX_TOKENS, early_stop_enabled=None):
+    """
+    LLM 응답을 스트리밍으로 받아 텍스트 조각을 내보냅니다.
+
+    LLM_STREAM_EARLY_STOP이 켜져 있으면 코드 블록의 닫는 펜스가 도착하는 즉시 요청을 끊습니다
+    (early_stop_enabled로 호출마다 바꿀 수 있음, 패치 모드는 블록이 여러 개일 수 있어 끔).
+    report(dict)를 주면 조기 종료 여부와 받은 스트림 조각 수(stream_chunks), API가 보고한 토큰 사용량
+    (completion_tokens, 조기 종료했거나 서버가 보내지 않으면 None), 절약한 토큰 수의 상한을 기록합니다.
+    조각 하나에 토큰이 하나 이상 들어 있으므로 tokens_saved_max는 max_tokens - 조각 수로 잡은 상한입니다.
+    """
+    if early_stop_enabled is None:
+        early_stop_enabled = LLM_STREAM_EARLY_STOP
+    parser = CodeFenceParser()
+    received = 0
+    early_stop = False
+    usage = {}
+    stream = llm_client.stream_chat_completion(
+        usage=usage,
+        model=OPENAI_MODEL,
+        messages=build_messages(prompt),
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=max_tokens
+    )
+    try:
+        async for text in stream:
+            received += 1
+            yield text
+            if early_stop_enabled and parser.feed(text):
+                early_stop = True
+                break
+    finally:
+        await stream.aclose()
+        if report is not None:
+            report.update({
+                "streamed": True,
+                "early_stop": early_stop,
+                "completion_tokens": usage.get("completion_tokens"),
+                "stream_chunks": received,
+                "tokens_saved_max": max_tokens - received if early_stop else 0
+            })
+    if early_stop:
+        logger.info(f"코드 블록이 닫혀 스트림을 중단했습니다: {received}개 조각 수신, 최대 {max_tokens - received}개 토큰 절약")
+
+async def request_completion(prompt, report=None, max_tokens=OPENAI_MAX_TOKENS, stream=None):
+    """
+    LLM 응답 전체 텍스트를 받습니다. stream이 참이면(기본값 LLM_STREAM_EARLY_STOP) 스트리밍으로 받아
+    코드 블록이 닫히면 끊고, 아니면 한 번에 받습니다. report(dict)를 주면 토큰 사용량을 기록합니다.
+    """
+    if stream is None:
+        stream = LLM_STREAM_EARLY_STOP
+    if stream:
+        return "".join([text async for text in stream_completion(prompt, report, max_tokens)])
+    response = await llm_client.create_chat_completion(
+        model=OPENAI_MODEL,
+        messages=build_messages(prompt),
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=max_tokens
+    )
+    if report is not None and response.usage is not None:
+        report.update({
+            "streamed": False,
+            "early_stop": False,
+            "completion_tokens": response.usage.completion_tokens,
+            "tokens_saved_max": 0
+        })
+    return response.choices[0].message.content
+
+async def generate_modified_script_async(original_code, webhook_data, report=None):
+    """
+    generate_modified_script의 비동기 버전입니다.
+    공유 비동기 클라이언트(llm_client)를 사용하므로 이벤트 루프를 막지 않습니다.
+    LLM_STREAM_EARLY_STOP이 켜져 있으면 응답을 스트리밍으로 받아 코드 블록이 끝나면 요청을 끊습니다.
+    report(dict)를 주면 호출별 토큰 사용량과 캐시 사용 여부를 기록합니다.
+    단순한 매개변수 변경 요청은 LLM 없이 규칙(pine_rules)으로 처리합니다.
+    """
+    # 규칙으로 처리할 수 있는 요청이면 LLM을 호출하지 않음
+    rule_code = pine_rules.try_rules(original_code, webhook_data, report)
+    if rule_code is not None:
+        return rule_code
+    
+    # OpenAI API 키 확인
+    api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not api_key:
+        logger.warning("OpenAI API 키가 설정되지 않았습니다.")
+        return original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다. 환경 변수 OPENAI_API_KEY를 설정해 주세요."
+    
+    try:
+        logger.debug("전략 코드 수정 시작 (비동기)")
+        
+        prompt_code, compaction = compact_code(original_code, report)
+        prompt = build_prompt(prompt_code, webhook_data, report, patch=LLM_PATCH_MODE)
+        logger.debug(f"웹훅 데이터 처리 완료, OpenAI API 요청 준비")
+        
+        # 모의 응답 모드 (디버깅용)
+        if os.environ.get("DEBUG_MODE") == "true":
+            logger.info("디버그 모드: 모의 응답 반환")
+            return original_code + "\n\n// 이것은 디버그 모드의 모의 응답입니다. OpenAI API가 호출되지 않았습니다."
+        
+        # 동일한 요청의 캐시된 응답이 있으면 재사용 (디스크 조회는 저장소 스레드 풀에서 실행)
+        cache_key = response_cache_key(original_code, webhook_data)
+        if cache_key:
+            cached_code = await async_storage.run(llm_cache.cache.get, cache_key)
+            if cached_code is not None:
+                logger.info("캐시된 LLM 응답 사용")
+                if report is not None:
+                    report["cached"] = True
+                return cached_code
+        
+        logger.debug("OpenAI API 비동기 요청 시작")
+        
+        # OpenAI API 호출
+        try:
+            modified_code = None
+            if LLM_PATCH_MODE:
+                # 바꿀 부분만 받아 로컬에서 적용, 실패하면 전체 코드 프롬프트로 다시 요청
+                content = await request_completion(prompt, report, OPENAI_PATCH_MAX_TOKENS, stream=False)
+                modified_code = apply_patch_response(prompt_code, content, report)
+                if modified_code is None:
+                    prompt = build_prompt(prompt_code, webhook_data, report)
+            
+            if modified_code is None:
+                content = await request_completion(prompt, report)
+                
+                # 수정된 코드 추출
+                logger.debug(f"OpenAI API 응답 수신: {len(content)} 문자")
+                modified_code = extract_code_block(content)
+            if compaction is not None:
+                # 프롬프트에서 뺀 주석/시각화 줄을 다시 넣음
+                modified_code = compaction.restore(modified_code)
+            if cache_key:
+                await async_storage.run(llm_cache.cache.put, cache_key, modified_code)
             
             logger.info("전략 코드 수정 완료")
             return modified_code
@@ -186,42 +564,260 @@ def generate_modified_script(original_code, webhook_data):
         logger.error(traceback.format_exc())
         return original_code + f"\n\n// 코드 수정 중 오류 발생: {str(e)}"
 
+async def request_choices(prompt, n, report=None, max_tokens=OPENAI_MAX_TOKENS):
+    """한 번의 API 요청으로 응답 n개(choices)를 받습니다. report(dict)를 주면 토큰 사용량을 기록합니다."""
+    response = await llm_client.create_chat_completion(
+        model=OPENAI_MODEL,
+        messages=build_messages(prompt),
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=max_tokens,
+        n=n
+    )
+    if report is not None and response.usage is not None:
+        report.update({
+            "streamed": False,
+            "early_stop": False,
+            "completion_tokens": response.usage.completion_tokens,
+            "tokens_saved_max": 0
+        })
+    return [choice.message.content or "" for choice in response.choices]
+
+async def generate_candidate_scripts_async(original_code, webhook_data, report=None, n=None):
+    """
+    한 번의 API 요청으로 수정 후보 n개(기본값 LLM_CANDIDATES)를 받아 각 응답의 코드를 추출합니다.
+    같은 코드는 한 번만 담으며, n이 1 이하이거나 규칙/API 키 없음/디버그 모드로 처리되면 후보는 하나입니다.
+    받은 후보 목록은 (요청, 후보 수, 패치 모드)별로 LLM 응답 캐시에 저장해 같은 요청에 다시 사용합니다.
+    패치 모드에서는 응답마다 패치를 적용하고, 적용된 후보가 없으면 전체 코드 모드로 다시 요청합니다.
+    """
+    n = candidate_ranker.LLM_CANDIDATES if n is None else n
+    if n <= 1:
+        return [await generate_modified_script_async(original_code, webhook_data, report)]
+
+    # 규칙으로 처리할 수 있는 요청이면 LLM을 호출하지 않음
+    rule_code = pine_rules.try_rules(original_code, webhook_data, report)
+    if rule_code is not None:
+        return [rule_code]
+
+    # OpenAI API 키 확인
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OpenAI API 키가 설정되지 않았습니다.")
+        return [original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다. 환경 변수 OPENAI_API_KEY를 설정해 주세요."]
+
+    try:
+        logger.debug(f"전략 코드 수정 후보 {n}개 요청 시작")
+
+        prompt_code, compaction = compact_code(original_code, report)
+        prompt = build_prompt(prompt_code, webhook_data, report, patch=LLM_PATCH_MODE)
+
+        # 모의 응답 모드 (디버깅용)
+        if os.environ.get("DEBUG_MODE") == "true":
+            logger.info("디버그 모드: 모의 응답 반환")
+            return [original_code + "\n\n// 이것은 디버그 모드의 모의 응답입니다. OpenAI API가 호출되지 않았습니다."]
+
+        # 동일한 요청에서 이전에 받은 후보 목록이 캐시에 있으면 재사용 (순위는 호출한 쪽에서 다시 매김)
+        cache_key = response_cache_key(original_code, webhook_data, candidates=n)
+        if cache_key:
+            cached_candidates = await async_storage.run(llm_cache.cache.get, cache_key)
+            if isinstance(cached_candidates, list) and cached_candidates:
+                logger.info(f"캐시된 LLM 후보 {len(cached_candidates)}개 사용")
+                if report is not None:
+                    report.update({"cached": True, "candidates_requested": n, "candidates": len(cached_candidates)})
+                return cached_candidates
+
+        try:
+            candidates = []
+            if LLM_PATCH_MODE:
+                contents = await request_choices(prompt, n, report, OPENAI_PATCH_MAX_TOKENS)
+                candidates = [code for code in (apply_patch_response(prompt_code, content) for content in contents)
+                              if code is not None]
+                if report is not None:
+                    report["patch"] = {"applied": len(candidates), "choices": len(contents)}
+                if not candidates:
+                    logger.warning("패치를 적용할 수 있는 후보가 없어 전체 코드 모드로 다시 요청합니다.")
+                    prompt = build_prompt(prompt_code, webhook_data, report)
+
+            if not candidates:
+                contents = await request_choices(prompt, n, report)
+                logger.debug(f"OpenAI API 응답 수신: 후보 {len(contents)}개")
+                candidates = [extract_code_block(content) for content in contents]
+            if compaction is not None:
+                # 프롬프트에서 뺀 주석/시각화 줄을 다시 넣음
+                candidates = [compaction.restore(code) for code in candidates]
+            # 같은 코드는 한 번만 평가
+            candidates = list(dict.fromkeys(code for code in candidates if code))
+            if report is not None:
+                report.update({"candidates_requested": n, "candidates": len(candidates)})
+            if cache_key and candidates:
+                await async_storage.run(llm_cache.cache.put, cache_key, candidates)
+            logger.info(f"전략 코드 수정 후보 {len(candidates)}개 생성 완료")
+            return candidates or [original_code + "\n\n// OpenAI API가 빈 응답을 반환했습니다."]
+
+        except Exception as api_error:
+            logger.error(f"OpenAI API 호출 오류: {str(api_error)}")
+            logger.error(traceback.format_exc())
+            # 오류 발생 시 원본 코드에 오류 메시지 추가
+            return [original_code + f"\n\n// OpenAI API 오류가 발생했습니다: {str(api_error)}"]
+
+    except Exception as e:
+        logger.error(f"전략 코드 수정 중 오류 발생: {str(e)}")
+        logger.error(traceback.format_exc())
+        return [original_code + f"\n\n// 코드 수정 중 오류 발생: {str(e)}"]
+
+async def select_modified_script_async(original_code, webhook_data, bars=None, report=None):
+    """
+    best-of-N 모드의 코드 수정입니다. 후보를 여러 개 받아 bars(bar_store.BarWindow, 최근 봉)로 동시에 백테스트하고
+    점수(profit factor와 최대 낙폭)가 가장 높은 후보를 (코드, 순위 정보)로 반환합니다.
+    후보가 하나뿐이면 순위 정보는 None입니다. 캐시된 후보 목록을 쓸 때도 순위를 다시 매기며,
+    이때 후보의 백테스트 결과는 대개 백테스트 결과 캐시에서 가져옵니다.
+    """
+    candidates = await generate_candidate_scripts_async(original_code, webhook_data, report)
+    if len(candidates) == 1:
+        return candidates[0], None
+    ranking = await candidate_ranker.rank(original_code, candidates, bars)
+    return candidates[ranking["selected"]], ranking
+
+async def stream_modified_script(original_code, webhook_data):
+    """
+    generate_modified_script_async의 스트리밍 버전입니다.
+    LLM 응답 조각을 {"type": "token", "text": ...}로 도착하는 대로 내보내고, 마지막에 코드 블록을
+    추출한 결과를 {"type": "done", "modified_code": ..., "cached": ..., "llm": 토큰 사용량}으로 내보냅니다.
+    패치 모드에서 패치를 적용하지 못하면 {"type": "retry", "reason": ...}를 보낸 뒤 전체 코드를 다시 스트리밍합니다.
+    API 키가 없거나 디버그 모드이거나 캐시된 응답이 있으면 done 이벤트만 내보냅니다.
+    API 호출 오류는 호출한 쪽에서 처리하도록 그대로 올립니다.
+    규칙(pine_rules)으로 처리한 요청도 done 이벤트만 내보냅니다.
+    """
+    report = {}
+    
+    # 규칙으로 처리할 수 있는 요청이면 LLM을 호출하지 않음
+    rule_code = pine_rules.try_rules(original_code, webhook_data, report)
+    if rule_code is not None:
+        yield {"type": "done", "modified_code": rule_code, "cached": False, "llm": report}
+        return
+
+    # OpenAI API 키 확인
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        logger.warning("OpenAI API 키가 설정되지 않았습니다.")
+        yield {
+            "type": "done",
+            "modified_code": original_code + "\n\n// OpenAI API 키가 설정되지 않아 코드 수정이 불가능합니다. 환경 변수 OPENAI_API_KEY를 설정해 주세요.",
+            "cached": False
+        }
+        return
+
+    logger.debug("전략 코드 수정 시작 (스트리밍)")
+    prompt_code, compaction = compact_code(original_code, report)
+    prompt = build_prompt(prompt_code, webhook_data, report, patch=LLM_PATCH_MODE)
+
+    # 모의 응답 모드 (디버깅용)
+    if os.environ.get("DEBUG_MODE") == "true":
+        logger.info("디버그 모드: 모의 응답 반환")
+        yield {
+            "type": "done",
+            "modified_code": original_code + "\n\n// 이것은 디버그 모드의 모의 응답입니다. OpenAI API가 호출되지 않았습니다.",
+            "cached": False
+        }
+        return
+
+    # 동일한 요청의 캐시된 응답이 있으면 재사용
+    cache_key = response_cache_key(original_code, webhook_data)
+    if cache_key:
+        cached_code = await async_storage.run(llm_cache.cache.get, cache_key)
+        if cached_code is not None:
+            logger.info("캐시된 LLM 응답 사용")
+            yield {"type": "done", "modified_code": cached_code, "cached": True, "llm": report}
+            return
+
+    logger.debug("OpenAI API 스트리밍 요청 시작")
+    modified_code = None
+    if LLM_PATCH_MODE:
+        parts = []
+        async for text in stream_completion(prompt, report, OPENAI_PATCH_MAX_TOKENS, early_stop_enabled=False):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+        modified_code = apply_patch_response(prompt_code, "".join(parts), report)
+        if modified_code is None:
+            # 지금까지 보낸 토큰은 버리고 전체 코드 모드로 다시 받음
+            yield {"type": "retry", "reason": report["patch"]["error"]}
+            prompt = build_prompt(prompt_code, webhook_data, report)
+
+    if modified_code is None:
+        parts = []
+        async for text in stream_completion(prompt, report):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+
+        content = "".join(parts)
+        logger.debug(f"OpenAI API 스트리밍 응답 수신 완료: {len(content)} 문자")
+        modified_code = extract_code_block(content)
+    if compaction is not None:
+        # 프롬프트에서 뺀 주석/시각화 줄을 다시 넣음
+        modified_code = compaction.restore(modified_code)
+    if cache_key:
+        await async_storage.run(llm_cache.cache.put, cache_key, modified_code)
+
+    logger.info("전략 코드 수정 완료 (스트리밍)")
+    yield {"type": "done", "modified_code": modified_code, "cached": False, "llm": report}
+
+def _trailing_exit(model, call):
+    """strategy.exit 호출을 트레일링 스탑 사용 여부에 따라 나뉘는 if/else 블록으로 바꿉니다."""
+    exit_id = call.arg(0).value
+    trail_id = exit_id.replace("_SL", "_TS") if "_SL" in exit_id else exit_id + "_TS"
+    original = model.code[call.start:call.end]
+    trailing = original[:call.end - call.start - 1] + ", trail_points=close * trailingStopPct / 100)"
+    trailing = trailing.replace(call.args[0].text, f'"{trail_id}"', 1)
+    indent = " " * call.statement.indent
+    return f"if (useTrailingStop)\n{indent}    {trailing}\n{indent}else\n{indent}    {original}"
+
 def generate_mock_response(original_code, analysis, suggestions):
     """
     API 키가 없거나 OpenAI API 호출에 실패한 경우 모의 응답을 생성합니다.
+    문자열 일치 대신 파싱한 input 선언과 strategy.exit 호출 위치를 고쳐 씁니다.
     """
+    model = pine_parser.parse(original_code)
+    
     # 기본 RSI 값 변경
-    if "RSI" in original_code and "과매도 기준" in original_code:
-        modified_code = original_code.replace("rsiOversold = input(33", "rsiOversold = input(28")
-        modified_code = modified_code.replace("rsiOversold = input(30", "rsiOversold = input(28")
+    if any(call.name in ("rsi", "ta.rsi") for call in model.indicators) and "rsiOversold" in model.inputs:
+        replacements = []
+        
+        def set_default(name, value):
+            decl = model.inputs.get(name)
+            if decl is not None and decl.default is not None:
+                replacements.append((decl.default.start, decl.default.end, value))
+        
+        set_default("rsiOversold", "28")
         
         # 이익 실현 비율 변경
-        if "이익 실현 %" in modified_code:
-            modified_code = modified_code.replace("takeProfitPct = input(5.0", "takeProfitPct = input(7.0")
+        set_default("takeProfitPct", "7.0")
             
         # 볼린저 밴드 활성화
-        if "useBollingerBands = input(false" in modified_code:
-            modified_code = modified_code.replace("useBollingerBands = input(false", "useBollingerBands = input(true")
-            
-        # 트레일링 스탑 추가
-        if "useTrailingStop" not in modified_code and "strateg" in modified_code:
-            # 기존 변수 뒤에 추가
-            if "bbMultiplier" in modified_code:
-                modified_code = modified_code.replace("bbMultiplier = input(2.0", 
-                    "bbMultiplier = input(2.0"
-                    + "\nuseTrailingStop = input(true, title=\"트레일링 스탑 사용\", tooltip=\"트레일링 스탑을 적용합니다.\")"
-                    + "\ntrailingStopPct = input(2.0, title=\"트레일링 스탑 %\", tooltip=\"트레일링 스탑 비율입니다.\")")
+        if model.input_value("useBollingerBands") is False:
+            set_default("useBollingerBands", "true")
             
-        # 트레일링 스탑 로직 추가
-        if "strategy.exit" in modified_code and "trail_points" not in modified_code:
-            modified_code = modified_code.replace("strategy.exit(\"TP_SL_Long\", \"RSI_Long\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100)",
-                "if (useTrailingStop)\n    strategy.exit(\"TP_TS_Long\", \"RSI_Long\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100, trail_points=close * trailingStopPct / 100)\nelse\n    strategy.exit(\"TP_SL_Long\", \"RSI_Long\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100)")
+        # 트레일링 스탑 추가 (마지막 input 선언 뒤)
+        trailing = "useTrailingStop" in model.inputs
+        if not trailing and model.inputs and model.exits:
+            last_input = list(model.inputs.values())[-1].statement
+            position = model.line_end(last_input)
+            replacements.append((position, position,
+                "\nuseTrailingStop = input(true, title=\"트레일링 스탑 사용\", tooltip=\"트레일링 스탑을 적용합니다.\")"
+                + "\ntrailingStopPct = input(2.0, title=\"트레일링 스탑 %\", tooltip=\"트레일링 스탑 비율입니다.\")"))
+            trailing = True
             
-            modified_code = modified_code.replace("strategy.exit(\"TP_SL_Short\", \"RSI_Short\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100)",
-                "if (useTrailingStop)\n    strategy.exit(\"TP_TS_Short\", \"RSI_Short\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100, trail_points=close * trailingStopPct / 100)\nelse\n    strategy.exit(\"TP_SL_Short\", \"RSI_Short\", profit=close * takeProfitPct / 100, loss=close * stopLossPct / 100)")
+        # 트레일링 스탑 로직 추가 (한 문장 전체인 strategy.exit만, 이미 trail_points가 있으면 그대로 둠)
+        if trailing:
+            for call in model.exits:
+                if (call.start == call.statement.start
+                        and "trail_points" not in call.kwargs and call.args and isinstance(call.args[0].value, str)):
+                    replacements.append((call.start, call.end, _trailing_exit(model, call)))
         
         # 전략 이름 변경
-        modified_code = modified_code.replace("strategy(\"Simple RSI Strategy", "strategy(\"Optimized RSI Strategy")
+        if model.name and model.name.startswith("Simple RSI Strategy"):
+            title = model.declaration.arg(0, "title")
+            replacements.append((title.start, title.end, title.text.replace("Simple", "Optimized", 1)))
+        
+        modified_code = pine_parser.replace_spans(original_code, replacements)
         
         # 주석 추가
         modified_code += "\n\n// 모의 API를 통해 자동 생성된 코드:\n"
@@ -242,8 +838,9 @@ def save_modification(strategy_code, modified_code, webhook_data, strategy_dir):
     try:
         logger.debug("수정된 코드 저장 시작")
         
-        # 타임스탬프 생성
+        # 타임스탬프와 파일 ID 생성 (ULID: 시간순 정렬, 여러 프로세스에서 동시에 저장해도 충돌 없음)
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_id = storage_utils.new_ulid()
         
         # 디렉토리 확인 및 생성
         try:
@@ -255,32 +852,16 @@ def save_modification(strategy_code, modified_code, webhook_data, strategy_dir):
             raise
         
         # 수정된 코드 파일명
-        modified_file = os.path.join(strategy_dir, f"modified_{timestamp}.pine")
+        modified_file = os.path.join(strategy_dir, f"modified_{file_id}.pine")
         
         # 메타데이터 파일명
-        metadata_file = os.path.join(strategy_dir, f"metadata_{timestamp}.json")
+        metadata_file = os.path.join(strategy_dir, f"metadata_{file_id}.json")
         
         logger.debug(f"파일 경로 설정 - 수정된 코드: {modified_file}, 메타데이터: {metadata_file}")
         
-        # 원본 코드에서 전략 이름 추출
-        original_strategy = "Unknown Strategy"
-        for line in strategy_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    original_strategy = line[start_idx:end_idx]
-                    break
-        
-        # 수정된 코드에서 전략 이름 추출
-        modified_strategy = "Modified Strategy"
-        for line in modified_code.split("\n"):
-            if 'strategy("' in line:
-                start_idx = line.find('strategy("') + len('strategy("')
-                end_idx = line.find('"', start_idx)
-                if start_idx >= 0 and end_idx >= 0:
-                    modified_strategy = line[start_idx:end_idx]
-                    break
+        # 원본/수정된 코드에서 전략 이름 추출
+        original_strategy = extract_strategy_name(strategy_code)
+        modified_strategy = extract_strategy_name(modified_code, "Modified Strategy")
         
         logger.debug(f"전략 이름 추출 - 원본: {original_strategy}, 수정됨: {modified_strategy}")
         
@@ -289,6 +870,7 @@ def save_modification(strategy_code, modified_code, webhook_data, strategy_dir):
         
         # 메타데이터 생성
         metadata = {
+            "id": file_id,
             "timestamp": timestamp,
             "original_strategy": original_strategy,
             "modified_strategy": modified_strategy,
@@ -297,20 +879,30 @@ def save_modification(strategy_code, modified_code, webhook_data, strategy_dir):
             "trading_problem": webhook_data.get("trading_problem", ""),
             "modification_summary": modification_summary
         }
+        if "optimization" in webhook_data:
+            # 매개변수 탐색으로 저장한 경우 고른 조합과 그 조합의 백테스트 성과
+            metadata["optimization"] = webhook_data["optimization"]
+        if "candidates" in webhook_data:
+            # best-of-N 모드에서 평가한 모든 후보의 점수
+            metadata["candidates"] = webhook_data["candidates"]
         
         logger.debug("메타데이터 생성 완료")
         
         # 파일 저장
         try:
-            with open(modified_file, 'w') as f:
-                f.write(modified_code)
+            # 임시 파일에 쓴 뒤 rename으로 교체 (읽는 쪽은 완성된 파일만 보게 됨)
+            storage_utils.atomic_write(modified_file, modified_code)
             logger.debug(f"수정된 코드 저장 완료: {modified_file}")
                 
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=4)
+            storage_utils.atomic_write(metadata_file, fast_json.dumps(metadata))
             logger.debug(f"메타데이터 저장 완료: {metadata_file}")
+            
+            # 내역 조회용 메타데이터 저장소에도 기록
+            metadata_store.record_modification(strategy_dir, metadata, modified_file, metadata_file)
+            status_counters.counters.record_modification(modified_file, metadata_file)
                 
             return {
+                "id": file_id,
                 "timestamp": timestamp,
                 "modified_file": modified_file,
                 "metadata_file": metadata_file
@@ -332,6 +924,12 @@ def test_analysis(strategy_code, sample_webhook_data):
     """
     return generate_modified_script(strategy_code, sample_webhook_data)
 
+async def test_analysis_async(strategy_code, sample_webhook_data):
+    """
+    테스트 분석을 위한 비동기 메서드
+    """
+    return await generate_modified_script_async(strategy_code, sample_webhook_data)
+
 def parse_response(response_text: str) -> dict:
     """
     LLM의 응답을 파싱하여 설명과 수정된 코드를 분리합니다.
@@ -0,0 +1,472 @@
+# pine_parser.py
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# 로깅 설정
+logger = logging.getLogger("pine_parser")
+
+# 파싱 결과를 코드 해시별로 보관할 개수 (환경 변수로 조정 가능)
+PINE_PARSE_CACHE_SIZE = int(os.getenv("PINE_PARSE_CACHE_SIZE", "256"))
+
+DECLARATION_FUNCTIONS = ("strategy", "study", "indicator")
+ORDER_FUNCTIONS = (
+    "strategy.entry", "strategy.exit", "strategy.close", "strategy.close_all",
+    "strategy.order", "strategy.cancel", "strategy.cancel_all"
+)
+# v4의 내장 지표 함수 (v5에서는 ta. 접두사가 붙음)
+INDICATOR_FUNCTIONS = (
+    "rsi", "sma", "ema", "wma", "vwma", "rma", "hma", "alma", "swma", "stdev", "variance", "dev",
+    "atr", "tr", "macd", "bb", "bbw", "cci", "cmo", "mfi", "stoch", "tsi", "wpr", "mom", "roc",
+    "change", "highest", "lowest", "highestbars", "lowestbars", "crossover", "crossunder", "cross",
+    "vwap", "sar", "supertrend", "dmi", "kc", "kcw", "linreg", "percentrank", "pivothigh", "pivotlow",
+    "falling", "rising", "cum", "correlation", "median", "valuewhen", "barssince"
+)
+# 선언 앞에 올 수 있는 키워드/타입 (var float x = ...)
+_DECLARATION_KEYWORDS = (
+    "var", "varip", "int", "float", "bool", "color", "string", "line", "label", "box", "table",
+    "series", "simple", "const", "input"
+)
+_ASSIGNMENT_OPERATORS = ("=", ":=", "+=", "-=", "*=", "/=", "%=")
+# 줄 끝에 오면 다음 줄로 식이 이어지는 토큰
+_CONTINUATION_TOKENS = ("?", ":", ",", "+", "-", "*", "/", "%", "=", ":=", "==", "!=", "<", ">",
+                        "<=", ">=", "and", "or", "not", "(", "[")
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>//[^\n]*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<color>\#[0-9A-Fa-f]{6}(?:[0-9A-Fa-f]{2})?)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>:=|==|!=|<=|>=|=>|\+=|-=|\*=|/=|%=|[-+*/%<>=?:,.()\[\]])
+  | (?P<newline>\n)
+  | (?P<space>[ \t\r]+)
+  | (?P<error>.)
+""", re.VERBOSE)
+_VERSION_PATTERN = re.compile(r"//\s*@version\s*=\s*(\d+)")
+
+
+class Token:
+    __slots__ = ("kind", "value", "start", "end", "line")
+
+    def __init__(self, kind, value, start, end, line):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+        self.line = line
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r}, line={self.line})"
+
+
+def tokenize(code):
+    """
+    Pine Script 코드를 토큰 목록으로 나눕니다. 공백은 버리고, 줄의 들여쓰기는
+    각 줄 첫 토큰 앞에 indent 토큰(값은 공백 수)으로 넣습니다.
+    """
+    tokens = []
+    line = 1
+    at_line_start = True
+    for match in _TOKEN_PATTERN.finditer(code):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "space":
+            if at_line_start:
+                tokens.append(Token("indent", len(value.expandtabs(4)), match.start(), match.end(), line))
+                at_line_start = False
+            continue
+        if at_line_start and kind != "newline":
+            tokens.append(Token("indent", 0, match.start(), match.start(), line))
+        at_line_start = kind == "newline"
+        tokens.append(Token(kind, value, match.start(), match.end(), line))
+        if kind == "newline":
+            line += 1
+    return tokens
+
+
+class Arg:
+    """호출 인자 하나입니다. value는 리터럴이면 그 값, 아니면 None이며 text/start/end는 원본 코드 위치입니다."""
+
+    __slots__ = ("text", "start", "end", "value", "is_literal")
+
+    def __init__(self, text, start, end, value, is_literal):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.value = value
+        self.is_literal = is_literal
+
+    def __repr__(self):
+        return f"Arg({self.text!r})"
+
+
+class Call:
+    """함수 호출 하나입니다. args는 위치 인자, kwargs는 이름 있는 인자(Arg)입니다."""
+
+    __slots__ = ("name", "args", "kwargs", "start", "end", "line", "statement")
+
+    def __init__(self, name, args, kwargs, start, end, line, statement):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.start = start
+        self.end = end
+        self.line = line
+        self.statement = statement
+
+    def arg(self, position, keyword=None):
+        """keyword 인자가 있으면 그것을, 없으면 position번째 위치 인자를 반환합니다."""
+        if keyword and keyword in self.kwargs:
+            return self.kwargs[keyword]
+        return self.args[position] if position < len(self.args) else None
+
+    def __repr__(self):
+        return f"Call({self.name}, line={self.line})"
+
+
+class Statement:
+    """논리적인 문장 하나(이어지는 줄 포함)입니다."""
+
+    __slots__ = ("tokens", "indent", "line", "start", "end", "target", "operator", "calls")
+
+    def __init__(self, tokens, indent):
+        self.tokens = tokens
+        self.indent = indent
+        self.line = tokens[0].line
+        self.start = tokens[0].start
+        self.end = tokens[-1].end
+        self.target = None
+        self.operator = None
+        self.calls = []
+
+
+class InputDecl:
+    """input() 선언입니다. default/title은 Arg이며 default.value로 기본값을 읽습니다."""
+
+    __slots__ = ("name", "function", "default", "title", "call", "statement")
+
+    def __init__(self, name, call, statement):
+        self.name = name
+        self.function = call.name
+        self.default = call.arg(0, "defval")
+        self.title = call.arg(1, "title")
+        self.call = call
+        self.statement = statement
+
+    @property
+    def line(self):
+        return self.statement.line
+
+    def __repr__(self):
+        return f"InputDecl({self.name}={self.default.text if self.default else None})"
+
+
+class PineModel:
+    """
+    전략 코드의 구조 모델입니다. 전략 선언, input 선언, 주문(strategy.entry/exit 등) 호출,
+    지표 함수 호출, 변수 대입을 담습니다. parse()가 코드 해시별로 공유하므로 수정하지 말아야 합니다.
+    """
+
+    def __init__(self, code, digest):
+        self.code = code
+        self.digest = digest
+        self.version = None
+        self.declaration = None
+        self.statements = []
+        self.calls = []
+        self.inputs = OrderedDict()
+        self.orders = []
+        self.indicators = []
+        self.assignments = OrderedDict()
+        self.functions = []
+        self.errors = []
+
+    @property
+    def name(self):
+        """strategy()/study()/indicator() 선언의 제목입니다. 없으면 None입니다."""
+        if self.declaration is None:
+            return None
+        title = self.declaration.arg(0, "title")
+        if title is None or not isinstance(title.value, str):
+            return None
+        return title.value
+
+    @property
+    def entries(self):
+        return [call for call in self.orders if call.name == "strategy.entry"]
+
+    @property
+    def exits(self):
+        return [call for call in self.orders if call.name == "strategy.exit"]
+
+    def input_value(self, name, default=None):
+        decl = self.inputs.get(name)
+        if decl is None or decl.default is None or not decl.default.is_literal:
+            return default
+        return decl.default.value
+
+    def line_end(self, statement):
+        """문장이 끝나는 줄의 줄바꿈 위치(없으면 코드 끝)를 반환합니다."""
+        newline = self.code.find("\n", statement.end)
+        return len(self.code) if newline < 0 else newline
+
+
+def _literal(tokens):
+    """토큰들이 리터럴 하나(부호 있는 숫자 포함)이면 (값, True), 아니면 (None, False)를 반환합니다."""
+    sign = 1
+    if len(tokens) == 2 and tokens[0].kind == "op" and tokens[0].value in ("-", "+"):
+        sign = -1 if tokens[0].value == "-" else 1
+        tokens = tokens[1:]
+    if len(tokens) != 1:
+        return None, False
+    token = tokens[0]
+    if token.kind == "number":
+        text = token.value
+        number = float(text) if any(char in text for char in ".eE") else int(text)
+        return sign * number, True
+    if sign != 1:
+        return None, False
+    if token.kind == "string":
+        return re.sub(r"\\(.)", r"\1", token.value[1:-1]), True
+    if token.kind == "color":
+        return token.value, True
+    if token.kind == "name" and token.value in ("true", "false"):
+        return token.value == "true", True
+    if token.kind == "name" and token.value == "na":
+        return None, True
+    return None, False
+
+
+def _split_statements(tokens):
+    """토큰을 논리적인 문장으로 묶습니다. 괄호 안이나 연산자로 끝난 줄, 4의 배수가 아닌 들여쓰기는 이어지는 줄로 봅니다."""
+    lines = []
+    current = None
+    for token in tokens:
+        if token.kind == "indent":
+            current = {"indent": token.value, "tokens": []}
+            lines.append(current)
+        elif token.kind in ("newline", "comment"):
+            continue
+        elif current is not None:
+            current["tokens"].append(token)
+    lines = [line for line in lines if line["tokens"]]
+
+    statements = []
+    group = None
+    depth = 0
+    for line in lines:
+        continues = group is not None and (
+            depth > 0
+            or (line["indent"] > group["indent"] and (
+                line["indent"] % 4 != 0 or group["tokens"][-1].value in _CONTINUATION_TOKENS))
+        )
+        if not continues:
+            if group is not None:
+                statements.append(Statement(group["tokens"], group["indent"]))
+            group = {"indent": line["indent"], "tokens": []}
+            depth = 0
+        group["tokens"].extend(line["tokens"])
+        for token in line["tokens"]:
+            if token.kind == "op" and token.value in "([":
+                depth += 1
+            elif token.kind == "op" and token.value in ")]":
+                depth = max(depth - 1, 0)
+    if group is not None:
+        statements.append(Statement(group["tokens"], group["indent"]))
+    return statements
+
+
+def _parse_calls(code, statement, model):
+    """문장 안의 함수 호출(중첩 포함)을 찾아 Call로 만듭니다."""
+    tokens = statement.tokens
+    calls = []
+    for index, token in enumerate(tokens):
+        if token.kind != "name":
+            continue
+        if index > 0 and tokens[index - 1].kind == "op" and tokens[index - 1].value == ".":
+            continue
+        # 점으로 이어진 이름 (strategy.entry, ta.rsi, input.int)
+        end = index
+        while (end + 2 < len(tokens) and tokens[end + 1].value == "." and tokens[end + 1].kind == "op"
+               and tokens[end + 2].kind == "name"):
+            end += 2
+        if end + 1 >= len(tokens) or tokens[end + 1].kind != "op" or tokens[end + 1].value != "(":
+            continue
+        name = "".join(tok.value for tok in tokens[index:end + 1])
+
+        args, kwargs = [], {}
+        depth = 0
+        arg_tokens = []
+        position = end + 2
+        closed = None
+        while position < len(tokens):
+            tok = tokens[position]
+            if tok.kind == "op" and tok.value in "([":
+                depth += 1
+            elif tok.kind == "op" and tok.value in ")]":
+                if depth == 0:
+                    closed = position
+                    break
+                depth -= 1
+            if depth == 0 and tok.kind == "op" and tok.value == ",":
+                _add_arg(code, arg_tokens, args, kwargs)
+                arg_tokens = []
+            else:
+                arg_tokens.append(tok)
+            position += 1
+        if closed is None:
+            model.errors.append(f"{token.line}행: {name} 호출의 괄호가 닫히지 않았습니다.")
+            continue
+        _add_arg(code, arg_tokens, args, kwargs)
+        calls.append(Call(name, args, kwargs, token.start, tokens[closed].end, token.line, statement))
+    return calls
+
+
+def _add_arg(code, arg_tokens, args, kwargs):
+    if not arg_tokens:
+        return
+    keyword = None
+    if (len(arg_tokens) > 2 and arg_tokens[0].kind == "name"
+            and arg_tokens[1].kind == "op" and arg_tokens[1].value == "="):
+        keyword = arg_tokens[0].value
+        arg_tokens = arg_tokens[2:]
+    value, is_literal = _literal(arg_tokens)
+    start, end = arg_tokens[0].start, arg_tokens[-1].end
+    arg = Arg(code[start:end], start, end, value, is_literal)
+    if keyword:
+        kwargs[keyword] = arg
+    else:
+        args.append(arg)
+
+
+def _parse_assignment(statement):
+    """대입문이면 statement.target/operator를 채웁니다. 함수 정의(=>)면 "function"을 반환합니다."""
+    depth = 0
+    for index, token in enumerate(statement.tokens):
+        if token.kind != "op":
+            continue
+        if token.value in "([":
+            depth += 1
+        elif token.value in ")]":
+            depth -= 1
+        elif depth == 0 and token.value == "=>":
+            return "function"
+        elif depth == 0 and token.value in _ASSIGNMENT_OPERATORS:
+            prefix = statement.tokens[:index]
+            names = [tok.value for tok in prefix if tok.kind == "name"]
+            if not names or any(tok.kind not in ("name", "op") for tok in prefix):
+                return None
+            if prefix[0].value == "[":
+                # [a, b] = f() 형태의 튜플 대입
+                statement.target = tuple(names)
+            elif all(tok.kind == "name" for tok in prefix) and all(
+                    name in _DECLARATION_KEYWORDS for name in names[:-1]):
+                statement.target = names[-1]
+            else:
+                return None
+            statement.operator = token.value
+            return "assignment"
+        elif depth == 0 and token.value in ("==", "!=", "?"):
+            return None
+    return None
+
+
+def _build_model(code, digest):
+    model = PineModel(code, digest)
+    version = _VERSION_PATTERN.search(code)
+    if version:
+        model.version = int(version.group(1))
+
+    tokens = tokenize(code)
+    for token in tokens:
+        if token.kind == "error":
+            model.errors.append(f"{token.line}행: 알 수 없는 문자 {token.value!r}")
+
+    for statement in _split_statements(tokens):
+        model.statements.append(statement)
+        kind = _parse_assignment(statement)
+        statement.calls = _parse_calls(code, statement, model)
+        model.calls.extend(statement.calls)
+        if kind == "function":
+            model.functions.append(statement.tokens[0].value)
+            continue
+        if kind == "assignment":
+            targets = statement.target if isinstance(statement.target, tuple) else (statement.target,)
+            for target in targets:
+                model.assignments.setdefault(target, []).append(statement.line)
+            first = statement.calls[0] if statement.calls else None
+            if (first is not None and isinstance(statement.target, str)
+                    and (first.name == "input" or first.name.startswith("input."))
+                    and first.start == _value_start(statement)):
+                model.inputs[statement.target] = InputDecl(statement.target, first, statement)
+        for call in statement.calls:
+            if call.name in DECLARATION_FUNCTIONS and statement.indent == 0 and model.declaration is None:
+                model.declaration = call
+            elif call.name in ORDER_FUNCTIONS:
+                model.orders.append(call)
+            elif call.name in INDICATOR_FUNCTIONS or call.name.startswith("ta."):
+                model.indicators.append(call)
+    return model
+
+
+def _value_start(statement):
+    """대입문에서 연산자 뒤 값이 시작하는 위치입니다."""
+    for index, token in enumerate(statement.tokens):
+        if token.kind == "op" and token.value == statement.operator:
+            return statement.tokens[index + 1].start if index + 1 < len(statement.tokens) else None
+    return None
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def code_digest(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def parse(code):
+    """
+    코드를 파싱해 PineModel을 반환합니다. 같은 내용의 코드는 해시로 찾아 한 번만 파싱하며,
+    최근 PINE_PARSE_CACHE_SIZE개의 결과를 보관합니다.
+    """
+    digest = code_digest(code)
+    with _cache_lock:
+        model = _cache.get(digest)
+        if model is not None:
+            _cache.move_to_end(digest)
+            _cache_stats["hits"] += 1
+            return model
+        _cache_stats["misses"] += 1
+
+    model = _build_model(code, digest)
+    if model.errors:
+        logger.debug(f"Pine 코드 파싱 경고 {len(model.errors)}건: {model.errors[:3]}")
+
+    with _cache_lock:
+        _cache[digest] = model
+        while len(_cache) > PINE_PARSE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return model
+
+
+def cache_info():
+    with _cache_lock:
+        return {"size": len(_cache), "max_size": PINE_PARSE_CACHE_SIZE, **_cache_stats}
+
+
+def replace_spans(code, replacements):
+    """(시작, 끝, 새 텍스트) 목록을 코드에 적용합니다. 위치는 모두 원본 code 기준입니다."""
+    result = code
+    last_start = len(code) + 1
+    for start, end, text in sorted(replacements, key=lambda item: item[0], reverse=True):
+        if end > last_start:
+            raise ValueError("겹치는 위치를 동시에 바꿀 수 없습니다.")
+        result = result[:start] + text + result[end:]
+        last_start = start
+    return result
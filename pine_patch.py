@@ -0,0 +1,221 @@
+# pine_patch.py
+import re
+import logging
+
+# 로깅 설정
+logger = logging.getLogger("pine_patch")
+
+FORMAT_SEARCH_REPLACE = "search_replace"
+FORMAT_UNIFIED_DIFF = "unified_diff"
+
+# 검색 블록 앞뒤의 변경되지 않는 문맥 줄을 최대 몇 줄까지 버리고 다시 찾을지 (GNU patch의 fuzz와 같은 의미)
+MAX_FUZZ = 2
+
+# 패치 모드 프롬프트의 응답 형식 안내 (전체 코드 대신 바꿀 부분만 받음)
+PATCH_INSTRUCTIONS = """4. 전체 코드를 다시 쓰지 말고, 바꿀 부분만 아래 형식의 검색/치환 블록으로 반환하세요.
+   - SEARCH 부분에는 원본 코드의 연속된 줄을 그대로 복사하고, 위치를 특정할 수 있도록 바꿀 줄의 앞뒤 1~2줄을 함께 넣으세요.
+   - 바꿀 곳이 여러 군데면 코드 순서대로 블록을 여러 개 쓰세요. 줄을 지울 때는 REPLACE 부분을 비워 두세요.
+   - 통합 diff(@@ -시작,줄수 +시작,줄수 @@ 형식)로 반환해도 됩니다.
+5. 변경 사항에는 설명 주석을 추가해주세요.
+
+<<<<<<< SEARCH
+rsiOversold = input(30, title="RSI 과매도 기준")
+=======
+rsiOversold = input(25, title="RSI 과매도 기준")  // 과매도 기준 완화
+>>>>>>> REPLACE
+
+검색/치환 블록:
+"""
+
+_SEARCH_MARKER = re.compile(r"^\s*<{5,}\s*SEARCH\s*$")
+_DIVIDER_MARKER = re.compile(r"^\s*={5,}\s*$")
+_REPLACE_MARKER = re.compile(r"^\s*>{5,}\s*REPLACE\s*$")
+_HUNK_HEADER = re.compile(r"^@@\s*-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s*@@")
+
+
+class PatchError(Exception):
+    """패치를 찾지 못했거나 원본 코드에 적용할 수 없을 때 발생합니다."""
+
+
+class PatchNotFound(PatchError):
+    """응답에 검색/치환 블록이나 diff가 없을 때 발생합니다."""
+
+
+class Edit:
+    """원본의 search 줄들을 replace 줄들로 바꾸는 편집 하나입니다. hint는 예상 위치(0부터 시작하는 줄 번호)입니다."""
+
+    def __init__(self, search, replace, hint=None):
+        self.search = search
+        self.replace = replace
+        self.hint = hint
+
+    def context(self):
+        """search와 replace에 공통으로 들어 있는 앞/뒤 문맥 줄 수를 반환합니다."""
+        head = 0
+        limit = min(len(self.search), len(self.replace))
+        while head < limit and _normalize(self.search[head]) == _normalize(self.replace[head]):
+            head += 1
+        tail = 0
+        while (tail < limit - head
+               and _normalize(self.search[-1 - tail]) == _normalize(self.replace[-1 - tail])):
+            tail += 1
+        return head, tail
+
+
+def _normalize(line):
+    """공백 차이를 무시하고 비교하도록 줄을 정규화합니다."""
+    return " ".join(line.split())
+
+
+def parse_search_replace(text):
+    """<<<<<<< SEARCH / ======= / >>>>>>> REPLACE 블록을 Edit 목록으로 읽습니다."""
+    edits = []
+    search = replace = None
+    for line in text.split("\n"):
+        if _SEARCH_MARKER.match(line):
+            search, replace = [], None
+        elif search is None:
+            continue
+        elif replace is None and _DIVIDER_MARKER.match(line):
+            replace = []
+        elif replace is not None and _REPLACE_MARKER.match(line):
+            edits.append(Edit(search, replace))
+            search = replace = None
+        elif replace is None:
+            search.append(line)
+        else:
+            replace.append(line)
+    if search is not None:
+        raise PatchError("닫히지 않은 검색/치환 블록이 있습니다.")
+    return edits
+
+
+def parse_unified_diff(text):
+    """
+    통합 diff의 hunk를 Edit 목록으로 읽습니다.
+    LLM이 쓴 diff는 줄 수가 틀린 경우가 많아 @@ 헤더의 줄 수는 무시하고 시작 줄만 위치 힌트로 씁니다.
+    """
+    edits = []
+    hunk = None
+    for line in text.split("\n"):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            hunk = Edit([], [], max(int(header.group(1)) - 1, 0))
+            edits.append(hunk)
+            continue
+        if hunk is None:
+            continue
+        if line.startswith("--- ") or line.startswith("+++ ") or line.startswith("```"):
+            hunk = None
+        elif line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        elif line.startswith("-"):
+            hunk.search.append(line[1:])
+        elif line.startswith("+"):
+            hunk.replace.append(line[1:])
+        elif line.startswith(" ") or not line:
+            hunk.search.append(line[1:])
+            hunk.replace.append(line[1:])
+        else:
+            hunk = None
+    for edit in edits:
+        # hunk 뒤에 붙은 빈 문맥 줄은 diff가 끝난 뒤의 빈 줄일 수 있으므로 버림
+        while edit.search and edit.replace and not edit.search[-1].strip() and not edit.replace[-1].strip():
+            edit.search.pop()
+            edit.replace.pop()
+    return [edit for edit in edits if edit.search != edit.replace]
+
+
+def parse_patch(text):
+    """응답에서 패치를 찾아 (형식, Edit 목록)을 반환합니다. 없으면 PatchError가 발생합니다."""
+    edits = parse_search_replace(text)
+    if edits:
+        return FORMAT_SEARCH_REPLACE, edits
+    edits = parse_unified_diff(text)
+    if edits:
+        return FORMAT_UNIFIED_DIFF, edits
+    raise PatchNotFound("응답에서 검색/치환 블록이나 diff를 찾을 수 없습니다.")
+
+
+def _matches(lines, search, compare):
+    size = len(search)
+    targets = [compare(line) for line in search]
+    return [start for start in range(len(lines) - size + 1)
+            if all(compare(lines[start + offset]) == target for offset, target in enumerate(targets))]
+
+
+def find_block(lines, search, hint=None):
+    """
+    lines에서 search 줄들이 시작하는 위치를 찾습니다. 정확히 일치하는 곳을 먼저 찾고,
+    없으면 줄 끝 공백, 그다음 모든 공백 차이를 무시합니다. 여러 곳이 맞으면 hint에 가장 가까운 곳을 고릅니다.
+    찾지 못하면 None, 일치 방식이 정확하지 않으면 (위치, True)를 반환합니다.
+    """
+    for fuzzy, compare in enumerate((lambda line: line, str.rstrip, _normalize)):
+        found = _matches(lines, search, compare)
+        if found:
+            if hint is None:
+                return found[0], bool(fuzzy)
+            return min(found, key=lambda start: abs(start - hint)), bool(fuzzy)
+    return None
+
+
+def _locate_edit(lines, edit, hint):
+    """문맥 줄을 최대 MAX_FUZZ줄까지 줄여 가며 edit의 위치를 찾습니다. (시작, 검색 줄, 바꿀 줄, fuzzy)를 반환합니다."""
+    head, tail = edit.context()
+    for fuzz in range(MAX_FUZZ + 1):
+        trim_head = min(fuzz, head)
+        trim_tail = min(fuzz, tail)
+        search = edit.search[trim_head:len(edit.search) - trim_tail]
+        replace = edit.replace[trim_head:len(edit.replace) - trim_tail]
+        if not search:
+            break
+        located = find_block(lines, search, None if hint is None else hint + trim_head)
+        if located is not None:
+            start, fuzzy = located
+            return start, search, replace, fuzzy or fuzz > 0
+        if trim_head == head and trim_tail == tail:
+            break
+    raise PatchError("원본 코드에서 다음 검색 블록을 찾을 수 없습니다:\n" + "\n".join(edit.search))
+
+
+def apply_edits(code, edits):
+    """
+    Edit 목록을 코드 순서대로 적용합니다. 이전 편집이 끝난 위치를 다음 편집의 위치 힌트로 쓰며,
+    diff의 줄 번호 힌트는 앞선 편집으로 늘거나 줄어든 줄 수만큼 보정합니다.
+    (적용된 코드, 정확히 일치하지 않아 느슨하게 찾은 편집 수)를 반환합니다.
+    """
+    lines = code.split("\n")
+    cursor = 0
+    offset = 0
+    fuzzy_edits = 0
+    for edit in edits:
+        if not edit.search:
+            # 문맥 없는 삽입은 diff의 줄 번호로만 위치를 정할 수 있음
+            if edit.hint is None:
+                raise PatchError("검색 블록이 비어 있어 위치를 정할 수 없습니다.")
+            start = min(edit.hint + offset, len(lines))
+            lines[start:start] = edit.replace
+            cursor = start + len(edit.replace)
+            offset += len(edit.replace)
+            continue
+        hint = edit.hint + offset if edit.hint is not None else cursor
+        start, search, replace, fuzzy = _locate_edit(lines, edit, hint)
+        lines[start:start + len(search)] = replace
+        cursor = start + len(replace)
+        offset += len(replace) - len(search)
+        fuzzy_edits += fuzzy
+    return "\n".join(lines), fuzzy_edits
+
+
+def apply_patch(code, text):
+    """
+    LLM 응답(text)의 패치를 code에 적용합니다.
+    (적용된 코드, {"format", "edits", "fuzzy_edits"})를 반환하며, 실패하면 PatchError가 발생합니다.
+    """
+    patch_format, edits = parse_patch(text)
+    patched, fuzzy_edits = apply_edits(code, edits)
+    if patched == code:
+        raise PatchError("패치를 적용해도 코드가 바뀌지 않습니다.")
+    logger.debug(f"패치 적용: {patch_format}, 편집 {len(edits)}개 (느슨한 일치 {fuzzy_edits}개)")
+    return patched, {"format": patch_format, "edits": len(edits), "fuzzy_edits": fuzzy_edits}
@@ -0,0 +1,234 @@
+# pine_rules.py
+import os
+import re
+import time
+import logging
+from functools import lru_cache
+
+import pine_parser
+
+# 로깅 설정
+logger = logging.getLogger("pine_rules")
+
+# 단순한 매개변수 변경 요청을 LLM 없이 규칙으로 처리할지 여부 (환경 변수로 조정 가능)
+PINE_RULES_ENABLED = os.getenv("PINE_RULES_ENABLED", "true") == "true"
+
+# 요청 문장과 input 선언(제목, 변수 이름)을 같은 개념으로 묶는 패턴
+_CONCEPT_PATTERNS = [(concept, re.compile(pattern, re.IGNORECASE)) for concept, pattern in (
+    ("rsi", r"rsi"),
+    ("oversold", r"과매도|oversold"),
+    ("overbought", r"과매수|overbought"),
+    ("take_profit", r"이익\s*실현|익절|목표\s*수익|take\s*profit|\btp\b"),
+    ("stop_loss", r"손절|stop\s*loss|\bsl\b"),
+    ("trailing", r"트레일링|trailing|trail"),
+    ("bollinger", r"볼린저|bollinger|\bbb"),
+    ("macd", r"macd"),
+    ("atr", r"atr"),
+    ("length", r"기간|길이|length|period|\blen\b"),
+    ("multiplier", r"배수|승수|multiplier|\bmult"),
+    ("fast", r"단기|빠른|fast"),
+    ("slow", r"장기|느린|slow"),
+    ("signal", r"시그널|signal"),
+    ("threshold", r"기준|임계|threshold|level"),
+)]
+# 기준/임계값 같은 일반 단어는 다른 개념이 없을 때만 대상 구분에 씀
+_WEAK_CONCEPTS = ("threshold",)
+
+# "28로", "5%에서 7%로", "2.5 으로"
+_VALUE_PATTERN = re.compile(
+    r"(?:(?P<previous>-?\d+(?:\.\d+)?)\s*%?\s*에서\s*)?(?P<value>-?\d+(?:\.\d+)?)\s*%?\s*(?:으로|로|=)(?![가-힣])"
+)
+_ENABLE_PATTERN = re.compile(r"(?:을|를|은|는)?\s*(?P<verb>비활성화|사용\s*(?:하지|안|중지|중단)|끄|꺼|해제|활성화|사용|켜|적용)")
+_DISABLE_VERBS = re.compile(r"^(?:비활성화|사용\s*(?:하지|안|중지|중단)|끄|꺼|해제)")
+# 문장을 요청 단위로 나누는 구분자 (쉼표, 마침표, 접속 표현, "낮추고 " 같은 연결 어미)
+_CLAUSE_SPLIT = re.compile(r"[,;\n]|(?<!\d)\.(?!\d)|그리고|또한|(?<=[가-힣])(?:고|며|하여|해서)\s+|\s및\s")
+# 값 뒤에 남아도 되는 말 (동사와 어미)
+_VERB_TAIL = re.compile(
+    r"^\s*(?:낮추|낮춰|높이|높여|줄이|줄여|늘리|늘려|올리|올려|내리|내려|바꾸|바꿔|변경|조정|설정|수정|완화|강화|맞추|맞춰|하)"
+    r"[가-힣]*\s*[.!]?\s*$"
+)
+_CAMEL_SPLIT = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|_")
+
+_applied = 0
+_skipped = 0
+
+
+class RuleChange:
+    """규칙으로 바꾼 input 기본값 하나입니다."""
+
+    __slots__ = ("name", "title", "old", "new")
+
+    def __init__(self, name, title, old, new):
+        self.name = name
+        self.title = title
+        self.old = old
+        self.new = new
+
+    def to_dict(self):
+        return {"name": self.name, "title": self.title, "old": self.old, "new": self.new}
+
+
+@lru_cache(maxsize=1024)
+def _concepts(text):
+    found = frozenset(concept for concept, pattern in _CONCEPT_PATTERNS if pattern.search(text))
+    strong = found.difference(_WEAK_CONCEPTS)
+    return strong or found
+
+
+def _input_concepts(decl):
+    title = decl.title.value if decl.title is not None and isinstance(decl.title.value, str) else ""
+    return _concepts(title + " " + " ".join(_CAMEL_SPLIT.split(decl.name)))
+
+
+def _compact(text):
+    return re.sub(r"\s+", "", text).lower()
+
+
+def extract_targets(text):
+    """
+    요청 문장에서 (대상 표현, 새 값, 이전 값) 목록을 뽑습니다. 새 값은 숫자(float) 또는 bool입니다.
+    대상을 찾지 못한 요청 단위가 하나라도 있으면 None을 반환합니다 (규칙으로 처리할 수 없는 요청).
+    """
+    targets = []
+    for clause in _CLAUSE_SPLIT.split(text or ""):
+        clause = clause.strip()
+        if not clause:
+            continue
+        match = _VALUE_PATTERN.search(clause)
+        if match is not None:
+            if not _VERB_TAIL.match(clause[match.end():]) and clause[match.end():].strip():
+                return None
+            previous = match.group("previous")
+            targets.append((clause[:match.start()], float(match.group("value")),
+                            float(previous) if previous is not None else None))
+            continue
+        # "볼린저 밴드 사용을 해제"처럼 앞에도 동사가 나올 수 있으므로 마지막 동사를 봄
+        for match in reversed(list(_ENABLE_PATTERN.finditer(clause))):
+            tail = clause[match.end():]
+            if not tail.strip() or _VERB_TAIL.match(tail):
+                enable = not _DISABLE_VERBS.match(match.group("verb"))
+                targets.append((clause[:match.start()], enable, None))
+                break
+        else:
+            return None
+    return targets or None
+
+
+def resolve_input(model, subject):
+    """대상 표현에 해당하는 input 선언을 찾습니다. 찾지 못하거나 후보가 여럿이면 None을 반환합니다."""
+    compact_subject = _compact(subject)
+    # 제목이나 변수 이름을 그대로 쓴 경우 (가장 긴 것)
+    named = []
+    for decl in model.inputs.values():
+        title = decl.title.value if decl.title is not None and isinstance(decl.title.value, str) else None
+        for label in (title, decl.name):
+            if label and _compact(label) in compact_subject:
+                named.append((len(label), decl))
+    if named:
+        named.sort(key=lambda item: item[0], reverse=True)
+        if len(named) == 1 or named[0][0] > named[1][0] or named[0][1] is named[1][1]:
+            return named[0][1]
+
+    wanted = _concepts(subject)
+    if not wanted:
+        return None
+    scored = []
+    for decl in model.inputs.values():
+        concepts = _input_concepts(decl)
+        overlap = len(wanted & concepts)
+        if overlap:
+            scored.append((overlap, -len(concepts - wanted), decl))
+    if not scored:
+        return None
+    scored.sort(key=lambda item: item[:2], reverse=True)
+    if len(scored) > 1 and scored[0][:2] == scored[1][:2]:
+        return None
+    best = scored[0]
+    # 요청에 나온 개념을 모두 가진 선언만 인정 (예: "볼린저 기간"이 rsiLength로 가지 않도록)
+    if best[0] < len(wanted):
+        return None
+    return best[2]
+
+
+def format_input_value(decl, value):
+    """input 선언의 타입에 맞는 기본값 텍스트를 만듭니다. 맞지 않거나 범위를 벗어나면 None을 반환합니다."""
+    current = decl.default.value
+    if isinstance(current, bool) or decl.function == "input.bool":
+        return ("true" if value else "false") if isinstance(value, bool) else None
+    if isinstance(value, bool) or not decl.default.is_literal or not isinstance(current, (int, float)):
+        return None
+    for keyword, check in (("minval", lambda bound: value < bound), ("maxval", lambda bound: value > bound)):
+        bound = decl.call.kwargs.get(keyword)
+        if bound is not None and isinstance(bound.value, (int, float)) and check(bound.value):
+            return None
+    if isinstance(current, int) and decl.function != "input.float":
+        return str(int(value)) if value == int(value) else None
+    return repr(float(value))
+
+
+def apply_rules(code, text):
+    """
+    요청 문장(text)의 매개변수 변경을 코드의 input 기본값에 한 번에 적용합니다.
+    모든 요청을 규칙으로 처리할 수 있으면 (수정된 코드, RuleChange 목록)을, 아니면 None을 반환합니다.
+    """
+    targets = extract_targets(text)
+    if targets is None:
+        return None
+    model = pine_parser.parse(code)
+    replacements = []
+    changes = []
+    seen = set()
+    for subject, value, previous in targets:
+        decl = resolve_input(model, subject)
+        if decl is None or decl.default is None or decl.name in seen:
+            logger.debug(f"규칙으로 처리할 수 없는 요청: {subject!r}")
+            return None
+        if previous is not None and isinstance(decl.default.value, (int, float)) and decl.default.value != previous:
+            logger.debug(f"요청의 이전 값이 코드와 다릅니다: {decl.name} = {decl.default.text}, 요청 {previous}")
+            return None
+        new_text = format_input_value(decl, value)
+        if new_text is None:
+            logger.debug(f"{decl.name}에 값을 적용할 수 없습니다: {value}")
+            return None
+        seen.add(decl.name)
+        if new_text == decl.default.text:
+            continue
+        replacements.append((decl.default.start, decl.default.end, new_text))
+        title = decl.title.value if decl.title is not None else None
+        changes.append(RuleChange(decl.name, title, decl.default.text, new_text))
+    if not replacements:
+        return None
+    return pine_parser.replace_spans(code, replacements), changes
+
+
+def try_rules(code, webhook_data, report=None):
+    """
+    웹훅의 suggested_improvements를 규칙으로 처리해 봅니다. 처리하면 수정된 코드를,
+    아니면 None을 반환합니다. report(dict)를 주면 report["rules"]에 결과와 걸린 시간을 기록합니다.
+    """
+    global _applied, _skipped
+    if not PINE_RULES_ENABLED:
+        return None
+    started = time.perf_counter()
+    result = apply_rules(code, webhook_data.get("suggested_improvements", ""))
+    elapsed_us = round((time.perf_counter() - started) * 1_000_000)
+    if result is None:
+        _skipped += 1
+    else:
+        _applied += 1
+    if report is not None:
+        report["rules"] = {
+            "applied": result is not None,
+            "changes": [change.to_dict() for change in result[1]] if result else [],
+            "elapsed_us": elapsed_us
+        }
+    if result is None:
+        return None
+    modified_code, changes = result
+    logger.info(f"규칙으로 전략 코드 수정 ({elapsed_us}us): "
+                + ", ".join(f"{change.name} {change.old} -> {change.new}" for change in changes))
+    return modified_code
+
+
+def stats():
+    return {"enabled": PINE_RULES_ENABLED, "applied": _applied, "skipped": _skipped}
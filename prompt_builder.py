@@ -0,0 +1,236 @@
+# prompt_builder.py
+import os
+import math
+import logging
+
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken이 없으면 문자 수 기반 추정치로 토큰을 셈
+    tiktoken = None
+
+# 로깅 설정
+logger = logging.getLogger("prompt_builder")
+
+# 프롬프트 크기 설정 (환경 변수로 조정 가능)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_MAX_RAW_TRADES = int(os.getenv("PROMPT_MAX_RAW_TRADES", "20"))
+# 거래 수가 이 값 이하면 요약 없이 모든 거래를 그대로 나열
+PROMPT_SUMMARY_MIN_TRADES = int(os.getenv("PROMPT_SUMMARY_MIN_TRADES", "10"))
+
+# 메시지마다 역할/구분자에 쓰이는 토큰 (OpenAI 채팅 형식 기준)
+_MESSAGE_OVERHEAD_TOKENS = 4
+_REPLY_PRIMING_TOKENS = 3
+
+# 승/패 판정에 쓰는 result 문자열 (profit_pct가 숫자가 아닐 때)
+_WIN_WORDS = ("win", "profit", "tp", "승", "익절")
+_LOSS_WORDS = ("loss", "lose", "sl", "패", "손절")
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken 인코딩 로드 실패, 추정치를 사용합니다: {str(e)}")
+            return None
+    return _encoding
+
+
+def token_counter_name():
+    return "tiktoken" if _get_encoding() is not None else "estimate"
+
+
+def count_tokens(text):
+    """
+    텍스트의 토큰 수를 셉니다. tiktoken이 있으면 정확히 세고, 없으면
+    ASCII 4자당 1토큰, 한글 등 그 밖의 문자는 1자당 1토큰으로 추정합니다.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def count_message_tokens(messages):
+    """채팅 메시지 목록 전체(역할/구분자 포함)의 프롬프트 토큰 수를 셉니다."""
+    total = _REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += _MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+    return total
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace("%", "").strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _outcome(result, pnl):
+    """승이면 1, 패면 -1, 알 수 없으면 0을 반환합니다. 수익률 부호를 우선합니다."""
+    if not np.isnan(pnl) and pnl != 0:
+        return 1 if pnl > 0 else -1
+    text = str(result).lower()
+    if any(word in text for word in _WIN_WORDS):
+        return 1
+    if any(word in text for word in _LOSS_WORDS):
+        return -1
+    return 0
+
+
+def _trade_arrays(trades):
+    directions = np.array([str(trade.get("direction", "불명")) for trade in trades], dtype=object)
+    pnl = np.array([_to_float(trade.get("profit_pct")) for trade in trades], dtype=float)
+    outcomes = np.array([_outcome(trade.get("result"), value) for trade, value in zip(trades, pnl)], dtype=int)
+    return directions, pnl, outcomes
+
+
+def _max_streaks(outcomes):
+    """연속된 승(1)/패(-1) 구간 길이를 벡터 연산으로 구해 (최대 연승, 최대 연패, 현재 연속 기록)을 반환합니다."""
+    if outcomes.size == 0:
+        return 0, 0, (0, 0)
+    # 값이 바뀌는 위치로 구간을 나눔
+    boundaries = np.flatnonzero(np.diff(outcomes)) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [outcomes.size])))
+    values = outcomes[starts]
+    win_runs = lengths[values == 1]
+    loss_runs = lengths[values == -1]
+    return (
+        int(win_runs.max()) if win_runs.size else 0,
+        int(loss_runs.max()) if loss_runs.size else 0,
+        (int(values[-1]), int(lengths[-1]))
+    )
+
+
+def _pnl_stats(pnl):
+    valid = pnl[~np.isnan(pnl)]
+    if valid.size == 0:
+        return None
+    p10, p50, p90 = np.percentile(valid, [10, 50, 90])
+    return {
+        "mean": float(valid.mean()),
+        "p10": float(p10),
+        "p50": float(p50),
+        "p90": float(p90)
+    }
+
+
+def summarize_trades(trades):
+    """
+    거래 목록을 승/패 수, 방향별 평균/백분위 수익률, 연승/연패 같은 집계값으로 요약합니다.
+    """
+    directions, pnl, outcomes = _trade_arrays(trades)
+    wins = int(np.count_nonzero(outcomes == 1))
+    losses = int(np.count_nonzero(outcomes == -1))
+    by_direction = {}
+    for direction in dict.fromkeys(directions.tolist()):
+        mask = directions == direction
+        direction_outcomes = outcomes[mask]
+        decided = np.count_nonzero(direction_outcomes)
+        by_direction[direction] = {
+            "count": int(mask.sum()),
+            "win_rate": float(np.count_nonzero(direction_outcomes == 1) / decided * 100) if decided else None,
+            "pnl": _pnl_stats(pnl[mask])
+        }
+    max_win_streak, max_loss_streak, current = _max_streaks(outcomes[outcomes != 0])
+    return {
+        "count": len(trades),
+        "wins": wins,
+        "losses": losses,
+        "win_rate": wins / (wins + losses) * 100 if wins + losses else None,
+        "pnl": _pnl_stats(pnl),
+        "by_direction": by_direction,
+        "max_win_streak": max_win_streak,
+        "max_loss_streak": max_loss_streak,
+        "current_streak": current
+    }
+
+
+def select_trades(trades, limit):
+    """
+    원문 그대로 보여줄 거래를 고릅니다. 최근 거래 절반, 나머지는 손익 절댓값이 큰 거래이며
+    원래 순서(목록의 뒤쪽이 최근)를 유지한 인덱스 배열을 반환합니다.
+    """
+    count = len(trades)
+    if limit <= 0 or count == 0:
+        return np.array([], dtype=int)
+    if count <= limit:
+        return np.arange(count)
+    recent = max(1, limit // 2)
+    chosen = np.arange(count - recent, count)
+    _, pnl, _ = _trade_arrays(trades[:count - recent])
+    magnitude = np.nan_to_num(np.abs(pnl), nan=-1.0)
+    extremes = np.argsort(-magnitude, kind="stable")[:limit - recent]
+    return np.sort(np.concatenate((extremes, chosen)))
+
+
+def _format_pct(value):
+    return "불명" if value is None else f"{value:.2f}%"
+
+
+def _format_pnl(stats):
+    if stats is None:
+        return "수익률 정보 없음"
+    return (f"평균 수익률 {stats['mean']:.2f}%, 수익률 p10/p50/p90: "
+            f"{stats['p10']:.2f}% / {stats['p50']:.2f}% / {stats['p90']:.2f}%")
+
+
+def format_trade(index, trade):
+    return (f"- 거래 {index + 1}: {trade.get('direction', '불명')}, 결과: {trade.get('result', '불명')}, "
+            f"수익률: {trade.get('profit_pct', '불명')}%\n")
+
+
+def format_summary(summary):
+    lines = [f"최근 {summary['count']}개 거래 통계:"]
+    lines.append(f"- 승/패: {summary['wins']}승 {summary['losses']}패 (승률 {_format_pct(summary['win_rate'])}), {_format_pnl(summary['pnl'])}")
+    for direction, stats in summary["by_direction"].items():
+        lines.append(f"- {direction}: {stats['count']}건, 승률 {_format_pct(stats['win_rate'])}, {_format_pnl(stats['pnl'])}")
+    outcome, length = summary["current_streak"]
+    current = f"{length}연승" if outcome == 1 else f"{length}연패" if outcome == -1 else "없음"
+    lines.append(f"- 최대 연승 {summary['max_win_streak']}회, 최대 연패 {summary['max_loss_streak']}회, 현재 {current}")
+    return "\n".join(lines) + "\n"
+
+
+def build_trades_section(trades, token_budget, max_raw_trades=PROMPT_MAX_RAW_TRADES):
+    """
+    프롬프트의 거래 내역 부분을 token_budget 안에서 만듭니다.
+
+    거래가 적으면 기존처럼 모두 나열하고, 많으면 집계 요약과 주요 거래 일부만 넣습니다.
+    예산을 넘으면 나열하는 거래 수를 절반씩 줄입니다. (텍스트, 정보 dict)를 반환합니다.
+    """
+    info = {"trades_total": len(trades), "trades_included": 0, "trades_summarized": False}
+    if not trades:
+        return "", info
+
+    if len(trades) <= PROMPT_SUMMARY_MIN_TRADES:
+        text = f"최근 {len(trades)}개 거래 요약:\n" + "".join(format_trade(i, trade) for i, trade in enumerate(trades))
+        if count_tokens(text) <= token_budget:
+            info["trades_included"] = len(trades)
+            return text, info
+
+    info["trades_summarized"] = True
+    summary_text = format_summary(summarize_trades(trades))
+    limit = min(max_raw_trades, len(trades))
+    while True:
+        indexes = select_trades(trades, limit)
+        text = summary_text
+        if indexes.size:
+            text += f"주요 거래 {indexes.size}개 (최근 거래와 손익이 큰 거래):\n"
+            text += "".join(format_trade(int(i), trades[int(i)]) for i in indexes)
+        if count_tokens(text) <= token_budget or limit == 0:
+            break
+        limit //= 2
+    if count_tokens(text) > token_budget:
+        # 요약만으로도 넘치면 거래 내역을 넣지 않음
+        logger.warning(f"거래 요약이 토큰 예산({token_budget})을 넘어 프롬프트에서 제외합니다.")
+        info["trades_summarized"] = False
+        return "", info
+    info["trades_included"] = int(indexes.size)
+    return text, info
@@ -0,0 +1,25 @@
+# sse.py
+from fastapi.responses import StreamingResponse
+
+import fast_json
+
+
+def format_event(event, data):
+    """
+    Server-Sent Events 이벤트 하나를 만듭니다.
+    data는 JSON 한 줄로 직렬화하므로 코드의 줄바꿈이 이벤트 경계와 섞이지 않습니다.
+    """
+    return f"event: {event}\ndata: {fast_json.dumps_str(data)}\n\n"
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    text/event-stream 응답입니다. 이벤트가 모이지 않고 바로 전달되도록 캐시와 프록시 버퍼링을 끕니다.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content, status_code=200, headers=None, **kwargs):
+        stream_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        stream_headers.update(headers or {})
+        super().__init__(content, status_code=status_code, headers=stream_headers, **kwargs)
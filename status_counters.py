@@ -0,0 +1,214 @@
+# status_counters.py
+import os
+import time
+import atexit
+import logging
+import threading
+import traceback
+
+import fast_json
+from storage_utils import atomic_write, file_lock
+
+# 로깅 설정
+logger = logging.getLogger("status_counters")
+
+# 상태 카운터 설정 (환경 변수로 조정 가능)
+_STORAGE_ROOT = os.path.dirname(os.getenv("LOG_DIR", "/tmp/storage/webhooks"))
+STATUS_COUNTERS_FILE = os.getenv("STATUS_COUNTERS_FILE", os.path.join(_STORAGE_ROOT, "status_counters.json"))
+STATUS_COUNTERS_FLUSH_INTERVAL = float(os.getenv("STATUS_COUNTERS_FLUSH_INTERVAL", "30"))
+
+COUNTER_NAMES = ("webhooks", "strategies", "modifications")
+
+
+def _newer_webhook(a, b):
+    """두 최근 웹훅 정보 중 더 최근 것을 반환합니다."""
+    if not a:
+        return b
+    if not b:
+        return a
+    key_a = (a.get("timestamp") or "", a.get("id") or "")
+    key_b = (b.get("timestamp") or "", b.get("id") or "")
+    return b if key_b >= key_a else a
+
+
+class StatusCounters:
+    """
+    /status에 필요한 카운트와 최근 웹훅 정보를 메모리에 유지합니다.
+
+    쓰기 경로(웹훅 수신, 수정 코드 저장)가 값을 직접 갱신하고, 값은 주기적으로 파일에 저장됩니다.
+    시작할 때는 저장된 값을 먼저 불러온 뒤 백그라운드 스레드가 디렉토리를 한 번 스캔해 맞춥니다.
+    스캔 중에 들어온 갱신은 키(웹훅 ID, 파일 이름)와 함께 따로 모아 두었다가, 스캔이 이미 센 것을 빼고
+    스캔 결과에 더합니다.
+
+    여러 프로세스가 같은 파일을 공유할 수 있도록, 저장할 때는 잠금 아래에서 파일의 값에
+    마지막 저장 이후 이 프로세스에서 늘어난 만큼(delta)만 더하고 합친 값을 다시 읽어 옵니다.
+    """
+
+    def __init__(self, state_path=STATUS_COUNTERS_FILE, flush_interval=STATUS_COUNTERS_FLUSH_INTERVAL):
+        self.state_path = state_path
+        self.flush_interval = flush_interval
+        self.counts = {name: 0 for name in COUNTER_NAMES}
+        # 파일과 마지막으로 맞춘 시점의 값 (counts - _base가 아직 저장하지 않은 delta)
+        self._base = dict(self.counts)
+        self._absolute = False
+        self.latest_webhook = None
+        self.reconciled = False
+        self.last_flush = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._scan_deltas = None
+        self._started = False
+        self._stop = threading.Event()
+        self._load()
+
+    def _read_state(self):
+        try:
+            return fast_json.load_file(self.state_path)
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        try:
+            state = self._read_state()
+            if state is None:
+                return
+            for name in COUNTER_NAMES:
+                self.counts[name] = int(state.get("counts", {}).get(name, 0))
+            self._base = dict(self.counts)
+            self.latest_webhook = state.get("latest_webhook")
+            logger.debug(f"저장된 상태 카운터 로드: {self.counts}")
+        except Exception as e:
+            logger.error(f"상태 카운터 파일 로드 중 오류: {str(e)}")
+
+    def _add(self, name, key):
+        """_lock을 잡은 상태에서 호출합니다. key는 스캔 결과에 이미 포함되었는지 판단할 때 씁니다."""
+        self.counts[name] += 1
+        if self._scan_deltas is not None:
+            self._scan_deltas[name].append(key)
+        self._dirty = True
+
+    def incr(self, name, amount=1, key=None):
+        with self._lock:
+            for _ in range(amount):
+                self._add(name, key)
+
+    def record_webhook(self, webhook_id, timestamp):
+        """웹훅 하나가 저장되었음을 기록합니다."""
+        with self._lock:
+            self._add("webhooks", webhook_id)
+            self.latest_webhook = {"id": webhook_id, "timestamp": timestamp}
+
+    def record_modification(self, modified_file=None, metadata_file=None):
+        """수정 코드(.pine)와 메타데이터 파일이 하나씩 저장되었음을 기록합니다."""
+        with self._lock:
+            self._add("strategies", os.path.basename(modified_file) if modified_file else None)
+            self._add("modifications", os.path.basename(metadata_file) if metadata_file else None)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counts": dict(self.counts),
+                "latest_webhook": self.latest_webhook,
+                "reconciled": self.reconciled
+            }
+
+    def start(self, scan):
+        """
+        백그라운드 스레드를 시작합니다. scan은 실제 저장소를 세어
+        {"counts": {...}, "latest_webhook": ..., "includes": 함수} 형식으로 반환하는 함수입니다.
+        includes(name, key)는 스캔 중에 기록된 갱신(웹훅 ID, 파일 이름)이 이미 센 값에 포함되었는지 알려주며,
+        없거나 키가 없는 갱신은 포함되지 않은 것으로 보고 더합니다.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        thread = threading.Thread(target=self._run, args=(scan,), name="status-counters", daemon=True)
+        thread.start()
+
+    def _run(self, scan):
+        self.reconcile(scan)
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def reconcile(self, scan):
+        """디렉토리 스캔 결과로 카운터를 맞춥니다."""
+        with self._lock:
+            self._scan_deltas = {name: [] for name in COUNTER_NAMES}
+        try:
+            result = scan()
+        except Exception as e:
+            logger.error(f"상태 카운터 스캔 중 오류: {str(e)}")
+            logger.error(traceback.format_exc())
+            with self._lock:
+                self._scan_deltas = None
+            return
+
+        includes = result.get("includes") or (lambda name, key: False)
+        with self._lock:
+            # 스캔 중에 기록된 갱신 중 스캔이 이미 센 것은 빼고 더함
+            deltas = {name: sum(1 for key in self._scan_deltas[name] if key is None or not includes(name, key))
+                      for name in COUNTER_NAMES}
+            for name in COUNTER_NAMES:
+                self.counts[name] = result["counts"].get(name, 0) + deltas[name]
+            # 스캔 이후에 새 웹훅이 들어왔으면 그 정보가 더 최신이므로 유지
+            if deltas["webhooks"] == 0:
+                self.latest_webhook = result.get("latest_webhook")
+            self._scan_deltas = None
+            self.reconciled = True
+            # 스캔 결과는 delta가 아니라 전체 값이므로 파일 값을 그대로 덮어씀
+            self._absolute = True
+            self._dirty = True
+        logger.debug(f"상태 카운터 스캔 완료: {self.counts}")
+        self.flush()
+
+    def flush(self):
+        """
+        잠금 파일을 잡고 저장된 값에 이 프로세스의 delta를 더해 저장한 뒤,
+        다른 프로세스의 갱신이 반영된 값으로 메모리 카운터를 맞춥니다.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+            base = dict(self._base)
+            latest_webhook = self.latest_webhook
+            absolute = self._absolute
+            dirty = self._dirty
+        try:
+            with file_lock(self.state_path + ".lock", exclusive=dirty):
+                state = self._read_state() or {}
+                saved_counts = state.get("counts", {})
+                if absolute:
+                    merged = counts
+                else:
+                    merged = {name: int(saved_counts.get(name, 0)) + counts[name] - base[name] for name in COUNTER_NAMES}
+                merged_latest = _newer_webhook(state.get("latest_webhook"), latest_webhook)
+                if dirty:
+                    atomic_write(self.state_path, fast_json.dumps({
+                        "counts": merged,
+                        "latest_webhook": merged_latest,
+                        "saved_at": time.time()
+                    }))
+                    self.last_flush = time.time()
+        except Exception as e:
+            logger.error(f"상태 카운터 저장 중 오류: {str(e)}")
+            return
+
+        with self._lock:
+            # 저장하는 동안 늘어난 값은 다음 저장의 delta로 남김
+            for name in COUNTER_NAMES:
+                self.counts[name] = merged[name] + self.counts[name] - counts[name]
+            self._base = merged
+            self.latest_webhook = _newer_webhook(self.latest_webhook, merged_latest)
+            if absolute:
+                self._absolute = False
+            if self.counts == merged and self.latest_webhook == merged_latest:
+                self._dirty = False
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+# 프로세스 전체에서 공유하는 카운터
+counters = StatusCounters()
+atexit.register(counters.flush)
@@ -0,0 +1,150 @@
+# storage_utils.py
+import os
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 등 fcntl이 없는 환경에서는 프로세스 간 잠금 없이 동작
+    fcntl = None
+
+# 로깅 설정
+logger = logging.getLogger("storage_utils")
+
+# ULID 인코딩에 쓰는 Crockford Base32 문자
+_ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ULID_RANDOM_BITS = 80
+_ULID_RANDOM_MAX = (1 << _ULID_RANDOM_BITS) - 1
+
+_ulid_lock = threading.Lock()
+_last_ulid_ms = 0
+_last_ulid_random = 0
+
+
+def _encode_ulid(ms, randomness):
+    value = (ms << _ULID_RANDOM_BITS) | randomness
+    chars = []
+    for _ in range(26):
+        chars.append(_ULID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def _decode_ulid(ulid):
+    value = 0
+    for char in ulid.upper():
+        value = (value << 5) | _ULID_ALPHABET.index(char)
+    return value >> _ULID_RANDOM_BITS, value & _ULID_RANDOM_MAX
+
+
+def new_ulid(after=None):
+    """
+    시간순으로 정렬되는 ULID(26자)를 발급합니다.
+
+    앞 48비트는 밀리초 시각, 뒤 80비트는 난수입니다. 같은 프로세스에서 같은 밀리초에
+    발급하면 난수 부분을 1씩 늘려 단조 증가를 보장하고, after를 주면 그보다 큰 ID를 반환합니다.
+    여러 프로세스가 동시에 발급해도 난수 부분 덕분에 충돌하지 않습니다.
+    """
+    global _last_ulid_ms, _last_ulid_random
+    with _ulid_lock:
+        ms = int(time.time() * 1000)
+        floor_ms, floor_random = _last_ulid_ms, _last_ulid_random
+        if after:
+            after_ms, after_random = _decode_ulid(after)
+            if (after_ms, after_random) > (floor_ms, floor_random):
+                floor_ms, floor_random = after_ms, after_random
+
+        if ms > floor_ms:
+            randomness = int.from_bytes(os.urandom(10), "big")
+        else:
+            ms = floor_ms
+            randomness = floor_random + 1
+            if randomness > _ULID_RANDOM_MAX:
+                ms += 1
+                randomness = 0
+        _last_ulid_ms, _last_ulid_random = ms, randomness
+        return _encode_ulid(ms, randomness)
+
+
+def ulid_time(ulid):
+    """ULID에 들어 있는 생성 시각(epoch 초)을 반환합니다. ULID가 아니면 None을 반환합니다."""
+    try:
+        if len(ulid) != 26:
+            return None
+        return _decode_ulid(ulid)[0] / 1000.0
+    except (TypeError, ValueError):
+        return None
+
+
+def atomic_write(path, data, fsync=False):
+    """
+    같은 디렉토리의 임시 파일에 쓴 뒤 rename으로 교체합니다.
+    읽는 쪽은 이전 내용이나 새 내용 중 하나만 보게 되며, 임시 파일 이름이
+    프로세스/호출마다 달라 동시에 써도 서로 덮어쓰지 않습니다.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    mode = "wb" if isinstance(data, bytes) else "w"
+    try:
+        with open(tmp_path, mode) as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(lock_path, exclusive=True):
+    """
+    lock_path 파일에 flock을 걸어 여러 프로세스(uvicorn --workers N) 사이의 접근을 직렬화합니다.
+    exclusive=False면 공유 잠금으로 읽기끼리는 동시에 진행됩니다.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def read_locked(path, default=None):
+    """
+    다른 프로세스가 교체 중인 파일을 공유 잠금 아래에서 읽습니다.
+    파일이 없고 default가 주어지면 배타 잠금 아래에서 default로 만든 뒤 반환합니다.
+    반환값은 (내용, 새로 만들었는지 여부)입니다.
+    """
+    lock_path = path + ".lock"
+    with file_lock(lock_path, exclusive=False):
+        try:
+            with open(path, "r") as f:
+                return f.read(), False
+        except FileNotFoundError:
+            if default is None:
+                raise
+    with file_lock(lock_path):
+        # 잠금을 기다리는 동안 다른 프로세스가 만들었을 수 있음
+        try:
+            with open(path, "r") as f:
+                return f.read(), False
+        except FileNotFoundError:
+            atomic_write(path, default)
+            return default, True
+
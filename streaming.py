@@ -0,0 +1,891 @@
+# streaming.py
+"""
+새 봉이 들어올 때마다 전략의 진입/청산 조건을 한 봉씩 계산하는 스트리밍 엔진입니다.
+
+backtester는 전체 봉 배열을 한 번에 계산하지만, 실시간으로는 봉 하나가 추가될 때마다 전체를 다시 계산할 필요가
+없습니다. 여기서는 backtester가 컴파일한 식 트리를 봉 단위 스칼라로 계산하고, rsi/ema/sma/crossover 같은
+지표는 직전 값만 들고 있는 작은 상태 객체(_SMA, _Seeded, _RSI, _Cross ...)로 갱신하므로 봉 하나를 처리하는
+시간과 메모리는 누적 봉 수와 관계없이 일정합니다. 계산 결과와 체결 규칙은 backtester.run_backtest와 같으며
+tools/replay_bars.py --verify로 거래 단위로 비교할 수 있습니다.
+
+StreamRegistry는 (티커, 타임프레임, 전략 파일)별 엔진을 보관하고, 처음 만들 때나 전략 코드가 바뀌었을 때
+봉 저장소의 최근 봉으로 상태를 채운 뒤(워밍업) 새 봉부터 신호를 반환합니다.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import backtester
+import pine_parser
+from backtester import BacktestError, UnsupportedConstruct
+
+# 로깅 설정
+logger = logging.getLogger("streaming")
+
+# 엔진을 새로 만들 때 상태를 채우는 데 쓸 저장된 봉 수 (환경 변수로 조정 가능)
+STREAM_WARMUP_BARS = int(os.getenv("STREAM_WARMUP_BARS", "5000"))
+# 메모리에 유지할 엔진 수 (가장 오래 쓰지 않은 엔진부터 버림)
+STREAM_MAX_STREAMS = int(os.getenv("STREAM_MAX_STREAMS", "32"))
+
+NA = float("nan")
+
+# 봉 튜플의 열 순서 (bar_store.COLUMNS와 같음)
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume")
+_FIELD_INDEX = {name: index for index, name in enumerate(BAR_FIELDS)}
+
+# 봉마다 상태를 갱신하는 함수 (분기에서 건너뛰지 않도록 항상 계산함)
+_STATEFUL_FUNCTIONS = frozenset(("rsi", "sma", "ema", "rma", "stdev", "highest", "lowest",
+                                 "crossover", "crossunder", "cross", "change"))
+_POSITION_PRICE = backtester.POSITION_PRICE
+
+
+def _is_na(value):
+    return value is None or value != value
+
+
+def _to_float(value):
+    if value is None:
+        return NA
+    return float(value)
+
+
+def _truth(value):
+    """Pine 조건값을 bool로 바꿉니다. na와 0은 거짓입니다."""
+    return bool(value) if value is not None and value == value else False
+
+
+# --- 지표 상태 객체 (봉 하나마다 update를 한 번 호출) ---
+
+class _SMA:
+    """단순 이동 평균입니다. 최근 length개 값의 합과 na 개수를 유지하고, length번마다 합을 다시 계산해 오차 누적을 막습니다."""
+
+    __slots__ = ("length", "ring", "position", "count", "total", "missing", "window")
+
+    def __init__(self, length):
+        self.length = length
+        self.ring = [0.0] * length
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.missing = 0
+        self.window = [NA] * length
+
+    def update(self, value):
+        length = self.length
+        if length <= 0:
+            return NA
+        position = self.position
+        invalid = value != value
+        if self.count >= length:
+            self.total -= self.ring[position]
+            if self.window[position] != self.window[position]:
+                self.missing -= 1
+        stored = 0.0 if invalid else value
+        self.ring[position] = stored
+        self.window[position] = value
+        self.total += stored
+        self.missing += invalid
+        self.count += 1
+        position += 1
+        if position == length:
+            position = 0
+            self.total = math.fsum(self.ring)
+        self.position = position
+        if self.count < length or self.missing:
+            return NA
+        return self.total / length
+
+
+class _Stdev:
+    """모집단 표준편차입니다. 평균은 _SMA로 구하고, 편차는 최근 length개 값에 대해 계산합니다."""
+
+    __slots__ = ("average",)
+
+    def __init__(self, length):
+        self.average = _SMA(length)
+
+    def update(self, value):
+        average = self.average
+        mean = average.update(value)
+        if mean != mean:
+            return NA
+        total = 0.0
+        for item in average.window:
+            deviation = item - mean
+            if abs(deviation) <= 1e-10:
+                deviation = 0.0
+            total += deviation * deviation
+        return math.sqrt(total / average.length)
+
+
+class _Seeded:
+    """
+    length개 값의 sma로 시작해 alpha로 지수 평활합니다 (rma/ema). indicators의 rma/ema와 같이 중간에 na가 오면
+    na를 이어 가다가 최근 length개 값이 모두 있는 봉의 sma로 다시 시작합니다.
+    """
+
+    __slots__ = ("alpha", "average", "value")
+
+    def __init__(self, length, alpha):
+        self.alpha = alpha
+        # 다시 시작할 때 쓸 sma는 평활 중에도 계속 갱신함
+        self.average = _SMA(length)
+        self.value = NA
+
+    def update(self, value):
+        seed = self.average.update(value)
+        previous = self.value
+        if previous != previous:
+            self.value = seed
+        else:
+            self.value = self.alpha * value + (1.0 - self.alpha) * previous
+        return self.value
+
+
+class _RSI:
+    """상승/하락폭의 rma로 계산하는 상대 강도 지수입니다."""
+
+    __slots__ = ("previous", "up", "down")
+
+    def __init__(self, length):
+        self.previous = NA
+        self.up = _Seeded(length, 1.0 / length)
+        self.down = _Seeded(length, 1.0 / length)
+
+    def update(self, value):
+        delta = value - self.previous
+        self.previous = value
+        if delta != delta:
+            up = self.up.update(NA)
+            down = self.down.update(NA)
+        else:
+            up = self.up.update(delta if delta > 0.0 else 0.0)
+            down = self.down.update(-delta if delta < 0.0 else 0.0)
+        if up != up or down != down:
+            return NA
+        if down == 0.0:
+            return 100.0
+        if up == 0.0:
+            return 0.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+
+class _Extreme:
+    """최근 length개 값의 최고/최저값입니다. 단조 덱으로 봉마다 상수 시간에 갱신하며, 구간에 na가 있으면 na입니다."""
+
+    __slots__ = ("length", "sign", "candidates", "index", "last_missing")
+
+    def __init__(self, length, highest):
+        self.length = length
+        self.sign = 1.0 if highest else -1.0
+        self.candidates = deque()
+        self.index = -1
+        self.last_missing = None
+
+    def update(self, value):
+        self.index += 1
+        index = self.index
+        candidates = self.candidates
+        if value != value:
+            self.last_missing = index
+        else:
+            signed = self.sign * value
+            while candidates and candidates[-1][1] <= signed:
+                candidates.pop()
+            candidates.append((index, signed))
+        oldest = index - self.length + 1
+        while candidates and candidates[0][0] < oldest:
+            candidates.popleft()
+        if self.length <= 0 or oldest < 0 or (self.last_missing is not None and self.last_missing >= oldest):
+            return NA
+        return self.sign * candidates[0][1]
+
+
+class _History:
+    """series[offset]를 위해 최근 offset + 1개 값을 보관합니다."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, offset):
+        self.values = deque([NA] * (offset + 1), maxlen=offset + 1)
+
+    def update(self, value):
+        self.values.append(value)
+        return self.values[0]
+
+
+class _Cross:
+    """직전 봉의 두 값을 기억해 crossover/crossunder/cross를 판단합니다."""
+
+    __slots__ = ("kind", "previous_a", "previous_b")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.previous_a = NA
+        self.previous_b = NA
+
+    def update(self, a, b):
+        previous_a, previous_b = self.previous_a, self.previous_b
+        self.previous_a, self.previous_b = a, b
+        over = a > b and previous_a <= previous_b
+        if self.kind == "crossover":
+            return over
+        under = a < b and previous_a >= previous_b
+        return under if self.kind == "crossunder" else over or under
+
+
+def _as_length(value):
+    if value is None or value != value:
+        raise BacktestError("지표 기간이 na입니다.")
+    return int(round(float(value)))
+
+
+class StreamingEvaluator:
+    """
+    컴파일한 전략의 식을 현재 봉 하나에 대해 계산합니다. 지표 호출과 series[n]은 식 노드별 상태 객체를 갱신하므로
+    봉마다 모든 식을 한 번씩 계산해야 합니다 (조건이 상수인 분기만 backtester와 같이 건너뜀).
+    """
+
+    def __init__(self, compiled, overrides=None):
+        self.compiled = compiled
+        self.overrides = overrides or {}
+        self.bar = None
+        self.bar_index = -1
+        self.position_price = NA
+        self.memo = {}
+        self.states = {}
+        self.constants = {}
+        self.resolving = set()
+
+    def step(self, bar):
+        """다음 봉으로 넘어갑니다. bar는 BAR_FIELDS 순서의 튜플입니다."""
+        self.bar = bar
+        self.bar_index += 1
+        self.memo.clear()
+
+    def evaluate(self, node):
+        memo = self.memo
+        if node in memo:
+            return memo[node]
+        value = self._evaluate(node)
+        memo[node] = value
+        return value
+
+    def condition(self, terms):
+        result = True
+        for term in terms:
+            # 상태 갱신을 위해 앞 항이 거짓이어도 모든 항을 계산함
+            result = _truth(self.evaluate(term)) and result
+        return result
+
+    def is_constant(self, node):
+        """봉과 무관한 식인지 여부입니다 (backtester에서 스칼라로 계산되는 식)."""
+        constant = self.constants.get(node)
+        if constant is None:
+            constant = self._is_constant(node)
+            self.constants[node] = constant
+        return constant
+
+    def _is_constant(self, node):
+        kind = node[0]
+        if kind in ("num", "bool", "str", "na"):
+            return True
+        if kind == "name":
+            name = node[1]
+            if name in self.overrides or name in self.compiled.model.inputs:
+                return True
+            variable = self.compiled.variables.get(name)
+            return variable is not None and name not in self.resolving and self._resolve_constant(name, variable)
+        if kind == "call":
+            name = node[1]
+            if name == "input" or name.startswith("input."):
+                return True
+            for prefix in ("ta.", "math."):
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+            if name in _STATEFUL_FUNCTIONS:
+                return False
+            return all(self.is_constant(arg) for arg in node[2]) and all(self.is_constant(value) for _, value in node[3])
+        return all(self.is_constant(child) for child in node[1:] if isinstance(child, tuple))
+
+    def _resolve_constant(self, name, variable):
+        self.resolving.add(name)
+        try:
+            return self.is_constant(variable)
+        finally:
+            self.resolving.discard(name)
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind in ("num", "bool", "str"):
+            return node[1]
+        if kind == "na":
+            return None
+        if kind == "name":
+            return self._name(node[1])
+        if kind == "call":
+            return self._call(node, node[1], node[2], dict(node[3]))
+        if kind == "index":
+            offset = self.evaluate(node[2])
+            value = self.evaluate(node[1])
+            if self.is_constant(node[1]):
+                return value
+            state = self.states.get(node)
+            if state is None:
+                state = self.states[node] = _History(max(0, _as_length(offset)))
+            return state.update(_to_float(value))
+        if kind == "unary":
+            value = self.evaluate(node[2])
+            if node[1] == "not":
+                return not _truth(value)
+            value = _to_float(value) if value is None else value
+            return -value if node[1] == "-" else value
+        if kind == "ternary":
+            return self._ternary(node[1], node[2], node[3])
+        if kind == "binary":
+            return self._binary(node[1], node[2], node[3])
+        raise UnsupportedConstruct(f"알 수 없는 식입니다: {kind}")
+
+    def _ternary(self, condition_node, true_node, false_node):
+        condition = self.evaluate(condition_node)
+        if self.is_constant(condition_node):
+            return self.evaluate(true_node if _truth(condition) else false_node)
+        when_true = self.evaluate(true_node)
+        when_false = self.evaluate(false_node)
+        value = when_true if _truth(condition) else when_false
+        if isinstance(when_true, bool) and isinstance(when_false, bool):
+            return value
+        return _to_float(value)
+
+    def _binary(self, operator, left_node, right_node):
+        left = self.evaluate(left_node)
+        if operator in ("and", "or"):
+            if self.is_constant(left_node) and _truth(left) == (operator == "or"):
+                # 상수 조건은 backtester와 같이 단락 평가
+                return operator == "or"
+            right = _truth(self.evaluate(right_node))
+            return (_truth(left) and right) if operator == "and" else (_truth(left) or right)
+        right = self.evaluate(right_node)
+        if isinstance(left, str) or isinstance(right, str):
+            if operator in ("==", "!="):
+                return (left == right) == (operator == "==")
+            raise UnsupportedConstruct(f"문자열에는 {operator} 연산을 쓸 수 없습니다.")
+        left = NA if left is None else left
+        right = NA if right is None else right
+        if operator == "+":
+            return left + right
+        if operator == "-":
+            return left - right
+        if operator == "*":
+            return left * right
+        if operator == "/":
+            if right == 0:
+                if self.is_constant(right_node) or left == 0 or left != left:
+                    return NA
+                return math.copysign(math.inf, left) * math.copysign(1.0, right)
+            return left / right
+        if operator == "%":
+            try:
+                return math.fmod(left, right)
+            except ValueError:
+                return NA
+        if operator == "==":
+            return left == right
+        if operator == "!=":
+            # na는 어떤 비교에서도 거짓
+            return left != right and left == left and right == right
+        if operator == "<":
+            return left < right
+        if operator == ">":
+            return left > right
+        if operator == "<=":
+            return left <= right
+        if operator == ">=":
+            return left >= right
+        raise UnsupportedConstruct(f"지원하지 않는 연산자입니다: {operator}")
+
+    def _name(self, name):
+        bar = self.bar
+        index = _FIELD_INDEX.get(name)
+        if index is not None and name != "time":
+            return bar[index]
+        if name == "hl2":
+            return (bar[2] + bar[3]) / 2
+        if name == "hlc3":
+            return (bar[2] + bar[3] + bar[4]) / 3
+        if name == "ohlc4":
+            return (bar[1] + bar[2] + bar[3] + bar[4]) / 4
+        if name == "bar_index":
+            return float(self.bar_index)
+        if name == _POSITION_PRICE:
+            return self.position_price
+        if name in self.overrides:
+            return self.overrides[name]
+        decl = self.compiled.model.inputs.get(name)
+        if decl is not None:
+            if decl.default is None or not decl.default.is_literal:
+                raise UnsupportedConstruct(f"input {name}의 기본값이 리터럴이 아닙니다.")
+            return decl.default.value
+        node = self.compiled.variables.get(name)
+        if node is not None:
+            if name in self.resolving:
+                raise UnsupportedConstruct(f"변수 {name}가 자기 자신을 참조합니다.")
+            self.resolving.add(name)
+            try:
+                return self.evaluate(node)
+            finally:
+                self.resolving.discard(name)
+        if name in self.compiled.invalid_variables:
+            raise UnsupportedConstruct(f"변수 {name}: {self.compiled.invalid_variables[name]}")
+        raise UnsupportedConstruct(f"지원하지 않는 이름입니다: {name}")
+
+    def _state(self, node, factory):
+        state = self.states.get(node)
+        if state is None:
+            state = self.states[node] = factory()
+        return state
+
+    def _call(self, node, name, args, kwargs):
+        if name == "input" or name.startswith("input."):
+            default = args[0] if args else kwargs.get("defval")
+            if default is None:
+                raise UnsupportedConstruct("기본값이 없는 input입니다.")
+            return self.evaluate(default)
+        for prefix in ("ta.", "math."):
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        values = [self.evaluate(arg) for arg in args]
+
+        if name in ("rsi", "sma", "ema", "rma", "stdev"):
+            source = kwargs.get("source")
+            source = _to_float(self.evaluate(source) if source is not None else values.pop(0))
+            length = kwargs.get("length")
+            length = _as_length(self.evaluate(length) if length is not None else values[0])
+            factories = {
+                "rsi": lambda: _RSI(length),
+                "sma": lambda: _SMA(length),
+                "ema": lambda: _Seeded(length, 2.0 / (length + 1)),
+                "rma": lambda: _Seeded(length, 1.0 / length),
+                "stdev": lambda: _Stdev(length)
+            }
+            return self._state(node, factories[name]).update(source)
+        if name in ("highest", "lowest"):
+            if len(values) == 1:
+                source = self.bar[2 if name == "highest" else 3]
+            else:
+                source = _to_float(values.pop(0))
+            length = _as_length(values[0])
+            return self._state(node, lambda: _Extreme(length, name == "highest")).update(source)
+        if name in ("crossover", "crossunder", "cross"):
+            return self._state(node, lambda: _Cross(name)).update(_to_float(values[0]), _to_float(values[1]))
+        if name == "change":
+            offset = _as_length(values[1]) if len(values) > 1 else 1
+            value = _to_float(values[0])
+            return value - self._state(node, lambda: _History(max(0, offset))).update(value)
+        if name == "nz":
+            replacement = values[1] if len(values) > 1 else 0.0
+            return replacement if _is_na(values[0]) else values[0]
+        if name == "na":
+            return _is_na(values[0])
+        if name == "iff":
+            return self._ternary(*args)
+        if name in ("abs", "sqrt", "log", "exp"):
+            value = _to_float(values[0])
+            with np.errstate(all="ignore"):
+                return float({"abs": np.abs, "sqrt": np.sqrt, "log": np.log, "exp": np.exp}[name](value))
+        if name in ("max", "min"):
+            function = max if name == "max" else min
+            result = _to_float(values[0])
+            for value in values[1:]:
+                value = _to_float(value)
+                # fmax/fmin처럼 na가 아닌 쪽을 고름
+                result = value if result != result else result if value != value else function(result, value)
+            return result
+        raise UnsupportedConstruct(f"지원하지 않는 함수입니다: {name}")
+
+
+class StrategyStream:
+    """
+    전략 하나의 봉 단위 실행 상태입니다. update(bar)는 backtester와 같은 순서로 처리합니다.
+
+    1. 직전 봉 종가에 나온 진입/청산 신호를 이번 봉 시가에 체결 (반대 방향 진입은 기존 포지션을 청산하고 진입)
+    2. 보유 포지션의 strategy.exit 가격(목표가/손절가/트레일링)에 이번 봉 고가/저가가 닿았는지 확인
+    3. 종가에서 모든 조건을 계산해 다음 봉 시가에 체결할 신호를 정함
+
+    반환값은 이번 봉에서 생긴 이벤트(signal/entry/exit) 목록입니다.
+    """
+
+    def __init__(self, code, overrides=None, mintick=None, record_trades=False):
+        self.compiled = backtester.compile_strategy(code)
+        self.digest = pine_parser.code_digest(code)
+        self.evaluator = StreamingEvaluator(self.compiled, overrides)
+        self.mintick = backtester.BACKTEST_MINTICK if mintick is None else mintick
+        self.lock = threading.Lock()
+
+        compiled = self.compiled
+        self.exit_orders = []
+        self.close_orders = []
+        for entry in compiled.entries:
+            orders = [order for order in compiled.exits if order.from_entry in (None, entry.id)]
+            stops = [order for order in orders if not order.market]
+            if len(stops) > 1:
+                raise UnsupportedConstruct(f"진입 {entry.id}에 strategy.exit가 여러 개 적용됩니다.")
+            self.exit_orders.append(stops[0] if stops else None)
+            self.close_orders.append([order for order in orders if order.market and entry.direction in order.states])
+        self.uses_position_price = {
+            id(order): any(_POSITION_PRICE in backtester.expression_names(node) for node in order.levels.values())
+            for order in compiled.exits
+        }
+
+        self.bars = 0
+        self.last_time = None
+        self.position = 0
+        self.entry = None
+        self.entry_price = NA
+        self.entry_bar = None
+        self.entry_time = None
+        self.pending = None
+        self.pending_levels = None
+        self.levels = None
+        self.exit_enabled = False
+        self.peak = None
+        self.record_trades = record_trades
+        self.trades = []
+        self.signals = 0
+        self.closed_trades = 0
+
+    # --- 처리 ---
+
+    def update(self, bar):
+        """봉 하나를 처리합니다. bar는 (time, open, high, low, close, volume) 튜플입니다."""
+        events = []
+        index = self.bars
+        evaluator = self.evaluator
+        evaluator.step(bar)
+
+        if self.pending is not None:
+            self._fill(bar, index, events)
+        if self.position != 0 and self.levels is not None:
+            hit = self._find_exit(bar)
+            if hit is not None:
+                self._close(index, bar[0], hit[0], hit[1], events)
+
+        evaluator.position_price = self.entry_price if self.position != 0 else NA
+        entry_signals = [evaluator.condition(entry.conditions) for entry in self.compiled.entries]
+        calls = {}
+        for order in self.compiled.exits:
+            called = evaluator.condition(order.conditions)
+            levels = {name: _to_float(evaluator.evaluate(node)) for name, node in order.levels.items()}
+            calls[id(order)] = (called, levels)
+        self._signals(bar, index, entry_signals, calls, events)
+
+        self.bars += 1
+        self.last_time = bar[0]
+        return events
+
+    def _signals(self, bar, index, entry_signals, calls, events):
+        state = self.position
+        entry_index = None
+        for position, (entry, signal) in enumerate(zip(self.compiled.entries, entry_signals)):
+            # 같은 봉에 여러 진입이 있으면 나중에 실행된 주문이 최종 포지션을 정함
+            if signal and state in entry.states and entry.direction != state:
+                entry_index = position
+        if entry_index is not None:
+            entry = self.compiled.entries[entry_index]
+            self.pending = ("entry", entry_index)
+            # 신호 봉에서 이미 호출된 청산 주문은 진입 봉부터 유효 (진입가를 쓰는 주문은 제외)
+            order = self.exit_orders[entry_index]
+            self.pending_levels = None
+            if order is not None and state in order.states and not self.uses_position_price[id(order)]:
+                called, levels = calls[id(order)]
+                if called:
+                    self.pending_levels = levels
+            self.signals += 1
+            events.append({"type": "signal", "action": "entry", "order_id": entry.id,
+                           "direction": _direction_name(entry.direction), "bar": index, "time": bar[0],
+                           "price": bar[4]})
+            return
+        if state == 0:
+            return
+        order = self.exit_orders[self.entry]
+        if order is not None and self.exit_enabled:
+            called, levels = calls[id(order)]
+            if called:
+                self.levels = levels
+        for order in self.close_orders[self.entry]:
+            if calls[id(order)][0]:
+                self.pending = ("close", order.id)
+                self.signals += 1
+                events.append({"type": "signal", "action": "close", "order_id": order.id,
+                               "entry_id": self.compiled.entries[self.entry].id,
+                               "direction": _direction_name(state), "bar": index, "time": bar[0], "price": bar[4]})
+                return
+
+    def _fill(self, bar, index, events):
+        kind, value = self.pending
+        self.pending = None
+        open_price = bar[1]
+        if kind == "close":
+            if self.position != 0:
+                self._close(index, bar[0], open_price, "close", events)
+            return
+        if self.position != 0:
+            self._close(index, bar[0], open_price, "reverse", events)
+        entry = self.compiled.entries[value]
+        self.position = entry.direction
+        self.entry = value
+        self.entry_price = open_price
+        self.entry_bar = index
+        self.entry_time = bar[0]
+        self.peak = None
+        order = self.exit_orders[value]
+        self.levels = self.pending_levels
+        self.exit_enabled = self.pending_levels is not None or (order is not None and entry.direction in order.states)
+        self.pending_levels = None
+        events.append({"type": "entry", "entry_id": entry.id, "direction": _direction_name(entry.direction),
+                       "bar": index, "time": bar[0], "price": open_price})
+
+    def _close(self, index, bar_time, price, reason, events):
+        direction = self.position
+        entry = self.compiled.entries[self.entry]
+        profit_loss = round(direction * (price / self.entry_price - 1) * 100, 4) if self.entry_price else None
+        event = {"type": "exit", "entry_id": entry.id, "direction": _direction_name(direction), "bar": index,
+                 "time": bar_time, "price": price, "reason": reason, "entry_price": self.entry_price,
+                 "profit_loss": profit_loss}
+        events.append(event)
+        if self.record_trades:
+            self.trades.append({
+                "type": "LONG" if direction == 1 else "SHORT",
+                "entry_id": entry.id,
+                "entry_bar": self.entry_bar,
+                "entry_price": self.entry_price,
+                "exit_bar": index,
+                "exit_price": price,
+                "exit_reason": reason
+            })
+        self.closed_trades += 1
+        self.position = 0
+        self.entry = None
+        self.entry_price = NA
+        self.entry_bar = None
+        self.entry_time = None
+        self.levels = None
+        self.exit_enabled = False
+        self.peak = None
+
+    def _line(self, levels, price_key, ticks_key, sign, direction, entry):
+        """청산 가격을 거래 방향을 곱한 부호 공간으로 바꿉니다 (backtester._Simulator._plan과 같은 식)."""
+        if price_key in levels:
+            return direction * levels[price_key]
+        if ticks_key in levels:
+            return entry + sign * self.mintick * levels[ticks_key]
+        return sign * math.inf
+
+    def _find_exit(self, bar):
+        """이번 봉에서 strategy.exit 가격에 닿았으면 (체결 가격, 사유)를, 아니면 None을 반환합니다."""
+        levels = self.levels
+        direction = self.position
+        entry = direction * self.entry_price
+        _, open_price, high, low = bar[0], bar[1], bar[2], bar[3]
+        if direction == 1:
+            opened, favorable, adverse = open_price, high, low
+        else:
+            opened, favorable, adverse = -open_price, -low, -high
+        target = self._line(levels, "limit", "profit", 1, direction, entry)
+        fixed_stop = self._line(levels, "stop", "loss", -1, direction, entry)
+        hit_target = favorable >= target
+        hit_stop = adverse <= fixed_stop
+        stop = fixed_stop
+
+        trail_stop = None
+        if "trail_offset" in levels:
+            offset = self.mintick * levels["trail_offset"]
+            if self.peak is None:
+                # 활성화된 봉 다음부터는 그때까지의 최고가(부호 공간)에서 offset만큼 떨어진 가격이 손절가
+                if favorable >= self._line(levels, "trail_price", "trail_points", 1, direction, entry):
+                    self.peak = favorable
+            else:
+                trail_stop = self.peak - offset
+                self.peak = max(self.peak, favorable)
+                hit_stop = hit_stop or adverse <= trail_stop
+                stop = fixed_stop if trail_stop != trail_stop else trail_stop if fixed_stop != fixed_stop \
+                    else max(fixed_stop, trail_stop)
+
+        if not (hit_target or hit_stop):
+            return None
+        stop_reason = "trailing" if trail_stop is not None and trail_stop > fixed_stop else "stop"
+        if hit_stop and opened <= stop:
+            price, reason = opened, stop_reason
+        elif hit_target and opened >= target:
+            price, reason = opened, "target"
+        elif hit_stop and hit_target:
+            # 시가에서 고가가 저가보다 가까우면 고가를 먼저 지났다고 봄
+            high_first = (high - open_price) <= (open_price - low)
+            favorable_first = high_first if direction == 1 else not high_first
+            price, reason = (target, "target") if favorable_first else (stop, stop_reason)
+        elif hit_target:
+            price, reason = target, "target"
+        else:
+            price, reason = stop, stop_reason
+        return direction * price, reason
+
+    def feed(self, columns, collect=True):
+        """
+        열 배열 딕셔너리(bar_store 형식)의 봉을 차례로 처리합니다. last_time 이하의 봉은 이미 처리한 것으로 보고 건너뜁니다.
+        collect가 False면 이벤트를 모으지 않습니다 (워밍업).
+        """
+        events = []
+        times = np.asarray(columns["time"])
+        start = int(np.searchsorted(times, self.last_time, "right")) if self.last_time is not None else 0
+        if start >= times.size:
+            return events, 0
+        rows = zip(*(np.asarray(columns[name][start:]).tolist() for name in BAR_FIELDS))
+        with np.errstate(invalid="ignore"):
+            for bar in rows:
+                result = self.update(bar)
+                if collect:
+                    events.extend(result)
+        return events, times.size - start
+
+    def state(self):
+        entry = self.compiled.entries[self.entry] if self.entry is not None else None
+        pending = None
+        if self.pending is not None:
+            kind, value = self.pending
+            pending = {"action": kind, "order_id": self.compiled.entries[value].id if kind == "entry" else value}
+        return {
+            "position": _direction_name(self.position),
+            "entry_id": entry.id if entry is not None else None,
+            "entry_price": self.entry_price if entry is not None else None,
+            "entry_time": self.entry_time,
+            "pending": pending,
+            "bars": self.bars,
+            "last_time": self.last_time
+        }
+
+
+def _direction_name(direction):
+    return {1: "long", -1: "short", 0: "flat"}[direction]
+
+
+class StreamRegistry:
+    """(티커, 타임프레임, 전략 파일)별 StrategyStream을 보관합니다. 전략 코드가 바뀌면 엔진을 다시 만듭니다."""
+
+    def __init__(self, max_streams=STREAM_MAX_STREAMS):
+        self.max_streams = max_streams
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+        # 같은 엔진을 동시에 두 번 만들지 않도록 생성(워밍업)은 한 번에 하나씩
+        self._build_lock = threading.Lock()
+        self.created = 0
+        self.warmup_bars = 0
+        self.processed = 0
+        self.signals = 0
+        self.total_us = 0.0
+
+    def get(self, key, code, history=None):
+        """
+        key의 엔진을 반환합니다. 없거나 코드가 다르면 새로 만들고, history(첫 새 봉 이전까지의 열 배열을 돌려주는
+        함수)로 상태를 채웁니다. 반환값은 (엔진, 새로 만들었는지 여부)입니다.
+        """
+        digest = pine_parser.code_digest(code)
+        stream = self._lookup(key, digest)
+        if stream is not None:
+            return stream, False
+        with self._build_lock:
+            stream = self._lookup(key, digest)
+            if stream is not None:
+                return stream, False
+            stream = StrategyStream(code)
+            warmed = 0
+            if history is not None:
+                columns = history()
+                if columns is not None:
+                    _, warmed = stream.feed(columns, collect=False)
+            self._store(key, stream, warmed)
+        logger.info(f"스트리밍 엔진 생성: {key} (워밍업 {warmed}개 봉)")
+        return stream, True
+
+    def _lookup(self, key, digest):
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is not None and stream.digest == digest:
+                self._streams.move_to_end(key)
+                return stream
+            return None
+
+    def _store(self, key, stream, warmed):
+        with self._lock:
+            self._streams[key] = stream
+            self._streams.move_to_end(key)
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+            self.created += 1
+            self.warmup_bars += warmed
+
+    def record(self, processed, signals, elapsed_us):
+        with self._lock:
+            self.processed += processed
+            self.signals += signals
+            self.total_us += elapsed_us
+
+    def stats(self):
+        with self._lock:
+            return {
+                "streams": len(self._streams),
+                "max_streams": self.max_streams,
+                "created": self.created,
+                "warmup_bars": self.warmup_bars,
+                "processed_bars": self.processed,
+                "signals": self.signals,
+                "avg_us_per_bar": round(self.total_us / self.processed, 2) if self.processed else 0.0
+            }
+
+
+# 프로세스 전체에서 공유하는 엔진 목록
+registry = StreamRegistry()
+
+
+def process_bars(store, ticker, timeframe, strategy, code, bars, save=True):
+    """
+    새 봉(normalize_bars 형식)을 봉 저장소에 덧붙이고(save) 전략 엔진에 차례로 넣어 발생한 이벤트를 반환합니다.
+    엔진이 없으면 저장소에서 첫 새 봉 이전의 봉 STREAM_WARMUP_BARS개로 상태를 채우고, 엔진이 마지막으로 본 봉과
+    새 봉 사이에 저장된 봉이 있으면 먼저 반영한 뒤 처리합니다.
+    """
+    times = bars["time"]
+
+    def history():
+        if times.size == 0 or STREAM_WARMUP_BARS <= 0:
+            return None
+        return store.window(ticker, timeframe, end=int(times[0]) - 1, limit=STREAM_WARMUP_BARS)
+
+    stream, created = registry.get((ticker, timeframe, strategy), code, history)
+    with stream.lock:
+        if stream.last_time is not None and times.size and int(times[0]) - 1 > stream.last_time:
+            # 다른 경로(POST /bars/{ticker}/{timeframe})로 저장된 사이 봉을 먼저 반영 (신호는 버림)
+            stream.feed(store.window(ticker, timeframe, start=stream.last_time + 1, end=int(times[0]) - 1),
+                        collect=False)
+        stored = store.append(ticker, timeframe, bars) if save else None
+        started = time.perf_counter()
+        events, processed = stream.feed(bars)
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        registry.record(processed, sum(1 for event in events if event["type"] == "signal"), elapsed_us)
+        return {
+            "processed": processed,
+            "skipped": int(times.size) - processed,
+            "created": created,
+            "events": events,
+            "position": stream.state(),
+            "stored": stored,
+            "elapsed_us": round(elapsed_us, 1),
+            "us_per_bar": round(elapsed_us / processed, 2) if processed else 0.0
+        }
+
+
+def stats():
+    return registry.stats()
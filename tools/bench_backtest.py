@@ -0,0 +1,82 @@
+# tools/bench_backtest.py
+"""
+벡터화 백테스터(backtester)의 실행 시간을 측정하는 벤치마크입니다.
+
+기본값은 1시간 봉 1년치(8,760개)의 합성 OHLCV 데이터(기하 브라운 운동)이며, 파일마다
+컴파일(첫 실행), 이후 실행의 중앙값/최솟값과 거래 수, 웹훅과 같은 성과 지표를 출력합니다.
+
+사용법:
+    python tools/bench_backtest.py --glob "storage/strategies/*.pine" --bars 8760 --repeat 50
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import backtester  # noqa: E402
+
+HOUR_MS = 3_600_000
+
+
+def synthetic_bars(count, seed=7, price=27000.0, volatility=0.006):
+    """1시간 봉 합성 OHLCV 배열 (시간 열 포함, (count, 6))을 만듭니다."""
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0.0, volatility, count)))
+    open_ = np.concatenate(([price], close[:-1])) * (1 + rng.normal(0.0, volatility / 10, count))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0.0, volatility / 2, count)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0.0, volatility / 2, count)))
+    volume = rng.uniform(10.0, 100.0, count)
+    times = 1_672_531_200_000 + np.arange(count) * HOUR_MS
+    return np.column_stack([times, open_, high, low, close, volume])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벡터화 백테스터 실행 시간 벤치마크")
+    parser.add_argument("--glob", default="storage/strategies/*.pine", help="측정할 파일 패턴 (저장소 루트 기준)")
+    parser.add_argument("--bars", type=int, default=8760, help="봉 개수 (기본값: 1시간 봉 1년)")
+    parser.add_argument("--repeat", type=int, default=50, help="파일마다 반복 실행할 횟수")
+    parser.add_argument("--seed", type=int, default=7, help="합성 데이터 난수 시드")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT_DIR, args.glob)))
+    if not paths:
+        print(f"파일이 없습니다: {args.glob}")
+        return 1
+    bars = backtester.load_bars(synthetic_bars(args.bars, args.seed))
+
+    print(f"봉 {args.bars}개, 반복 {args.repeat}회, mintick {backtester.BACKTEST_MINTICK}")
+    print(f"  {'파일':<24}{'첫 실행':>10}{'중앙값':>10}{'최소':>10}{'거래':>7}{'승률':>8}{'PF':>7}{'MDD':>7}")
+    failures = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        name = os.path.basename(path)
+        try:
+            started = time.perf_counter()
+            result = backtester.run_backtest(code, bars)
+            first_ms = (time.perf_counter() - started) * 1000
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                backtester.run_backtest(code, bars)
+                timings.append((time.perf_counter() - started) * 1000)
+        except backtester.BacktestError as e:
+            failures += 1
+            print(f"  {name:<24}백테스트할 수 없음: {e}")
+            continue
+        performance = result["performance"]
+        profit_factor = performance["profit_factor"]
+        print(f"  {name:<24}{first_ms:>8.2f}ms{float(np.median(timings)):>8.2f}ms{min(timings):>8.2f}ms"
+              f"{performance['total_trades']:>7}{performance['winrate']:>7.1f}%"
+              f"{profit_factor if profit_factor is not None else '-':>7}{performance['max_drawdown']:>6.2f}%")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# tools/bench_json.py
+"""
+표준 json 모듈과 fast_json(orjson)의 JSON 파싱/직렬화 처리량을 비교하는 마이크로벤치마크입니다.
+
+두 가지 페이로드를 사용합니다.
+  - sample_webhook.json: 일반적인 웹훅 본문 크기
+  - 거래 10,000건이 들어 있는 합성 웹훅: 큰 백테스트 결과를 보내는 경우
+
+"이전"은 변경 전 코드 경로(json.loads, 들여쓰기가 있는 json.dumps 메타데이터,
+ensure_ascii=False 압축 json.dumps 로그 레코드)이고, "이후"는 fast_json입니다.
+
+사용법:
+    python tools/bench_json.py --seconds 1.0 --trades 10000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import fast_json  # noqa: E402
+
+
+def make_trades_payload(sample, trades):
+    """sample_webhook.json을 바탕으로 거래 내역이 trades건인 웹훅을 만듭니다."""
+    rng = random.Random(42)
+    payload = dict(sample)
+    price = 27000.0
+    signals = []
+    for i in range(trades):
+        entry = price + rng.uniform(-200, 200)
+        exit_price = entry * (1 + rng.uniform(-0.02, 0.02))
+        signals.append({
+            "time": f"2023-05-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            "type": "LONG" if i % 2 == 0 else "SHORT",
+            "entry_price": round(entry, 2),
+            "exit_price": round(exit_price, 2),
+            "profit_loss": round((exit_price - entry) / entry * 100, 4),
+            "rsi_value": round(rng.uniform(10, 90), 2),
+            "comment": "RSI 과매도 진입"
+        })
+        price = exit_price
+    payload["recent_signals"] = signals
+    return payload
+
+
+def measure(func, seconds):
+    """seconds 동안 func를 반복 호출하고 초당 호출 수를 반환합니다."""
+    func()
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        func()
+        calls += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return calls / (now - started)
+
+
+def bench_payload(name, payload, seconds):
+    body = json.dumps(payload).encode("utf-8")
+    print(f"\n[{name}] 본문 {len(body):,} 바이트")
+
+    cases = [
+        ("본문 파싱",
+         lambda: json.loads(body),
+         lambda: fast_json.loads(body)),
+        ("로그 레코드 직렬화",
+         lambda: (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"),
+         lambda: fast_json.dumps(payload) + b"\n"),
+        ("메타데이터 파일 직렬화",
+         lambda: json.dumps(payload, indent=4),
+         lambda: fast_json.dumps(payload)),
+        ("응답 본문 렌더링",
+         lambda: JSONResponse(payload).body,
+         lambda: fast_json.FastJSONResponse(payload).body),
+    ]
+    print(f"  {'항목':<16}{'이전(건/초)':>14}{'이후(건/초)':>14}{'배율':>8}")
+    for label, before, after in cases:
+        before_rate = measure(before, seconds)
+        after_rate = measure(after, seconds)
+        print(f"  {label:<16}{before_rate:>14,.0f}{after_rate:>14,.0f}{after_rate / before_rate:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 코덱 처리량 비교")
+    parser.add_argument("--seconds", type=float, default=1.0, help="항목당 측정 시간(초)")
+    parser.add_argument("--trades", type=int, default=10000, help="큰 페이로드의 거래 수")
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT_DIR, "sample_webhook.json"), "rb") as f:
+        sample = json.loads(f.read())
+
+    print(f"fast_json 백엔드: {fast_json.BACKEND}")
+    if fast_json.BACKEND != "orjson":
+        print("  (orjson이 설치되지 않아 이후 값도 표준 json으로 측정됩니다: pip install orjson)")
+    bench_payload("sample_webhook.json", sample, args.seconds)
+    bench_payload(f"거래 {args.trades:,}건", make_trades_payload(sample, args.trades), args.seconds)
+
+
+if __name__ == "__main__":
+    main()
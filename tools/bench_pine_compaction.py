@@ -0,0 +1,82 @@
+# tools/bench_pine_compaction.py
+"""
+Pine Script 코드 압축(pine_compactor) 전후의 토큰 수를 비교하는 벤치마크입니다.
+
+파일마다 코드 토큰 수, sample_webhook.json으로 만든 전체 프롬프트(시스템 메시지 포함) 토큰 수를
+압축 전후로 측정하고, 압축한 코드를 그대로 복원했을 때 원본과 같은지도 확인합니다.
+토큰 수는 prompt_builder.count_tokens를 사용합니다 (tiktoken이 없으면 추정치).
+
+사용법:
+    python tools/bench_pine_compaction.py --glob "storage/strategies/*.pine"
+"""
+import os
+import sys
+import glob
+import json
+import logging
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import prompt_builder  # noqa: E402
+import pine_compactor  # noqa: E402
+import pine_modifier  # noqa: E402
+
+# 프롬프트를 만들 때마다 남기는 로그는 표에 섞이지 않도록 숨김
+logging.getLogger("pine_modifier").setLevel(logging.WARNING)
+
+
+def prompt_tokens(code, webhook_data):
+    prompt = pine_modifier.build_prompt(code, webhook_data)
+    return prompt_builder.count_message_tokens(pine_modifier.build_messages(prompt))
+
+
+def _saving(before, after):
+    return (before - after) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pine Script 코드 압축 토큰 벤치마크")
+    parser.add_argument("--glob", default="storage/strategies/*.pine", help="측정할 파일 패턴 (저장소 루트 기준)")
+    parser.add_argument("--webhook", default="sample_webhook.json", help="프롬프트 구성에 쓸 웹훅 데이터")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT_DIR, args.glob)))
+    if not paths:
+        print(f"파일이 없습니다: {args.glob}")
+        return 1
+    with open(os.path.join(ROOT_DIR, args.webhook), "rb") as f:
+        webhook_data = json.loads(f.read())
+
+    print(f"토큰 계산: {prompt_builder.token_counter_name()}")
+    print(f"  {'파일':<24}{'줄 제거':>8}{'코드 이전':>10}{'코드 이후':>10}{'절감':>8}"
+          f"{'프롬프트 이전':>14}{'프롬프트 이후':>14}{'절감':>8}  복원")
+    totals = [0, 0, 0, 0]
+    failures = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        compaction = pine_compactor.CompactedCode(code)
+        round_trip = compaction.restore(compaction.code) == code
+        failures += not round_trip
+        counts = [
+            prompt_builder.count_tokens(code),
+            prompt_builder.count_tokens(compaction.code),
+            prompt_tokens(code, webhook_data),
+            prompt_tokens(compaction.code, webhook_data)
+        ]
+        totals = [total + count for total, count in zip(totals, counts)]
+        print(f"  {os.path.basename(path):<24}{compaction.removed_lines:>8}{counts[0]:>10}{counts[1]:>10}"
+              f"{_saving(counts[0], counts[1]):>7.1f}%{counts[2]:>14}{counts[3]:>14}"
+              f"{_saving(counts[2], counts[3]):>7.1f}%  {'OK' if round_trip else '불일치'}")
+    print(f"  {'합계':<24}{'':>8}{totals[0]:>10}{totals[1]:>10}{_saving(totals[0], totals[1]):>7.1f}%"
+          f"{totals[2]:>14}{totals[3]:>14}{_saving(totals[2], totals[3]):>7.1f}%")
+    if failures:
+        print(f"복원 결과가 원본과 다른 파일: {failures}개")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# tools/bench_pine_compiler.py
+"""
+전략 검사(pine_compiler)의 진단과 비용을 점검합니다.
+
+파일마다 진단을 출력하고, 기본 input 값과 --overrides로 바꾼 값에서 검사를 켜고 끈 백테스트 결과
+(성과 지표, 거래 목록)가 같은지 확인한 뒤, 처음 검사, 캐시된 검사, 식 해석기(backtester.Evaluator)로
+진입/청산 조건과 가격을 계산하는 데 걸린 시간의 중앙값을 출력합니다.
+
+사용법:
+    python tools/bench_pine_compiler.py --glob "storage/strategies/*.pine" --bars 8760 --repeat 50
+    python tools/bench_pine_compiler.py --overrides "rsiLength=7,rsiOversold=25"
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backtester  # noqa: E402
+import indicators  # noqa: E402
+import pine_compiler  # noqa: E402
+from bench_backtest import synthetic_bars  # noqa: E402
+
+
+def parse_overrides(text):
+    overrides = {}
+    for item in filter(None, (text or "").split(",")):
+        name, _, value = item.partition("=")
+        overrides[name.strip()] = float(value)
+    return overrides
+
+
+def run(code, bars, overrides, checked):
+    pine_compiler.PINE_COMPILER_ENABLED = checked
+    result = backtester.run_backtest(code, bars, overrides, include_trades=True)
+    result.pop("elapsed_ms")
+    return result
+
+
+def evaluate_all(evaluator, compiled):
+    """시뮬레이터가 계산하는 식을 모두 계산합니다."""
+    for entry in compiled.entries:
+        evaluator.condition(entry.conditions)
+    for order in compiled.exits:
+        evaluator.condition(order.conditions)
+        for node in order.levels.values():
+            if backtester.POSITION_PRICE not in backtester.expression_names(node):
+                evaluator.evaluate(node)
+
+
+def time_check(code, bars, overrides, repeat):
+    compiled = backtester.compile_strategy(code)
+    timings = {"check": [], "cached": [], "evaluate": []}
+    for _ in range(repeat):
+        pine_compiler.clear_cache()
+        started = time.perf_counter()
+        pine_compiler.check(code, overrides.keys())
+        timings["check"].append(time.perf_counter() - started)
+        started = time.perf_counter()
+        pine_compiler.check(code, overrides.keys())
+        timings["cached"].append(time.perf_counter() - started)
+        # 지표 캐시를 비워 식 계산 비용 전체를 측정
+        indicators.cache.clear()
+        started = time.perf_counter()
+        evaluate_all(backtester.Evaluator(compiled, bars, overrides), compiled)
+        timings["evaluate"].append(time.perf_counter() - started)
+    return {name: float(np.median(values)) * 1000 for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="전략 검사의 진단과 비용 점검")
+    parser.add_argument("--glob", default="storage/strategies/*.pine", help="점검할 파일 패턴 (저장소 루트 기준)")
+    parser.add_argument("--bars", type=int, default=8760, help="봉 개수 (기본값: 1시간 봉 1년)")
+    parser.add_argument("--repeat", type=int, default=50, help="시간 측정 반복 횟수")
+    parser.add_argument("--seed", type=int, default=7, help="합성 데이터 난수 시드")
+    parser.add_argument("--overrides", help="바꿔서 함께 점검할 input 값 (예: rsiLength=7,rsiOversold=25)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT_DIR, args.glob)))
+    if not paths:
+        print(f"파일이 없습니다: {args.glob}")
+        return 1
+    bars = backtester.load_bars(synthetic_bars(args.bars, args.seed))
+    variants = [{}] + ([parse_overrides(args.overrides)] if args.overrides else [])
+
+    print(f"봉 {args.bars}개, 반복 {args.repeat}회")
+    failures = 0
+    enabled = pine_compiler.PINE_COMPILER_ENABLED
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        print(os.path.basename(path))
+        for item in pine_compiler.diagnose(code):
+            print(f"  [{item['severity']}{', input 분기' if item['gated'] else ''}] {item['line']}행: {item['message']}")
+        try:
+            for overrides in variants:
+                unchecked = run(code, bars, overrides, False)
+                checked = run(code, bars, overrides, True)
+                if unchecked != checked:
+                    failures += 1
+                    keys = [key for key in unchecked if unchecked[key] != checked.get(key)]
+                    print(f"  불일치 (overrides {overrides}): {', '.join(keys)}")
+                else:
+                    print(f"  같음 (overrides {overrides}): 거래 {len(checked['trades'])}건, "
+                          f"PF {checked['performance']['profit_factor']}")
+            timings = time_check(code, bars, variants[-1], args.repeat)
+            print(f"  중앙값: 검사 {timings['check']:.3f}ms, 캐시된 검사 {timings['cached']:.4f}ms, "
+                  f"식 계산 {timings['evaluate']:.3f}ms")
+        except backtester.BacktestError as e:
+            print(f"  백테스트할 수 없음: {e}")
+        finally:
+            pine_compiler.PINE_COMPILER_ENABLED = enabled
+    print(f"검사 캐시: {pine_compiler.stats()}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+# tools/check_indicator_parity.py
+"""
+벡터화 지표(indicators)가 TradingView 내장 함수와 같은 값을 내는지 점검합니다.
+
+1. Pine Script 레퍼런스 매뉴얼의 정의를 봉 단위 반복문으로 그대로 옮긴 참조 구현과 비교합니다
+   (합성 OHLCV, 평탄/단조 구간, 앞쪽이나 중간에 na가 있는 시리즈, 여러 기간). na 위치는 정확히 같아야 합니다.
+2. StockCharts ChartSchool의 Wilder RSI(14) 계산 예제와 비교합니다. 예제 표는 중간값(평균 상승/하락폭)을
+   소수 둘째 자리로 반올림해 계산하므로 0.1 이내 차이를 허용합니다.
+3. cached()가 직접 계산과 같은 값을 돌려주고, 같은 입력에서는 캐시를 재사용하는지 확인합니다.
+
+사용법:
+    python tools/check_indicator_parity.py --bars 2000 --seed 7
+"""
+import os
+import sys
+import math
+import argparse
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import indicators  # noqa: E402
+from bench_backtest import synthetic_bars  # noqa: E402
+
+NA = float("nan")
+
+# StockCharts ChartSchool "Relative Strength Index (RSI)" 계산 예제 (종가, 15번째 봉부터의 RSI 14)
+STOCKCHARTS_CLOSES = [
+    44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42, 45.84, 46.08, 45.89, 46.03, 45.61, 46.28,
+    46.28, 46.00, 46.03, 46.41, 46.22, 45.64, 46.21, 46.25, 45.71, 46.45, 45.78, 45.35, 44.03, 44.18,
+    44.22, 44.57, 43.42, 42.66, 43.13
+]
+STOCKCHARTS_RSI = [
+    70.53, 66.32, 66.55, 69.41, 66.36, 57.97, 62.93, 63.26, 56.06, 62.38, 54.71, 50.42, 39.99, 41.46,
+    41.87, 45.46, 37.30, 33.08, 37.77
+]
+STOCKCHARTS_TOLERANCE = 0.1
+
+
+def is_na(value):
+    return value is None or value != value
+
+
+def nz(value, replacement=0.0):
+    return replacement if is_na(value) else value
+
+
+# --- Pine 레퍼런스 매뉴얼 정의를 봉 단위로 옮긴 참조 구현 ---
+
+def pine_sma(src, length):
+    result = []
+    for index in range(len(src)):
+        window = src[index - length + 1:index + 1] if index >= length - 1 else None
+        result.append(NA if window is None or any(is_na(value) for value in window) else sum(window) / length)
+    return result
+
+
+def pine_seeded(src, length, alpha):
+    # sum := na(sum[1]) ? ta.sma(src, length) : alpha * src + (1 - alpha) * nz(sum[1])
+    averages = pine_sma(src, length)
+    result = []
+    previous = NA
+    for index, value in enumerate(src):
+        current = averages[index] if is_na(previous) else alpha * value + (1 - alpha) * nz(previous)
+        result.append(current)
+        previous = current
+    return result
+
+
+def pine_rma(src, length):
+    return pine_seeded(src, length, 1 / length)
+
+
+def pine_ema(src, length):
+    # 내장 ta.ema는 rma와 같이 첫 length개의 sma로 시작함 (앞 length - 1개 봉은 na)
+    return pine_seeded(src, length, 2 / (length + 1))
+
+
+def pine_rsi(src, length):
+    up = [NA] + [max(src[i] - src[i - 1], 0.0) for i in range(1, len(src))]
+    down = [NA] + [max(src[i - 1] - src[i], 0.0) for i in range(1, len(src))]
+    up, down = pine_rma(up, length), pine_rma(down, length)
+    result = []
+    for u, d in zip(up, down):
+        if is_na(u) or is_na(d):
+            result.append(NA)
+        else:
+            result.append(100.0 if d == 0 else 0.0 if u == 0 else 100 - 100 / (1 + u / d))
+    return result
+
+
+def pine_stdev(src, length):
+    # 평균과의 차이가 1e-10 이하이면 0으로 보는 TradingView stdev (모집단, length로 나눔)
+    averages = pine_sma(src, length)
+    result = []
+    for index in range(len(src)):
+        if is_na(averages[index]):
+            result.append(NA)
+            continue
+        total = 0.0
+        for offset in range(length):
+            deviation = src[index - offset] - averages[index]
+            if abs(deviation) <= 1e-10:
+                deviation = 0.0
+            total += deviation * deviation
+        result.append(math.sqrt(total / length))
+    return result
+
+
+def pine_bb(src, length, mult):
+    basis = pine_sma(src, length)
+    deviation = [mult * value for value in pine_stdev(src, length)]
+    return basis, [b + d for b, d in zip(basis, deviation)], [b - d for b, d in zip(basis, deviation)]
+
+
+def pine_crossover(a, b):
+    return [index > 0 and a[index] > b[index] and a[index - 1] <= b[index - 1] for index in range(len(a))]
+
+
+def pine_crossunder(a, b):
+    return [index > 0 and a[index] < b[index] and a[index - 1] >= b[index - 1] for index in range(len(a))]
+
+
+# --- 비교 ---
+
+def compare(name, actual, expected, failures):
+    actual = np.asarray(actual, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    actual_na, expected_na = np.isnan(actual), np.isnan(expected)
+    if actual.shape != expected.shape or not np.array_equal(actual_na, expected_na):
+        mismatch = np.flatnonzero(actual_na != expected_na)
+        failures.append(f"{name}: na 위치가 다릅니다 (첫 차이 봉 {mismatch[0] if mismatch.size else '-'})")
+        return
+    valid = ~expected_na
+    if not np.allclose(actual[valid], expected[valid], rtol=1e-9, atol=1e-8):
+        error = float(np.max(np.abs(actual[valid] - expected[valid])))
+        failures.append(f"{name}: 최대 오차 {error:.3g}")
+
+
+def with_gaps(values):
+    """중간에 na가 하나, 연속으로 여러 개, 짧은 간격으로 반복해 나오는 시리즈입니다."""
+    values = [float(value) for value in values]
+    for start, count in ((100, 1), (300, 3), (500, 1), (503, 1), (506, 1), (900, 60)):
+        values[start:start + count] = [NA] * min(count, max(len(values) - start, 0))
+    return values
+
+
+def check_reference(close, lengths, failures):
+    series = {
+        "close": close,
+        "flat": [100.0] * 60 + list(close[60:]),
+        "rising": [float(value) for value in range(1, 200)],
+        "falling": [float(value) for value in range(200, 1, -1)],
+        # 중간 na 뒤에는 na가 이어지다가 sma로 다시 시작해야 함
+        "gap": [1.0, 2.0, 3.0, 4.0, 5.0, NA] + [float(value) for value in range(6, 40)],
+        "gaps": with_gaps(close)
+    }
+    checks = 0
+    for label, src in series.items():
+        src = [float(value) for value in src]
+        for length in lengths:
+            compare(f"sma({label}, {length})", indicators.sma(src, length), pine_sma(src, length), failures)
+            compare(f"rma({label}, {length})", indicators.rma(src, length), pine_rma(src, length), failures)
+            compare(f"ema({label}, {length})", indicators.ema(src, length), pine_ema(src, length), failures)
+            compare(f"rsi({label}, {length})", indicators.rsi(src, length), pine_rsi(src, length), failures)
+            compare(f"stdev({label}, {length})", indicators.stdev(src, length), pine_stdev(src, length), failures)
+            for actual, expected, part in zip(indicators.bb(src, length, 2.0), pine_bb(src, length, 2.0),
+                                              ("basis", "upper", "lower")):
+                compare(f"bb({label}, {length}).{part}", actual, expected, failures)
+            checks += 8
+
+    # 앞쪽이 na인 시리즈 (rsi의 sma, rsi 교차)
+    for length in lengths:
+        rsi_values = pine_rsi(series["close"], length)
+        compare(f"sma(rsi, {length})", indicators.sma(rsi_values, length), pine_sma(rsi_values, length), failures)
+        compare(f"ema(rsi, {length})", indicators.ema(rsi_values, length), pine_ema(rsi_values, length), failures)
+        for level in (30.0, 70.0):
+            levels = [level] * len(rsi_values)
+            compare(f"crossover(rsi {length}, {level})", indicators.crossover(rsi_values, level),
+                    pine_crossover(rsi_values, levels), failures)
+            compare(f"crossunder(rsi {length}, {level})", indicators.crossunder(rsi_values, level),
+                    pine_crossunder(rsi_values, levels), failures)
+        checks += 6
+    return checks
+
+
+def check_stockcharts(failures):
+    values = indicators.rsi(STOCKCHARTS_CLOSES, 14)
+    if not np.isnan(values[:14]).all():
+        failures.append("StockCharts RSI: 앞 14개 봉이 na가 아닙니다.")
+    error = float(np.max(np.abs(values[14:] - np.asarray(STOCKCHARTS_RSI))))
+    if error > STOCKCHARTS_TOLERANCE:
+        failures.append(f"StockCharts RSI: 최대 오차 {error:.3f} (허용 {STOCKCHARTS_TOLERANCE})")
+    return error
+
+
+def check_cache(close, failures):
+    indicators.cache.clear()
+    before = indicators.cache.stats()
+    first = indicators.cached("rsi", close, 14)
+    second = indicators.cached("rsi", close.copy(), 14)
+    after = indicators.cache.stats()
+    compare("cached rsi", first, indicators.rsi(close, 14), failures)
+    if second is not first or after["hits"] - before["hits"] != 1:
+        failures.append("cached(): 같은 내용의 시리즈에서 캐시를 재사용하지 않았습니다.")
+    if first.flags.writeable:
+        failures.append("cached(): 결과 배열이 읽기 전용이 아닙니다.")
+    crossed = indicators.cached("crossover", first, 30)
+    compare("cached crossover", crossed, indicators.crossover(indicators.rsi(close, 14), 30), failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="지표 함수의 TradingView 동일성 점검")
+    parser.add_argument("--bars", type=int, default=2000, help="합성 데이터 봉 개수")
+    parser.add_argument("--seed", type=int, default=7, help="합성 데이터 난수 시드")
+    parser.add_argument("--lengths", default="2,5,14,20,50", help="점검할 기간 (쉼표로 구분)")
+    args = parser.parse_args()
+
+    close = synthetic_bars(args.bars, args.seed)[:, 4]
+    lengths = [int(value) for value in args.lengths.split(",")]
+    failures = []
+    checks = check_reference(close, lengths, failures)
+    stockcharts_error = check_stockcharts(failures)
+    check_cache(close, failures)
+
+    print(f"참조 구현 비교 {checks}건 (봉 {args.bars}개, 기간 {lengths})")
+    print(f"StockCharts RSI(14) 예제 최대 차이 {stockcharts_error:.3f}")
+    if failures:
+        print(f"불일치 {len(failures)}건:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("모든 지표가 일치합니다.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
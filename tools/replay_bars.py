@@ -0,0 +1,155 @@
+# tools/replay_bars.py
+"""
+거래소 대신 봉을 한 개씩 흘려보내는 로컬 재생 피드입니다.
+
+봉 저장소의 시리즈(--ticker, --timeframe) 또는 합성 OHLCV 데이터(--bars)를 시간순으로 하나씩 보냅니다.
+
+- 기본: 프로세스 안에서 streaming.StrategyStream에 봉을 넣고 봉당 처리 시간(중앙값/p99/최대)과 신호 수를 출력합니다.
+  --verify를 주면 같은 봉으로 backtester.run_backtest를 실행해 거래 목록이 같은지 비교합니다.
+- --url: 실행 중인 서버의 POST /webhook/bars로 봉을 --batch개씩 보내고(--delay초 간격) 받은 신호를 출력합니다.
+
+사용법:
+    python tools/replay_bars.py --strategy storage/strategies/current.pine --bars 8760 --verify
+    python tools/replay_bars.py --ticker BTCUSDT --timeframe 1h --url http://localhost:8000 --delay 0.5
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import urllib.request
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backtester  # noqa: E402
+import bar_store  # noqa: E402
+import streaming  # noqa: E402
+from bench_backtest import synthetic_bars  # noqa: E402
+
+# 가격 비교 허용 오차 (backtester는 거래 가격을 소수 8자리로 반올림함)
+PRICE_TOLERANCE = 1e-6
+
+
+def load_columns(args):
+    if args.ticker:
+        root = args.bar_dir or os.path.join(ROOT_DIR, "storage", "bars")
+        window = bar_store.get_store(root).window(args.ticker, args.timeframe, args.start, args.end, args.limit)
+        return {name: np.asarray(array) for name, array in window.items()}
+    array = synthetic_bars(args.bars, args.seed)
+    columns = {name: array[:, index + 1] for index, name in enumerate(backtester.OHLCV_COLUMNS)}
+    columns["time"] = array[:, 0].astype(np.int64)
+    return columns
+
+
+def replay_local(code, columns, verify):
+    stream = streaming.StrategyStream(code, record_trades=True)
+    rows = list(zip(*(columns[name].tolist() for name in streaming.BAR_FIELDS)))
+    timings = []
+    signals = 0
+    with np.errstate(invalid="ignore"):
+        for bar in rows:
+            started = time.perf_counter()
+            events = stream.update(bar)
+            timings.append((time.perf_counter() - started) * 1e6)
+            signals += sum(1 for event in events if event["type"] == "signal")
+    timings = np.asarray(timings)
+    print(f"  봉 {len(rows)}개, 신호 {signals}건, 청산된 거래 {len(stream.trades)}건, 현재 {stream.state()['position']}")
+    print(f"  봉당 처리 시간 중앙값 {np.median(timings):.1f}us, p99 {np.percentile(timings, 99):.1f}us, "
+          f"최대 {timings.max():.1f}us")
+    if not verify:
+        return True
+
+    result = backtester.run_backtest(code, {name: columns[name] for name in ("time",) + backtester.OHLCV_COLUMNS},
+                                     include_trades=True)
+    expected = result["trades"]
+    mismatches = []
+    for index, (actual, trade) in enumerate(zip(stream.trades, expected)):
+        same = (actual["type"] == trade["type"] and actual["entry_id"] == trade["entry_id"]
+                and actual["entry_bar"] == trade["entry_bar"] and actual["exit_bar"] == trade["exit_bar"]
+                and actual["exit_reason"] == trade["exit_reason"]
+                and abs(actual["entry_price"] - trade["entry_price"]) <= PRICE_TOLERANCE
+                and abs(actual["exit_price"] - trade["exit_price"]) <= PRICE_TOLERANCE)
+        if not same:
+            mismatches.append((index, actual, trade))
+    if len(stream.trades) != len(expected):
+        print(f"  불일치: 거래 수 스트리밍 {len(stream.trades)}건, 백테스트 {len(expected)}건")
+    for index, actual, trade in mismatches[:5]:
+        print(f"  불일치: {index}번째 거래\n    스트리밍 {actual}\n    백테스트 {trade}")
+    if mismatches or len(stream.trades) != len(expected):
+        return False
+    print(f"  백테스트와 거래 {len(expected)}건이 모두 같습니다.")
+    return True
+
+
+def replay_http(args, columns):
+    url = args.url.rstrip("/") + "/webhook/bars"
+    ticker = args.ticker or "REPLAY"
+    timeframe = args.timeframe or "1h"
+    size = columns["time"].size
+    for start in range(0, size, args.batch):
+        bars = [{name: columns[name][index].item() for name in streaming.BAR_FIELDS}
+                for index in range(start, min(size, start + args.batch))]
+        body = {"ticker": ticker, "timeframe": timeframe, "strategy": args.strategy_name, "bars": bars}
+        request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            result = json.loads(response.read())
+        if result.get("status") != "success":
+            print(f"  오류: {result.get('message') or result.get('detail')}")
+            return False
+        for event in result["events"]:
+            print(f"  {event['time']} {event['type']:<6} {event.get('action', event.get('reason', '')):<8}"
+                  f" {event['direction']:<5} {event['price']}")
+        if args.delay:
+            time.sleep(args.delay)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="봉 재생 피드 (스트리밍 전략 엔진 점검)")
+    parser.add_argument("--strategy", default="storage/strategies/*.pine", help="전략 파일 패턴 (저장소 루트 기준)")
+    parser.add_argument("--ticker", help="봉 저장소의 티커 (없으면 합성 데이터)")
+    parser.add_argument("--timeframe", help="봉 저장소의 타임프레임")
+    parser.add_argument("--bar-dir", help="봉 저장소 디렉토리 (기본값: storage/bars)")
+    parser.add_argument("--start", help="재생 시작 시간 (밀리초 epoch 또는 ISO 8601)")
+    parser.add_argument("--end", help="재생 끝 시간")
+    parser.add_argument("--limit", type=int, help="재생할 마지막 봉 수")
+    parser.add_argument("--bars", type=int, default=8760, help="합성 데이터 봉 개수")
+    parser.add_argument("--seed", type=int, default=7, help="합성 데이터 난수 시드")
+    parser.add_argument("--verify", action="store_true", help="백테스트 결과와 거래 목록 비교")
+    parser.add_argument("--url", help="봉을 보낼 서버 주소 (예: http://localhost:8000)")
+    parser.add_argument("--strategy-name", default="current.pine", help="--url로 보낼 때 서버의 전략 파일명")
+    parser.add_argument("--batch", type=int, default=1, help="--url로 한 번에 보낼 봉 수")
+    parser.add_argument("--delay", type=float, default=0.0, help="--url로 보낼 때 요청 사이 대기 시간 (초)")
+    args = parser.parse_args()
+    if args.ticker and not args.timeframe:
+        parser.error("--ticker에는 --timeframe이 필요합니다.")
+
+    columns = load_columns(args)
+    if args.url:
+        return 0 if replay_http(args, columns) else 1
+
+    paths = sorted(glob.glob(os.path.join(ROOT_DIR, args.strategy)))
+    if not paths:
+        print(f"파일이 없습니다: {args.strategy}")
+        return 1
+    failures = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        print(os.path.basename(path))
+        try:
+            if not replay_local(code, columns, args.verify):
+                failures += 1
+        except backtester.BacktestError as e:
+            print(f"  재생할 수 없음: {e}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# tools/stress_storage.py
+"""
+여러 프로세스가 동시에 같은 저장소에 쓸 때 데이터가 유실되지 않는지 확인하는 스트레스 테스트입니다.
+
+uvicorn --workers N 배포와 같은 상황을 흉내 내어, 각 프로세스가 여러 스레드로
+웹훅 로그 추가, 수정 코드 저장(save_modification), current.pine 읽기, 상태 카운터 저장을
+동시에 수행한 뒤 결과를 검사합니다.
+
+사용법:
+    python tools/stress_storage.py --processes 8 --threads 4 --webhooks 200 --modifications 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import threading
+import multiprocessing
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def run_worker(worker_no, args):
+    """워커 프로세스 하나: 스레드마다 웹훅 추가와 수정 코드 저장을 반복합니다."""
+    logging.disable(logging.CRITICAL)
+    import webhook_log
+    import pine_modifier
+    import status_counters
+    import storage_utils
+
+    log = webhook_log.get_log(os.environ["LOG_DIR"])
+    strategy_dir = os.environ["STRATEGY_DIR"]
+    current_file = os.path.join(strategy_dir, "current.pine")
+    ids = []
+    files = []
+    errors = []
+    lock = threading.Lock()
+
+    def thread_main(thread_no):
+        try:
+            for i in range(args.webhooks):
+                webhook_id = log.append({"worker": worker_no, "thread": thread_no, "seq": i, "ticker": "BTCUSD"})
+                status_counters.counters.record_webhook(webhook_id, time.strftime("%Y-%m-%d %H:%M:%S"))
+                with lock:
+                    ids.append(webhook_id)
+                if args.modifications and i % max(1, args.webhooks // args.modifications) == 0:
+                    code, _ = storage_utils.read_locked(current_file, default='strategy("Stress")\n')
+                    result = pine_modifier.save_modification(code, code + f"// {worker_no}-{thread_no}-{i}\n",
+                                                             {"suggested_improvements": "stress"}, strategy_dir)
+                    if "error" in result:
+                        raise RuntimeError(result["error"])
+                    with lock:
+                        files.append(result["modified_file"])
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    threads = [threading.Thread(target=thread_main, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    status_counters.counters.flush()
+    return ids, files, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="저장소 동시 쓰기 스트레스 테스트")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--webhooks", type=int, default=200, help="스레드당 웹훅 수")
+    parser.add_argument("--modifications", type=int, default=20, help="스레드당 수정 코드 저장 수")
+    parser.add_argument("--segment-bytes", type=int, default=64 * 1024, help="세그먼트 교체를 자주 일으키기 위한 작은 크기")
+    parser.add_argument("--dir", default=None, help="저장소 디렉토리 (기본: 임시 디렉토리)")
+    args = parser.parse_args()
+
+    storage = args.dir or tempfile.mkdtemp(prefix="stress_storage_")
+    os.environ["LOG_DIR"] = os.path.join(storage, "webhooks")
+    os.environ["STRATEGY_DIR"] = os.path.join(storage, "strategies")
+    os.environ["WEBHOOK_LOG_SEGMENT_BYTES"] = str(args.segment_bytes)
+    os.environ["STATUS_COUNTERS_FLUSH_INTERVAL"] = "0.5"
+
+    started = time.time()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(run_worker, [(n, args) for n in range(args.processes)])
+    elapsed = time.time() - started
+
+    ids = [i for r in results for i in r[0]]
+    files = [f for r in results for f in r[1]]
+    errors = [e for r in results for e in r[2]]
+
+    import webhook_log
+    import metadata_store
+    logging.disable(logging.CRITICAL)
+    log = webhook_log.WebhookLog(os.environ["LOG_DIR"])
+    store = metadata_store.get_store(os.environ["STRATEGY_DIR"])
+
+    # 세그먼트 파일의 ID가 전체적으로 정렬되어 있는지 확인
+    record_count = log.count()
+    on_disk = []
+    for segment in log.segments:
+        with open(segment.path, "rb") as f:
+            on_disk.extend(json.loads(line)["id"] for line in f)
+    missing = [i for i in ids if (log.get(i) or {}).get("id") != i]
+    pine_files = [f for f in os.listdir(os.environ["STRATEGY_DIR"]) if f.startswith("modified_") and f.endswith(".pine")]
+    with open(os.path.join(storage, "status_counters.json")) as f:
+        counters = json.load(f)["counts"]
+
+    expected_webhooks = args.processes * args.threads * args.webhooks
+    checks = [
+        ("발급된 웹훅 ID 수", len(ids), expected_webhooks),
+        ("중복 없는 웹훅 ID 수", len(set(ids)), expected_webhooks),
+        ("로그 레코드 수", record_count, expected_webhooks),
+        ("디스크의 레코드 수", len(on_disk), expected_webhooks),
+        ("ID로 찾지 못한 레코드 수", len(missing), 0),
+        ("디스크의 ID 정렬 여부", on_disk == sorted(on_disk), True),
+        ("수정 코드 파일 수", len(pine_files), len(files)),
+        ("중복 없는 수정 코드 파일 수", len(set(files)), len(files)),
+        ("메타데이터 저장소 레코드 수", store.count(), len(files)),
+        ("웹훅 카운터", counters["webhooks"], expected_webhooks),
+        ("수정 내역 카운터", counters["modifications"], len(files)),
+        ("작업 중 오류 수", len(errors), 0),
+    ]
+
+    print(f"저장소: {storage}")
+    print(f"프로세스 {args.processes}개 x 스레드 {args.threads}개, {elapsed:.2f}초, "
+          f"세그먼트 {len(log.segments)}개, 웹훅 {expected_webhooks / elapsed:.0f}건/초")
+    failed = 0
+    for name, actual, expected in checks:
+        ok = actual == expected
+        failed += not ok
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}: {actual} (기대값 {expected})")
+    for error in errors[:10]:
+        print(f"  오류: {error}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# webhook_coalescer.py
+import os
+import json
+import asyncio
+import logging
+
+from job_queue import JobQueueFull
+
+# 로깅 설정
+logger = logging.getLogger("webhook_coalescer")
+
+# 병합 창 설정 (초 단위, 0이면 병합하지 않음)
+WEBHOOK_COALESCE_WINDOW = float(os.getenv("WEBHOOK_COALESCE_WINDOW", "2.0"))
+WEBHOOK_COALESCE_MAX_WAIT = float(os.getenv("WEBHOOK_COALESCE_MAX_WAIT", "10.0"))
+
+
+def coalesce_key(webhook_data):
+    """같은 전략/티커의 웹훅을 묶기 위한 키를 만듭니다."""
+    strategy_name = webhook_data.get("strategy_name", "")
+    ticker = webhook_data.get("ticker", "")
+    return f"{strategy_name}|{ticker}"
+
+
+def merge_payloads(payloads):
+    """
+    도착 순서대로 쌓인 웹훅들을 하나로 병합합니다.
+
+    - recent_trades: 최신 웹훅의 거래부터 중복 없이 합칩니다.
+    - performance: 성과 데이터가 있는 가장 최근 웹훅의 값을 사용합니다.
+    - 나머지 필드: 가장 최근 웹훅의 값을 사용합니다.
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+
+    merged = {}
+    for payload in payloads:
+        merged.update(payload)
+
+    trades = []
+    seen = set()
+    for payload in reversed(payloads):
+        for trade in payload.get("recent_trades", []) or []:
+            trade_key = json.dumps(trade, sort_keys=True, ensure_ascii=False)
+            if trade_key not in seen:
+                seen.add(trade_key)
+                trades.append(trade)
+    if trades:
+        merged["recent_trades"] = trades
+
+    for payload in reversed(payloads):
+        if payload.get("performance"):
+            merged["performance"] = payload["performance"]
+            break
+
+    merged["coalesced_count"] = len(payloads)
+    return merged
+
+
+class WebhookCoalescer:
+    """
+    전략/티커별로 짧은 시간 안에 들어온 웹훅을 모아 하나의 작업으로 처리합니다.
+
+    첫 웹훅이 도착하면 작업을 만들고, 같은 키의 웹훅이 window초 안에 계속 들어오면
+    처리 시점을 뒤로 미룹니다(최대 max_wait초). 병합된 웹훅은 모두 같은 작업 ID를 받습니다.
+    """
+
+    def __init__(self, job_queue, window=WEBHOOK_COALESCE_WINDOW, max_wait=WEBHOOK_COALESCE_MAX_WAIT):
+        self.job_queue = job_queue
+        self.window = window
+        self.max_wait = max(max_wait, window)
+        self._pending = {}
+
+    def submit(self, webhook_data, webhook_id=None):
+        """
+        웹훅을 병합 대기열에 추가하고 (작업, 기존 작업에 합류했는지 여부)를 반환합니다.
+        """
+        if self.window <= 0:
+            job = self.job_queue.submit(webhook_data, webhook_ids=[webhook_id], coalesced_requests=1)
+            return job, False
+
+        loop = asyncio.get_running_loop()
+        key = coalesce_key(webhook_data)
+        batch = self._pending.get(key)
+        joined = batch is not None
+
+        if batch is None:
+            job = self.job_queue.create(coalesce_key=key, webhook_ids=[], coalesced_requests=0)
+            batch = {"job": job, "payloads": [], "first_at": loop.time(), "handle": None}
+            self._pending[key] = batch
+        else:
+            batch["handle"].cancel()
+
+        batch["payloads"].append(webhook_data)
+        batch["job"].info["webhook_ids"].append(webhook_id)
+        batch["job"].info["coalesced_requests"] = len(batch["payloads"])
+
+        # 디바운스: 마지막 웹훅 이후 window초 뒤에 처리하되 최대 대기 시간을 넘기지 않음
+        delay = min(self.window, batch["first_at"] + self.max_wait - loop.time())
+        batch["handle"] = loop.call_later(max(0.0, delay), self._flush, key)
+
+        logger.debug(f"웹훅 병합 대기: {key} ({len(batch['payloads'])}개)")
+        return batch["job"], joined
+
+    def _flush(self, key):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        merged = merge_payloads(batch["payloads"])
+        logger.debug(f"웹훅 {len(batch['payloads'])}개를 병합하여 작업 등록: {batch['job'].id}")
+        try:
+            self.job_queue.enqueue(batch["job"], merged)
+        except JobQueueFull as e:
+            logger.error(f"병합된 작업 등록 실패: {str(e)}")
+
+    def stats(self):
+        return {
+            "window": self.window,
+            "max_wait": self.max_wait,
+            "pending_keys": len(self._pending),
+            "pending_webhooks": sum(len(b["payloads"]) for b in self._pending.values())
+        }
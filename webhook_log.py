@@ -0,0 +1,457 @@
+# webhook_log.py
+import os
+import time
+import bisect
+import datetime
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+
+import fast_json
+from storage_utils import new_ulid, ulid_time, file_lock
+
+# 로깅 설정
+logger = logging.getLogger("webhook_log")
+
+# 세그먼트 로그 설정 (환경 변수로 조정 가능)
+WEBHOOK_LOG_SEGMENT_BYTES = int(os.getenv("WEBHOOK_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+WEBHOOK_LOG_SEGMENT_SECONDS = float(os.getenv("WEBHOOK_LOG_SEGMENT_SECONDS", str(24 * 3600)))
+WEBHOOK_LOG_INDEX_INTERVAL = int(os.getenv("WEBHOOK_LOG_INDEX_INTERVAL", "64"))
+WEBHOOK_LOG_COMMIT_DELAY = float(os.getenv("WEBHOOK_LOG_COMMIT_DELAY", "0.002"))
+WEBHOOK_LOG_FSYNC = os.getenv("WEBHOOK_LOG_FSYNC", "true") == "true"
+
+LOCK_FILENAME = ".lock"
+SEGMENT_PREFIX = "segment_"
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx"
+
+
+def _dumps(obj):
+    return fast_json.dumps_str(obj)
+
+
+def _id_time(record_id):
+    """레코드 ID(ULID)에 들어 있는 생성 시각(epoch 초)을 반환합니다."""
+    created_at = ulid_time(record_id)
+    return created_at if created_at is not None else time.time()
+
+
+class Segment:
+    """세그먼트 파일 하나의 메타데이터와 희소 인덱스입니다."""
+
+    def __init__(self, directory, seq):
+        self.seq = seq
+        self.path = os.path.join(directory, f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{SEGMENT_PREFIX}{seq:08d}{INDEX_SUFFIX}")
+        self.size = 0
+        self.records = 0
+        self.first_id = None
+        self.last_id = None
+        self.last_received_at = None
+        self.created_at = time.time()
+        self.sealed = False
+        # 희소 인덱스: INDEX_INTERVAL개마다 (id, offset)
+        self.index_ids = []
+        self.index_offsets = []
+
+
+class WebhookLog:
+    """
+    웹훅을 세그먼트 단위의 추가 전용 NDJSON 로그로 저장합니다.
+
+    - 세그먼트는 크기(WEBHOOK_LOG_SEGMENT_BYTES)나 생성 후 경과 시간
+      (WEBHOOK_LOG_SEGMENT_SECONDS)을 넘으면 교체됩니다.
+    - 세그먼트마다 INDEX_INTERVAL개 레코드마다 (id, offset)을 기록한 희소 인덱스를 둡니다.
+    - 동시에 들어온 추가 요청은 묶어서 한 번의 fsync로 커밋합니다(group commit).
+    - 여러 프로세스(uvicorn --workers N)가 같은 로그를 쓸 수 있습니다. 쓰기는 디렉토리의
+      잠금 파일에 배타 잠금을 걸고, 다른 프로세스가 그동안 추가한 레코드와 세그먼트를
+      먼저 따라 읽은 뒤(catch-up) 진행합니다. 레코드 ID(ULID)도 잠금 안에서 디스크의
+      마지막 ID보다 크게 발급하므로 세그먼트 안팎에서 항상 정렬되어 있습니다.
+    """
+
+    def __init__(self, log_dir, segment_bytes=WEBHOOK_LOG_SEGMENT_BYTES, segment_seconds=WEBHOOK_LOG_SEGMENT_SECONDS,
+                 index_interval=WEBHOOK_LOG_INDEX_INTERVAL, commit_delay=WEBHOOK_LOG_COMMIT_DELAY, fsync=WEBHOOK_LOG_FSYNC):
+        self.directory = os.path.join(log_dir, "segments")
+        self.lock_path = os.path.join(self.directory, LOCK_FILENAME)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.index_interval = max(1, index_interval)
+        self.commit_delay = commit_delay
+        self.fsync = fsync
+
+        # _cond: group commit 조정용, _state_lock: 세그먼트 상태 변경/조회용
+        self._cond = threading.Condition()
+        self._state_lock = threading.Lock()
+        self._pending = []
+        self._flushing = False
+        self._open_batch = 1
+        self._committed_batch = 0
+        self._batch_errors = {}
+        self._data_file = None
+        self._index_file = None
+        self._file_seq = None
+        self._opened = False
+        self.segments = []
+        self.total_records = 0
+        self.commits = 0
+
+    # ------------------------------------------------------------------
+    # 열기, 복구, 다른 프로세스의 변경 따라 읽기
+    # ------------------------------------------------------------------
+    def _ensure_open(self):
+        """처음 사용할 때 세그먼트를 읽고 복구합니다. _state_lock을 잡은 상태에서 호출합니다."""
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.lock_path):
+            seqs = sorted(
+                int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                for name in os.listdir(self.directory)
+                if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+            )
+            for i, seq in enumerate(seqs):
+                segment = Segment(self.directory, seq)
+                self._load_segment(segment, is_last=(i == len(seqs) - 1))
+                self.segments.append(segment)
+                self.total_records += segment.records
+        self._opened = True
+        logger.debug(f"웹훅 로그 열기 완료: 세그먼트 {len(self.segments)}개, 레코드 {self.total_records}개")
+
+    def _scan_records(self, segment, start, count, build_index):
+        """
+        segment의 start 위치부터 끝까지 완전한 레코드를 읽어 상태를 갱신합니다.
+        (읽은 뒤 레코드 수, 마지막 완전한 레코드의 끝 위치, 새 인덱스 항목)을 반환합니다.
+        """
+        valid_end = start
+        new_index = []
+        with open(segment.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                record = fast_json.loads(raw)
+                if build_index and count % self.index_interval == 0:
+                    new_index.append((record["id"], offset))
+                if segment.first_id is None and count == 0:
+                    segment.first_id = record["id"]
+                segment.last_id = record["id"]
+                segment.last_received_at = record.get("received_at")
+                count += 1
+                offset += len(raw)
+                valid_end = offset
+        return count, valid_end, new_index
+
+    def _load_segment(self, segment, is_last):
+        """인덱스 파일을 읽고, 봉인되지 않은 세그먼트는 마지막 인덱스 위치부터 끝까지 스캔합니다."""
+        sealed_info = None
+        if os.path.exists(segment.index_path):
+            with open(segment.index_path, "r") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    entry = fast_json.loads(line)
+                    if entry.get("sealed"):
+                        sealed_info = entry
+                    else:
+                        segment.index_ids.append(entry["id"])
+                        segment.index_offsets.append(entry["offset"])
+        segment.size = os.path.getsize(segment.path)
+
+        if sealed_info is not None:
+            segment.sealed = True
+            segment.records = sealed_info["count"]
+            segment.first_id = segment.index_ids[0] if segment.index_ids else None
+            segment.last_id = sealed_info["last_id"]
+            segment.last_received_at = sealed_info.get("last_received_at")
+            return
+
+        # 파일 끝을 넘어서는 위치를 가리키는 인덱스 항목은 버립니다.
+        while segment.index_offsets and segment.index_offsets[-1] >= segment.size:
+            segment.index_ids.pop()
+            segment.index_offsets.pop()
+        start = segment.index_offsets[-1] if segment.index_offsets else 0
+        records_before = (len(segment.index_offsets) - 1) * self.index_interval if segment.index_offsets else 0
+        rebuild = not segment.index_offsets
+
+        count, valid_end, new_index = self._scan_records(segment, start, records_before, rebuild)
+
+        # 마지막 줄이 중간에 끊겼다면(비정상 종료) 잘라냅니다.
+        if valid_end < segment.size:
+            logger.warning(f"세그먼트 끝의 불완전한 레코드를 잘라냅니다: {segment.path}")
+            with open(segment.path, "r+b") as f:
+                f.truncate(valid_end)
+            segment.size = valid_end
+
+        if rebuild and new_index:
+            segment.index_ids = [i for i, _ in new_index]
+            segment.index_offsets = [o for _, o in new_index]
+            with open(segment.index_path, "w") as f:
+                for record_id, offset in new_index:
+                    f.write(_dumps({"id": record_id, "offset": offset}) + "\n")
+        if segment.index_ids:
+            segment.first_id = segment.index_ids[0]
+        if segment.first_id is not None:
+            segment.created_at = _id_time(segment.first_id)
+        segment.records = count
+
+        if not is_last:
+            self._seal(segment)
+
+    def _catch_up(self):
+        """
+        다른 프로세스가 추가한 레코드와 새 세그먼트를 메모리 상태에 반영합니다.
+        _state_lock과 잠금 파일(공유 또는 배타)을 잡은 상태에서 호출합니다.
+        """
+        active = self.segments[-1] if self.segments else None
+        if active is not None and not active.sealed:
+            size = os.path.getsize(active.path)
+            if size > active.size:
+                before = active.records
+                count, valid_end, new_index = self._scan_records(active, active.size, active.records, True)
+                for record_id, offset in new_index:
+                    active.index_ids.append(record_id)
+                    active.index_offsets.append(offset)
+                active.records = count
+                active.size = valid_end
+                self.total_records += count - before
+                if before == 0 and active.first_id is not None:
+                    active.created_at = _id_time(active.first_id)
+
+        # 다른 프로세스가 세그먼트를 교체했으면 다음 번호의 세그먼트가 생겨 있음
+        seq = active.seq + 1 if active is not None else 1
+        while os.path.exists(Segment(self.directory, seq).path):
+            if active is not None:
+                active.sealed = True
+            segment = Segment(self.directory, seq)
+            self._load_segment(segment, is_last=True)
+            self.segments.append(segment)
+            self.total_records += segment.records
+            active = segment
+            seq += 1
+
+    @contextmanager
+    def _synced(self, exclusive=False):
+        """세그먼트 상태를 잠그고 디스크와 맞춘 상태에서 작업합니다."""
+        with self._state_lock:
+            self._ensure_open()
+            with file_lock(self.lock_path, exclusive=exclusive):
+                self._catch_up()
+                yield
+
+    # ------------------------------------------------------------------
+    # 세그먼트 교체
+    # ------------------------------------------------------------------
+    def _seal(self, segment):
+        with open(segment.index_path, "a") as f:
+            f.write(_dumps({
+                "sealed": True,
+                "count": segment.records,
+                "last_id": segment.last_id,
+                "last_received_at": segment.last_received_at
+            }) + "\n")
+        segment.sealed = True
+
+    def _close_files(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = None
+        self._index_file = None
+        self._file_seq = None
+
+    def _open_files(self, segment):
+        if self._file_seq != segment.seq:
+            self._close_files()
+            self._data_file = open(segment.path, "ab")
+            self._index_file = open(segment.index_path, "a")
+            self._file_seq = segment.seq
+
+    def _needs_rotation(self, segment):
+        too_big = segment.size >= self.segment_bytes
+        too_old = segment.records > 0 and time.time() - segment.created_at >= self.segment_seconds
+        return segment.sealed or too_big or too_old
+
+    def _active_segment(self):
+        """쓰기 대상 세그먼트를 반환하고, 필요하면 새 세그먼트로 교체합니다."""
+        active = self.segments[-1] if self.segments else None
+        if active is not None and not active.sealed:
+            if not self._needs_rotation(active):
+                self._open_files(active)
+                return active
+            self._close_files()
+            self._seal(active)
+            logger.debug(f"세그먼트 교체: {active.path} ({active.records}개 레코드)")
+
+        seq = active.seq + 1 if active is not None else 1
+        segment = Segment(self.directory, seq)
+        self._open_files(segment)
+        self.segments.append(segment)
+        return segment
+
+    # ------------------------------------------------------------------
+    # 쓰기 (group commit)
+    # ------------------------------------------------------------------
+    def append(self, data):
+        """
+        웹훅 데이터를 로그에 추가하고, 디스크에 커밋된 뒤 레코드 ID를 반환합니다.
+        """
+        entry = {"id": None, "received_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "data": data}
+        with self._cond:
+            self._pending.append(entry)
+            my_batch = self._open_batch
+
+            while self._committed_batch < my_batch:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # 리더가 되어 잠시 기다린 뒤 모인 레코드를 한 번에 커밋
+                self._flushing = True
+                if self.commit_delay > 0:
+                    self._cond.wait(self.commit_delay)
+                batch = self._pending
+                batch_id = self._open_batch
+                self._pending = []
+                self._open_batch += 1
+                self._cond.release()
+                error = None
+                try:
+                    with self._synced(exclusive=True):
+                        self._write_batch(batch)
+                except Exception as e:
+                    error = e
+                    logger.error(f"웹훅 로그 커밋 중 오류: {str(e)}")
+                    logger.error(traceback.format_exc())
+                finally:
+                    self._cond.acquire()
+                self._committed_batch = batch_id
+                if error is not None:
+                    self._batch_errors[batch_id] = error
+                self._flushing = False
+                self._cond.notify_all()
+
+            error = self._batch_errors.get(my_batch)
+            if error is not None:
+                raise error
+            self._batch_errors = {k: v for k, v in self._batch_errors.items() if k > my_batch - 100}
+            return entry["id"]
+
+    def _write_batch(self, batch):
+        """레코드 묶음에 ID를 발급하고 세그먼트에 쓴 뒤 fsync 한 번으로 커밋합니다."""
+        chunk = []
+        index_lines = []
+        segment = None
+        last_id = self.segments[-1].last_id if self.segments else None
+        for entry in batch:
+            if segment is None or self._needs_rotation(segment):
+                # 교체 전에 이전 세그먼트에 모인 레코드를 먼저 씀
+                if segment is not None:
+                    self._flush_chunk(segment, chunk, index_lines)
+                    chunk, index_lines = [], []
+                segment = self._active_segment()
+            record_id = new_ulid(after=last_id)
+            last_id = record_id
+            line = fast_json.dumps({"id": record_id, "received_at": entry["received_at"], "data": entry["data"]}) + b"\n"
+            if segment.records % self.index_interval == 0:
+                index_lines.append(_dumps({"id": record_id, "offset": segment.size}) + "\n")
+                segment.index_ids.append(record_id)
+                segment.index_offsets.append(segment.size)
+            if segment.first_id is None:
+                segment.first_id = record_id
+                segment.created_at = _id_time(record_id)
+            chunk.append(line)
+            segment.size += len(line)
+            segment.records += 1
+            segment.last_id = record_id
+            segment.last_received_at = entry["received_at"]
+            self.total_records += 1
+            entry["id"] = record_id
+        if segment is not None:
+            self._flush_chunk(segment, chunk, index_lines)
+        self.commits += 1
+
+    def _flush_chunk(self, segment, chunk, index_lines):
+        self._data_file.write(b"".join(chunk))
+        self._data_file.flush()
+        if self.fsync:
+            os.fsync(self._data_file.fileno())
+        if index_lines:
+            self._index_file.write("".join(index_lines))
+            self._index_file.flush()
+
+    # ------------------------------------------------------------------
+    # 읽기
+    # ------------------------------------------------------------------
+    def get(self, record_id):
+        """레코드 ID로 웹훅 레코드를 찾습니다. 없으면 None을 반환합니다."""
+        with self._synced():
+            first_ids = [s.first_id for s in self.segments if s.first_id is not None]
+            segments = [s for s in self.segments if s.first_id is not None]
+            pos = bisect.bisect_right(first_ids, record_id) - 1
+            if pos < 0:
+                return None
+            segment = segments[pos]
+            if segment.last_id is not None and record_id > segment.last_id:
+                return None
+            idx = bisect.bisect_right(segment.index_ids, record_id) - 1
+            if idx < 0:
+                return None
+            offset = segment.index_offsets[idx]
+            end = segment.size
+
+        with open(segment.path, "rb") as f:
+            f.seek(offset)
+            while f.tell() < end:
+                raw = f.readline()
+                if not raw.endswith(b"\n"):
+                    break
+                record = fast_json.loads(raw)
+                if record["id"] == record_id:
+                    return record
+                if record["id"] > record_id:
+                    break
+        return None
+
+    def count(self):
+        with self._synced():
+            return self.total_records
+
+    def latest(self):
+        """가장 최근 레코드의 ID와 수신 시각을 반환합니다."""
+        with self._synced():
+            for segment in reversed(self.segments):
+                if segment.last_id is not None:
+                    return {"id": segment.last_id, "timestamp": segment.last_received_at}
+        return None
+
+    def summary(self):
+        """레코드 수와 가장 최근 레코드를 같은 시점에서 읽어 {"records", "latest"}로 반환합니다."""
+        with self._synced():
+            latest = None
+            for segment in reversed(self.segments):
+                if segment.last_id is not None:
+                    latest = {"id": segment.last_id, "timestamp": segment.last_received_at}
+                    break
+            return {"records": self.total_records, "latest": latest}
+
+    def stats(self):
+        with self._synced():
+            return {
+                "segments": len(self.segments),
+                "records": self.total_records,
+                "commits": self.commits,
+                "active_segment": os.path.basename(self.segments[-1].path) if self.segments else None
+            }
+
+
+# 로그 디렉토리별 인스턴스 (프로세스 안에서 공유)
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_log(log_dir):
+    with _logs_lock:
+        if log_dir not in _logs:
+            _logs[log_dir] = WebhookLog(log_dir)
+        return _logs[log_dir]